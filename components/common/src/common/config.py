@@ -34,6 +34,20 @@ REGION = os.getenv("REGION", "us-central1")
 CUSTOM_CLAIMS_ENABLED = bool(
     os.getenv("CUSTOM_CLAIMS_ENABLED", "false").lower() == "true")
 
+# in-process cache of validated tokens, see common.utils.auth_service
+AUTH_TOKEN_CACHE_ENABLED = bool(
+    os.getenv("AUTH_TOKEN_CACHE_ENABLED", "true").lower() == "true")
+AUTH_TOKEN_CACHE_MAX_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_MAX_SIZE", "10000"))
+# seconds a validated token (or user record) is reused.  This is how long a
+# deactivated or deleted user can keep access, so keep it short.
+AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "60"))
+# verify Firebase ID tokens locally instead of calling the auth service.
+# The user record is read from Firestore (and cached like tokens) to check
+# the user status and add the user type; tokens of users without a record
+# are still validated by the auth service.
+AUTH_LOCAL_TOKEN_VERIFICATION = bool(
+    os.getenv("AUTH_LOCAL_TOKEN_VERIFICATION", "false").lower() == "true")
+
 # TODO: Automate this with existing GKE service names.
 SERVICES = {
     "authentication": {
@@ -14,18 +14,83 @@
 """
 FireO BaseModel to be inherited by all other objects in ORM
 """
+import asyncio
+import base64
 import datetime
-from typing import List, Tuple
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
 import fireo
+from fireo.database import db
 from fireo.models import Model
+from fireo.queries.query_wrapper import ModelWrapper
 from fireo.fields import DateTime, TextField
 from fireo.fields.errors import (RequiredField,
                                  UnSupportedAttribute,
                                  FieldValidationFailed,
                                  ValidatorNotCallable)
-from common.utils.errors import ResourceNotFoundException
+from google.cloud import firestore
+from common.utils.errors import ResourceNotFoundException, ValidationError
 import common.config
 
+# max number of writes in a single Firestore batch commit
+FIRESTORE_BATCH_WRITE_LIMIT = 500
+# max number of concurrent batch commits in save_all
+FIRESTORE_BATCH_WRITE_WORKERS = 4
+
+# shared async Firestore clients keyed by event loop
+_async_db_clients = {}
+_async_db_clients_lock = threading.Lock()
+
+
+def get_async_db_client() -> firestore.AsyncClient:
+  """
+  Get the shared async Firestore client of the running event loop, using
+  the project and credentials of the fireo connection.  Async clients are
+  bound to the event loop they are used on, so a new client is created for
+  a new loop.
+  """
+  loop = asyncio.get_running_loop()
+  with _async_db_clients_lock:
+    client_loop, client = _async_db_clients.get(id(loop), (None, None))
+    if client is None or client_loop is not loop:
+      # drop clients of event loops that have been closed
+      for stale_key in [k for k, (l, _) in _async_db_clients.items()
+                        if l.is_closed()]:
+        del _async_db_clients[stale_key]
+      # pylint: disable=protected-access
+      client = firestore.AsyncClient(project=db.conn.project,
+                                     credentials=db.conn._credentials)
+      _async_db_clients[id(loop)] = (loop, client)
+    return client
+
+
+class _WriteRecorder():
+  """
+  Stands in for a fireo batch to record the writes of a save or update,
+  so that fireo serializes the model and the writes can be sent with the
+  async client.
+  """
+
+  def __init__(self):
+    self.writes = []
+
+  def set(self, ref, data, merge=False):
+    self.writes.append(("set", ref.path, data, merge))
+
+  def update(self, ref, data):
+    self.writes.append(("update", ref.path, data, None))
+
+  async def commit(self):
+    client = get_async_db_client()
+    for op, path, data, merge in self.writes:
+      doc_ref = client.document(path)
+      if op == "set":
+        await doc_ref.set(data, merge=bool(merge))
+      elif data:
+        await doc_ref.update(data)
+
 
 # pylint: disable = too-few-public-methods, arguments-renamed
 class BaseModel(Model):
@@ -89,6 +154,137 @@ class BaseModel(Model):
     self.last_modified_time = date_timestamp
     return super().update(key, transaction, batch)
 
+  async def asave(self, input_datetime=None, merge=None) -> "BaseModel":
+    """Saves this object with the async Firestore client, setting the
+       timestamps as save does.
+        Args:
+            input_datetime (datetime, optional): Defaults to now.
+            merge (bool, optional): merge into an existing document
+        Returns:
+            BaseModel: this object
+        """
+    if self._id is None:
+      self._id = self.new_id()
+    writes = _WriteRecorder()
+    self.save(input_datetime=input_datetime, batch=writes, merge=merge)
+    await writes.commit()
+    return self
+
+  async def aupdate(self, input_datetime=None, key=None) -> "BaseModel":
+    """Updates the changed fields of this object with the async Firestore
+       client, setting last_modified_time as update does.
+        Args:
+            input_datetime (datetime, optional): Defaults to now.
+            key (str, optional): key of the document to update
+        Returns:
+            BaseModel: this object
+        """
+    writes = _WriteRecorder()
+    self.update(input_datetime=input_datetime, key=key, batch=writes)
+    await writes.commit()
+    return self
+
+  @classmethod
+  def _encode_page_token(cls, order_field: str, value,
+                         doc_id: Optional[str] = None) -> str:
+    """
+    Encode the order field value of the last object in a page, and its
+    document id for queries that order by the document id after the
+    order field, so that objects with the same value are not skipped
+    """
+    is_datetime = isinstance(value, datetime.datetime)
+    cursor = {
+      "field": order_field,
+      "value": value.isoformat() if is_datetime else value,
+      "is_datetime": is_datetime
+    }
+    if doc_id is not None:
+      cursor["id"] = doc_id
+    return base64.urlsafe_b64encode(
+        json.dumps(cursor).encode("utf-8")).decode("utf-8")
+
+  @classmethod
+  def _decode_page_token(cls, page_token: str) -> dict:
+    """
+    Decode a page token into start_after field values, including the
+    document id as "__name__" if the token has one
+    """
+    try:
+      cursor = json.loads(base64.urlsafe_b64decode(page_token.encode("utf-8")))
+      value = cursor["value"]
+      if cursor["is_datetime"]:
+        value = datetime.datetime.fromisoformat(value)
+      field_values = {cursor["field"]: value}
+      if "id" in cursor:
+        field_values["__name__"] = str(cursor["id"])
+      return field_values
+    except (ValueError, KeyError, TypeError) as e:
+      raise ValidationError(f"Invalid page token {page_token}") from e
+
+  @classmethod
+  def count_query(cls, query) -> int:
+    """Count the objects matching a query with a Firestore aggregation
+       query, without reading the documents.
+        Args:
+            query: filtered query of this model, e.g.
+              cls.collection.filter(...)
+        Returns:
+            int: number of matching objects
+        """
+    result = query.query().count().get()
+    return int(result[0][0].value)
+
+  @classmethod
+  def new_id(cls) -> str:
+    """Generates a document id for a new object of this type, so that other
+       objects can reference it before it is saved.
+        Returns:
+            str: a new document id
+        """
+    return db.conn.collection(cls._meta.collection_name).document().id
+
+  @classmethod
+  def save_all(cls,
+               objects: List["BaseModel"],
+               input_datetime=None,
+               batch_size=FIRESTORE_BATCH_WRITE_LIMIT,
+               max_workers=FIRESTORE_BATCH_WRITE_WORKERS) -> List["BaseModel"]:
+    """Saves new objects of this type with batched writes of up to
+       batch_size objects, committing up to max_workers batches concurrently.
+       Objects without an id are given one before they are written.
+       Batches are committed atomically, but not all objects are saved if a
+       batch fails.
+        Args:
+            objects (list): objects to save
+            input_datetime (datetime, optional): created time of the objects.
+              Defaults to now.
+            batch_size (int): max number of objects per batch commit
+            max_workers (int): max number of concurrent batch commits
+        Returns:
+            list: the saved objects
+        """
+    if input_datetime is None:
+      input_datetime = datetime.datetime.utcnow()
+    for obj in objects:
+      if obj.id is None:
+        obj.id = cls.new_id()
+
+    def commit_batch(batch_objects):
+      batch = fireo.batch()
+      for obj in batch_objects:
+        obj.save(input_datetime=input_datetime, batch=batch)
+      batch.commit()
+
+    batches = [objects[i:i + batch_size]
+               for i in range(0, len(objects), batch_size)]
+    if len(batches) <= 1 or max_workers <= 1:
+      for batch_objects in batches:
+        commit_batch(batch_objects)
+    else:
+      with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(commit_batch, batches))
+    return objects
+
   def get_fields(self, reformat_datetime=False, remove_meta=False):
     """
     Overrides default method to fix data type for datetime fields.
@@ -146,6 +342,129 @@ class BaseModel(Model):
           f"{cls.collection_name} with id {doc_id} is not found")
     return obj
 
+  @classmethod
+  def find_by_ids(cls, doc_ids: List[str]) -> List["BaseModel"]:
+    """Looks up multiple objects of this type by id (not key) in a single
+       batched read.  Missing and soft deleted objects are skipped.
+        Args:
+            doc_ids (list): document ids without collection_name
+        Returns:
+            [any]: list of objects in the order of doc_ids
+        """
+    unique_ids = list(dict.fromkeys(doc_ids))
+    if not unique_ids:
+      return []
+    collection = db.conn.collection(cls.collection_name)
+    refs = [collection.document(doc_id) for doc_id in unique_ids]
+    objects = {}
+    for doc in db.conn.get_all(refs):
+      obj = cls._from_document(doc)
+      if obj is not None and obj.deleted_at_timestamp is None:
+        objects[doc.id] = obj
+    return [objects[doc_id] for doc_id in doc_ids if doc_id in objects]
+
+  @classmethod
+  def _from_document(cls, doc) -> Optional["BaseModel"]:
+    """ Object of this type from a document snapshot, None if missing """
+    if not doc.exists:
+      return None
+    obj = ModelWrapper.from_query_result(cls(), doc)
+    if obj is not None:
+      # attach key so the object can be updated, as fireo queries do
+      # pylint: disable=protected-access
+      obj._update_doc = obj.key
+    return obj
+
+  @classmethod
+  def _column_name(cls, field_name: str) -> str:
+    """ Firestore field name of a model field """
+    field = cls._meta.field_list.get(field_name)
+    return field.db_column_name if field is not None else field_name
+
+  @classmethod
+  async def afind_by_id(cls, doc_id):
+    """Async version of find_by_id, reading the document with the async
+       Firestore client.
+        Args:
+            doc_id (string): the document id without collection_name
+        Raises:
+            ResourceNotFoundException: if the object is missing or deleted
+        Returns:
+            [any]: an instance of the subclassed Model
+        """
+    client = get_async_db_client()
+    doc = await client.collection(cls.collection_name).document(doc_id).get()
+    obj = cls._from_document(doc)
+    if obj is None or obj.deleted_at_timestamp is not None:
+      raise ResourceNotFoundException(
+          f"{cls.collection_name} with id {doc_id} is not found")
+    return obj
+
+  @classmethod
+  async def afind_by_ids(cls, doc_ids: List[str]) -> List["BaseModel"]:
+    """Async version of find_by_ids: looks up multiple objects in a single
+       batched read.  Missing and soft deleted objects are skipped.
+        Args:
+            doc_ids (list): document ids without collection_name
+        Returns:
+            [any]: list of objects in the order of doc_ids
+        """
+    unique_ids = list(dict.fromkeys(doc_ids))
+    if not unique_ids:
+      return []
+    client = get_async_db_client()
+    collection = client.collection(cls.collection_name)
+    refs = [collection.document(doc_id) for doc_id in unique_ids]
+    objects = {}
+    async for doc in client.get_all(refs):
+      obj = cls._from_document(doc)
+      if obj is not None and obj.deleted_at_timestamp is None:
+        objects[doc.id] = obj
+    return [objects[doc_id] for doc_id in doc_ids if doc_id in objects]
+
+  @classmethod
+  async def afetch(cls,
+                   filters: Sequence[Tuple[str, str, object]] = (),
+                   order_by: Optional[str] = None,
+                   skip: int = 0,
+                   limit: Optional[int] = None,
+                   include_deleted: bool = False) -> List["BaseModel"]:
+    """Fetches objects of this type matching filters with the async
+       Firestore client.  Soft deleted objects are skipped unless
+       include_deleted is set.
+        Args:
+            filters (list): (field name, operator, value) filters, e.g.
+              [("user_id", "==", user_id)]
+            order_by (str, optional): field to order by, prefixed with "-"
+              for descending order
+            skip (int): number of objects to skip
+            limit (int, optional): max number of objects
+            include_deleted (bool): include soft deleted objects
+        Returns:
+            list: list of objects
+        """
+    client = get_async_db_client()
+    query = client.collection(cls.collection_name)
+    for field_name, op, value in filters:
+      query = query.where(cls._column_name(field_name), op, value)
+    if not include_deleted:
+      query = query.where("deleted_at_timestamp", "==", None)
+    if order_by:
+      direction = firestore.Query.ASCENDING
+      if order_by.startswith("-"):
+        direction = firestore.Query.DESCENDING
+      query = query.order_by(cls._column_name(order_by.lstrip("-")),
+                             direction=direction)
+    if skip:
+      query = query.offset(skip)
+    if limit:
+      query = query.limit(limit)
+    objects = []
+    async for doc in query.stream():
+      obj = cls._from_document(doc)
+      if obj is not None:
+        objects.append(obj)
+    return objects
 
   def reload(self):
     """ reload this model """
@@ -14,8 +14,11 @@
 """
 Models for LLM generation and chat
 """
-from typing import List, Optional, TYPE_CHECKING
-from fireo.fields import TextField, ListField, IDField
+from typing import List, Optional, Tuple, TYPE_CHECKING
+from fireo.database import db
+from fireo.fields import TextField, ListField, IDField, NumberField
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 from common.models import BaseModel
 
 # Use TYPE_CHECKING to avoid circular imports
@@ -34,6 +37,18 @@ CHAT_QUERY_RESULT = "QueryResult"
 CHAT_QUERY_REFERENCES = "QueryReferences"
 CHAT_QUERY_REFRENCE_READABLE = "ReadableQueryReference"
 
+# denormalized fields returned by chat listings, which never read history
+CHAT_SUMMARY_FIELDS = [
+  "user_id",
+  "title",
+  "prompt",
+  "llm_type",
+  "agent_name",
+  "message_count",
+  "created_time",
+  "last_modified_time"
+]
+
 class UserChat(BaseModel):
   """
   UserChat ORM class
@@ -45,11 +60,46 @@ class UserChat(BaseModel):
   llm_type = TextField(required=False)
   agent_name = TextField(required=False)
   history = ListField(default=[])
+  message_count = NumberField(default=0)
 
   class Meta:
     ignore_none_field = False
     collection_name = BaseModel.DATABASE_PREFIX + "user_chats"
 
+  def save(self,
+           input_datetime=None,
+           transaction=None,
+           batch=None,
+           merge=None,
+           no_return=False):
+    """ refresh chat summary fields before saving """
+    self.update_summary()
+    return super().save(input_datetime, transaction, batch, merge, no_return)
+
+  def update(self,
+             input_datetime=None,
+             key=None,
+             transaction=None,
+             batch=None):
+    """ refresh chat summary fields before updating """
+    self.update_summary()
+    return super().update(input_datetime, key, transaction, batch)
+
+  def update_summary(self):
+    """
+    Update the denormalized summary fields (first prompt and message count)
+    from chat history, so chat listings do not need to read the history.
+    """
+    history = self.history or []
+    messages = [entry for entry in history
+                if self.is_human(entry) or self.is_ai(entry)]
+    self.message_count = len(messages)
+    if not self.prompt:
+      first_prompt = next(
+          (entry for entry in messages if self.is_human(entry)), None)
+      if first_prompt:
+        self.prompt = self.entry_content(first_prompt)
+
   @classmethod
   def find_by_user(cls,
                    user_id,
@@ -75,6 +125,99 @@ class UserChat(BaseModel):
             None).order(order_by).offset(skip).fetch(limit)
     return list(objects)
 
+  @classmethod
+  def find_summaries_by_user(cls,
+                             user_id,
+                             skip=0,
+                             order_by="-created_time",
+                             limit=20,
+                             page_token=None) -> Tuple[List[dict],
+                                                       Optional[str]]:
+    """
+    Fetch chat summaries for user.  Only the denormalized summary fields
+    are read from the database (chat history is never fetched), and
+    skip/limit/order are applied by the database query.  Chats are
+    ordered by document id after order_by, so that pages don't skip
+    chats with the same order_by value.
+
+    Args:
+        user_id (str): User id
+        skip (int, optional): number of chats to skip, ignored if
+          page_token is provided.
+        order_by (str, optional): order list according to order_by field.
+        limit (int, optional): max number of chats to be fetched.
+        page_token (str, optional): next_page_token returned by a
+          previous call, to fetch the following page.
+
+    Returns:
+        Tuple of list of chat summary dicts and the next page token
+        (None if there are no more chats).
+    """
+    order_field = order_by.lstrip("-")
+    direction = firestore.Query.DESCENDING if order_by.startswith("-") \
+        else firestore.Query.ASCENDING
+    query = cls.collection.filter(
+        "user_id", "==", user_id).filter(
+            "deleted_at_timestamp", "==", None).order(order_by)
+    if not page_token and skip:
+      query = query.offset(skip)
+    query = query.limit(limit).query().order_by(
+        FieldPath.document_id(), direction=direction)
+    if page_token:
+      query = query.start_after(cls._decode_page_token(page_token))
+
+    summaries = []
+    for doc in query.select(CHAT_SUMMARY_FIELDS).stream():
+      summary = {field: None for field in CHAT_SUMMARY_FIELDS}
+      summary.update(doc.to_dict())
+      summary["id"] = doc.id
+      summaries.append(summary)
+
+    next_page_token = None
+    if len(summaries) == limit and summaries[-1].get(order_field) is not None:
+      next_page_token = cls._encode_page_token(
+          order_field, summaries[-1][order_field], summaries[-1]["id"])
+
+    for summary in summaries:
+      summary["created_time"] = str(summary["created_time"])
+      summary["last_modified_time"] = str(summary["last_modified_time"])
+    return summaries, next_page_token
+
+  @classmethod
+  def backfill_summaries(cls, batch_size=500) -> int:
+    """Set the summary fields (first prompt and message count) of chats
+    saved before they were added.  Only the summary fields are written,
+    so last_modified_time is unchanged.
+
+    Returns:
+        int: number of chats updated
+    """
+    collection = db.conn.collection(cls._meta.collection_name)
+    batch = db.conn.batch()
+    batch_count = 0
+    updated = 0
+    for doc in collection.select(["history", "prompt",
+                                  "message_count"]).stream():
+      data = doc.to_dict()
+      chat = cls()
+      chat.history = data.get("history")
+      chat.prompt = data.get("prompt")
+      chat.update_summary()
+      summary = {"prompt": chat.prompt or "",
+                 "message_count": chat.message_count}
+      if all(data.get(field) == value for field, value in summary.items()):
+        continue
+      batch.update(collection.document(doc.id), summary)
+      batch_count += 1
+      updated += 1
+      if batch_count == batch_size:
+        batch.commit()
+        batch = db.conn.batch()
+        batch_count = 0
+    if batch_count:
+      batch.commit()
+    return updated
+
   @classmethod
   def get_history_entry(cls, prompt: str, response: str) -> List[dict]:
     """ Get history entry for query and response """
@@ -90,6 +233,33 @@ class UserChat(BaseModel):
                      query_references: Optional[List["QueryReference"]]=None,
                      query_refs_str: Optional[str]=None):
     """ Update history with query and response """
+    self.add_history(prompt, response, custom_entry, query_engine,
+                     query_result, query_references, query_refs_str)
+    self.save(merge=True)
+
+  async def aupdate_history(self,
+                            prompt: str=None,
+                            response: str=None,
+                            custom_entry: dict=None,
+                            query_engine: Optional["QueryEngine"]=None,
+                            query_result: Optional["QueryResult"]=None,
+                            query_references: Optional[
+                                List["QueryReference"]]=None,
+                            query_refs_str: Optional[str]=None):
+    """ Update history with query and response, saving asynchronously """
+    self.add_history(prompt, response, custom_entry, query_engine,
+                     query_result, query_references, query_refs_str)
+    await self.asave(merge=True)
+
+  def add_history(self,
+                  prompt: str=None,
+                  response: str=None,
+                  custom_entry: dict=None,
+                  query_engine: Optional["QueryEngine"]=None,
+                  query_result: Optional["QueryResult"]=None,
+                  query_references: Optional[List["QueryReference"]]=None,
+                  query_refs_str: Optional[str]=None):
+    """ Add query and response entries to history, without saving """
 
     if not self.history:
       self.history = []
@@ -143,8 +313,6 @@ class UserChat(BaseModel):
         CHAT_QUERY_REFRENCE_READABLE: query_refs_str
       })
 
-    self.save(merge=True)
-
   @classmethod
   def is_human(cls, entry: dict) -> bool:
     return CHAT_HUMAN in entry.keys()
@@ -14,7 +14,7 @@
 """
 Models for LLM Query Engines
 """
-from typing import List
+from typing import Dict, List
 from fireo.fields import (TextField, ListField, IDField,
                           BooleanField, NumberField, MapField)
 from common.models import BaseModel
@@ -29,6 +29,9 @@ QE_TYPE_VERTEX_SEARCH = "qe_vertex_search"
 QE_TYPE_LLM_SERVICE = "qe_llm_service"
 QE_TYPE_INTEGRATED_SEARCH = "qe_integrated_search"
 
+# max number of values in a firestore "in" filter
+FIRESTORE_IN_FILTER_LIMIT = 30
+
 class UserQuery(BaseModel):
   """
   UserQuery ORM class
@@ -75,6 +78,22 @@ class UserQuery(BaseModel):
                      references: List[dict]=None,
                      custom_entry=None):
     """ Update history with query and response """
+    self.add_history(prompt, response, references, custom_entry)
+    self.save(merge=True)
+
+  async def aupdate_history(self, prompt: str=None,
+                            response: str=None,
+                            references: List[dict]=None,
+                            custom_entry=None):
+    """ Update history with query and response, saving asynchronously """
+    self.add_history(prompt, response, references, custom_entry)
+    await self.asave(merge=True)
+
+  def add_history(self, prompt: str=None,
+                  response: str=None,
+                  references: List[dict]=None,
+                  custom_entry=None):
+    """ Add query and response entries to history, without saving """
     if not self.history:
       self.history = []
 
@@ -90,8 +109,6 @@ class UserQuery(BaseModel):
     if custom_entry:
       self.history.append(custom_entry)
 
-    self.save(merge=True)
-
   @classmethod
   def is_human(cls, entry: dict) -> bool:
     return QUERY_HUMAN in entry.keys()
@@ -127,6 +144,9 @@ class QueryEngine(BaseModel):
   parent_engine_id = TextField(required=False)
   manifest_url = TextField(required=False)
   params = MapField(default={})
+  # next unused vector store index, so that an index update continues
+  # from the end of the previous build
+  next_index = NumberField(required=False)
 
   class Meta:
     ignore_none_field = False
@@ -322,6 +342,14 @@ class QueryDocument(BaseModel):
   index_start = NumberField(required=False)
   index_end = NumberField(required=False)
   metadata = MapField(required=False)
+  # version of the source file the document was indexed from, e.g. the
+  # GCS object generation and md5 hash
+  generation = NumberField(required=False)
+  md5_hash = TextField(required=False)
+  # sha256 hash of the file content
+  file_hash = TextField(required=False)
+  # number of chunks that failed to embed and are not in the vector store
+  chunks_not_indexed = NumberField(required=False)
 
   class Meta:
     ignore_none_field = False
@@ -372,6 +400,24 @@ class QueryDocument(BaseModel):
           None).get()
     return q_doc
 
+  @classmethod
+  def find_all_by_query_engine_id(cls, query_engine_id) -> \
+      List["QueryDocument"]:
+    """
+    Fetch all QueryDocuments for query engine, without a limit
+
+    Args:
+        query_engine_id (str): Query Engine id
+
+    Returns:
+        List[QueryDocument]: List of QueryDocuments
+
+    """
+    objects = cls.collection.filter(
+      "query_engine_id", "==", query_engine_id).filter(
+      "deleted_at_timestamp", "==", None).fetch()
+    return list(objects)
+
   @classmethod
   def find_by_index_file(cls, query_engine_id, index_file):
     """
@@ -438,3 +484,31 @@ class QueryDocumentChunk(BaseModel):
             "deleted_at_timestamp", "==",
             None).get()
     return q_chunk
+
+  @classmethod
+  def find_by_indexes(cls, query_engine_id,
+                      indexes: List[int]) -> Dict[int, "QueryDocumentChunk"]:
+    """
+    Fetch document chunks for a query engine by index, using "in"
+    queries of up to FIRESTORE_IN_FILTER_LIMIT indexes each
+
+    Args:
+        query_engine_id (str): Query engine id
+        indexes (list): QueryDocumentChunk indexes
+
+    Returns:
+        dict of index to QueryDocumentChunk, for the indexes found
+
+    """
+    unique_indexes = list(dict.fromkeys(indexes))
+    q_chunks = {}
+    for i in range(0, len(unique_indexes), FIRESTORE_IN_FILTER_LIMIT):
+      batch_indexes = unique_indexes[i:i + FIRESTORE_IN_FILTER_LIMIT]
+      objects = cls.collection.filter(
+          "query_engine_id", "==", query_engine_id).filter(
+              "index", "in", batch_indexes).filter(
+              "deleted_at_timestamp", "==",
+              None).fetch()
+      for q_chunk in objects:
+        q_chunks[q_chunk.index] = q_chunk
+    return q_chunks
@@ -14,7 +14,11 @@
 """
 User Data Model
 """
+from typing import List, Optional, Tuple
 import regex
+from fireo.database import db
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 from common.models import BaseModel
 from common.utils.errors import ResourceNotFoundException
 from fireo.fields import (TextField, NumberField, MapField,
@@ -25,6 +29,35 @@ from fireo.fields import (TextField, NumberField, MapField,
 USER_TYPES = ["user", "learner", "faculty", "assessor", "admin", "coach",
               "instructor", "lxe", "curriculum_designer", "robot"]
 
+# max length of the prefix tokens stored in User.search_tokens
+SEARCH_TOKEN_MAX_LENGTH = 20
+
+
+def get_search_words(*values: str) -> List[str]:
+  """Split values into the normalized lowercase words that a user search
+  matches by prefix: each whole value, and its parts separated by whitespace
+  or email punctuation, e.g. "steve.jobs@example.com" gives
+  ["steve.jobs@example.com", "steve", "jobs", "example", "com"]."""
+  words = []
+  for value in values:
+    value = (value or "").strip().lower()
+    if not value:
+      continue
+    words.append(value)
+    words.extend(word for word in regex.split(r"[\s@._+\-]+", value) if word)
+  return list(dict.fromkeys(words))
+
+
+def get_search_tokens(*values: str) -> List[str]:
+  """Prefix tokens of the search words of values, up to
+  SEARCH_TOKEN_MAX_LENGTH characters long"""
+  tokens = set()
+  for word in get_search_words(*values):
+    for i in range(1, min(len(word), SEARCH_TOKEN_MAX_LENGTH) + 1):
+      tokens.add(word[:i])
+  return sorted(tokens)
+
+
 def validate_name(name):
   """Validator method to validate name"""
   if regex.fullmatch(r"[\D\p{L}\p{N}\s]+$", name):
@@ -76,11 +109,127 @@ class User(BaseModel):
   photo_url = TextField()
   inspace_user = MapField(default={})
   is_deleted = BooleanField(default=False)
+  # lowercase prefixes of names and email, maintained on save and update
+  search_tokens = ListField()
 
   class Meta:
     collection_name = BaseModel.DATABASE_PREFIX + "users"
     ignore_none_field = False
 
+  def update_search_tokens(self):
+    """Set search_tokens from the user names and email"""
+    self.search_tokens = get_search_tokens(self.first_name, self.last_name,
+                                           self.email)
+
+  def save(self,
+           input_datetime=None,
+           transaction=None,
+           batch=None,
+           merge=None,
+           no_return=False):
+    self.update_search_tokens()
+    return super().save(input_datetime, transaction, batch, merge, no_return)
+
+  def update(self,
+             input_datetime=None,
+             key=None,
+             transaction=None,
+             batch=None):
+    self.update_search_tokens()
+    return super().update(input_datetime, key, transaction, batch)
+
+  def get_fields(self, reformat_datetime=False, remove_meta=False):
+    fields = super().get_fields(reformat_datetime, remove_meta)
+    # the search index is internal, not part of the user data
+    fields.pop("search_tokens", None)
+    return fields
+
+  @classmethod
+  def search(cls, search_query, skip=0, limit=10,
+             page_token=None) -> Tuple[List["User"], Optional[str]]:
+    """Search users by prefixes of their email, first name and last name,
+    newest first.  Every word of search_query must be a prefix of a word of
+    the user's names or email.  Users are ordered by document id after
+    created_time, so that pages don't skip users created at the same time.
+
+    Args:
+        search_query (str): words to search for
+        skip (int, optional): number of matching users to skip, ignored if
+          page_token is provided.
+        limit (int, optional): max number of users to be fetched.
+        page_token (str, optional): next_page_token returned by a
+          previous call, to fetch the following page.
+
+    Returns:
+        Tuple of list of User objects and the next page token
+        (None if there are no more users).
+    """
+    terms = get_search_words(*(search_query or "").split())
+    if not terms:
+      return [], None
+
+    # the index holds prefixes up to SEARCH_TOKEN_MAX_LENGTH, so query by
+    # the longest term and check the other terms on the matching users
+    token = max(terms, key=len)[:SEARCH_TOKEN_MAX_LENGTH]
+    query = cls.collection.filter(
+      "search_tokens", "array_contains", token).filter(
+        "is_deleted", "==", False).order("-created_time").query().order_by(
+          FieldPath.document_id(), direction=firestore.Query.DESCENDING)
+    if page_token:
+      query = query.start_after(cls._decode_page_token(page_token))
+
+    users = []
+    skipped = 0
+    last_user = None
+    for doc in query.stream():
+      user = cls._from_document(doc)
+      last_user = user
+      words = get_search_words(user.first_name, user.last_name, user.email)
+      if not all(any(word.startswith(term) for word in words)
+                 for term in terms):
+        continue
+      if not page_token and skipped < skip:
+        skipped += 1
+        continue
+      users.append(user)
+      if len(users) == limit:
+        break
+
+    next_page_token = None
+    if len(users) == limit and last_user.created_time is not None:
+      next_page_token = cls._encode_page_token("created_time",
+                                               last_user.created_time,
+                                               doc_id=last_user.id)
+    return users, next_page_token
+
+  @classmethod
+  def backfill_search_tokens(cls, batch_size=500) -> int:
+    """Set search_tokens of users saved before the search index was added.
+    Only the search_tokens field is written, so last_modified_time is
+    unchanged.
+
+    Returns:
+        int: number of users updated
+    """
+    collection = db.conn.collection(cls._meta.collection_name)
+    batch = db.conn.batch()
+    batch_count = 0
+    updated = 0
+    for user in cls.collection.fetch():
+      tokens = get_search_tokens(user.first_name, user.last_name, user.email)
+      if user.search_tokens == tokens:
+        continue
+      batch.update(collection.document(user.id), {"search_tokens": tokens})
+      batch_count += 1
+      updated += 1
+      if batch_count == batch_size:
+        batch.commit()
+        batch = db.conn.batch()
+        batch_count = 0
+    if batch_count:
+      batch.commit()
+    return updated
+
   @classmethod
   def find_by_user_id(cls, user_id, is_deleted=False):
     """Find the user using user_id
@@ -125,6 +274,20 @@ class User(BaseModel):
       email = email.lower()
     return cls.collection.filter("email", "==", email).get()
 
+  @classmethod
+  async def afind_by_email(cls, email):
+    """Async version of find_by_email
+    Args:
+        email (string): user's email address
+    Returns:
+        User: User Object, None if not found
+    """
+    if email:
+      email = email.lower()
+    users = await cls.afetch([("email", "==", email)], limit=1,
+                             include_deleted=True)
+    return users[0] if users else None
+
   @classmethod
   def find_by_status(cls, status):
     """Find the user using status
@@ -34,11 +34,19 @@ __all__ = ["Counter",
            "measure_latency",
            "track_streaming_response_size",
            "record_response_size",
-           "record_user_activity"]
+           "record_user_activity",
+           "AUTH_TOKEN_CACHE_REQUESTS"]
 
 # Default logger
 logger = Logger.get_logger("common.monitoring.metrics")
 
+# Shared metrics recorded by common utils
+AUTH_TOKEN_CACHE_REQUESTS = Counter(
+  "auth_token_cache_requests_total",
+  "Validated token cache lookups by result (hit, miss, local)",
+  ["result"]
+)
+
 
 def filter_metric_labels(metric, labels, additional_labels=None):
   """Filter labels to only include those defined in the metric.
@@ -15,18 +15,28 @@
 # pylint: disable = consider-using-f-string,logging-fstring-interpolation
 
 """Firebase token validation"""
+import hashlib
 import json
+import time
 import requests
 import firebase_admin
-from firebase_admin.auth import get_user
+from firebase_admin.auth import (get_user, verify_id_token,
+                                 InvalidIdTokenError, CertificateFetchError)
 from fastapi import Depends
 from fastapi.security import HTTPBearer
 from common.utils.errors import InvalidTokenError
-from common.config import SERVICES, CUSTOM_CLAIMS_ENABLED
+from common.config import (SERVICES, CUSTOM_CLAIMS_ENABLED,
+                           AUTH_TOKEN_CACHE_ENABLED,
+                           AUTH_TOKEN_CACHE_MAX_SIZE,
+                           AUTH_TOKEN_CACHE_TTL,
+                           AUTH_LOCAL_TOKEN_VERIFICATION)
+from common.models import User
+from common.monitoring.metrics import AUTH_TOKEN_CACHE_REQUESTS
 from common.utils.cache_service import set_key, get_key
 from common.utils.errors import TokenNotFoundError
 from common.utils.http_exceptions import (InternalServerError, Unauthenticated)
 from common.utils.logging_handler import Logger
+from common.utils.ttl_cache import TTLCache
 from common.utils.context_vars import (
   get_trace_headers,
   preserve_context
@@ -39,6 +49,13 @@ default_firebase_app = firebase_admin.initialize_app()
 
 Logger = Logger.get_logger(__file__)
 
+# validated token claims, keyed by token hash
+token_cache = TTLCache(max_size=AUTH_TOKEN_CACHE_MAX_SIZE,
+                       default_ttl=AUTH_TOKEN_CACHE_TTL)
+# user record fields read for local token verification, keyed by email
+user_cache = TTLCache(max_size=AUTH_TOKEN_CACHE_MAX_SIZE,
+                      default_ttl=AUTH_TOKEN_CACHE_TTL)
+
 
 @preserve_context
 def validate_token(token: auth_scheme = Depends()):
@@ -64,32 +81,125 @@ def validate_token(token: auth_scheme = Depends()):
 def validate_oauth_token(token: auth_scheme = Depends()):
   """
   Validate OAuth token from Firebase Auth or Cloud Identity Platform.
+
+  Validated token claims are cached in-process for AUTH_TOKEN_CACHE_TTL
+  seconds, so repeated requests with the same token skip the auth service.
   """
   if not token:
     raise TokenNotFoundError("Unauthorized: token is empty.")
 
   token_dict = dict(token)
   if token_dict["credentials"]:
-    api_endpoint = f"http://{AUTH_SERVICE_NAME}/{AUTH_SERVICE_NAME}/" \
-        "api/v1/validate"
-
-    headers = get_trace_headers()
-    headers["Authorization"] =\
-    f"{token_dict['scheme']} {token_dict['credentials']}"
-
-    res = requests.get(
-        url=api_endpoint,
-        headers=headers,
-        timeout=60)
-    data = res.json()
-    if res.status_code == 200 and data["success"] is True:
-      return data.get("data")
-    else:
-      raise InvalidTokenError(data["message"])
+    cache_key = None
+    if AUTH_TOKEN_CACHE_ENABLED:
+      cache_key = hashlib.sha256(
+          token_dict["credentials"].encode("utf-8")).hexdigest()
+      token_data = token_cache.get(cache_key)
+      if token_data is not None:
+        AUTH_TOKEN_CACHE_REQUESTS.labels(result="hit").inc()
+        return dict(token_data)
+      AUTH_TOKEN_CACHE_REQUESTS.labels(result="miss").inc()
+
+    token_data = None
+    if AUTH_LOCAL_TOKEN_VERIFICATION:
+      token_data = verify_token_locally(token_dict["credentials"])
+    if token_data is None:
+      token_data = validate_token_with_auth_service(token_dict)
+
+    if cache_key is not None:
+      cache_token_data(cache_key, token_data)
+    return token_data
   else:
     raise InvalidTokenError("Unauthorized: Invalid token.")
 
 
+def validate_token_with_auth_service(token_dict: dict) -> dict:
+  """
+  Validate token by calling the authentication service.
+  """
+  api_endpoint = f"http://{AUTH_SERVICE_NAME}/{AUTH_SERVICE_NAME}/" \
+      "api/v1/validate"
+
+  headers = get_trace_headers()
+  headers["Authorization"] =\
+  f"{token_dict['scheme']} {token_dict['credentials']}"
+
+  res = requests.get(
+      url=api_endpoint,
+      headers=headers,
+      timeout=60)
+  data = res.json()
+  if res.status_code == 200 and data["success"] is True:
+    return data.get("data")
+  else:
+    raise InvalidTokenError(data["message"])
+
+
+def verify_token_locally(id_token: str):
+  """
+  Verify a Firebase ID token signature in-process, against the Firebase
+  public keys cached by firebase_admin, and check the Firestore user record
+  like the auth service does.
+
+  Returns:
+    decoded token claims with the user type fields of the auth service, or
+    None if the token should be validated by the auth service: the public
+    keys could not be fetched, or the user has no record (which the auth
+    service may create)
+  """
+  try:
+    token_data = verify_id_token(id_token, app=default_firebase_app)
+  except InvalidIdTokenError as e:
+    raise InvalidTokenError(f"Unauthorized: {str(e)}") from e
+  except CertificateFetchError as e:
+    Logger.error(f"Unable to fetch Firebase public keys: {e}")
+    return None
+
+  user_fields = get_user_fields(token_data.get("email"))
+  if user_fields is None:
+    return None
+  if user_fields.get("status") == "inactive":
+    raise InvalidTokenError("Unauthorized: User status is inactive.")
+  token_data["access_api_docs"] = user_fields.get("access_api_docs", False)
+  token_data["user_type"] = user_fields.get("user_type")
+  AUTH_TOKEN_CACHE_REQUESTS.labels(result="local").inc()
+  return token_data
+
+
+def get_user_fields(email: str):
+  """
+  Return the status and user type fields of the user record of email,
+  cached for AUTH_TOKEN_CACHE_TTL seconds, or None if there is no record.
+  """
+  if not email:
+    return None
+  user_fields = user_cache.get(email)
+  if user_fields is None:
+    user = User.find_by_email(email)
+    if user is None:
+      return None
+    user_fields = {
+      "status": user.status,
+      "access_api_docs": user.access_api_docs,
+      "user_type": user.user_type,
+    }
+    user_cache.set(email, user_fields)
+  return user_fields
+
+
+def cache_token_data(cache_key: str, token_data: dict):
+  """
+  Cache validated token claims for AUTH_TOKEN_CACHE_TTL seconds, or until
+  the token "exp" claim if that is sooner.
+  """
+  if not token_data or token_data.get("exp") is None:
+    return
+  now = time.time()
+  expires_at = min(float(token_data["exp"]), now + AUTH_TOKEN_CACHE_TTL)
+  if expires_at > now:
+    token_cache.set(cache_key, dict(token_data), expires_at)
+
+
 def validate_service_account_token(token: auth_scheme = Depends()):
   """
   Validate token for Service Account.
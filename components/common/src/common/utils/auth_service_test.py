@@ -0,0 +1,99 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Unit tests for token validation caching and local verification
+"""
+# disabling these rules, as they cause issues with pytest fixtures
+# pylint: disable=unused-argument,redefined-outer-name
+import time
+from unittest import mock
+import pytest
+from common.utils import auth_service
+from common.utils.errors import InvalidTokenError
+
+TOKEN = {"scheme": "Bearer", "credentials": "fake-id-token"}
+
+
+def fake_token_data(**fields):
+  return {"email": "user@example.com", "exp": time.time() + 3600, **fields}
+
+
+@pytest.fixture
+def clean_caches():
+  auth_service.token_cache.clear()
+  auth_service.user_cache.clear()
+  yield
+  auth_service.token_cache.clear()
+  auth_service.user_cache.clear()
+
+
+@mock.patch("common.utils.auth_service.AUTH_LOCAL_TOKEN_VERIFICATION", False)
+@mock.patch("common.utils.auth_service.AUTH_TOKEN_CACHE_ENABLED", True)
+@mock.patch("common.utils.auth_service.validate_token_with_auth_service")
+def test_validate_oauth_token_cached(mock_validate, clean_caches):
+  mock_validate.return_value = fake_token_data(user_type="learner")
+
+  # miss, then hit
+  assert auth_service.validate_oauth_token(TOKEN)["user_type"] == "learner"
+  assert auth_service.validate_oauth_token(TOKEN)["user_type"] == "learner"
+  assert mock_validate.call_count == 1
+
+  # entries expire after the cache ttl, even if the token is still valid
+  expired_time = time.time() + auth_service.AUTH_TOKEN_CACHE_TTL + 1
+  with mock.patch("common.utils.ttl_cache.time.time",
+                  return_value=expired_time):
+    auth_service.validate_oauth_token(TOKEN)
+  assert mock_validate.call_count == 2
+
+
+@mock.patch("common.utils.auth_service.AUTH_TOKEN_CACHE_ENABLED", True)
+@mock.patch("common.utils.auth_service.validate_token_with_auth_service")
+def test_cache_expired_token(mock_validate, clean_caches):
+  mock_validate.return_value = fake_token_data(exp=time.time() - 1)
+  auth_service.validate_oauth_token(TOKEN)
+  auth_service.validate_oauth_token(TOKEN)
+  assert mock_validate.call_count == 2
+
+
+@mock.patch("common.utils.auth_service.AUTH_LOCAL_TOKEN_VERIFICATION", True)
+@mock.patch("common.utils.auth_service.AUTH_TOKEN_CACHE_ENABLED", False)
+@mock.patch("common.utils.auth_service.validate_token_with_auth_service")
+@mock.patch("common.utils.auth_service.User")
+@mock.patch("common.utils.auth_service.verify_id_token")
+def test_verify_token_locally(mock_verify, mock_user, mock_validate,
+                              clean_caches):
+  mock_verify.side_effect = lambda *args, **kwargs: fake_token_data()
+  mock_user.find_by_email.return_value = mock.Mock(
+      status="active", access_api_docs=True, user_type="faculty")
+
+  token_data = auth_service.validate_oauth_token(TOKEN)
+  assert token_data["user_type"] == "faculty"
+  assert token_data["access_api_docs"] is True
+  auth_service.validate_oauth_token(TOKEN)
+  assert mock_user.find_by_email.call_count == 1
+  mock_validate.assert_not_called()
+
+  # users without a record are validated by the auth service
+  auth_service.user_cache.clear()
+  mock_user.find_by_email.return_value = None
+  mock_validate.return_value = fake_token_data(user_type="learner")
+  assert auth_service.validate_oauth_token(TOKEN)["user_type"] == "learner"
+  assert mock_validate.call_count == 1
+
+  # inactive users are rejected
+  auth_service.user_cache.clear()
+  mock_user.find_by_email.return_value = mock.Mock(
+      status="inactive", access_api_docs=False, user_type="learner")
+  with pytest.raises(InvalidTokenError):
+    auth_service.validate_oauth_token(TOKEN)
@@ -15,11 +15,43 @@
 """
 Utilities for calling other platform microservices
 """
+import asyncio
 import json
+import os
+import random
+import threading
+from urllib.parse import urlsplit
+import httpx
 import requests
 from common.utils.context_vars import get_trace_headers
 
 DEFAULT_TIMEOUT = 300
+DEFAULT_CONNECT_TIMEOUT = 10
+
+# connection pool settings for the shared async clients, per host
+ASYNC_MAX_CONNECTIONS_PER_HOST = int(
+    os.getenv("ASYNC_MAX_CONNECTIONS_PER_HOST", "100"))
+ASYNC_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("ASYNC_MAX_KEEPALIVE_CONNECTIONS", "20"))
+ASYNC_KEEPALIVE_EXPIRY = float(os.getenv("ASYNC_KEEPALIVE_EXPIRY", "30"))
+
+# retry settings for the async methods
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 0.5
+RETRY_BACKOFF_MAX_SECONDS = 8
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout,
+                    httpx.PoolTimeout, httpx.RemoteProtocolError)
+# requests that are not idempotent are only retried when the server can't
+# have acted on them: when throttled, or when no connection was made
+NON_IDEMPOTENT_RETRY_STATUS_CODES = (429,)
+NON_IDEMPOTENT_RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout,
+                                   httpx.PoolTimeout)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+# shared async clients keyed by (event loop, url origin)
+_async_clients = {}
+_async_clients_lock = threading.Lock()
 
 def get_method(url: str,
                query_params=None,
@@ -145,3 +177,176 @@ def delete_method(url: str,
   return requests.delete(
       url=f"{url}", json=request_body, headers=headers,
       timeout=timeout)
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+  """
+  Get the shared, pooled async client for the origin (scheme, host and
+  port) of url.  Each origin has its own connection pool, so the
+  connection limits apply per host.  Clients are bound to the running
+  event loop, and a new client is created for a new loop.
+  """
+  loop = asyncio.get_running_loop()
+  parts = urlsplit(url)
+  key = (id(loop), parts.scheme, parts.netloc)
+  with _async_clients_lock:
+    client_loop, client = _async_clients.get(key, (None, None))
+    if client is None or client_loop is not loop or client.is_closed:
+      # drop clients of event loops that have been closed
+      for stale_key in [k for k, (l, _) in _async_clients.items()
+                        if l.is_closed()]:
+        del _async_clients[stale_key]
+      client = httpx.AsyncClient(
+          limits=httpx.Limits(
+              max_connections=ASYNC_MAX_CONNECTIONS_PER_HOST,
+              max_keepalive_connections=ASYNC_MAX_KEEPALIVE_CONNECTIONS,
+              keepalive_expiry=ASYNC_KEEPALIVE_EXPIRY),
+          timeout=httpx.Timeout(DEFAULT_TIMEOUT,
+                                connect=DEFAULT_CONNECT_TIMEOUT))
+      _async_clients[key] = (loop, client)
+    return client
+
+
+async def close_async_clients():
+  """
+  Close the shared async clients of the running event loop, e.g. on
+  application shutdown.
+  """
+  loop = asyncio.get_running_loop()
+  with _async_clients_lock:
+    keys = [key for key, (client_loop, _) in _async_clients.items()
+            if client_loop is loop]
+    clients = [_async_clients.pop(key)[1] for key in keys]
+  for client in clients:
+    await client.aclose()
+
+
+async def async_request(method: str,
+                        url: str,
+                        query_params=None,
+                        request_body=None,
+                        headers=None,
+                        auth_client=None,
+                        token=None,
+                        timeout=DEFAULT_TIMEOUT,
+                        retries=DEFAULT_RETRIES,
+                        idempotent=None) -> httpx.Response:
+  """
+  Send an HTTP request with the shared async client for the url host.
+  Trace headers from the request context are propagated.  Connection
+  errors and retryable status codes (429, 502, 503, 504) of idempotent
+  requests are retried with exponential backoff and jitter.  Other
+  requests, e.g. POST, are only retried when throttled (429) or when the
+  connection could not be made.
+  Parameters
+  ----------
+  method: str
+  url: str
+  query_params: dict
+  request_body: dict
+  headers: dict
+  token: token
+  timeout: total timeout in seconds
+  retries: number of retries after the first attempt
+  idempotent: True if the request can safely be sent more than once,
+    defaults to True for GET, HEAD, OPTIONS, PUT and DELETE requests
+  Returns
+  -------
+  httpx.Response
+  """
+  if auth_client is not None:
+    # the auth client may sign in with a blocking request
+    token = await asyncio.to_thread(auth_client.get_id_token)
+
+  if idempotent is None:
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+  if idempotent:
+    retry_status_codes = RETRY_STATUS_CODES
+    retry_exceptions = RETRY_EXCEPTIONS
+  else:
+    retry_status_codes = NON_IDEMPOTENT_RETRY_STATUS_CODES
+    retry_exceptions = NON_IDEMPOTENT_RETRY_EXCEPTIONS
+
+  request_headers = get_trace_headers()
+  if headers:
+    request_headers.update(headers)
+  if token:
+    request_headers["Authorization"] = f"Bearer {token}"
+
+  client = get_async_client(url)
+  attempt = 0
+  while True:
+    try:
+      resp = await client.request(
+          method, url, params=query_params, json=request_body,
+          headers=request_headers,
+          timeout=httpx.Timeout(timeout, connect=DEFAULT_CONNECT_TIMEOUT))
+      if resp.status_code not in retry_status_codes or attempt >= retries:
+        return resp
+    except retry_exceptions:
+      if attempt >= retries:
+        raise
+    backoff = min(RETRY_BACKOFF_SECONDS * (2 ** attempt),
+                  RETRY_BACKOFF_MAX_SECONDS)
+    await asyncio.sleep(backoff + random.uniform(0, backoff))
+    attempt += 1
+
+
+async def async_get_method(url: str,
+                           query_params=None,
+                           auth_client=None,
+                           token=None,
+                           timeout=DEFAULT_TIMEOUT,
+                           retries=DEFAULT_RETRIES) -> httpx.Response:
+  """
+  Async counterpart of get_method
+  """
+  return await async_request("GET", url, query_params=query_params,
+                             auth_client=auth_client, token=token,
+                             timeout=timeout, retries=retries)
+
+
+async def async_post_method(url: str,
+                            request_body=None,
+                            headers=None,
+                            auth_client=None,
+                            token=None,
+                            timeout=DEFAULT_TIMEOUT,
+                            retries=DEFAULT_RETRIES,
+                            idempotent=False) -> httpx.Response:
+  """
+  Async counterpart of post_method.  Set idempotent for endpoints that
+  can safely be called more than once, to also retry 5xx responses.
+  """
+  return await async_request("POST", url, request_body=request_body,
+                             headers=headers, auth_client=auth_client,
+                             token=token, timeout=timeout, retries=retries,
+                             idempotent=idempotent)
+
+
+async def async_put_method(url: str,
+                           request_body=None,
+                           auth_client=None,
+                           token=None,
+                           timeout=DEFAULT_TIMEOUT,
+                           retries=DEFAULT_RETRIES) -> httpx.Response:
+  """
+  Async counterpart of put_method
+  """
+  return await async_request("PUT", url, request_body=request_body,
+                             auth_client=auth_client, token=token,
+                             timeout=timeout, retries=retries)
+
+
+async def async_delete_method(url: str,
+                              request_body=None,
+                              auth_client=None,
+                              token=None,
+                              timeout=DEFAULT_TIMEOUT,
+                              retries=DEFAULT_RETRIES) -> httpx.Response:
+  """
+  Async counterpart of delete_method
+  """
+  return await async_request("DELETE", url, request_body=request_body,
+                             auth_client=auth_client, token=token,
+                             timeout=timeout, retries=retries)
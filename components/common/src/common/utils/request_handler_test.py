@@ -0,0 +1,132 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Unit test for the async methods of request_handler.py
+"""
+# disabling pylint rules that conflict with pytest fixtures
+# pylint: disable=redefined-outer-name
+from unittest import mock
+import httpx
+import pytest
+from common.utils import request_handler
+from common.utils.request_handler import (async_request, async_get_method,
+                                          async_post_method,
+                                          RETRY_BACKOFF_SECONDS,
+                                          RETRY_BACKOFF_MAX_SECONDS)
+
+URL = "http://test-service/api/v1/test"
+
+
+@pytest.fixture
+def responses():
+  """
+  Patch the async client to send requests to a mock transport.  Each
+  request pops the next item of the returned list, a status code or an
+  exception to raise.
+  """
+  items = []
+  requests = []
+
+  def handler(request):
+    requests.append(request)
+    item = items.pop(0)
+    if isinstance(item, Exception):
+      raise item
+    return httpx.Response(item, json={"status": item})
+
+  client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+  with mock.patch.object(request_handler, "get_async_client",
+                         return_value=client), \
+       mock.patch.object(request_handler.asyncio, "sleep",
+                         new=mock.AsyncMock()) as mock_sleep:
+    yield items, requests, mock_sleep
+
+
+@pytest.mark.asyncio
+async def test_get_retries_with_backoff(responses):
+  items, requests, mock_sleep = responses
+  items.extend([503, httpx.ConnectError("refused"), 200])
+
+  resp = await async_get_method(URL, retries=2)
+  assert resp.status_code == 200
+  assert len(requests) == 3
+
+  # exponential backoff with up to 100% jitter
+  delays = [call.args[0] for call in mock_sleep.call_args_list]
+  assert len(delays) == 2
+  for attempt, delay in enumerate(delays):
+    backoff = min(RETRY_BACKOFF_SECONDS * 2 ** attempt,
+                  RETRY_BACKOFF_MAX_SECONDS)
+    assert backoff <= delay <= 2 * backoff
+
+
+@pytest.mark.asyncio
+async def test_retries_exhausted(responses):
+  items, requests, _ = responses
+  items.extend([502, 502])
+  resp = await async_get_method(URL, retries=1)
+  assert resp.status_code == 502
+  assert len(requests) == 2
+
+  items.extend([httpx.ConnectError("refused")] * 2)
+  with pytest.raises(httpx.ConnectError):
+    await async_get_method(URL, retries=1)
+
+
+@pytest.mark.asyncio
+async def test_post_not_retried_on_server_error(responses):
+  items, requests, _ = responses
+  items.append(503)
+  resp = await async_post_method(URL, request_body={"a": 1})
+  assert resp.status_code == 503
+  assert len(requests) == 1
+
+  # the request may have reached the server
+  items.append(httpx.RemoteProtocolError("disconnected"))
+  with pytest.raises(httpx.RemoteProtocolError):
+    await async_post_method(URL, request_body={"a": 1})
+
+
+@pytest.mark.asyncio
+async def test_post_retried_when_not_sent(responses):
+  items, requests, _ = responses
+  items.extend([429, httpx.ConnectError("refused"), 200])
+  resp = await async_post_method(URL, request_body={"a": 1})
+  assert resp.status_code == 200
+  assert len(requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_idempotent_post_retried(responses):
+  items, requests, _ = responses
+  items.extend([503, 200])
+  resp = await async_post_method(URL, request_body={"a": 1},
+                                 idempotent=True)
+  assert resp.status_code == 200
+  assert len(requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_headers_and_token(responses):
+  items, requests, _ = responses
+  items.append(200)
+  auth_client = mock.Mock()
+  auth_client.get_id_token.return_value = "test-token"
+
+  await async_request("GET", URL, query_params={"q": "x"},
+                      headers={"X-Test": "1"}, auth_client=auth_client)
+  request = requests[0]
+  assert request.headers["Authorization"] == "Bearer test-token"
+  assert request.headers["X-Test"] == "1"
+  assert request.url.params["q"] == "x"
@@ -0,0 +1,77 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process, bounded LRU cache with per-entry expiry."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+  """
+  Thread-safe LRU cache holding at most max_size entries.  Each entry
+  expires at its own expiry timestamp (epoch seconds), which defaults to
+  now + default_ttl.  Expired entries are dropped on lookup.
+  """
+
+  def __init__(self, max_size: int = 1000, default_ttl: float = 3600):
+    self.max_size = max_size
+    self.default_ttl = default_ttl
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, key: Hashable, default: Any = None) -> Any:
+    """
+    Return cached value for key, or default if missing or expired.
+    """
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return default
+      value, expires_at = entry
+      if expires_at <= time.time():
+        del self._entries[key]
+        return default
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key: Hashable, value: Any,
+          expires_at: Optional[float] = None):
+    """
+    Cache value for key until expires_at (epoch seconds).  The least
+    recently used entry is evicted when the cache is full.
+    """
+    if expires_at is None:
+      expires_at = time.time() + self.default_ttl
+    with self._lock:
+      self._entries[key] = (value, expires_at)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_size:
+        self._entries.popitem(last=False)
+
+  def delete(self, key: Hashable):
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def __contains__(self, key: Hashable) -> bool:
+    return self.get(key) is not None
+
+  def __len__(self) -> int:
+    with self._lock:
+      return len(self._entries)
@@ -0,0 +1,50 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Unit test for ttl_cache.py
+"""
+import time
+from common.utils.ttl_cache import TTLCache
+
+
+def test_get_and_expire():
+  cache = TTLCache(max_size=10)
+  cache.set("a", 1)
+  cache.set("b", 2, expires_at=time.time() - 1)
+  assert cache.get("a") == 1
+  assert cache.get("b") is None
+  assert cache.get("b", "default") == "default"
+  assert len(cache) == 1
+
+
+def test_lru_eviction():
+  cache = TTLCache(max_size=2)
+  cache.set("a", 1)
+  cache.set("b", 2)
+  # touch "a" so that "b" is the least recently used entry
+  assert cache.get("a") == 1
+  cache.set("c", 3)
+  assert "b" not in cache
+  assert cache.get("a") == 1
+  assert cache.get("c") == 3
+
+
+def test_delete_and_clear():
+  cache = TTLCache()
+  cache.set("a", 1)
+  cache.set("b", 2)
+  cache.delete("a")
+  assert "a" not in cache
+  cache.clear()
+  assert len(cache) == 0
@@ -0,0 +1,107 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Throughput benchmark of the Matching Engine index data writer.
+
+Writes 1M 768-dimension embeddings in windows of 1000 with
+index_writer.IndexDataWriter, and compares it with the previous JSON
+format with string values on a sample of the vectors.  Data is written to
+a sink that only counts bytes, so the benchmark measures formatting, not
+upload bandwidth.  Peak RSS stays flat as the number of vectors grows.
+"""
+import argparse
+import json
+import resource
+import time
+import numpy as np
+from services.query.index_writer import IndexDataWriter
+
+EMBEDDING_DIM = 768
+WINDOW_SIZE = 1000
+# number of distinct windows of random embeddings
+NUM_WINDOWS = 4
+
+
+class CountingSink():
+  """ binary file that discards data and counts the bytes written """
+
+  def __init__(self):
+    self.num_bytes = 0
+
+  def write(self, data: bytes) -> int:
+    self.num_bytes += len(data)
+    return len(data)
+
+
+def write_previous_format(sink: CountingSink, ids, embeddings):
+  """ previous implementation of the index data format """
+  lines = [
+    json.dumps(
+      {
+        "id": str(idx),
+        "embedding": [str(value) for value in embedding],
+      }
+    )
+    + "\n"
+    for idx, embedding in zip(ids, embeddings)
+  ]
+  sink.write("".join(lines).encode("utf-8"))
+
+
+def write_new_format(sink: CountingSink, ids, embeddings):
+  IndexDataWriter(sink).write(ids, embeddings)
+
+
+def run_writer(write, windows, num_vectors: int):
+  """ write num_vectors embeddings, returns (seconds, bytes written) """
+  sink = CountingSink()
+  elapsed = 0
+  for index_base in range(0, num_vectors, WINDOW_SIZE):
+    embeddings = windows[(index_base // WINDOW_SIZE) % len(windows)]
+    embeddings = embeddings[:num_vectors - index_base]
+    ids = np.arange(index_base, index_base + len(embeddings))
+    start_time = time.perf_counter()
+    write(sink, ids, embeddings)
+    elapsed += time.perf_counter() - start_time
+  return elapsed, sink.num_bytes
+
+
+def peak_rss_mb() -> float:
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_benchmark(num_vectors: int, num_sample_vectors: int):
+  rng = np.random.default_rng(0)
+  windows = [rng.standard_normal((WINDOW_SIZE, EMBEDDING_DIM)).tolist()
+             for _ in range(NUM_WINDOWS)]
+
+  print(f"{'writer':>10} {'vectors':>9} {'seconds':>9} "
+        f"{'vectors/s':>10} {'bytes/vector':>13} {'peak rss (MB)':>14}")
+  for name, write, count in [
+      ("previous", write_previous_format, num_sample_vectors),
+      ("streamed", write_new_format, num_vectors)]:
+    elapsed, num_bytes = run_writer(write, windows, count)
+    print(f"{name:>10} {count:>9} {elapsed:>9.1f} "
+          f"{count / elapsed:>10.0f} {num_bytes / count:>13.0f} "
+          f"{peak_rss_mb():>14.0f}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--vectors", type=int, default=1_000_000,
+                      help="number of vectors written by the new writer")
+  parser.add_argument("--sample-vectors", type=int, default=50_000,
+                      help="number of vectors written in the previous format")
+  args = parser.parse_args()
+  run_benchmark(args.vectors, args.sample_vectors)
@@ -0,0 +1,56 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmark of PDF text extraction.
+
+Compares sequential DataSource.read_pdf with page-parallel extraction over
+synthetic PDFs of 100 to 800 pages.
+"""
+import os
+import tempfile
+import time
+from services.query.data_source import DataSource
+from testing.synthetic_pdf import write_synthetic_pdf
+
+PAGE_COUNTS = [100, 200, 400, 800]
+PROCESSES = min(4, os.cpu_count() or 1)
+
+
+def time_read_pdf(pdf_path: str, processes: int) -> float:
+  start = time.perf_counter()
+  DataSource.read_pdf("benchmark.pdf", pdf_path,
+                      processes=processes, min_pages=1)
+  return time.perf_counter() - start
+
+
+def run_benchmark():
+  print(f"parallel extraction with {PROCESSES} processes")
+  print(f"{'pages':>6} {'sequential (s)':>15} "
+        f"{'parallel (s)':>13} {'speedup':>9}")
+  with tempfile.TemporaryDirectory() as temp_dir:
+    for num_pages in PAGE_COUNTS:
+      pdf_path = os.path.join(temp_dir, f"synthetic_{num_pages}.pdf")
+      write_synthetic_pdf(pdf_path, num_pages)
+      assert DataSource.read_pdf("benchmark.pdf", pdf_path, processes=1) == \
+          DataSource.read_pdf("benchmark.pdf", pdf_path,
+                              processes=PROCESSES, min_pages=1)
+
+      old_time = min(time_read_pdf(pdf_path, 1) for _ in range(3))
+      new_time = min(time_read_pdf(pdf_path, PROCESSES) for _ in range(3))
+      print(f"{num_pages:>6} {old_time:>15.3f} "
+            f"{new_time:>13.3f} {old_time / new_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+  run_benchmark()
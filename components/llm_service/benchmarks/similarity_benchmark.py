@@ -0,0 +1,68 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Micro-benchmark of sentence similarity scoring.
+
+Compares query_service.get_similarity with the previous pandas iterrows()
+implementation for 10 to 1000 sentences per chunk.
+"""
+import timeit
+from functools import partial
+import numpy as np
+import pandas as pd
+from numpy.linalg import norm
+from services.query.query_service import get_similarity
+
+EMBEDDING_DIM = 768
+SENTENCE_COUNTS = [10, 50, 100, 500, 1000]
+
+
+def get_similarity_iterrows(query_embeddings, sentence_embeddings) -> list:
+  """ previous implementation of get_similarity """
+  query_df = pd.DataFrame(query_embeddings.transpose())
+  sentence_df = pd.DataFrame(sentence_embeddings)
+
+  cos_sim = []
+  for _, row in sentence_df.iterrows():
+    x = row
+    y = query_df
+    cosine = np.dot(x, y) / (norm(x) * norm(y))
+    cos_sim.append(cosine[0])
+  return cos_sim
+
+
+def run_benchmark():
+  rng = np.random.default_rng(0)
+  query_embeddings = rng.standard_normal((1, EMBEDDING_DIM))
+  print(f"{'sentences':>10} {'iterrows (ms)':>15} "
+        f"{'vectorized (ms)':>16} {'speedup':>9}")
+  for count in SENTENCE_COUNTS:
+    sentence_embeddings = rng.standard_normal((count, EMBEDDING_DIM))
+    assert np.allclose(
+        get_similarity_iterrows(query_embeddings, sentence_embeddings),
+        get_similarity(query_embeddings, sentence_embeddings))
+
+    number = max(1, 1000 // count)
+    old_time = min(timeit.repeat(
+        partial(get_similarity_iterrows, query_embeddings, sentence_embeddings),
+        number=number, repeat=3)) / number
+    new_time = min(timeit.repeat(
+        partial(get_similarity, query_embeddings, sentence_embeddings),
+        number=number * 10, repeat=3)) / (number * 10)
+    print(f"{count:>10} {old_time * 1000:>15.3f} "
+          f"{new_time * 1000:>16.3f} {old_time / new_time:>8.0f}x")
+
+
+if __name__ == "__main__":
+  run_benchmark()
@@ -41,7 +41,11 @@ from config.config import (
 
     # model config object
     get_model_config,
+    swap_model_config,
+    start_model_config_watcher,
+    stop_model_config_watcher,
     MODEL_CONFIG_PATH,
+    MODEL_CONFIG_WATCH,
 
     # agent config
     AGENT_CONFIG_PATH,
@@ -56,9 +60,9 @@ from config.config import (
     LLM_BACKEND_ROBOT_USERNAME,
     LLM_BACKEND_ROBOT_PASSWORD,
 
-    # LLM vendor flags
-    ENABLE_OPENAI_LLM,
-    ENABLE_COHERE_LLM,
+    # LLM provider and vendor flags
+    is_provider_enabled,
+    is_vendor_enabled,
 
     # default LLM models
     DEFAULT_LLM_TYPE,
@@ -72,6 +76,43 @@ from config.config import (
     # query engine and other defaults
     DEFAULT_WEB_DEPTH_LIMIT,
     MODALITY_SET,
+    INTEGRATED_SEARCH_CHILD_TIMEOUT,
+
+    # ingestion pipeline
+    INGESTION_QUEUE_SIZE,
+    INGESTION_CHUNK_WORKERS,
+    INGESTION_INDEX_WORKERS,
+    INGESTION_SAVE_WORKERS,
+
+    # pdf text extraction
+    PDF_EXTRACT_PROCESSES,
+    PDF_EXTRACT_MIN_PAGES,
+    PDF_EXTRACT_TIMEOUT,
+
+    # data source downloads
+    GCS_DOWNLOAD_WORKERS,
+
+    # multimodal pdf rendering
+    MULTIMODAL_PDF_PAGE_WINDOW,
+    MULTIMODAL_PAGE_UPLOAD_WORKERS,
+
+    # embedding cache
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MAX_SIZE,
+    EMBEDDING_CACHE_TTL,
+    EMBEDDING_CACHE_REDIS_ENABLED,
+
+    # batched multimodal embeddings
+    MULTIMODAL_EMBEDDING_CONCURRENCY,
+    MULTIMODAL_EMBEDDING_QPS,
+    MULTIMODAL_EMBEDDING_WINDOW,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_RETRY_DELAY,
+    EMBEDDING_MAX_FAILED_CHUNK_RATIO,
+
+    # text embedding scheduler
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_BATCH_MAX_TOKENS,
     )
 
 from config.model_config import (
@@ -118,6 +159,7 @@ from config.model_config import (
     KEY_NAME,
     KEY_DEFAULT_SYSTEM_PROMPT,
     KEY_MODEL_REGION,
+    KEY_MODEL_QPS,
 
     # model types
     MODEL_TYPES,
@@ -142,7 +184,9 @@ from config.model_config import (
 from config.vector_store_config import (
   DEFAULT_VECTOR_STORE,
   VECTOR_STORES,
-  PG_HOST
+  PG_HOST,
+  VECTOR_STORE_LOCAL,
+  LOCAL_VECTOR_STORE_PATH
 )
 
 from config.onedrive_config import (
@@ -154,6 +198,8 @@ from config.onedrive_config import (
 
 from config.utils import (
   get_provider_models,
+  get_model_provider,
+  get_call_plan,
   get_provider_value,
   get_provider_embedding_types,
   get_provider_config,
@@ -28,6 +28,7 @@ from schemas.error_schema import (UnauthorizedResponseModel,
                                   ValidationErrorResponseModel)
 from utils.gcs_helper import get_blob_from_gcs_path
 from google.cloud import secretmanager
+from config.model_config_watcher import ModelConfigWatcher, load_model_config
 from config.model_config import (ModelConfig, VENDOR_OPENAI,
                                 PROVIDER_VERTEX, VENDOR_COHERE,
                                 PROVIDER_MODEL_GARDEN,
@@ -84,41 +85,74 @@ ERROR_RESPONSES = {
 }
 
 # model config
+# local path or gs:// url of the model config, defaults to models.json
 _model_config = None
-MODEL_CONFIG_PATH = None
+MODEL_CONFIG_PATH = os.getenv("MODEL_CONFIG_PATH") or \
+    os.path.join(os.path.dirname(__file__), "models.json")
+
+# hot reloading of model config, see config.model_config_watcher
+MODEL_CONFIG_WATCH = get_environ_flag("MODEL_CONFIG_WATCH", False)
+# seconds between checks for a changed model config
+MODEL_CONFIG_POLL_INTERVAL = \
+    float(os.getenv("MODEL_CONFIG_POLL_INTERVAL", "30"))
+# seconds after which model config is reloaded even if unchanged (0 = never)
+MODEL_CONFIG_TTL = float(os.getenv("MODEL_CONFIG_TTL", "0"))
 
 def get_model_config() -> ModelConfig:
   global _model_config
-  global MODEL_CONFIG_PATH
   if _model_config is None:
-    MODEL_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "models.json")
-    _model_config = ModelConfig(MODEL_CONFIG_PATH)
-    _model_config.load_model_config()
+    _model_config = load_model_config(MODEL_CONFIG_PATH)
   return _model_config
 
-mc = get_model_config()
-
-# provider enabled flags
-ENABLE_GOOGLE_LLM = mc.is_provider_enabled(PROVIDER_VERTEX)
-ENABLE_GOOGLE_MODEL_GARDEN = \
-    mc.is_provider_enabled(PROVIDER_MODEL_GARDEN)
-ENABLE_TRUSS_LLAMA2 = mc.is_provider_enabled(PROVIDER_TRUSS)
-ENABLE_VLLM_GEMMA = mc.is_provider_enabled(PROVIDER_VLLM)
-
-# vendor enabled flags
-ENABLE_OPENAI_LLM = mc.is_vendor_enabled(VENDOR_OPENAI)
-ENABLE_COHERE_LLM = mc.is_vendor_enabled(VENDOR_COHERE)
+def swap_model_config(model_config: ModelConfig):
+  """
+  Replace the current model config with a fully loaded model config.
+  The swap is a single assignment, so readers see either the old or the
+  new config.
+  """
+  global _model_config
+  _model_config = model_config
+
+_model_config_watcher = None
+
+def start_model_config_watcher() -> ModelConfigWatcher:
+  """ start reloading model config when it changes """
+  global _model_config_watcher
+  if _model_config_watcher is None:
+    _model_config_watcher = ModelConfigWatcher(
+        MODEL_CONFIG_PATH, swap_model_config,
+        poll_interval=MODEL_CONFIG_POLL_INTERVAL, ttl=MODEL_CONFIG_TTL)
+    _model_config_watcher.start()
+  return _model_config_watcher
+
+def stop_model_config_watcher():
+  global _model_config_watcher
+  if _model_config_watcher is not None:
+    _model_config_watcher.stop()
+    _model_config_watcher = None
+
+def is_provider_enabled(provider_id: str) -> bool:
+  """
+  Return whether a provider is enabled in the current model config.  The
+  config can be reloaded, so this is checked on each call.
+  """
+  return get_model_config().is_provider_enabled(provider_id)
+
+def is_vendor_enabled(vendor_id: str) -> bool:
+  """
+  Return whether a vendor is enabled in the current model config.  The
+  config can be reloaded, so this is checked on each call.
+  """
+  return get_model_config().is_vendor_enabled(vendor_id)
 
-Logger.info(f"ENABLE_GOOGLE_LLM = {ENABLE_GOOGLE_LLM}")
-Logger.info(f"ENABLE_OPENAI_LLM = {ENABLE_OPENAI_LLM}")
-Logger.info(f"ENABLE_COHERE_LLM = {ENABLE_COHERE_LLM}")
-Logger.info(f"ENABLE_GOOGLE_MODEL_GARDEN = {ENABLE_GOOGLE_MODEL_GARDEN}")
-Logger.info(f"ENABLE_TRUSS_LLAMA2 = {ENABLE_TRUSS_LLAMA2}")
-Logger.info(f"ENABLE_VLLM_GEMMA = {ENABLE_VLLM_GEMMA}")
+mc = get_model_config()
 
-# API Keys
-_, OPENAI_API_KEY = mc.get_vendor_api_key(VENDOR_OPENAI)
-_, COHERE_API_KEY = mc.get_vendor_api_key(VENDOR_COHERE)
+for _provider_id in [PROVIDER_VERTEX, PROVIDER_MODEL_GARDEN, PROVIDER_TRUSS,
+                     PROVIDER_VLLM]:
+  Logger.info(f"provider {_provider_id} enabled = "
+              f"{is_provider_enabled(_provider_id)}")
+for _vendor_id in [VENDOR_OPENAI, VENDOR_COHERE]:
+  Logger.info(f"vendor {_vendor_id} enabled = {is_vendor_enabled(_vendor_id)}")
 
 # default models
 DEFAULT_LLM_TYPE = VERTEX_LLM_TYPE_CHAT
@@ -132,6 +166,74 @@ DEFAULT_CHAT_SUMMARY_MODEL = VERTEX_LLM_TYPE_GEMINI_2_0_FLASH
 # other defaults
 DEFAULT_WEB_DEPTH_LIMIT = 1
 
+# query engine build ingestion pipeline, see services.query.pipeline
+# max number of documents waiting between pipeline stages
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "4"))
+# number of concurrent workers for each pipeline stage
+INGESTION_CHUNK_WORKERS = int(os.getenv("INGESTION_CHUNK_WORKERS", "4"))
+INGESTION_INDEX_WORKERS = int(os.getenv("INGESTION_INDEX_WORKERS", "2"))
+INGESTION_SAVE_WORKERS = int(os.getenv("INGESTION_SAVE_WORKERS", "2"))
+
+# page-parallel PDF text extraction, see DataSource.read_pdf
+# number of processes in the process-wide pool of PDF extraction workers,
+# 1 to extract text in the calling process
+PDF_EXTRACT_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES",
+                                      str(min(4, os.cpu_count() or 1))))
+# PDFs with fewer pages than this are extracted by a single worker
+PDF_EXTRACT_MIN_PAGES = int(os.getenv("PDF_EXTRACT_MIN_PAGES", "50"))
+# max number of seconds to extract the text of a single PDF
+PDF_EXTRACT_TIMEOUT = int(os.getenv("PDF_EXTRACT_TIMEOUT", "600"))
+
+# number of threads downloading data source files from GCS, see
+# DataSource.iter_documents
+GCS_DOWNLOAD_WORKERS = int(os.getenv("GCS_DOWNLOAD_WORKERS", "8"))
+
+# page-windowed PDF rendering for multimodal chunking, see
+# DataSource.chunk_document_multimodal
+# max number of PDF pages rendered to images at a time
+MULTIMODAL_PDF_PAGE_WINDOW = int(os.getenv("MULTIMODAL_PDF_PAGE_WINDOW", "8"))
+# number of threads uploading page images to GCS
+MULTIMODAL_PAGE_UPLOAD_WORKERS = \
+    int(os.getenv("MULTIMODAL_PAGE_UPLOAD_WORKERS", "8"))
+
+# cache of query embeddings, see services.embedding_cache
+EMBEDDING_CACHE_ENABLED = get_environ_flag("EMBEDDING_CACHE_ENABLED", True)
+EMBEDDING_CACHE_MAX_SIZE = int(os.getenv("EMBEDDING_CACHE_MAX_SIZE", "10000"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+# also share cached embeddings between replicas through redis
+EMBEDDING_CACHE_REDIS_ENABLED = \
+    get_environ_flag("EMBEDDING_CACHE_REDIS_ENABLED", False)
+
+# batched multimodal embeddings, see services.embeddings
+# max number of multimodal embedding requests in flight per batch
+MULTIMODAL_EMBEDDING_CONCURRENCY = \
+    int(os.getenv("MULTIMODAL_EMBEDDING_CONCURRENCY", "16"))
+# default requests per second per multimodal embedding model, overridden
+# by the "qps" setting of the model in the model config
+MULTIMODAL_EMBEDDING_QPS = float(os.getenv("MULTIMODAL_EMBEDDING_QPS", "10"))
+# max number of multimodal chunks of a document embedded at a time, page
+# images of PDF chunks are read from GCS for one window of chunks at a time
+MULTIMODAL_EMBEDDING_WINDOW = \
+    int(os.getenv("MULTIMODAL_EMBEDDING_WINDOW", "64"))
+# text embedding scheduler, see services.embedding_scheduler
+# max number of text embedding requests in flight per embedding model
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))
+# max estimated number of tokens in a text embedding request
+EMBEDDING_BATCH_MAX_TOKENS = \
+    int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "15000"))
+# retries of a throttled or failed embedding request, with exponential
+# backoff starting at EMBEDDING_RETRY_DELAY seconds
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_RETRY_DELAY = float(os.getenv("EMBEDDING_RETRY_DELAY", "1"))
+# max fraction of the chunks of a document that can fail to embed (after
+# retries) for the document to be indexed without them
+EMBEDDING_MAX_FAILED_CHUNK_RATIO = \
+    float(os.getenv("EMBEDDING_MAX_FAILED_CHUNK_RATIO", "0.05"))
+
+# timeout in seconds for each child engine query of an integrated search
+INTEGRATED_SEARCH_CHILD_TIMEOUT = \
+    float(os.getenv("INTEGRATED_SEARCH_CHILD_TIMEOUT", "30"))
+
 # config for agents and datasets
 AGENT_CONFIG_PATH = os.environ.get("AGENT_CONFIG_PATH")
 if not AGENT_CONFIG_PATH:
@@ -23,8 +23,12 @@ import importlib
 import inspect
 import json
 import os
+import threading
+from copy import deepcopy
 from pathlib import Path
-from typing import Dict, Any, Callable, Tuple, List
+from types import MappingProxyType
+from typing import Dict, Any, Callable, Tuple, List, Mapping, NamedTuple, \
+    Optional
 from common.utils.config import get_environ_flag
 from common.utils.logging_handler import Logger
 from common.utils.secrets import get_secret
@@ -67,6 +71,7 @@ KEY_DATE_ADDED = "date_added"
 KEY_NAME = "name"
 KEY_DEFAULT_SYSTEM_PROMPT = "default_system_prompt"
 KEY_MODEL_REGION = "region"
+KEY_MODEL_QPS = "qps"
 
 MODEL_CONFIG_KEYS = [
   KEY_ENABLED,
@@ -96,7 +101,8 @@ MODEL_CONFIG_KEYS = [
   KEY_DATE_ADDED,
   KEY_NAME,
   KEY_DEFAULT_SYSTEM_PROMPT,
-  KEY_MODEL_REGION
+  KEY_MODEL_REGION,
+  KEY_MODEL_QPS
 ]
 
 # model providers
@@ -211,6 +217,74 @@ def load_langchain_classes() -> dict:
 
   return langchain_classes
 
+class ModelCallPlan(NamedTuple):
+  """
+  Resolved config needed to call a model, see ModelConfig.get_call_plan
+  """
+  model_id: str
+  provider_id: Optional[str]
+  model_name: Optional[str]
+  model_endpoint: Optional[str]
+  model_params: Mapping[str, Any]
+  is_chat: bool
+  is_multimodal: bool
+
+
+class ModelDispatchIndex():
+  """
+  Immutable indexes of model config, built from the config dicts of a
+  ModelConfig so that models can be dispatched to providers in O(1).
+
+  model_providers: model id -> provider id
+  provider_models: provider id -> tuple of model ids, in config order
+  model_params: model id -> resolved generation params (the model params,
+    or the global provider params if the model has none)
+  provider_model_name_params: (provider id, model name) -> resolved params
+  call_plans: model id -> ModelCallPlan
+  """
+
+  def __init__(self, mc):
+    all_model_config = mc.get_all_model_config()
+    model_providers = {}
+    provider_models = {}
+    model_params = {}
+    provider_model_name_params = {}
+    call_plans = {}
+    for model_id, model_config in all_model_config.items():
+      provider_id = model_config.get(KEY_PROVIDER)
+      model_providers[model_id] = provider_id
+      provider_models.setdefault(provider_id, []).append(model_id)
+
+      params = model_config.get(KEY_MODEL_PARAMS)
+      if params is None:
+        provider_config = mc.get_provider_config(provider_id) or {}
+        params = provider_config.get(KEY_MODEL_PARAMS)
+      params = MappingProxyType(deepcopy(params or {}))
+      model_params[model_id] = params
+
+      model_name = model_config.get(KEY_MODEL_NAME)
+      if model_name is not None and KEY_MODEL_PARAMS in model_config:
+        provider_model_name_params[(provider_id, model_name)] = params
+
+      call_plans[model_id] = ModelCallPlan(
+          model_id=model_id,
+          provider_id=provider_id,
+          model_name=model_name,
+          model_endpoint=model_config.get(KEY_MODEL_ENDPOINT),
+          model_params=params,
+          is_chat=bool(model_config.get(KEY_IS_CHAT, False)),
+          is_multimodal=bool(model_config.get(KEY_IS_MULTI, False)))
+
+    self.model_providers = MappingProxyType(model_providers)
+    self.provider_models = MappingProxyType(
+        {provider_id: tuple(model_ids)
+         for provider_id, model_ids in provider_models.items()})
+    self.model_params = MappingProxyType(model_params)
+    self.provider_model_name_params = \
+        MappingProxyType(provider_model_name_params)
+    self.call_plans = MappingProxyType(call_plans)
+
+
 class ModelConfig():
   """
   Model config class
@@ -275,9 +349,15 @@ class ModelConfig():
     embedding model config uses all model config keys except is_chat
     embedding models also include these keys
       dimension: dimension of embedding vector
+
+  Provider dispatch uses a ModelDispatchIndex built from these dicts.  The
+  index is rebuilt when the config is loaded, and is invalidated when any
+  of the provider or model dicts is replaced.
   """
 
   def __init__(self, model_config_path: str):
+    self._index_lock = threading.Lock()
+    self._dispatch_index: Optional[ModelDispatchIndex] = None
     self.model_config_path = model_config_path
     self.llm_model_providers: Dict[str, Dict[str, Any]] = {}
     self.llm_model_vendors: Dict[str, Dict[str, Any]] = {}
@@ -285,6 +365,83 @@ class ModelConfig():
     self.llm_embedding_models: Dict[str, Dict[str, Any]] = {}
     self.default_system_prompt: str = ""
 
+  @property
+  def llm_model_providers(self) -> Dict[str, Dict[str, Any]]:
+    return self._llm_model_providers
+
+  @llm_model_providers.setter
+  def llm_model_providers(self, value: Dict[str, Dict[str, Any]]):
+    self._llm_model_providers = value
+    self.invalidate_dispatch_index()
+
+  @property
+  def llm_models(self) -> Dict[str, Dict[str, Any]]:
+    return self._llm_models
+
+  @llm_models.setter
+  def llm_models(self, value: Dict[str, Dict[str, Any]]):
+    self._llm_models = value
+    self.invalidate_dispatch_index()
+
+  @property
+  def llm_embedding_models(self) -> Dict[str, Dict[str, Any]]:
+    return self._llm_embedding_models
+
+  @llm_embedding_models.setter
+  def llm_embedding_models(self, value: Dict[str, Dict[str, Any]]):
+    self._llm_embedding_models = value
+    self.invalidate_dispatch_index()
+
+  # dispatch index
+
+  def invalidate_dispatch_index(self):
+    """ drop the dispatch index, so it is rebuilt on next use """
+    with self._index_lock:
+      self._dispatch_index = None
+
+  def build_dispatch_index(self) -> ModelDispatchIndex:
+    """ build the dispatch index from the current config and swap it in """
+    with self._index_lock:
+      self._dispatch_index = ModelDispatchIndex(self)
+      return self._dispatch_index
+
+  def get_dispatch_index(self) -> ModelDispatchIndex:
+    """ return the dispatch index, building it if necessary """
+    index = self._dispatch_index
+    if index is None:
+      with self._index_lock:
+        if self._dispatch_index is None:
+          self._dispatch_index = ModelDispatchIndex(self)
+        index = self._dispatch_index
+    return index
+
+  def get_model_provider(self, model_id: str) -> Optional[str]:
+    """ return provider id for model, or None if the model is unknown """
+    return self.get_dispatch_index().model_providers.get(model_id)
+
+  def get_call_plan(self, model_id: str) -> Optional[ModelCallPlan]:
+    """ return resolved call plan for model, or None if model is unknown """
+    return self.get_dispatch_index().call_plans.get(model_id)
+
+  def get_model_params(self, model_id: str) -> Mapping[str, Any]:
+    """ return resolved (read-only) generation params for model """
+    return self.get_dispatch_index().model_params.get(
+        model_id, MappingProxyType({}))
+
+  def get_provider_model_name_params(self, provider_id: str,
+                                     model_name: str) -> Mapping[str, Any]:
+    """
+    Return resolved (read-only) generation params for a provider model
+    name, or the global provider params if no model with that name has
+    its own params.
+    """
+    params = self.get_dispatch_index().provider_model_name_params.get(
+        (provider_id, model_name))
+    if params is None:
+      provider_config = self.get_provider_config(provider_id) or {}
+      params = MappingProxyType(provider_config.get(KEY_MODEL_PARAMS) or {})
+    return params
+
   def read_model_config(self):
     """ read model config from json config file """
     try:
@@ -309,6 +466,7 @@ class ModelConfig():
     self.llm_models = mc.llm_models
     self.llm_embedding_models = mc.llm_embedding_models
     self.default_system_prompt = mc.default_system_prompt
+    self.build_dispatch_index()
 
   def set_model_config(self):
     """
@@ -527,19 +685,15 @@ class ModelConfig():
 
   def get_provider_models(self, provider_id: str) -> List[str]:
     """ return list of model ids for provider """
-    provider_models = [
-      model_id
-      for model_id, _ in self.get_all_model_config().items()
-      if self.get_config_value(model_id, KEY_PROVIDER) == provider_id
-    ]
-    return provider_models
+    return list(
+        self.get_dispatch_index().provider_models.get(provider_id, ()))
 
   def get_provider_model_config(self, provider_id: str) -> dict:
     """ get model config dict for provider models """
     provider_model_config = {
-      model_id: model_config
-      for model_id, model_config in self.get_all_model_config().items()
-      if self.get_config_value(model_id, KEY_PROVIDER) == provider_id
+      model_id: self.get_model_config(model_id)
+      for model_id in self.get_dispatch_index().provider_models.get(
+          provider_id, ())
     }
     return provider_model_config
 
@@ -559,10 +713,9 @@ class ModelConfig():
       provider_config = self.get_provider_config(provider_id)
       value = provider_config.get(key, default)
     else:
-      provider_config = self.get_provider_model_config(provider_id)
-      Logger.debug(f"provider_config={provider_config}")
-      model_config = provider_config.get(model_id)
-      value = model_config.get(key, default)
+      if self.get_model_provider(model_id) != provider_id:
+        raise ModelConfigMissingException(f"{provider_id} model {model_id}")
+      value = self.get_config_value(model_id, key, default)
 
     if value is None:
       Logger.error(f"key {key} for provider {provider_id} is None")
@@ -705,6 +858,7 @@ class ModelConfig():
     """
     self.read_model_config()
     self.set_model_config()
+    self.build_dispatch_index()
 
   def get_default_system_prompt(self, model_id: str = None) -> str:
     """Get default prompt for the given model.
@@ -18,7 +18,8 @@ Unit test for section.py
 # pylint: disable=unused-import,unused-argument,redefined-outer-name
 import os
 import pytest
-from config.model_config import ModelConfig
+from config.model_config import (ModelConfig, KEY_PROVIDER, KEY_MODEL_NAME,
+                                 KEY_MODEL_PARAMS, PROVIDER_VERTEX)
 from common.testing.firestore_emulator import clean_firestore, firestore_emulator
 
 TEST_MODEL_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "models.json")
@@ -27,3 +28,31 @@ def test_model_config_load():
   """test for creating and loading model config"""
   model_config = ModelConfig(TEST_MODEL_CONFIG_PATH)
   model_config.load_model_config()
+
+def test_model_config_dispatch_index():
+  """test for provider dispatch index of model config"""
+  model_config = ModelConfig(TEST_MODEL_CONFIG_PATH)
+  model_config.read_model_config()
+
+  for model_id, config in model_config.get_all_model_config().items():
+    provider_id = config.get(KEY_PROVIDER)
+    assert model_config.get_model_provider(model_id) == provider_id
+    assert model_id in model_config.get_provider_models(provider_id)
+    call_plan = model_config.get_call_plan(model_id)
+    assert call_plan.provider_id == provider_id
+    assert call_plan.model_name == config.get(KEY_MODEL_NAME)
+
+  vertex_config = model_config.get_provider_config(PROVIDER_VERTEX)
+  assert model_config.get_provider_model_name_params(
+      PROVIDER_VERTEX, "unknown-model") == vertex_config[KEY_MODEL_PARAMS]
+
+  # replacing model config invalidates the index
+  model_config.llm_models = {
+    "test-model": {KEY_PROVIDER: PROVIDER_VERTEX,
+                   KEY_MODEL_NAME: "test-model-name",
+                   KEY_MODEL_PARAMS: {"temperature": 0.5}}
+  }
+  assert model_config.get_model_provider("test-model") == PROVIDER_VERTEX
+  assert model_config.get_model_provider("VertexAI-Chat") is None
+  assert dict(model_config.get_provider_model_name_params(
+      PROVIDER_VERTEX, "test-model-name")) == {"temperature": 0.5}
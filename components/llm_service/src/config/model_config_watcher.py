@@ -0,0 +1,214 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Hot reloading of model config
+"""
+# pylint: disable=broad-exception-caught
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+from common.utils.logging_handler import Logger
+from config.model_config import (ModelConfig, ModelDispatchIndex,
+                                 InvalidModelConfigException,
+                                 KEY_ENABLED, KEY_MODEL_ENDPOINT,
+                                 KEY_MODEL_PARAMS, KEY_PROVIDER,
+                                 PROVIDER_MODEL_GARDEN, PROVIDER_TRUSS,
+                                 PROVIDER_VLLM, PROVIDER_LLM_SERVICE)
+from utils.gcs_helper import get_blob_from_gcs_path
+
+Logger = Logger.get_logger(__file__)
+
+# providers whose models are called at a configured endpoint
+ENDPOINT_PROVIDERS = [PROVIDER_MODEL_GARDEN, PROVIDER_TRUSS, PROVIDER_VLLM,
+                      PROVIDER_LLM_SERVICE]
+
+
+def get_model_config_version(source: str) -> str:
+  """
+  Return a version string for a model config source, which changes when
+  the source changes.  The source is a local file path or a gs:// url.
+  """
+  if source.startswith("gs://"):
+    blob = get_blob_from_gcs_path(source)
+    return f"{blob.generation}:{blob.md5_hash}"
+  stat = os.stat(source)
+  return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def load_model_config(source: str) -> ModelConfig:
+  """
+  Load and initialize a model config from a local file path or gs:// url.
+
+  Raises:
+    RuntimeError or InvalidModelConfigException if the config is invalid
+  """
+  if not source.startswith("gs://"):
+    model_config = ModelConfig(source)
+    model_config.load_model_config()
+    return model_config
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    local_path = os.path.join(temp_dir, "models.json")
+    get_blob_from_gcs_path(source).download_to_filename(local_path)
+    model_config = ModelConfig(local_path)
+    model_config.load_model_config()
+  model_config.model_config_path = source
+  return model_config
+
+
+def validate_model_config(model_config: ModelConfig):
+  """
+  Check a newly loaded model config before it replaces the current config:
+  every model has a configured provider, model params are dicts, enabled
+  models of endpoint providers have an endpoint, and the dispatch index
+  builds.
+
+  Raises:
+    InvalidModelConfigException if the config is not usable
+  """
+  source = model_config.model_config_path
+  if not model_config.llm_models:
+    raise InvalidModelConfigException(f"no models in model config {source}")
+
+  errors = []
+  for config_type, configs in [("provider", model_config.llm_model_providers),
+                               ("vendor", model_config.llm_model_vendors)]:
+    for config_id, config in configs.items():
+      if not isinstance(config, dict):
+        errors.append(f"{config_type} {config_id} config is not a dict")
+      elif not isinstance(config.get(KEY_MODEL_PARAMS) or {}, dict):
+        errors.append(f"{config_type} {config_id} model params are not a dict")
+
+  for model_id, config in model_config.get_all_model_config().items():
+    provider_id = config.get(KEY_PROVIDER)
+    if provider_id not in model_config.llm_model_providers:
+      errors.append(f"model {model_id} has unknown provider {provider_id}")
+    if not isinstance(config.get(KEY_MODEL_PARAMS) or {}, dict):
+      errors.append(f"model {model_id} model params are not a dict")
+    endpoint = config.get(KEY_MODEL_ENDPOINT)
+    if endpoint is not None and not (isinstance(endpoint, str) and endpoint):
+      errors.append(f"model {model_id} has an invalid endpoint {endpoint!r}")
+    elif endpoint is None and provider_id in ENDPOINT_PROVIDERS \
+        and config.get(KEY_ENABLED, True):
+      errors.append(f"model {model_id} of provider {provider_id} "
+                    "has no endpoint")
+  if errors:
+    raise InvalidModelConfigException(
+        f"invalid model config {source}: {'; '.join(errors)}")
+
+  try:
+    ModelDispatchIndex(model_config)
+  except Exception as e:
+    raise InvalidModelConfigException(
+        f"unable to index model config {source}: {e}") from e
+
+
+class ModelConfigWatcher():
+  """
+  Watch a model config source and reload it when it changes, or when
+  the reload TTL expires.
+
+  A new ModelConfig is fully loaded and validated in the watcher thread
+  before it is passed to on_reload, which swaps it in.  If loading or
+  validation fails the current config is kept.
+  """
+
+  def __init__(self,
+               source: str,
+               on_reload: Callable[[ModelConfig], None],
+               poll_interval: float = 30,
+               ttl: float = 0,
+               loader: Callable[[str], ModelConfig] = load_model_config):
+    """
+    Args:
+      source: local file path or gs:// url of the model config
+      on_reload: called with each new validated ModelConfig
+      poll_interval: seconds between checks of the source version
+      ttl: seconds after which the config is reloaded even if unchanged
+        (0 to only reload on change)
+      loader: function that loads a ModelConfig from the source
+    """
+    self.source = source
+    self.on_reload = on_reload
+    self.poll_interval = poll_interval
+    self.ttl = ttl
+    self.loader = loader
+    self.version: Optional[str] = None
+    self.loaded_time = time.monotonic()
+    self._stopped = threading.Event()
+    self._thread: Optional[threading.Thread] = None
+
+  def check(self) -> bool:
+    """
+    Reload the config if the source has changed or the TTL has expired.
+
+    Returns:
+      True if a new config was loaded and swapped in
+    """
+    try:
+      version = get_model_config_version(self.source)
+    except Exception as e:
+      Logger.error(f"Unable to check model config {self.source}: {e}")
+      return False
+
+    expired = self.ttl > 0 and \
+        time.monotonic() - self.loaded_time >= self.ttl
+    if version == self.version and not expired:
+      return False
+
+    try:
+      model_config = self.loader(self.source)
+      validate_model_config(model_config)
+    except Exception as e:
+      Logger.error(f"Invalid model config {self.source} version [{version}],"
+                   f" keeping current config: {e}")
+      # don't retry this version until it changes or the TTL expires
+      self.version = version
+      self.loaded_time = time.monotonic()
+      return False
+
+    self.on_reload(model_config)
+    self.version = version
+    self.loaded_time = time.monotonic()
+    Logger.info(f"Reloaded model config {self.source} version [{version}]")
+    return True
+
+  def start(self):
+    """ start watching the source in a daemon thread """
+    try:
+      self.version = get_model_config_version(self.source)
+    except Exception as e:
+      Logger.error(f"Unable to check model config {self.source}: {e}")
+    self.loaded_time = time.monotonic()
+    self._stopped.clear()
+    self._thread = threading.Thread(target=self._run,
+                                    name="model-config-watcher",
+                                    daemon=True)
+    self._thread.start()
+    Logger.info(f"Watching model config {self.source} every "
+                f"{self.poll_interval}s, ttl {self.ttl}s")
+
+  def stop(self):
+    """ stop watching the source """
+    self._stopped.set()
+    if self._thread is not None:
+      self._thread.join()
+      self._thread = None
+
+  def _run(self):
+    while not self._stopped.wait(self.poll_interval):
+      self.check()
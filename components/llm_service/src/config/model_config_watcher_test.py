@@ -0,0 +1,100 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Unit tests for model config hot reloading
+"""
+# disabling these rules, as they cause issues with pytest fixtures
+# pylint: disable=unused-import,unused-argument,redefined-outer-name
+import json
+import os
+import tempfile
+import pytest
+from config.model_config import (ModelConfig, InvalidModelConfigException,
+                                 KEY_ENABLED, KEY_MODEL_ENDPOINT,
+                                 KEY_MODEL_PARAMS, KEY_PROVIDER)
+from config.model_config_watcher import (ModelConfigWatcher,
+                                         validate_model_config)
+
+TEST_MODEL_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "models.json")
+
+
+def read_model_config(source: str) -> ModelConfig:
+  model_config = ModelConfig(source)
+  model_config.read_model_config()
+  return model_config
+
+
+def test_model_config_watcher_reload():
+  with open(TEST_MODEL_CONFIG_PATH, "r", encoding="utf-8") as f:
+    config_json = json.load(f)
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    source = os.path.join(temp_dir, "models.json")
+    with open(source, "w", encoding="utf-8") as f:
+      json.dump(config_json, f)
+
+    reloaded = []
+    watcher = ModelConfigWatcher(source, reloaded.append,
+                                 loader=read_model_config)
+    watcher.start()
+    watcher.stop()
+
+    # unchanged config is not reloaded
+    assert not watcher.check()
+    assert reloaded == []
+
+    # changed config is reloaded
+    config_json["models"] = {
+      "VertexAI-Chat": config_json["models"]["VertexAI-Chat"]
+    }
+    with open(source, "w", encoding="utf-8") as f:
+      json.dump(config_json, f)
+    os.utime(source, ns=(0, 1))
+    assert watcher.check()
+    assert list(reloaded[0].llm_models.keys()) == ["VertexAI-Chat"]
+
+    # invalid config is not swapped in
+    with open(source, "w", encoding="utf-8") as f:
+      f.write("{ invalid json")
+    os.utime(source, ns=(0, 2))
+    assert not watcher.check()
+    assert len(reloaded) == 1
+
+    # config is reloaded when the ttl expires
+    with open(source, "w", encoding="utf-8") as f:
+      json.dump(config_json, f)
+    os.utime(source, ns=(0, 3))
+    assert watcher.check()
+    watcher.ttl = 0.001
+    watcher.loaded_time -= 1
+    assert watcher.check()
+    assert len(reloaded) == 3
+
+
+def test_validate_model_config():
+  model_config = read_model_config(TEST_MODEL_CONFIG_PATH)
+  validate_model_config(model_config)
+
+  model_config.llm_models["VertexAI-Chat"][KEY_PROVIDER] = "unknown"
+  model_config.llm_models["VertexAI-Chat"][KEY_MODEL_PARAMS] = ["invalid"]
+  with pytest.raises(InvalidModelConfigException) as e:
+    validate_model_config(model_config)
+  assert "unknown provider" in str(e.value)
+  assert "model params are not a dict" in str(e.value)
+
+  model_config = read_model_config(TEST_MODEL_CONFIG_PATH)
+  model_config.llm_models["vLLM-Gemma-Chat"][KEY_ENABLED] = True
+  del model_config.llm_models["vLLM-Gemma-Chat"][KEY_MODEL_ENDPOINT]
+  with pytest.raises(InvalidModelConfigException, match="has no endpoint"):
+    validate_model_config(model_config)
@@ -23,6 +23,12 @@ from config.config import get_model_config
 def get_provider_models(provider_id):
   return get_model_config().get_provider_models(provider_id)
 
+def get_model_provider(model_id):
+  return get_model_config().get_model_provider(model_id)
+
+def get_call_plan(model_id):
+  return get_model_config().get_call_plan(model_id)
+
 def get_provider_embedding_types(provider_id):
   return get_model_config().get_provider_embedding_types(provider_id)
 
@@ -26,12 +26,14 @@ Logger = Logger.get_logger(__file__)
 # vector store types
 VECTOR_STORE_MATCHING_ENGINE = "matching_engine"
 VECTOR_STORE_LANGCHAIN_PGVECTOR = "langchain_pgvector"
+VECTOR_STORE_LOCAL = "local"
 PG_VECTOR_DEFAULT_DBNAME = "pgvector"
 LOCAL_HOST = "127.0.0.1"
 
 VECTOR_STORES = [
   VECTOR_STORE_MATCHING_ENGINE,
-  VECTOR_STORE_LANGCHAIN_PGVECTOR
+  VECTOR_STORE_LANGCHAIN_PGVECTOR,
+  VECTOR_STORE_LOCAL
 ]
 
 # postgres
@@ -44,6 +46,15 @@ PG_PASSWD = None
 Logger.info(f"PG_HOST = [{PG_HOST}]")
 Logger.info(f"PG_DBNAME = [{PG_DBNAME}]")
 
+# local vector store: directory of the engine index files, which must be
+# shared by the build jobs and the service, and min number of embeddings
+# searched with an HNSW index (if hnswlib is installed)
+LOCAL_VECTOR_STORE_PATH = get_env_setting("LOCAL_VECTOR_STORE_PATH",
+                                          "/tmp/llm_service/vector_stores")
+LOCAL_VECTOR_STORE_HNSW_MIN_SIZE = int(
+    get_env_setting("LOCAL_VECTOR_STORE_HNSW_MIN_SIZE", 50000))
+Logger.info(f"LOCAL_VECTOR_STORE_PATH = [{LOCAL_VECTOR_STORE_PATH}]")
+
 # load secrets
 secrets = secretmanager.SecretManagerServiceClient()
 try:
@@ -32,6 +32,7 @@ from routes import llm, chat, query, agent, agent_plan
 from common.utils.http_exceptions import add_exception_handlers
 from common.utils.logging_handler import Logger
 from common.utils.auth_service import validate_token
+from common.utils.request_handler import close_async_clients
 from common.config import CORS_ALLOW_ORIGINS, PROJECT_ID
 from common.monitoring.middleware import (
   RequestTrackingMiddleware,
@@ -69,6 +70,18 @@ app.add_middleware(
 
 metrics_router = create_metrics_router()
 
+@app.on_event("startup")
+async def startup():
+  """Start reloading model config on change, if enabled"""
+  if config.MODEL_CONFIG_WATCH:
+    config.start_model_config_watcher()
+
+@app.on_event("shutdown")
+async def shutdown():
+  """Close pooled http connections and stop model config reloading"""
+  await close_async_clients()
+  config.stop_model_config_watcher()
+
 @app.get("/ping")
 def health_check():
   """Health Check API
@@ -63,6 +63,26 @@ EMBEDDING_GENERATE_LATENCY = Histogram(
   ["embedding_type"]
 )
 
+EMBEDDING_CACHE_REQUESTS = Counter(
+  "embedding_cache_requests", "Embedding Cache Lookups by Result",
+  ["embedding_type", "result"]
+)
+
+EMBEDDING_BATCH_LATENCY = Histogram(
+  "embedding_batch_latency_seconds", "Embedding Request Latency per Batch",
+  ["embedding_type", "status"]
+)
+
+EMBEDDING_BATCH_THROTTLED = Counter(
+  "embedding_batch_throttled", "Embedding Requests Rejected by Quota",
+  ["embedding_type"]
+)
+
+EMBEDDING_CONCURRENCY_LIMIT = Gauge(
+  "embedding_concurrency_limit", "Adaptive Embedding Request Concurrency",
+  ["embedding_type"]
+)
+
 # Chat Metrics
 CHAT_GENERATE_COUNT = Counter(
   "chat_generate_count", "Chat Generation Count",
@@ -146,6 +166,50 @@ VECTOR_DB_DOC_COUNT = Histogram(
     10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000]
 )
 
+MULTIMODAL_DOC_PEAK_RSS = Histogram(
+  "multimodal_document_peak_rss_bytes",
+  "Peak Resident Memory while Chunking a Multimodal Document",
+  ["doc_type"], buckets=[
+    2**28, 2**29, 2**30, 2**31, 2**32, 2**33, 2**34]
+)
+
+# Integrated Search Metrics
+INTEGRATED_SEARCH_CHILD_COUNT = Counter(
+  "integrated_search_child_count", "Integrated Search Child Engine Query Count",
+  ["engine_type", "engine_name", "status"]
+)
+
+INTEGRATED_SEARCH_CHILD_LATENCY = Histogram(
+  "integrated_search_child_latency_seconds",
+  "Integrated Search Child Engine Query Latency",
+  ["engine_type", "engine_name"]
+)
+
+# Ingestion Pipeline Metrics
+INGESTION_STAGE_ITEMS = Counter(
+  "ingestion_stage_items", "Items Processed per Ingestion Pipeline Stage",
+  ["pipeline", "stage", "status"]
+)
+
+INGESTION_STAGE_LATENCY = Histogram(
+  "ingestion_stage_latency_seconds",
+  "Ingestion Pipeline Stage Latency per Item",
+  ["pipeline", "stage"]
+)
+
+# Streaming Query Metrics
+QUERY_STREAM_TIME_TO_FIRST_BYTE = Histogram(
+  "query_stream_time_to_first_byte_seconds",
+  "Streaming Query Time to First Event (References)",
+  ["engine_name"]
+)
+
+QUERY_STREAM_TIME_TO_FIRST_TOKEN = Histogram(
+  "query_stream_time_to_first_token_seconds",
+  "Streaming Query Time to First Response Token",
+  ["engine_name", "llm_type"]
+)
+
 
 def extract_llm_params(kwargs: Dict[str, Any]) -> Dict[str, Any]:
   """Extract LLM parameters from kwargs
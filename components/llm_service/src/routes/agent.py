@@ -35,7 +35,7 @@ from services.agents.agents import BaseAgent
 from services.agents.routing_agent import run_routing_agent, run_intent
 from config import (PAYLOAD_FILE_SIZE, ERROR_RESPONSES,
                     PROJECT_ID, DATABASE_PREFIX,
-                    ENABLE_OPENAI_LLM, ENABLE_COHERE_LLM,
+                    is_vendor_enabled, VENDOR_OPENAI, VENDOR_COHERE,
                     DEFAULT_VECTOR_STORE, PG_HOST, AGENT_CONFIG_PATH,
                     ONEDRIVE_CLIENT_ID, ONEDRIVE_TENANT_ID)
 from metrics import track_agent_execution
@@ -180,8 +180,8 @@ async def run_dispatch(agent_name: str, run_config: LLMAgentRunModel,
     env_vars = {
       "DATABASE_PREFIX": DATABASE_PREFIX,
       "PROJECT_ID": PROJECT_ID,
-      "ENABLE_OPENAI_LLM": str(ENABLE_OPENAI_LLM),
-      "ENABLE_COHERE_LLM": str(ENABLE_COHERE_LLM),
+      "ENABLE_OPENAI_LLM": str(is_vendor_enabled(VENDOR_OPENAI)),
+      "ENABLE_COHERE_LLM": str(is_vendor_enabled(VENDOR_COHERE)),
       "DEFAULT_VECTOR_STORE": str(DEFAULT_VECTOR_STORE),
       "PG_HOST": PG_HOST,
       "AGENT_CONFIG_PATH": AGENT_CONFIG_PATH,
@@ -275,8 +275,8 @@ async def agent_run(agent_name: str,
       env_vars = {
         "DATABASE_PREFIX": DATABASE_PREFIX,
         "PROJECT_ID": PROJECT_ID,
-        "ENABLE_OPENAI_LLM": str(ENABLE_OPENAI_LLM),
-        "ENABLE_COHERE_LLM": str(ENABLE_COHERE_LLM),
+        "ENABLE_OPENAI_LLM": str(is_vendor_enabled(VENDOR_OPENAI)),
+        "ENABLE_COHERE_LLM": str(is_vendor_enabled(VENDOR_COHERE)),
         "DEFAULT_VECTOR_STORE": str(DEFAULT_VECTOR_STORE),
         "PG_HOST": PG_HOST,
         "AGENT_CONFIG_PATH": AGENT_CONFIG_PATH,
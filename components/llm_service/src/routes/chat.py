@@ -157,17 +157,24 @@ def get_chat_llm_details(user_data: dict = Depends(validate_token),
 def get_chat_list(skip: int = 0, limit: int = 20,
                 with_all_history: bool = False,
                 with_first_history: bool = False,
+                page_token: Optional[str] = None,
                 user_data: dict = Depends(validate_token)):
   """
   Get user chats for authenticated user.  Chat data does not include
   chat history to slim payload.  To retrieve chat history use the
   get single chat endpoint.
 
+  Without history, chats are listed from their summary fields only and
+  the response includes a next_page_token that can be passed as
+  page_token to fetch the next page.
+
   Args:
     skip: `int`
       Number of tools to be skipped <br/>
     limit: `int`
       Size of tools array to be returned <br/>
+    page_token: `str`
+      Token returned by a previous call to fetch the next page <br/>
 
   Returns:
       LLMUserAllChatsResponse
@@ -180,23 +187,26 @@ def get_chat_list(skip: int = 0, limit: int = 20,
       raise ValidationError("Invalid value passed to \"limit\" query parameter")
 
     user = User.find_by_email(user_data.get("email"))
-    user_chats = UserChat.find_by_user(user.user_id)
-
-    chat_list = []
-    for i in user_chats:
-      chat_data = i.get_fields(reformat_datetime=True)
-      chat_data["id"] = i.id
-      # Trim chat history to slim return payload
-      if not with_all_history and not with_first_history:
-        del chat_data["history"]
-      elif with_first_history:
-        # Trim all chat history except the first one
-        chat_data["history"] = chat_data["history"][:1]
-      chat_list.append(chat_data)
+
+    next_page_token = None
+    if not with_all_history and not with_first_history:
+      chat_list, next_page_token = UserChat.find_summaries_by_user(
+          user.user_id, skip=skip, limit=limit, page_token=page_token)
+    else:
+      user_chats = UserChat.find_by_user(user.user_id, skip=skip, limit=limit)
+      chat_list = []
+      for i in user_chats:
+        chat_data = i.get_fields(reformat_datetime=True)
+        chat_data["id"] = i.id
+        if with_first_history:
+          # Trim all chat history except the first one
+          chat_data["history"] = chat_data["history"][:1]
+        chat_list.append(chat_data)
     return {
       "success": True,
       "message": f"Successfully retrieved user chats for user {user.user_id}",
-      "data": chat_list
+      "data": chat_list,
+      "next_page_token": next_page_token
     }
   except ValidationError as e:
     raise BadRequest(str(e)) from e
@@ -444,7 +454,7 @@ async def create_user_chat(
     chat_file_bytes = await chat_file.read()
 
   try:
-    user = User.find_by_email(user_data.get("email"))
+    user = await User.afind_by_email(user_data.get("email"))
 
     # If history is provided, parse the JSON string into a list
     if history:
@@ -459,14 +469,14 @@ async def create_user_chat(
                            prompt=prompt)
       user_chat.history = history_list  # Use the parsed list
       if chat_file:
-        user_chat.update_history(custom_entry={
+        user_chat.add_history(custom_entry={
           f"{CHAT_FILE}": chat_file.filename
         })
       elif chat_file_url:
-        user_chat.update_history(custom_entry={
+        user_chat.add_history(custom_entry={
           f"{CHAT_FILE_URL}": chat_file_url
         })
-      user_chat.save()
+      await user_chat.asave()
 
       chat_data = user_chat.get_fields(reformat_datetime=True)
       chat_data["id"] = user_chat.id
@@ -499,22 +509,22 @@ async def create_user_chat(
                          prompt=prompt)
     user_chat.history = UserChat.get_history_entry(prompt, response)
     if chat_file:
-      user_chat.update_history(custom_entry={
+      user_chat.add_history(custom_entry={
         f"{CHAT_FILE}": chat_file.filename
       })
     elif chat_file_url:
-      user_chat.update_history(custom_entry={
+      user_chat.add_history(custom_entry={
         f"{CHAT_FILE_URL}": chat_file_url
       })
     if response_files:
       for file in response_files:
-        user_chat.update_history(custom_entry={
+        user_chat.add_history(custom_entry={
           f"{CHAT_FILE}": file["name"]
         })
-        user_chat.update_history(custom_entry={
+        user_chat.add_history(custom_entry={
           f"{CHAT_FILE_BASE64}": file["contents"]
         })
-    user_chat.save()
+    await user_chat.asave()
 
     chat_data = user_chat.get_fields(reformat_datetime=True)
     chat_data["id"] = user_chat.id
@@ -554,10 +564,10 @@ async def create_empty_chat(user_data: dict = Depends(validate_token)):
   )
 
   try:
-    user = User.find_by_email(user_data.get("email"))
+    user = await User.afind_by_email(user_data.get("email"))
     # create new chat for user
     user_chat = UserChat(user_id=user.user_id)
-    user_chat.save()
+    await user_chat.asave()
     chat_data = user_chat.get_fields(reformat_datetime=True)
     chat_data["id"] = user_chat.id
     return {
@@ -634,7 +644,7 @@ async def user_chat_generate(chat_id: str,
       return BadRequest("Missing or invalid payload parameters")
 
     # fetch user chat
-    user_chat = UserChat.find_by_id(chat_id)
+    user_chat = await UserChat.afind_by_id(chat_id)
     if user_chat is None:
       raise ResourceNotFoundException(f"Chat {chat_id} not found ")
 
@@ -643,17 +653,17 @@ async def user_chat_generate(chat_id: str,
       # Generate and set chat title
       summary = await generate_chat_summary(user_chat)
       user_chat.title = summary
-      user_chat.save()
+      await user_chat.asave()
 
     if (chat_file_bytes
         and (mime_type := validate_multimodal_file_type(chat_file.filename))):
-      user_chat.update_history(custom_entry={
+      await user_chat.aupdate_history(custom_entry={
         CHAT_FILE_BASE64: chat_file_bytes,
         CHAT_FILE_TYPE: mime_type
       })
     if chat_files:
       for cur_chat_file in chat_files:
-        user_chat.update_history(custom_entry={
+        await user_chat.aupdate_history(custom_entry={
           CHAT_FILE_URL: cur_chat_file.gcs_path,
           CHAT_FILE_TYPE: cur_chat_file.mime_type
         })
@@ -674,7 +684,7 @@ async def user_chat_generate(chat_id: str,
         response, response_files = run_chat_tools(prompt)
       else:
         if query_engine_id:
-          query_engine = QueryEngine.find_by_id(query_engine_id)
+          query_engine = await QueryEngine.afind_by_id(query_engine_id)
           if not query_engine:
             raise ResourceNotFoundException(
               f"Query engine {query_engine_id} not found")
@@ -737,7 +747,7 @@ async def user_chat_generate(chat_id: str,
               # Record metrics
               LLM_RESPONSE_SIZE.labels(llm_type=llm_type).observe(total_chars)
               # Save response to history after streaming completes
-              user_chat.update_history(
+              await user_chat.aupdate_history(
                   prompt=prompt,
                   response=response_content,
                   query_engine=query_engine,
@@ -778,20 +788,20 @@ async def user_chat_generate(chat_id: str,
         }
       )
       # save chat history
-      user_chat.update_history(prompt=prompt, response=response)
+      await user_chat.aupdate_history(prompt=prompt, response=response)
       LLM_RESPONSE_SIZE.labels(llm_type=llm_type).observe(response_size)
 
       if response_files:
         for file in response_files:
-          user_chat.update_history(custom_entry={
+          await user_chat.aupdate_history(custom_entry={
             CHAT_FILE: file["name"]
           })
-          user_chat.update_history(custom_entry={
+          await user_chat.aupdate_history(custom_entry={
             CHAT_FILE_BASE64: file["contents"],
             CHAT_FILE_TYPE: "image/png"
           })
 
-      user_chat.update_history(
+      await user_chat.aupdate_history(
           query_engine=query_engine,
           query_references=query_references,
           query_refs_str=query_refs_str
@@ -834,14 +844,14 @@ async def generate_chat_summary_route(chat_id: str):
   """
   try:
     # Get the chat
-    user_chat = UserChat.find_by_id(chat_id)
+    user_chat = await UserChat.afind_by_id(chat_id)
     if user_chat is None:
       raise ResourceNotFoundException(f"Chat {chat_id} not found")
 
     # Generate summary and update title
     summary = await generate_chat_summary(user_chat)
     user_chat.title = summary
-    user_chat.save()
+    await user_chat.asave()
 
     chat_data = user_chat.get_fields(reformat_datetime=True)
     chat_data["id"] = user_chat.id
@@ -19,6 +19,7 @@
 # pylint: disable=unused-argument,redefined-outer-name,unused-import
 # pylint: disable=unused-variable,ungrouped-imports
 import os
+import datetime
 import json
 import pytest
 from typing import AsyncGenerator
@@ -28,10 +29,13 @@ from unittest import mock
 from testing.test_config import API_URL, TESTING_FOLDER_PATH
 from schemas.schema_examples import (LLM_GENERATE_EXAMPLE, CHAT_EXAMPLE,
                                      USER_EXAMPLE, QUERY_ENGINE_EXAMPLE)
+from fireo.database import db
+from google.cloud import firestore
 from common.models import UserChat, User, QueryEngine, QueryReference
 from common.models.llm import (CHAT_HUMAN, CHAT_AI, CHAT_FILE, CHAT_FILE_BASE64,
                              CHAT_SOURCE, CHAT_QUERY_RESULT,
                              CHAT_QUERY_REFERENCES)
+from common.utils.errors import ResourceNotFoundException
 from common.utils.http_exceptions import add_exception_handlers
 from common.utils.auth_service import validate_user
 from common.utils.auth_service import validate_token
@@ -129,6 +133,81 @@ def test_get_chats(create_user, create_chat, client_with_emulator):
   assert resp.status_code == 200, "Status 200"
   saved_ids = [i.get("id") for i in json_response.get("data")]
   assert CHAT_EXAMPLE["id"] in saved_ids, "all data not retrieved"
+  chat_data = json_response.get("data")[0]
+  assert "history" not in chat_data, "history returned in chat list"
+  assert chat_data["message_count"] == 4, "message count not returned"
+  assert chat_data["prompt"] == CHAT_EXAMPLE["prompt"], "prompt not returned"
+
+
+def test_get_chats_paginated(create_user, client_with_emulator):
+  for i in range(3):
+    chat = UserChat(user_id=CHAT_EXAMPLE["user_id"],
+                    title=f"Test chat {i}",
+                    history=UserChat.get_history_entry(f"prompt {i}",
+                                                       f"response {i}"))
+    chat.save()
+
+  resp = client_with_emulator.get(api_url, params={"limit": 2})
+  json_response = resp.json()
+  assert resp.status_code == 200, "Status 200"
+  first_page = [i.get("id") for i in json_response.get("data")]
+  assert len(first_page) == 2, "limit not applied"
+  page_token = json_response.get("next_page_token")
+  assert page_token, "next page token not returned"
+
+  resp = client_with_emulator.get(
+      api_url, params={"limit": 2, "page_token": page_token})
+  json_response = resp.json()
+  assert resp.status_code == 200, "Status 200"
+  second_page = [i.get("id") for i in json_response.get("data")]
+  assert len(second_page) == 1, "next page not retrieved"
+  assert not set(first_page) & set(second_page), "pages overlap"
+  assert json_response.get("next_page_token") is None, "unexpected page token"
+
+  resp = client_with_emulator.get(
+      api_url, params={"limit": 2, "page_token": "invalid"})
+  assert resp.status_code == 400, "Status 400"
+
+
+def test_get_chats_paginated_same_time(create_user, client_with_emulator):
+  # chats created at the same time are not skipped between pages
+  created_time = datetime.datetime.utcnow()
+  chat_ids = set()
+  for i in range(5):
+    chat = UserChat(user_id=CHAT_EXAMPLE["user_id"], title=f"Test chat {i}")
+    chat.save(input_datetime=created_time)
+    chat_ids.add(chat.id)
+
+  page_ids = []
+  params = {"limit": 2}
+  while True:
+    resp = client_with_emulator.get(api_url, params=params)
+    assert resp.status_code == 200, "Status 200"
+    json_response = resp.json()
+    page_ids.extend(i.get("id") for i in json_response.get("data"))
+    if not json_response.get("next_page_token"):
+      break
+    params["page_token"] = json_response.get("next_page_token")
+  assert len(page_ids) == len(chat_ids), "chats skipped or repeated"
+  assert set(page_ids) == chat_ids, "chats skipped"
+
+
+def test_backfill_summaries(create_user, client_with_emulator):
+  chat = UserChat(user_id=CHAT_EXAMPLE["user_id"],
+                  history=UserChat.get_history_entry("first prompt",
+                                                     "response"))
+  chat.save()
+  # a chat saved before the summary fields were added
+  db.conn.collection(UserChat.collection_name).document(chat.id).update(
+      {"prompt": "", "message_count": firestore.DELETE_FIELD})
+  last_modified_time = UserChat.find_by_id(chat.id).last_modified_time
+
+  assert UserChat.backfill_summaries() == 1
+  saved_chat = UserChat.find_by_id(chat.id)
+  assert saved_chat.message_count == 2, "message count not backfilled"
+  assert saved_chat.prompt == "first prompt", "prompt not backfilled"
+  assert saved_chat.last_modified_time == last_modified_time
+  assert UserChat.backfill_summaries() == 0
 
 
 def test_get_chat(create_user, create_chat, client_with_emulator):
@@ -143,6 +222,45 @@ def test_get_chat(create_user, create_chat, client_with_emulator):
   assert chatid == saved_id, "all data not retrieved"
 
 
+@pytest.mark.asyncio
+async def test_chat_async_model_access(create_user, create_chat,
+                                       client_with_emulator):
+  """Test the async model methods used by the chat routes"""
+  chat = await UserChat.afind_by_id(CHAT_EXAMPLE["id"])
+  assert chat.user_id == CHAT_EXAMPLE["user_id"], "chat not read"
+
+  new_chat = UserChat(user_id=CHAT_EXAMPLE["user_id"])
+  await new_chat.aupdate_history(prompt="async prompt",
+                                 response="async response")
+  assert new_chat.id is not None, "id not assigned"
+  saved_chat = UserChat.find_by_id(new_chat.id)
+  assert saved_chat.message_count == 2, "summary fields not saved"
+  assert saved_chat.prompt == "async prompt", "summary fields not saved"
+
+  chats = await UserChat.afind_by_ids(
+      [new_chat.id, "missing-id", CHAT_EXAMPLE["id"]])
+  assert [c.id for c in chats] == [new_chat.id, CHAT_EXAMPLE["id"]]
+
+  chats = await UserChat.afetch([("user_id", "==", CHAT_EXAMPLE["user_id"])],
+                                order_by="-created_time")
+  assert {c.id for c in chats} == {new_chat.id, CHAT_EXAMPLE["id"]}
+
+  new_chat.title = "async title"
+  await new_chat.aupdate()
+  assert UserChat.find_by_id(new_chat.id).title == "async title"
+
+  # soft deleted objects are not found
+  UserChat.soft_delete_by_id(new_chat.id)
+  with pytest.raises(ResourceNotFoundException):
+    await UserChat.afind_by_id(new_chat.id)
+  assert await UserChat.afind_by_ids([new_chat.id]) == []
+  chats = await UserChat.afetch([("user_id", "==", CHAT_EXAMPLE["user_id"])])
+  assert [c.id for c in chats] == [CHAT_EXAMPLE["id"]]
+
+  user = await User.afind_by_email(USER_EXAMPLE["email"])
+  assert user.user_id == USER_EXAMPLE["user_id"], "user not found by email"
+
+
 @pytest.mark.asyncio
 async def test_create_chat(create_user, client_with_emulator):
   """Test creating a new chat"""
@@ -15,12 +15,17 @@
 # pylint: disable = broad-except
 
 """ Query endpoints """
+import json
+import time
 import traceback
+from typing import AsyncGenerator, Callable, Optional
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 
 from common.models import (QueryEngine,
                            User, UserQuery, QueryDocument, UserChat)
-from common.models.llm_query import QE_TYPE_INTEGRATED_SEARCH
+from common.models.llm_query import (QE_TYPE_INTEGRATED_SEARCH,
+                                     QE_TYPE_LLM_SERVICE)
 from common.schemas.batch_job_schemas import BatchJobModel
 from common.utils.auth_service import validate_token
 from common.utils.batch_jobs import initiate_batch_job
@@ -33,8 +38,10 @@ from common.utils.http_exceptions import (InternalServerError, BadRequest,
                                           ResourceNotFound)
 from common.utils.logging_handler import Logger
 from config import (PROJECT_ID, DATABASE_PREFIX, PAYLOAD_FILE_SIZE,
-                    ERROR_RESPONSES, ENABLE_OPENAI_LLM, ENABLE_COHERE_LLM,
+                    ERROR_RESPONSES, is_vendor_enabled,
+                    VENDOR_OPENAI, VENDOR_COHERE,
                     DEFAULT_VECTOR_STORE, VECTOR_STORES, PG_HOST,
+                    VECTOR_STORE_LOCAL, LOCAL_VECTOR_STORE_PATH,
                     ONEDRIVE_CLIENT_ID, ONEDRIVE_TENANT_ID)
 from schemas.llm_schema import (LLMQueryModel,
                                 LLMUserAllQueriesResponse,
@@ -48,10 +55,17 @@ from schemas.llm_schema import (LLMQueryModel,
                                 LLMGetVectorStoreTypesResponse,
                                 LLMQueryEngineUpdateModel)
 from services.query.query_service import (query_generate,
-                                          delete_engine, update_user_query)
+                                          query_generate_stream,
+                                          delete_engine, update_user_query,
+                                          QE_BUILD_MODE_UPDATE,
+                                          QUERY_STREAM_REFERENCES,
+                                          QUERY_STREAM_TOKEN,
+                                          QUERY_STREAM_RESULT)
 from services.llm_generate import generate_chat_summary
 from utils.gcs_helper import upload_b64files_to_gcs
-from metrics import track_vector_db_query, track_vector_db_build
+from metrics import (track_vector_db_query, track_vector_db_build,
+                     QUERY_STREAM_TIME_TO_FIRST_BYTE,
+                     QUERY_STREAM_TIME_TO_FIRST_TOKEN)
 
 Logger = Logger.get_logger(__file__)
 router = APIRouter(prefix="/query", tags=["Query"], responses=ERROR_RESPONSES)
@@ -447,6 +461,21 @@ def delete_query_engine(query_engine_id: str, hard_delete: bool = True):
   }
 
 
+def query_engine_build_env_vars() -> dict:
+  """ environment variables of query engine build jobs """
+  return {
+    "DATABASE_PREFIX": DATABASE_PREFIX,
+    "PROJECT_ID": PROJECT_ID,
+    "ENABLE_OPENAI_LLM": str(is_vendor_enabled(VENDOR_OPENAI)),
+    "ENABLE_COHERE_LLM": str(is_vendor_enabled(VENDOR_COHERE)),
+    "DEFAULT_VECTOR_STORE": str(DEFAULT_VECTOR_STORE),
+    "PG_HOST": PG_HOST,
+    "LOCAL_VECTOR_STORE_PATH": LOCAL_VECTOR_STORE_PATH,
+    "ONEDRIVE_CLIENT_ID": ONEDRIVE_CLIENT_ID,
+    "ONEDRIVE_TENANT_ID": ONEDRIVE_TENANT_ID,
+  }
+
+
 @router.post(
     "/engine",
     name="Create a query engine",
@@ -500,6 +529,13 @@ async def query_engine_create(gen_config: LLMQueryEngineModel,
 
   params = genconfig_dict.get("params", {})
 
+  vector_store = genconfig_dict.get("vector_store") or DEFAULT_VECTOR_STORE
+  is_multimodal = str((params or {}).get("is_multimodal", "")).lower()
+  if query_engine_type in (None, "", QE_TYPE_LLM_SERVICE) and \
+      is_multimodal == "true" and vector_store == VECTOR_STORE_LOCAL:
+    raise BadRequest(
+        f"Vector store {vector_store} does not support multimodal engines")
+
   try:
     data = {
       "doc_url": doc_url,
@@ -512,17 +548,60 @@ async def query_engine_create(gen_config: LLMQueryEngineModel,
       "description": genconfig_dict.get("description", None),
       "params": params,
     }
-    env_vars = {
-      "DATABASE_PREFIX": DATABASE_PREFIX,
-      "PROJECT_ID": PROJECT_ID,
-      "ENABLE_OPENAI_LLM": str(ENABLE_OPENAI_LLM),
-      "ENABLE_COHERE_LLM": str(ENABLE_COHERE_LLM),
-      "DEFAULT_VECTOR_STORE": str(DEFAULT_VECTOR_STORE),
-      "PG_HOST": PG_HOST,
-      "ONEDRIVE_CLIENT_ID": ONEDRIVE_CLIENT_ID,
-      "ONEDRIVE_TENANT_ID": ONEDRIVE_TENANT_ID,
+    response = initiate_batch_job(data, JOB_TYPE_QUERY_ENGINE_BUILD,
+                                  query_engine_build_env_vars())
+    Logger.info(f"Batch job response: {response}")
+    return response
+  except Exception as e:
+    Logger.error(e)
+    Logger.error(traceback.print_exc())
+    raise InternalServerError(str(e)) from e
+
+
+@router.post(
+    "/engine/{query_engine_id}/update",
+    name="Update the documents of a query engine",
+    response_model=BatchJobModel)
+async def query_engine_update(query_engine_id: str,
+                              doc_url: Optional[str] = None,
+                              user_data: dict = Depends(validate_token)):
+  """
+  Start a job to update the document index of a query engine.  Only new
+  and changed documents are indexed, and documents removed from the
+  source are deleted from the engine.
+
+  Args:
+      query_engine_id (str)
+      doc_url (str): (optional) url of the documents, by default the url
+        the engine was built from
+      user_data (dict)
+  Returns:
+      BatchJobModel
+  """
+  q_engine = QueryEngine.find_by_id(query_engine_id)
+  if q_engine is None:
+    raise ResourceNotFoundException(f"Engine {query_engine_id} not found")
+
+  if q_engine.query_engine_type != QE_TYPE_LLM_SERVICE:
+    return BadRequest(
+        f"Query engine type {q_engine.query_engine_type} can't be updated")
+
+  doc_url = doc_url or q_engine.doc_url
+  if not doc_url:
+    return BadRequest("Missing or invalid payload parameters: doc_url")
+
+  Logger.info(f"Update query engine [{q_engine.name}] from {doc_url}")
+
+  try:
+    data = {
+      "build_mode": QE_BUILD_MODE_UPDATE,
+      "query_engine_id": q_engine.id,
+      "query_engine": q_engine.name,
+      "doc_url": doc_url,
+      "user_id": user_data.get("user_id"),
     }
-    response = initiate_batch_job(data, JOB_TYPE_QUERY_ENGINE_BUILD, env_vars)
+    response = initiate_batch_job(data, JOB_TYPE_QUERY_ENGINE_BUILD,
+                                  query_engine_build_env_vars())
     Logger.info(f"Batch job response: {response}")
     return response
   except Exception as e:
@@ -552,7 +631,7 @@ async def query(query_engine_id: str,
   """
   Logger.info(f"Using query engine with "
               f"query_engine_id=[{query_engine_id}] and {gen_config}")
-  q_engine = QueryEngine.find_by_id(query_engine_id)
+  q_engine = await QueryEngine.afind_by_id(query_engine_id)
   if q_engine is None:
     raise ResourceNotFoundException(f"Engine {query_engine_id} not found")
 
@@ -577,19 +656,18 @@ async def query(query_engine_id: str,
   Logger.info(f"chat_mode = {chat_mode}")
 
   # get the User GENIE stores
-  user = User.find_by_email(user_data.get("email"))
+  user = await User.afind_by_email(user_data.get("email"))
 
   run_as_batch_job = genconfig_dict.get("run_as_batch_job", False)
   Logger.info(f"run_as_batch_job = {run_as_batch_job}")
 
   user_query = None
-  user_chat = None
   if run_as_batch_job:
     # create user query object to hold the query state
     user_query = UserQuery(user_id=user.user_id,
                            prompt=prompt, query_engine_id=q_engine.id)
-    user_query.save()
-    user_query.update_history(prompt=prompt)
+    user_query.add_history(prompt=prompt)
+    await user_query.asave()
     query_data = user_query.get_fields(reformat_datetime=True)
     query_data["id"] = user_query.id
 
@@ -607,8 +685,8 @@ async def query(query_engine_id: str,
       env_vars = {
         "DATABASE_PREFIX": DATABASE_PREFIX,
         "PROJECT_ID": PROJECT_ID,
-        "ENABLE_OPENAI_LLM": str(ENABLE_OPENAI_LLM),
-        "ENABLE_COHERE_LLM": str(ENABLE_COHERE_LLM),
+        "ENABLE_OPENAI_LLM": str(is_vendor_enabled(VENDOR_OPENAI)),
+        "ENABLE_COHERE_LLM": str(is_vendor_enabled(VENDOR_COHERE)),
         "DEFAULT_VECTOR_STORE": str(DEFAULT_VECTOR_STORE),
         "PG_HOST": PG_HOST,
       }
@@ -628,30 +706,18 @@ async def query(query_engine_id: str,
       Logger.error(traceback.print_exc())
       raise InternalServerError(str(e)) from e
 
-  # perform normal synchronous query
-  try:
-    query_result, query_references = await query_generate(user.id,
-                                                          prompt,
-                                                          q_engine,
-                                                          user_data,
-                                                          llm_type,
-                                                          user_query,
-                                                          rank_sentences,
-                                                          query_filter)
-
-    Logger.info(f"Query response="
-                f"[{query_result.response}]")
-
+  async def save_query_history(query_result, query_references) -> dict:
     # save user query history
     user_query, query_reference_dicts = \
-        update_user_query(prompt,
-                          query_result.response,
-                          user.id,
-                          q_engine,
-                          query_references, None,
-                          query_filter)
+        await update_user_query(prompt,
+                                query_result.response,
+                                user.id,
+                                q_engine,
+                                query_references, None,
+                                query_filter)
 
     # Create UserChat if chat_mode is enabled
+    user_chat = None
     if chat_mode:
       user_chat = UserChat(user_id=user.user_id,
                           llm_type=llm_type,
@@ -660,18 +726,18 @@ async def query(query_engine_id: str,
                                                      query_result.response)
 
       # Add query engine results to chat history
-      user_chat.update_history(
+      user_chat.add_history(
         query_engine=q_engine,
         query_result=query_result,
         query_references=query_references
       )
 
-      user_chat.save()
+      await user_chat.asave()
 
       # Generate and set chat title
       summary = await generate_chat_summary(user_chat)
       user_chat.title = summary
-      user_chat.save()
+      await user_chat.asave()
 
     query_result_dict = query_result.get_fields(reformat_datetime=True)
 
@@ -685,6 +751,39 @@ async def query(query_engine_id: str,
       response_data["user_chat_id"] = user_chat.id
       response_data["user_chat"] = user_chat.get_fields(reformat_datetime=True)
 
+    return response_data
+
+  if genconfig_dict.get("stream", False):
+    return StreamingResponse(
+        query_event_stream(query_generate_stream(user.id,
+                                                 prompt,
+                                                 q_engine,
+                                                 user_data,
+                                                 llm_type,
+                                                 user_query,
+                                                 rank_sentences,
+                                                 query_filter),
+                           q_engine,
+                           llm_type,
+                           save_query_history),
+        media_type="text/event-stream")
+
+  # perform normal synchronous query
+  try:
+    query_result, query_references = await query_generate(user.id,
+                                                          prompt,
+                                                          q_engine,
+                                                          user_data,
+                                                          llm_type,
+                                                          user_query,
+                                                          rank_sentences,
+                                                          query_filter)
+
+    Logger.info(f"Query response="
+                f"[{query_result.response}]")
+
+    response_data = await save_query_history(query_result, query_references)
+
     return {
         "success": True,
         "message": "Successfully generated text",
@@ -718,7 +817,7 @@ async def query_continue(
   """
   Logger.info("Using query engine based on a prior user query "
               f"user_query_id={user_query_id}, gen_config={gen_config}")
-  user_query = UserQuery.find_by_id(user_query_id)
+  user_query = await UserQuery.afind_by_id(user_query_id)
   if user_query is None:
     raise ResourceNotFoundException(f"Query {user_query_id} not found")
 
@@ -740,7 +839,7 @@ async def query_continue(
   query_filter = genconfig_dict.get("query_filter")
   Logger.info(f"query_filter = {query_filter}")
 
-  q_engine = QueryEngine.find_by_id(user_query.query_engine_id)
+  q_engine = await QueryEngine.afind_by_id(user_query.query_engine_id)
 
   run_as_batch_job = genconfig_dict.get("run_as_batch_job", False)
 
@@ -758,8 +857,8 @@ async def query_continue(
       env_vars = {
         "DATABASE_PREFIX": DATABASE_PREFIX,
         "PROJECT_ID": PROJECT_ID,
-        "ENABLE_OPENAI_LLM": str(ENABLE_OPENAI_LLM),
-        "ENABLE_COHERE_LLM": str(ENABLE_COHERE_LLM),
+        "ENABLE_OPENAI_LLM": str(is_vendor_enabled(VENDOR_OPENAI)),
+        "ENABLE_COHERE_LLM": str(is_vendor_enabled(VENDOR_COHERE)),
         "DEFAULT_VECTOR_STORE": str(DEFAULT_VECTOR_STORE),
         "PG_HOST": PG_HOST,
       }
@@ -782,6 +881,43 @@ async def query_continue(
       Logger.error(traceback.print_exc())
       raise InternalServerError(str(e)) from e
 
+  async def save_query_history(query_result, query_references) -> dict:
+    # save user query history
+    _, query_reference_dicts = \
+        await update_user_query(prompt,
+                                query_result.response,
+                                user_query.user_id,
+                                q_engine,
+                                query_references)
+
+    Logger.info(f"Generated query response="
+                f"[{query_result.response}], "
+                f"query_result={query_result} "
+                f"query_references={[repr(qe) for qe in query_references]}")
+
+    query_result_dict = query_result.get_fields(reformat_datetime=True)
+
+    return {
+        "user_query_id": user_query.id,
+        "query_result": query_result_dict,
+        "query_references": query_reference_dicts
+    }
+
+  if genconfig_dict.get("stream", False):
+    return StreamingResponse(
+        query_event_stream(query_generate_stream(user_query.user_id,
+                                                 prompt,
+                                                 q_engine,
+                                                 user_data,
+                                                 llm_type,
+                                                 user_query,
+                                                 rank_sentences,
+                                                 query_filter),
+                           q_engine,
+                           llm_type,
+                           save_query_history),
+        media_type="text/event-stream")
+
   # perform normal synchronous query
   try:
     query_result, query_references = await query_generate(user_query.user_id,
@@ -792,32 +928,71 @@ async def query_continue(
                                                           user_query,
                                                           rank_sentences,
                                                           query_filter)
-    # save user query history
-    _, query_reference_dicts = \
-        update_user_query(prompt,
-                          query_result.response,
-                          user_query.user_id,
-                          q_engine,
-                          query_references)
-
-    Logger.info(f"Generated query response="
-                f"[{query_result.response}], "
-                f"query_result={query_result} "
-                f"query_references={[repr(qe) for qe in query_references]}")
-
-    query_result_dict = query_result.get_fields(reformat_datetime=True)
+    response_data = await save_query_history(query_result, query_references)
 
     return {
         "success": True,
         "message": "Successfully generated text",
-        "data": {
-            "user_query_id": user_query.id,
-            "query_result": query_result_dict,
-            "query_references": query_reference_dicts
-        }
+        "data": response_data
     }
 
   except Exception as e:
     Logger.error(e)
     Logger.error(traceback.print_exc())
     raise InternalServerError(str(e)) from e
+
+
+def format_sse_event(event: str, data) -> str:
+  """ Format a server-sent event with a JSON data payload """
+  return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def query_event_stream(query_stream: AsyncGenerator,
+                             q_engine: QueryEngine,
+                             llm_type: Optional[str],
+                             save_query_history: Callable) -> \
+                               AsyncGenerator[str, None]:
+  """
+  Convert the events of query_generate_stream to server-sent events.
+
+  Emits a "references" event with the references used in the prompt, a
+  "token" event for each chunk of the response, and, once the response is
+  complete and the query history is saved, a "done" event with the same
+  data as the non-streaming response.  Errors are emitted as an "error"
+  event, since the response status has already been sent.
+
+  Args:
+    query_stream: generator returned by query_generate_stream
+    q_engine: the query engine being queried
+    llm_type: the requested chat model, if any
+    save_query_history: async function that saves the query history for
+      a (QueryResult, list of QueryReference) and returns the response data
+  """
+  start_time = time.time()
+  llm_type = llm_type or q_engine.llm_type or "default"
+  first_token = True
+  try:
+    async for event, data in query_stream:
+      if event == QUERY_STREAM_REFERENCES:
+        query_reference_dicts = [
+          ref.get_fields(reformat_datetime=True) for ref in data
+        ]
+        QUERY_STREAM_TIME_TO_FIRST_BYTE.labels(
+          engine_name=q_engine.name).observe(time.time() - start_time)
+        yield format_sse_event("references", query_reference_dicts)
+      elif event == QUERY_STREAM_TOKEN:
+        if first_token:
+          first_token = False
+          QUERY_STREAM_TIME_TO_FIRST_TOKEN.labels(
+            engine_name=q_engine.name, llm_type=llm_type
+          ).observe(time.time() - start_time)
+        yield format_sse_event("token", data)
+      elif event == QUERY_STREAM_RESULT:
+        query_result, query_references = data
+        response_data = await save_query_history(query_result,
+                                                 query_references)
+        yield format_sse_event("done", response_data)
+  except Exception as e:
+    Logger.error(e)
+    Logger.error(traceback.print_exc())
+    yield format_sse_event("error", {"message": str(e)})
@@ -18,6 +18,7 @@
 # disabling pylint rules that conflict with pytest fixtures
 # pylint: disable=unused-argument,redefined-outer-name,unused-import,unused-variable,ungrouped-imports,use-implicit-booleaness-not-comparison
 import os
+import json
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
@@ -63,7 +64,8 @@ api_url = f"{API_URL}/query"
 
 with mock.patch("common.utils.secrets.get_secret"):
   with mock.patch("kubernetes.config.load_incluster_config"):
-    from routes.query import router
+    from routes.query import (router, QUERY_STREAM_REFERENCES,
+                              QUERY_STREAM_TOKEN, QUERY_STREAM_RESULT)
 
 app = FastAPI()
 add_exception_handlers(app)
@@ -247,6 +249,34 @@ def test_create_query_engine(create_user, client_with_emulator):
   query_engine_data = json_response.get("data")
   assert query_engine_data == FAKE_QE_BUILD_RESPONSE["data"]
 
+  # multimodal engines are not supported by the local vector store
+  params = {
+    **FAKE_QUERY_ENGINE_BUILD,
+    "query_engine": "query-engine-local-test",
+    "vector_store": "local",
+    "params": {"is_multimodal": "true"}
+  }
+  with mock.patch("routes.query.initiate_batch_job",
+                  return_value=FAKE_QE_BUILD_RESPONSE) as mock_job:
+    resp = client_with_emulator.post(url, json=params)
+  assert resp.status_code == 422
+  mock_job.assert_not_called()
+
+def test_update_query_engine_documents(create_engine, client_with_emulator):
+  qe_id = QUERY_ENGINE_EXAMPLE["id"]
+  url = f"{api_url}/engine/{qe_id}/update"
+  with mock.patch("routes.query.initiate_batch_job",
+                  return_value=FAKE_QE_BUILD_RESPONSE) as mock_batch_job:
+    resp = client_with_emulator.post(url)
+
+  json_response = resp.json()
+  assert resp.status_code == 200, "Status 200"
+  assert json_response.get("data") == FAKE_QE_BUILD_RESPONSE["data"]
+  job_data = mock_batch_job.call_args.args[0]
+  assert job_data["build_mode"] == "update"
+  assert job_data["query_engine_id"] == qe_id
+  assert job_data["doc_url"] == QUERY_ENGINE_EXAMPLE["doc_url"]
+
 def test_get_query_engine(create_engine, client_with_emulator):
   qe_id = QUERY_ENGINE_EXAMPLE["id"]
   url = f"{api_url}/engine/{qe_id}"
@@ -386,6 +416,41 @@ def test_query(create_user, create_engine,
     "returned query references"
 
 
+def test_query_stream(create_user, create_engine,
+                      create_query_result, create_query_reference,
+                      client_with_emulator):
+  q_engine_id = QUERY_ENGINE_EXAMPLE["id"]
+  url = f"{api_url}/engine/{q_engine_id}"
+
+  query_result = QueryResult.find_by_id(QUERY_RESULT_EXAMPLE["id"])
+
+  async def fake_query_stream(*args, **kwargs):
+    yield QUERY_STREAM_REFERENCES, [create_query_reference]
+    yield QUERY_STREAM_TOKEN, "test "
+    yield QUERY_STREAM_TOKEN, "response"
+    yield QUERY_STREAM_RESULT, (query_result, [create_query_reference])
+
+  with mock.patch("routes.query.query_generate_stream",
+                  side_effect=fake_query_stream):
+    resp = client_with_emulator.post(
+        url, json={**FAKE_QUERY_PARAMS, "stream": True})
+
+  assert resp.status_code == 200, "Status 200"
+  events = []
+  for sse_event in resp.text.strip().split("\n\n"):
+    event_line, data_line = sse_event.split("\n")
+    events.append((event_line[len("event: "):],
+                   json.loads(data_line[len("data: "):])))
+
+  assert [event for event, _ in events] == \
+    ["references", "token", "token", "done"], "events in order"
+  assert events[0][1][0]["id"] == create_query_reference.id, \
+    "references sent first"
+  assert events[1][1] + events[2][1] == "test response", "streamed tokens"
+  assert events[3][1]["query_result"]["id"] == \
+    QUERY_RESULT_EXAMPLE.get("id"), "returned query result"
+
+
 def test_query_generate(create_user, create_engine, create_user_query,
                         create_query_result, create_query_reference,
                         client_with_emulator):
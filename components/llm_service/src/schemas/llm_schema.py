@@ -207,6 +207,7 @@ class LLMQueryModel(BaseModel):
   rank_sentences: Optional[str] = None
   query_filter: Optional[str] = None
   chat_mode: Optional[bool] = False
+  stream: Optional[bool] = False
   model_config = ConfigDict(from_attributes=True, json_schema_extra={
       "example": QUERY_EXAMPLE
   })
@@ -368,6 +369,7 @@ class LLMUserChatResponse(BaseModel):
 class LLMUserAllChatsResponse(BaseModel):
   """LLM Get User All Chats Response model"""
   data: List[dict] = []
+  next_page_token: Optional[str] = None
   success: Optional[bool] = True
   message: Optional[str] = "Successfully retrieved user chats"
   model_config = ConfigDict(from_attributes=True, json_schema_extra={
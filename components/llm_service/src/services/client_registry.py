@@ -0,0 +1,166 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Process-wide registry of model and API client objects.
+
+Model handles (e.g. Vertex GenerativeModel) and API clients (e.g. the
+OpenAI client of a vLLM server) are created on first use and reused across
+requests, keyed by provider, model and endpoint.  A client is evicted after
+repeated failures, so the next request creates a fresh one.
+"""
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+from google.api_core import exceptions as google_exceptions
+from google.auth import exceptions as google_auth_exceptions
+from common.utils.logging_handler import Logger
+
+Logger = Logger.get_logger(__file__)
+
+# max number of cached clients
+CLIENT_REGISTRY_MAX_SIZE = 256
+# number of consecutive failures after which a client is evicted
+CLIENT_MAX_FAILURES = 3
+
+ClientKey = Tuple[Hashable, ...]
+
+# errors of the service or of the connection to it, as opposed to errors
+# of a request (e.g. invalid arguments), which a new client doesn't fix
+TRANSPORT_EXCEPTIONS = (google_exceptions.ServerError,
+                        google_exceptions.RetryError,
+                        google_auth_exceptions.TransportError,
+                        ConnectionError,
+                        TimeoutError)
+
+
+def is_transport_failure(error: Exception) -> bool:
+  """ True if error counts as a failure of the client that raised it """
+  return isinstance(error, TRANSPORT_EXCEPTIONS)
+
+
+def _is_closed_loop_key(key: ClientKey) -> bool:
+  """ True if key is for an asyncio client of a closed event loop """
+  for value in key:
+    if isinstance(value, weakref.ref):
+      loop = value()
+      if loop is None or loop.is_closed():
+        return True
+  return False
+
+
+class ClientRegistry():
+  """ LRU cache of client objects with failure-based eviction """
+
+  def __init__(self,
+               max_size: int = CLIENT_REGISTRY_MAX_SIZE,
+               max_failures: int = CLIENT_MAX_FAILURES):
+    self.max_size = max_size
+    self.max_failures = max_failures
+    self._clients: "OrderedDict[ClientKey, Any]" = OrderedDict()
+    self._failures = {}
+    self._lock = threading.Lock()
+
+  def get(self, key: ClientKey, factory: Callable[[], Any]) -> Any:
+    """
+    Return the client for key, creating it with factory if necessary.
+    The factory is called outside the lock, so a slow client creation
+    doesn't block other lookups.
+    """
+    with self._lock:
+      if key in self._clients:
+        self._clients.move_to_end(key)
+        return self._clients[key]
+
+    client = factory()
+
+    with self._lock:
+      if key in self._clients:
+        # another thread created the client first
+        self._clients.move_to_end(key)
+        return self._clients[key]
+      # drop asyncio clients of event loops that have been closed
+      for closed_key in [k for k in self._clients if _is_closed_loop_key(k)]:
+        del self._clients[closed_key]
+        self._failures.pop(closed_key, None)
+      self._clients[key] = client
+      self._failures.pop(key, None)
+      while len(self._clients) > self.max_size:
+        evicted_key, _ = self._clients.popitem(last=False)
+        self._failures.pop(evicted_key, None)
+    return client
+
+  def report_success(self, key: ClientKey):
+    """ reset the failure count of a client """
+    if key in self._failures:
+      with self._lock:
+        self._failures.pop(key, None)
+
+  def report_failure(self, key: ClientKey, error: Optional[Exception] = None):
+    """ count a failure of a client, evicting it after max_failures """
+    with self._lock:
+      failures = self._failures.get(key, 0) + 1
+      if failures >= self.max_failures:
+        self._clients.pop(key, None)
+        self._failures.pop(key, None)
+        Logger.warning(f"Evicted client {key} after {failures} failures: "
+                       f"{error}")
+      else:
+        self._failures[key] = failures
+
+  def evict(self, key: ClientKey):
+    """ remove a client from the registry """
+    with self._lock:
+      self._clients.pop(key, None)
+      self._failures.pop(key, None)
+
+  def clear(self):
+    """ remove all clients from the registry """
+    with self._lock:
+      self._clients.clear()
+      self._failures.clear()
+
+
+client_registry = ClientRegistry()
+
+
+def client_key(provider: str, model: Optional[str] = None,
+               endpoint: Optional[str] = None,
+               *extra: Hashable) -> ClientKey:
+  """
+  Registry key for a client of a provider, model and endpoint.  extra
+  values distinguish clients that are configured differently.
+  """
+  return (provider, model, endpoint, *extra)
+
+
+def async_client_key(provider: str, model: Optional[str] = None,
+                     endpoint: Optional[str] = None,
+                     *extra: Hashable) -> ClientKey:
+  """
+  Registry key for an asyncio client, which can only be used on the
+  event loop it was created on.  The key holds a weak reference to the
+  loop, so a new loop never gets the client of a closed loop, and clients
+  of closed loops are dropped from the registry.  Must be called from a
+  coroutine.
+  """
+  return client_key(provider, model, endpoint,
+                    weakref.ref(asyncio.get_running_loop()), *extra)
+
+
+def get_client(key: ClientKey, factory: Callable[[], Any]) -> Any:
+  """ return the shared client for key, creating it with factory """
+  return client_registry.get(key, factory)
@@ -0,0 +1,89 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Unit tests for the client registry
+"""
+# pylint: disable=protected-access
+import asyncio
+from unittest import mock
+from google.api_core import exceptions as google_exceptions
+from services.client_registry import (ClientRegistry, client_key,
+                                      async_client_key, is_transport_failure)
+
+
+def test_client_registry_reuses_clients():
+  registry = ClientRegistry(max_size=2)
+  factory = mock.Mock(side_effect=lambda: object())
+  key = client_key("Vertex", "model-1")
+
+  client = registry.get(key, factory)
+  assert registry.get(key, factory) is client
+  assert factory.call_count == 1
+
+  # different endpoint is a different client
+  assert registry.get(client_key("Vertex", "model-1", "endpoint"),
+                      factory) is not client
+  # least recently used client is evicted when the registry is full
+  registry.get(client_key("Vertex", "model-2"), factory)
+  assert registry.get(key, factory) is not client
+  assert factory.call_count == 4
+
+
+def test_client_registry_evicts_failing_clients():
+  registry = ClientRegistry(max_failures=2)
+  factory = mock.Mock(side_effect=lambda: object())
+  key = client_key("vLLM", "model-1", "http://endpoint/v1")
+
+  client = registry.get(key, factory)
+  registry.report_failure(key)
+  registry.report_success(key)
+  registry.report_failure(key)
+  assert registry.get(key, factory) is client
+
+  registry.report_failure(key)
+  assert registry.get(key, factory) is not client
+
+
+def test_async_client_key_per_loop():
+  registry = ClientRegistry()
+  factory = mock.Mock(side_effect=lambda: object())
+
+  async def get_client():
+    return registry.get(async_client_key("Vertex", "model-1"), factory)
+
+  loop = asyncio.new_event_loop()
+  client = loop.run_until_complete(get_client())
+  assert loop.run_until_complete(get_client()) is client
+  loop.close()
+
+  # a new loop gets a new client, and the client of the closed loop is
+  # dropped from the registry
+  new_loop = asyncio.new_event_loop()
+  try:
+    assert new_loop.run_until_complete(get_client()) is not client
+  finally:
+    new_loop.close()
+  assert factory.call_count == 2
+  assert len(registry._clients) == 1
+
+
+def test_is_transport_failure():
+  assert is_transport_failure(google_exceptions.ServiceUnavailable("down"))
+  assert is_transport_failure(google_exceptions.InternalServerError("error"))
+  assert is_transport_failure(ConnectionError("reset"))
+  assert not is_transport_failure(google_exceptions.InvalidArgument("bad"))
+  assert not is_transport_failure(
+      google_exceptions.TooManyRequests("throttled"))
+  assert not is_transport_failure(ValueError("blocked"))
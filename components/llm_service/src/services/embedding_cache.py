@@ -0,0 +1,98 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Content addressed cache of text embeddings, keyed by
+(embedding_type, sha256(text)).
+"""
+import hashlib
+from typing import List, Optional
+import numpy as np
+from common.utils import cache_service
+from common.utils.logging_handler import Logger
+from common.utils.ttl_cache import TTLCache
+from metrics import EMBEDDING_CACHE_REQUESTS
+
+# pylint: disable=broad-exception-caught
+
+Logger = Logger.get_logger(__file__)
+
+EMBEDDING_CACHE_KEY_PREFIX = "embedding"
+
+
+class EmbeddingCache:
+  """
+  Two tier embedding cache.  The first tier is an in-process LRU cache,
+  the optional second tier is the shared Redis cache.  Redis errors are
+  logged and treated as cache misses.
+  """
+
+  def __init__(self, max_size: int = 10000, ttl: int = 86400,
+               use_redis: bool = False):
+    self.ttl = ttl
+    self.use_redis = use_redis
+    self.memory_cache = TTLCache(max_size=max_size, default_ttl=ttl)
+
+  @staticmethod
+  def cache_key(embedding_type: str, text: str) -> str:
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{EMBEDDING_CACHE_KEY_PREFIX}:{embedding_type}:{text_hash}"
+
+  def get(self, embedding_type: str, text: str) -> Optional[np.ndarray]:
+    """
+    Return the cached embedding for text, or None on a cache miss.
+    """
+    key = self.cache_key(embedding_type, text)
+    embedding = self.memory_cache.get(key)
+    if embedding is not None:
+      EMBEDDING_CACHE_REQUESTS.labels(
+          embedding_type=embedding_type, result="memory_hit").inc()
+      return embedding
+
+    if self.use_redis:
+      try:
+        value = cache_service.get_key(key)
+      except Exception as e:
+        Logger.warning(f"Unable to read embedding cache from redis: {e}")
+        value = None
+      if value is not None:
+        embedding = np.array(value)
+        embedding.setflags(write=False)
+        self.memory_cache.set(key, embedding)
+        EMBEDDING_CACHE_REQUESTS.labels(
+            embedding_type=embedding_type, result="redis_hit").inc()
+        return embedding
+
+    EMBEDDING_CACHE_REQUESTS.labels(
+        embedding_type=embedding_type, result="miss").inc()
+    return None
+
+  def set(self, embedding_type: str, text: str,
+          embedding: List[float]):
+    """
+    Cache the embedding for text in all tiers.
+    """
+    key = self.cache_key(embedding_type, text)
+    # cached arrays are shared between callers, so make them read only
+    embedding = np.array(embedding)
+    embedding.setflags(write=False)
+    self.memory_cache.set(key, embedding)
+    if self.use_redis:
+      try:
+        cache_service.set_key(key, embedding.tolist(), expiry_time=self.ttl)
+      except Exception as e:
+        Logger.warning(f"Unable to write embedding cache to redis: {e}")
+
+  def clear(self):
+    """ Clear the in-process tier """
+    self.memory_cache.clear()
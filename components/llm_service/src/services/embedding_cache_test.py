@@ -0,0 +1,59 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Unit tests for the embedding cache
+"""
+import numpy.testing as npt
+from unittest import mock
+from services.embedding_cache import EmbeddingCache
+
+FAKE_EMBEDDING_TYPE = "fake-embedding-model"
+
+
+def test_embedding_cache_memory():
+  cache = EmbeddingCache(max_size=2)
+  assert cache.get(FAKE_EMBEDDING_TYPE, "text 1") is None
+  cache.set(FAKE_EMBEDDING_TYPE, "text 1", [0.1, 0.2])
+  npt.assert_array_equal(cache.get(FAKE_EMBEDDING_TYPE, "text 1"), [0.1, 0.2])
+  # keys include the embedding type
+  assert cache.get("other-embedding-model", "text 1") is None
+  assert EmbeddingCache.cache_key(FAKE_EMBEDDING_TYPE, "text 1") != \
+      EmbeddingCache.cache_key("other-embedding-model", "text 1")
+
+  # least recently used entry is evicted
+  cache.set(FAKE_EMBEDDING_TYPE, "text 2", [0.3])
+  cache.set(FAKE_EMBEDDING_TYPE, "text 3", [0.4])
+  assert cache.get(FAKE_EMBEDDING_TYPE, "text 1") is None
+
+
+@mock.patch("services.embedding_cache.cache_service")
+def test_embedding_cache_redis(mock_cache_service):
+  cache = EmbeddingCache(use_redis=True)
+  key = EmbeddingCache.cache_key(FAKE_EMBEDDING_TYPE, "text 1")
+  cache.set(FAKE_EMBEDDING_TYPE, "text 1", [0.1, 0.2])
+  mock_cache_service.set_key.assert_called_once_with(
+      key, [0.1, 0.2], expiry_time=cache.ttl)
+
+  # a miss in memory is served from redis and promoted to memory
+  cache.clear()
+  mock_cache_service.get_key.return_value = [0.1, 0.2]
+  npt.assert_array_equal(cache.get(FAKE_EMBEDDING_TYPE, "text 1"), [0.1, 0.2])
+  mock_cache_service.get_key.return_value = None
+  npt.assert_array_equal(cache.get(FAKE_EMBEDDING_TYPE, "text 1"), [0.1, 0.2])
+  assert mock_cache_service.get_key.call_count == 1
+
+  # redis errors are cache misses
+  mock_cache_service.get_key.side_effect = ConnectionError("redis down")
+  assert cache.get(FAKE_EMBEDDING_TYPE, "text 2") is None
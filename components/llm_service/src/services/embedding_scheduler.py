@@ -0,0 +1,246 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Scheduling of text embedding requests.
+
+Text chunks are packed into batches by estimated token count, and the
+batches are sent with a number of concurrent requests that adapts to the
+model quota: additive increase after each successful request,
+multiplicative decrease when a request is throttled.  Throttled batches
+are retried after a backoff, and chunks that fail are retried on their own.
+"""
+# pylint: disable=broad-exception-caught
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from common.utils.logging_handler import Logger
+from config import (EMBEDDING_MAX_CONCURRENCY, EMBEDDING_BATCH_MAX_TOKENS,
+                    EMBEDDING_MAX_RETRIES, EMBEDDING_RETRY_DELAY)
+from metrics import (EMBEDDING_BATCH_LATENCY, EMBEDDING_BATCH_THROTTLED,
+                     EMBEDDING_CONCURRENCY_LIMIT)
+from services.rate_limiter import THROTTLED_EXCEPTIONS
+
+Logger = Logger.get_logger(__file__)
+
+# rough number of characters per token, used to size batches
+CHARS_PER_TOKEN = 4
+
+Embedding = Optional[List[float]]
+
+
+def estimate_tokens(text: str) -> int:
+  """ estimated number of tokens in a text chunk """
+  return len(text) // CHARS_PER_TOKEN + 1
+
+
+def token_batches(text_chunks: List[str],
+                  max_tokens: int,
+                  max_items: int) -> List[List[int]]:
+  """
+  Pack text chunks into batches of at most max_items chunks and (except
+  for single chunks over the limit) max_tokens estimated tokens.
+
+  Returns:
+    list of batches, each a list of indexes into text_chunks
+  """
+  batches = []
+  batch = []
+  batch_tokens = 0
+  for i, text in enumerate(text_chunks):
+    tokens = estimate_tokens(text)
+    if batch and (batch_tokens + tokens > max_tokens or
+                  len(batch) >= max_items):
+      batches.append(batch)
+      batch = []
+      batch_tokens = 0
+    batch.append(i)
+    batch_tokens += tokens
+  if batch:
+    batches.append(batch)
+  return batches
+
+
+class AIMDConcurrencyLimit():
+  """
+  Concurrency limit with additive increase, multiplicative decrease.
+  The limit grows by about one request per limit successful requests,
+  and is multiplied by decrease_factor when a request is throttled.
+  """
+
+  def __init__(self,
+               max_limit: int,
+               min_limit: int = 1,
+               decrease_factor: float = 0.5):
+    self.max_limit = max_limit
+    self.min_limit = min_limit
+    self.decrease_factor = decrease_factor
+    self.limit = float(max_limit)
+    self._lock = threading.Lock()
+
+  @property
+  def current(self) -> int:
+    """ current number of requests allowed in flight """
+    return max(self.min_limit, int(self.limit))
+
+  def on_success(self):
+    with self._lock:
+      self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+  def on_throttle(self):
+    with self._lock:
+      self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+_concurrency_limits: Dict[str, AIMDConcurrencyLimit] = {}
+_concurrency_limits_lock = threading.Lock()
+
+
+def get_concurrency_limit(embedding_type: str,
+                          max_limit: int = EMBEDDING_MAX_CONCURRENCY) -> \
+                            AIMDConcurrencyLimit:
+  """
+  Return the process-wide concurrency limit of an embedding model, so
+  that the limit learned by one index build is used by the next.
+  """
+  with _concurrency_limits_lock:
+    limit = _concurrency_limits.get(embedding_type)
+    if limit is None or limit.max_limit != max_limit:
+      limit = _concurrency_limits[embedding_type] = \
+          AIMDConcurrencyLimit(max_limit)
+    return limit
+
+
+class EmbeddingScheduler():
+  """
+  Generate embeddings for a list of text chunks with batched, concurrent
+  requests to an embedding model.
+  """
+
+  def __init__(self,
+               embedding_type: str,
+               embed_batch: Callable[[List[str]], List[Embedding]],
+               max_items: int,
+               max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+               limit: Optional[AIMDConcurrencyLimit] = None,
+               max_retries: int = EMBEDDING_MAX_RETRIES,
+               retry_delay: float = EMBEDDING_RETRY_DELAY):
+    """
+    Args:
+      embedding_type: embedding model id
+      embed_batch: blocking function returning embeddings for a list of
+        text chunks, None for chunks that failed.  Raises one of
+        THROTTLED_EXCEPTIONS if the request is throttled.
+      max_items: max number of chunks per request
+      max_tokens: max estimated tokens per request
+      limit: concurrency limit, by default shared by all schedulers of
+        the embedding model
+      max_retries: max number of retries of a batch or chunk
+      retry_delay: initial retry backoff in seconds
+    """
+    self.embedding_type = embedding_type
+    self.embed_batch = embed_batch
+    self.max_items = max_items
+    self.max_tokens = max_tokens
+    self.limit = limit or get_concurrency_limit(embedding_type)
+    self.max_retries = max_retries
+    self.retry_delay = retry_delay
+
+  async def run(self, text_chunks: List[str]) -> List[Embedding]:
+    """
+    Returns:
+      list of embeddings indexed by text_chunks, None for chunks that
+      failed after all retries
+    """
+    results: List[Embedding] = [None] * len(text_chunks)
+    pending: Deque[Tuple[List[int], int]] = deque(
+        (batch, 0) for batch in
+        token_batches(text_chunks, self.max_tokens, self.max_items))
+    running = set()
+
+    with ThreadPoolExecutor(max_workers=self.limit.max_limit) as pool:
+      while pending or running:
+        while pending and len(running) < self.limit.current:
+          batch, attempt = pending.popleft()
+          running.add(asyncio.ensure_future(
+              self._send(pool, text_chunks, batch, attempt, results)))
+        done, running = await asyncio.wait(
+            running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+          pending.extend(task.result())
+
+    return results
+
+  async def _send(self, pool: ThreadPoolExecutor,
+                  text_chunks: List[str],
+                  batch: List[int],
+                  attempt: int,
+                  results: List[Embedding]) -> List[Tuple[List[int], int]]:
+    """
+    Send one batch, storing its embeddings in results.
+
+    Returns:
+      list of (batch, attempt) to retry
+    """
+    if attempt > 0:
+      await asyncio.sleep(
+          self.retry_delay * 2 ** (attempt - 1) * (1 + random.random()))
+
+    loop = asyncio.get_running_loop()
+    start_time = time.monotonic()
+    try:
+      embeddings = await loop.run_in_executor(
+          pool, self.embed_batch, [text_chunks[i] for i in batch])
+    except THROTTLED_EXCEPTIONS as e:
+      self.limit.on_throttle()
+      EMBEDDING_BATCH_THROTTLED.labels(
+          embedding_type=self.embedding_type).inc()
+      EMBEDDING_CONCURRENCY_LIMIT.labels(
+          embedding_type=self.embedding_type).set(self.limit.current)
+      if attempt >= self.max_retries:
+        Logger.error(f"embedding request for {len(batch)} chunk(s) throttled"
+                     f" {attempt + 1} times, giving up: {str(e)}")
+        return []
+      Logger.warning(f"embedding request for {len(batch)} chunk(s) throttled,"
+                     f" concurrency limit now {self.limit.current}: {str(e)}")
+      return [(batch, attempt + 1)]
+    except Exception as e:
+      Logger.error(f"error generating embeddings for {len(batch)} chunk(s):"
+                   f" {str(e)}")
+      embeddings = [None] * len(batch)
+      status = "error"
+    else:
+      self.limit.on_success()
+      status = "success"
+    EMBEDDING_CONCURRENCY_LIMIT.labels(
+        embedding_type=self.embedding_type).set(self.limit.current)
+    EMBEDDING_BATCH_LATENCY.labels(
+        embedding_type=self.embedding_type,
+        status=status).observe(time.monotonic() - start_time)
+
+    # retry the chunks that failed one at a time, so that one bad chunk
+    # doesn't fail the rest of its batch again
+    retries = []
+    for i, embedding in zip(batch, embeddings):
+      if embedding is not None:
+        results[i] = embedding
+      elif attempt < self.max_retries:
+        retries.append(([i], attempt + 1))
+    if len(embeddings) < len(batch) and attempt < self.max_retries:
+      retries.extend(([i], attempt + 1) for i in batch[len(embeddings):])
+    return retries
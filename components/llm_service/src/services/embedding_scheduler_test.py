@@ -0,0 +1,82 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Unit tests for the embedding scheduler
+"""
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+from services.embedding_scheduler import (AIMDConcurrencyLimit,
+                                          EmbeddingScheduler,
+                                          token_batches)
+
+
+def test_token_batches():
+  text_chunks = ["a" * 40, "b" * 40, "c" * 40, "d" * 400, "e"]
+  # 11 estimated tokens per short chunk, 101 for the long chunk
+  assert token_batches(text_chunks, max_tokens=25, max_items=10) == \
+      [[0, 1], [2], [3], [4]]
+  assert token_batches(text_chunks, max_tokens=1000, max_items=2) == \
+      [[0, 1], [2, 3], [4]]
+
+
+def test_aimd_concurrency_limit():
+  limit = AIMDConcurrencyLimit(max_limit=8)
+  assert limit.current == 8
+  limit.on_throttle()
+  limit.on_throttle()
+  assert limit.current == 2
+  for _ in range(3):
+    limit.on_success()
+  assert limit.current == 3
+  for _ in range(10):
+    limit.on_throttle()
+  assert limit.current == 1
+
+
+@pytest.mark.asyncio
+async def test_embedding_scheduler_retries():
+  calls = []
+
+  def embed_batch(batch):
+    calls.append(batch)
+    if len(calls) == 1:
+      raise ResourceExhausted("quota exceeded")
+    # the chunk "bad" fails the first time it is embedded
+    return [None if text == "bad" and calls.count(["bad"]) == 0 else [1.0]
+            for text in batch]
+
+  limit = AIMDConcurrencyLimit(max_limit=4)
+  scheduler = EmbeddingScheduler("test-embedding", embed_batch,
+                                 max_items=10, limit=limit, retry_delay=0)
+  embeddings = await scheduler.run(["good", "bad", "good"])
+
+  assert embeddings == [[1.0], [1.0], [1.0]]
+  # throttled batch is retried whole, the failed chunk on its own
+  assert calls == [["good", "bad", "good"],
+                   ["good", "bad", "good"],
+                   ["bad"]]
+  assert limit.limit < 4
+
+
+@pytest.mark.asyncio
+async def test_embedding_scheduler_gives_up():
+  def embed_batch(batch):
+    return [None for _ in batch]
+
+  scheduler = EmbeddingScheduler("test-embedding", embed_batch,
+                                 max_items=10, max_retries=2,
+                                 limit=AIMDConcurrencyLimit(max_limit=2),
+                                 retry_delay=0)
+  assert await scheduler.run(["a", "b"]) == [None, None]
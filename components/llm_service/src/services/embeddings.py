@@ -16,7 +16,9 @@ Generate Query embeddings. Currently, using Vertex TextEmbedding model.
 """
 import asyncio
 import json
-from typing import List, Optional, Generator, Tuple
+import random
+import weakref
+from typing import List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from vertexai.language_models import TextEmbeddingModel
@@ -27,11 +29,18 @@ from common.utils.request_handler import post_method
 from common.utils.token_handler import UserCredentials
 from config import (get_model_config, get_provider_embedding_types,
                     KEY_MODEL_NAME, KEY_MODEL_CLASS, KEY_MODEL_ENDPOINT,
-                    KEY_MODEL_TOKEN_LIMIT,
+                    KEY_MODEL_TOKEN_LIMIT, KEY_MODEL_QPS,
                     PROVIDER_VERTEX, PROVIDER_LANGCHAIN, PROVIDER_LLM_SERVICE,
                     DEFAULT_QUERY_EMBEDDING_MODEL,
                     DEFAULT_QUERY_MULTIMODAL_EMBEDDING_MODEL,
-                    REGION)
+                    REGION, EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_MAX_SIZE,
+                    EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_REDIS_ENABLED,
+                    MULTIMODAL_EMBEDDING_CONCURRENCY, MULTIMODAL_EMBEDDING_QPS,
+                    EMBEDDING_MAX_RETRIES, EMBEDDING_RETRY_DELAY)
+from services.embedding_cache import EmbeddingCache
+from services.client_registry import client_registry, client_key
+from services.rate_limiter import get_rate_limiter, THROTTLED_EXCEPTIONS
+from services.embedding_scheduler import EmbeddingScheduler
 from langchain.schema.embeddings import Embeddings
 
 # pylint: disable=broad-exception-caught
@@ -39,18 +48,28 @@ from langchain.schema.embeddings import Embeddings
 # per Vertex docs
 # https://cloud.google.com/vertex-ai/generative-ai/docs/embeddings/get-text-embeddings#get_text_embeddings_for_a_snippet_of_text
 # if region is us-central1 items per request is 250, in other regions it is 5
-# Limiting to 50, even though the max is 250. There is an undocumented
-# token limit across all chunks of 20000, and with 250 chunks we often
-# exceeded the 20K limit.
+# There is also an undocumented token limit across all chunks of 20000,
+# so batches are also limited to EMBEDDING_BATCH_MAX_TOKENS estimated
+# tokens, see services.embedding_scheduler.
 if REGION == "us-central1":
-  ITEMS_PER_REQUEST = 20
+  ITEMS_PER_REQUEST = 250
 else:
   ITEMS_PER_REQUEST = 5
 
 Logger = Logger.get_logger(__file__)
 
+embedding_cache = EmbeddingCache(max_size=EMBEDDING_CACHE_MAX_SIZE,
+                                 ttl=EMBEDDING_CACHE_TTL,
+                                 use_redis=EMBEDDING_CACHE_REDIS_ENABLED)
+
+# futures for cache keys whose embeddings are being generated, so that
+# concurrent lookups of the same text share one model call.  Futures are
+# bound to their event loop, so they are kept per loop.
+_pending_embeddings = weakref.WeakKeyDictionary()
+
 async def get_embeddings(text_chunks: List[str],
-                         embedding_type: str = None) -> \
+                         embedding_type: str = None,
+                         use_cache: bool = False) -> \
                           (Tuple)[List[bool], np.ndarray]:
   """
   Get embeddings for a list of text strings.
@@ -58,6 +77,8 @@ async def get_embeddings(text_chunks: List[str],
   Args:
     text_chunks: list of text chunks to generate embeddings for
     embedding_type: embedding model id
+    use_cache: look up and store embeddings in the embedding cache.  Meant
+      for query text, which repeats, rather than document chunks.
   Returns:
     Tuple of (list of booleans for chunk true if embeddings were generated,
               numpy array of embeddings indexed by chunks)
@@ -65,6 +86,9 @@ async def get_embeddings(text_chunks: List[str],
   if embedding_type is None or embedding_type == "":
     embedding_type = DEFAULT_QUERY_EMBEDDING_MODEL
 
+  if use_cache and EMBEDDING_CACHE_ENABLED:
+    return await _get_embeddings_cached(embedding_type, text_chunks)
+
   Logger.info(f"generating embeddings with {embedding_type}")
 
   is_successful, embeddings = await _generate_embeddings_batched(
@@ -73,6 +97,64 @@ async def get_embeddings(text_chunks: List[str],
 
   return is_successful, embeddings
 
+async def _get_embeddings_cached(embedding_type: str,
+                                 text_chunks: List[str]) -> \
+                                  (Tuple)[List[bool], np.ndarray]:
+  """
+  Get embeddings for text_chunks from the embedding cache, generating
+  and caching the embeddings of texts that are not cached.
+  """
+  loop = asyncio.get_running_loop()
+  loop_pending = _pending_embeddings.setdefault(loop, {})
+  embeddings = {}
+  pending = {}
+  missing = []
+  for text in dict.fromkeys(text_chunks):
+    embedding = embedding_cache.get(embedding_type, text)
+    key = EmbeddingCache.cache_key(embedding_type, text)
+    if embedding is not None:
+      embeddings[text] = embedding
+    elif key in loop_pending:
+      pending[text] = loop_pending[key]
+    else:
+      missing.append(text)
+
+  if missing:
+    Logger.info(f"generating {len(missing)} uncached embeddings "
+                f"with {embedding_type}")
+    futures = {}
+    for text in missing:
+      key = EmbeddingCache.cache_key(embedding_type, text)
+      futures[text] = loop_pending[key] = loop.create_future()
+    try:
+      is_successful, generated = await _generate_embeddings_batched(
+          embedding_type, missing)
+      generated = iter(generated)
+      for text, success in zip(missing, is_successful):
+        if success:
+          embeddings[text] = next(generated)
+          embedding_cache.set(embedding_type, text, embeddings[text])
+    finally:
+      # waiters get None if generation failed or was cancelled
+      for text in missing:
+        loop_pending.pop(EmbeddingCache.cache_key(embedding_type, text), None)
+        if not futures[text].done():
+          futures[text].set_result(embeddings.get(text))
+
+  for text, future in pending.items():
+    # shielded, so that cancelling this caller doesn't cancel the shared
+    # future of the other callers
+    embedding = await asyncio.shield(future)
+    if embedding is not None:
+      embeddings[text] = embedding
+
+  is_successful = [text in embeddings for text in text_chunks]
+  successful_embeddings = [embeddings[text] for text in text_chunks
+                           if text in embeddings]
+  if not successful_embeddings:
+    return is_successful, []
+  return is_successful, np.stack(successful_embeddings)
+
 async def get_multimodal_embeddings(user_text: List[str],
                                user_file_bytes: str,
                                embedding_type: str = None) -> \
@@ -100,27 +182,13 @@ async def get_multimodal_embeddings(user_text: List[str],
 
 async def _generate_embeddings_batched(embedding_type,
                                        text_chunks):
-  embeddings_list: List[List[float]] = []
-
-  # Prepare the batches using a generator
-  batches = _generate_batches(text_chunks, ITEMS_PER_REQUEST)
+  scheduler = EmbeddingScheduler(
+      embedding_type,
+      lambda batch: generate_embeddings(batch, embedding_type),
+      max_items=ITEMS_PER_REQUEST)
+  embeddings_list = await scheduler.run(text_chunks)
 
-  loop = asyncio.get_running_loop()
-  with ThreadPoolExecutor() as pool:
-    futures = []
-    for batch in batches:
-      futures.append(
-        loop.run_in_executor(
-            pool, generate_embeddings, batch, embedding_type)
-      )
-    futures = await asyncio.gather(*futures)
-    for future in futures:
-      embeddings_list.extend(future)
-
-  is_successful = [
-      embedding is not None for sentence, embedding in zip(
-        text_chunks, embeddings_list)
-  ]
+  is_successful = [embedding is not None for embedding in embeddings_list]
   try:
     embeddings_list_successful = np.stack(
       [embedding for embedding in embeddings_list if embedding is not None]
@@ -130,16 +198,6 @@ async def _generate_embeddings_batched(embedding_type,
     embeddings_list_successful = []
   return is_successful, embeddings_list_successful
 
-# Generator function to yield batches of text_chunks
-def _generate_batches(text_chunks: List[str],
-                      batch_size: int) -> \
-                        Generator[List[str], None, None]:
-  """
-  Generate batches of text_chunks
-  """
-  for i in range(0, len(text_chunks), batch_size):
-    yield text_chunks[i: i + batch_size]
-
 def generate_embeddings(batch: List[str],
                         embedding_type: str) -> \
                           List[Optional[List[float]]]:
@@ -216,17 +274,59 @@ def get_vertex_embeddings(embedding_type: str,
             f"chunk exceeds model {embedding_type} token limit {token_limit}")
   Logger.info(f"generating Vertex embeddings for {len(sentence_list)} chunk(s)"
               f" embedding model {google_llm}")
-  vertex_model = TextEmbeddingModel.from_pretrained(google_llm)
+  vertex_model = client_registry.get(
+      client_key(PROVIDER_VERTEX, google_llm, None,
+                 TextEmbeddingModel.__name__),
+      lambda: TextEmbeddingModel.from_pretrained(google_llm))
   try:
     embeddings = vertex_model.get_embeddings(sentence_list)
 
     return_value = [embedding.values for embedding in embeddings]
 
     return return_value
+  except THROTTLED_EXCEPTIONS:
+    # let the caller back off and retry
+    raise
   except Exception as e:
     Logger.error(f"error generating Vertex embeddings {str(e)}")
     return [None for _ in range(len(sentence_list))]
 
+def get_vertex_multimodal_model_name(embedding_type: str) -> str:
+  """ return the Vertex model name of a multimodal embedding type """
+  google_llm = get_model_config().get_provider_value(PROVIDER_VERTEX,
+                                                     KEY_MODEL_NAME,
+                                                     embedding_type)
+  if google_llm is None:
+    raise RuntimeError(
+        f"Vertex model name not found for embedding type {embedding_type}")
+  return google_llm
+
+def _vertex_multimodal_embeddings(google_llm: str,
+                                  user_text: str,
+                                  user_file_bytes: bytes) -> dict:
+  """
+  Generate embeddings for one multimodal chunk with a Vertex model.
+  Blocking, called from a worker thread.
+  """
+  user_file_image = None
+  if user_file_bytes:
+    user_file_image = Image(image_bytes=user_file_bytes)
+  vertex_model = client_registry.get(
+      client_key(PROVIDER_VERTEX, google_llm, None,
+                 MultiModalEmbeddingModel.__name__),
+      lambda: MultiModalEmbeddingModel.from_pretrained(google_llm))
+  embeddings = vertex_model.get_embeddings(image=user_file_image,
+                                           contextual_text=user_text)
+
+  return_value = {}
+  return_value["text"] = embeddings.text_embedding
+  return_value["image"] = embeddings.image_embedding
+  # TODO: also return vector part of video_embedding
+  # in return_value["video"] and potentially audio_embedding
+  # in return_value["audio"]
+
+  return return_value
+
 async def get_vertex_multimodal_embeddings(embedding_type: str,
                                       user_text: str,
                                       user_file_bytes: bytes) -> \
@@ -240,33 +340,16 @@ async def get_vertex_multimodal_embeddings(embedding_type: str,
   Returns:
     dictionary of embedding vectors for both text and image
   """
-  google_llm = get_model_config().get_provider_value(PROVIDER_VERTEX,
-                                                     KEY_MODEL_NAME,
-                                                     embedding_type)
-  if google_llm is None:
-    raise RuntimeError(
-        f"Vertex model name not found for embedding type {embedding_type}")
+  google_llm = get_vertex_multimodal_model_name(embedding_type)
 
   def _async_vertex_multimodal_embeddings():
     try:
       Logger.info(f"Generating Vertex embeddings for 1 multimodal chunk"
                   f" embedding model {google_llm}"
                   f" extracted text: {user_text}")
-      user_file_image = None
-      if user_file_bytes:
-        user_file_image = Image(image_bytes=user_file_bytes)
-      vertex_model = MultiModalEmbeddingModel.from_pretrained(google_llm)
-      embeddings = vertex_model.get_embeddings(image=user_file_image,
-                                               contextual_text=user_text)
-
-      return_value = {}
-      return_value["text"] = embeddings.text_embedding
-      return_value["image"] = embeddings.image_embedding
-      # TODO: also return vector part of video_embedding
-      # in return_value["video"] and potentially audio_embedding
-      # in return_value["audio"]
-
-      return return_value
+      return _vertex_multimodal_embeddings(google_llm,
+                                           user_text,
+                                           user_file_bytes)
     except Exception as e:
       Logger.error(f"error generating Vertex embeddings {str(e)}")
       raise e
@@ -275,6 +358,78 @@ async def get_vertex_multimodal_embeddings(embedding_type: str,
 
   return return_value
 
+async def get_multimodal_embeddings_batched(
+    chunks: List[Tuple[str, Optional[bytes]]],
+    embedding_type: str = None,
+    max_concurrency: int = MULTIMODAL_EMBEDDING_CONCURRENCY) -> List[dict]:
+  """
+  Get multimodal embeddings for a list of chunks.
+
+  The multimodal embedding model embeds one chunk per request, so up to
+  max_concurrency requests are kept in flight, limited to the qps of the
+  model by a token bucket shared by all callers.  Throttled requests are
+  retried individually with exponential backoff.
+
+  Args:
+    chunks: list of (text, file bytes) tuples, file bytes can be None
+    embedding_type: embedding model id
+    max_concurrency: max number of concurrent embedding requests
+  Returns:
+    list of dictionaries of embedding vectors for both text and image,
+    indexed by chunks
+  """
+  if embedding_type is None or embedding_type == "":
+    embedding_type = DEFAULT_QUERY_MULTIMODAL_EMBEDDING_MODEL
+  if embedding_type not in get_provider_embedding_types(PROVIDER_VERTEX):
+    raise InternalServerError(f"Unsupported embedding type {embedding_type}")
+  if not chunks:
+    return []
+
+  google_llm = get_vertex_multimodal_model_name(embedding_type)
+  qps = get_model_config().get_config_value(
+      embedding_type, KEY_MODEL_QPS, MULTIMODAL_EMBEDDING_QPS)
+  rate_limiter = get_rate_limiter((PROVIDER_VERTEX, embedding_type),
+                                  float(qps))
+  Logger.info(f"Generating Vertex embeddings for {len(chunks)} multimodal"
+              f" chunk(s) embedding model {google_llm}, {max_concurrency}"
+              f" concurrent requests, {qps} qps")
+
+  loop = asyncio.get_running_loop()
+  semaphore = asyncio.Semaphore(max_concurrency)
+
+  async def _embed_chunk(pool, user_text, user_file_bytes):
+    async with semaphore:
+      for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+        await rate_limiter.acquire()
+        try:
+          return await loop.run_in_executor(
+              pool, _vertex_multimodal_embeddings,
+              google_llm, user_text, user_file_bytes)
+        except THROTTLED_EXCEPTIONS as e:
+          if attempt == EMBEDDING_MAX_RETRIES:
+            Logger.error(f"error generating Vertex embeddings, throttled"
+                         f" {attempt + 1} times: {str(e)}")
+            raise
+          delay = EMBEDDING_RETRY_DELAY * 2 ** attempt * (1 + random.random())
+          Logger.warning(f"Vertex embedding request throttled, retrying in"
+                         f" {delay:.1f}s: {str(e)}")
+          await asyncio.sleep(delay)
+        except Exception as e:
+          Logger.error(f"error generating Vertex embeddings {str(e)}")
+          raise
+
+  with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+    tasks = [asyncio.ensure_future(_embed_chunk(pool, user_text,
+                                                user_file_bytes))
+             for user_text, user_file_bytes in chunks]
+    try:
+      return await asyncio.gather(*tasks)
+    except Exception:
+      # don't send the remaining requests if a chunk failed
+      for task in tasks:
+        task.cancel()
+      raise
+
 def get_langchain_embeddings(embedding_type: str,
     sentence_list: List[str]) -> List[Optional[List[float]]]:
   """
@@ -341,7 +496,7 @@ class LangchainEmbeddings(Embeddings):
   def embed_query(self, text: str) -> List[float]:
     embedding_type = DEFAULT_QUERY_EMBEDDING_MODEL
     _, embeddings = asyncio.get_event_loop().run_until_complete(
-        get_embeddings([text], embedding_type))
+        get_embeddings([text], embedding_type, use_cache=True))
     return embeddings[0]
 
   def embed_documents(self, texts: List[str]) -> List[List[float]]:
@@ -359,5 +514,6 @@ class LangchainEmbeddings(Embeddings):
   async def aembed_query(self, text: str) -> List[float]:
     """Asynchronous Embed query text."""
     embedding_type = DEFAULT_QUERY_EMBEDDING_MODEL
-    _, embeddings = await get_embeddings([text], embedding_type)
-    return embeddings
+    _, embeddings = await get_embeddings([text], embedding_type,
+                                         use_cache=True)
+    return embeddings[0]
@@ -17,6 +17,7 @@
 """
 # disabling pylint rules that conflict with pytest fixtures
 # pylint: disable=unused-argument,redefined-outer-name,ungrouped-imports,unused-import
+import asyncio
 import numpy.testing as npt
 import numpy as np
 import pytest
@@ -25,7 +26,10 @@ from common.utils.logging_handler import Logger
 from common.utils.config import set_env_var
 from vertexai.language_models import TextEmbedding
 from vertexai.vision_models import MultiModalEmbeddingResponse
-from services.embeddings import get_embeddings, get_multimodal_embeddings
+from google.api_core.exceptions import ResourceExhausted
+from services.embeddings import (get_embeddings, get_multimodal_embeddings,
+                                 get_multimodal_embeddings_batched,
+                                 embedding_cache, _pending_embeddings)
 with set_env_var("PG_HOST", ""):
   from config import (get_model_config, DEFAULT_QUERY_EMBEDDING_MODEL,
                       DEFAULT_QUERY_MULTIMODAL_EMBEDDING_MODEL)
@@ -62,6 +66,28 @@ async def test_get_embeddings(mock_get_vertex_embeddings):
   assert all(is_successful)
   npt.assert_array_equal(embeddings, FAKE_TEXT_EMBEDDINGS)
 
+@pytest.mark.asyncio
+@mock.patch("services.embeddings.TextEmbeddingModel.get_embeddings")
+async def test_get_embeddings_cached(mock_get_vertex_embeddings):
+  embedding_cache.clear()
+  mock_get_vertex_embeddings.return_value = FAKE_VERTEX_TEXT_EMBEDDINGS[:1]
+  embedding_type = DEFAULT_QUERY_EMBEDDING_MODEL
+  text_chunks = ["test sentence 1"]
+  is_successful, embeddings = await get_embeddings(
+      text_chunks, embedding_type, use_cache=True)
+  assert all(is_successful)
+  npt.assert_array_equal(embeddings, FAKE_TEXT_EMBEDDINGS[:1])
+
+  # cached embeddings are not generated again
+  mock_get_vertex_embeddings.return_value = FAKE_VERTEX_TEXT_EMBEDDINGS[1:2]
+  text_chunks = ["test sentence 2", "test sentence 1"]
+  is_successful, embeddings = await get_embeddings(
+      text_chunks, embedding_type, use_cache=True)
+  assert all(is_successful)
+  npt.assert_array_equal(embeddings, FAKE_TEXT_EMBEDDINGS[[1, 0]])
+  assert mock_get_vertex_embeddings.call_count == 2
+  assert mock_get_vertex_embeddings.call_args.args[0] == ["test sentence 2"]
+
 @pytest.mark.asyncio
 @mock.patch("services.embeddings.TextEmbeddingModel.get_embeddings")
 async def test_get_embeddings_empty(mock_get_vertex_embeddings):
@@ -82,3 +108,57 @@ async def test_get_embeddings_multimodal(mock_get_vertex_embeddings):
   embeddings = await get_multimodal_embeddings(
       text_chunks, FAKE_MULTIMODAL_IMAGE_BYTES, embedding_type)
   assert embeddings == FAKE_MULTIMODAL_EMBEDDINGS
+
+@pytest.mark.asyncio
+@mock.patch("services.embeddings.EMBEDDING_RETRY_DELAY", 0)
+@mock.patch(
+    "services.embeddings.MultiModalEmbeddingModel.get_embeddings")
+async def test_get_embeddings_multimodal_batched(mock_get_vertex_embeddings):
+  # the second request is throttled once and retried on its own
+  mock_get_vertex_embeddings.side_effect = [
+    FAKE_VERTEX_MULTIMODAL_EMBEDDINGS,
+    ResourceExhausted("quota exceeded"),
+    FAKE_VERTEX_MULTIMODAL_EMBEDDINGS,
+  ]
+  embedding_type = DEFAULT_QUERY_MULTIMODAL_EMBEDDING_MODEL
+  chunks = [("test sentence 1", None), ("test sentence 2", None)]
+  embeddings = await get_multimodal_embeddings_batched(
+      chunks, embedding_type, max_concurrency=1)
+  assert embeddings == [FAKE_MULTIMODAL_EMBEDDINGS, FAKE_MULTIMODAL_EMBEDDINGS]
+  assert mock_get_vertex_embeddings.call_count == 3
+  assert mock_get_vertex_embeddings.call_args.kwargs["contextual_text"] == \
+      "test sentence 2"
+
+@pytest.mark.asyncio
+async def test_get_embeddings_cached_waiter_cancelled():
+  embedding_cache.clear()
+  generating = asyncio.Event()
+  release = asyncio.Event()
+
+  async def fake_generate(embedding_type, text_chunks):
+    generating.set()
+    await release.wait()
+    return [True], np.array([[0.5]])
+
+  with mock.patch("services.embeddings._generate_embeddings_batched",
+                  side_effect=fake_generate) as mock_generate:
+    owner = asyncio.create_task(
+        get_embeddings(["test sentence"], use_cache=True))
+    await generating.wait()
+    cancelled_waiter = asyncio.create_task(
+        get_embeddings(["test sentence"], use_cache=True))
+    waiter = asyncio.create_task(
+        get_embeddings(["test sentence"], use_cache=True))
+    await asyncio.sleep(0)
+
+    # cancelling one waiter doesn't affect the owner or the other waiters
+    cancelled_waiter.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    for task in [owner, waiter]:
+      is_successful, embeddings = await task
+      assert is_successful == [True]
+      npt.assert_array_equal(embeddings, [[0.5]])
+    assert cancelled_waiter.cancelled()
+    assert mock_generate.call_count == 1
+    assert not _pending_embeddings.get(asyncio.get_running_loop())
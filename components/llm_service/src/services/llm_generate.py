@@ -16,13 +16,13 @@ LLM Generation Service
 """
 # pylint: disable=import-outside-toplevel,line-too-long
 import time
-import requests
 import base64
 from typing import Optional, List, AsyncGenerator, Union
 import google.auth
 import google.auth.transport.requests
 import google.cloud.aiplatform
-from openai import OpenAI, OpenAIError
+from openai import OpenAI, OpenAIError, APIConnectionError
+from openai import InternalServerError as OpenAIInternalServerError
 from vertexai.language_models import (ChatModel, TextGenerationModel)
 from vertexai.generative_models import (
     GenerativeModel, Part, GenerationConfig, HarmCategory, HarmBlockThreshold, Content)
@@ -31,24 +31,26 @@ from common.models import UserChat, UserQuery
 from common.utils.errors import ResourceNotFoundException
 from common.utils.http_exceptions import InternalServerError
 from common.utils.logging_handler import Logger
-from common.utils.request_handler import (post_method,
+from common.utils.request_handler import (async_post_method,
                                           DEFAULT_TIMEOUT)
 from common.utils.token_handler import UserCredentials
 from common.utils.context_vars import get_context
-from config import (get_model_config, get_provider_models,
-                    get_provider_value, get_provider_model_config,
+from config import (get_model_config, get_model_provider, get_call_plan,
+                    get_provider_value,
                     get_model_config_value, get_model_system_prompt,
                     PROVIDER_VERTEX, PROVIDER_TRUSS,
                     PROVIDER_MODEL_GARDEN, PROVIDER_VLLM,
                     PROVIDER_LANGCHAIN, PROVIDER_LLM_SERVICE,
                     PROVIDER_ANTHROPIC, KEY_MODEL_REGION,
-                    KEY_MODEL_ENDPOINT, KEY_MODEL_NAME,
+                    KEY_MODEL_ENDPOINT,
                     KEY_MODEL_TOKEN_LIMIT,
                     KEY_MODEL_PARAMS, KEY_MODEL_CONTEXT_LENGTH,
                     DEFAULT_LLM_TYPE, DEFAULT_MULTIMODAL_LLM_TYPE,
                     KEY_SUB_PROVIDER, SUB_PROVIDER_OPENAPI,
                     DEFAULT_CHAT_SUMMARY_MODEL)
 from services.langchain_service import langchain_llm_generate
+from services.client_registry import (client_registry, client_key,
+                                      is_transport_failure)
 from services.query.data_source import DataSourceFile
 from utils.errors import ContextWindowExceededException
 from utils.file_helper import read_gcs_file_as_base64
@@ -107,26 +109,23 @@ async def llm_generate(prompt: str, llm_type: str, stream: bool = False) -> \
     # call the appropriate provider to generate the chat response
     # for Google models, prioritize native client over langchain
     chat_llm_types = get_model_config().get_chat_llm_types()
-    if llm_type in get_provider_models(PROVIDER_LLM_SERVICE):
+    call_plan = get_call_plan(llm_type)
+    provider = call_plan.provider_id if call_plan else None
+    if provider == PROVIDER_LLM_SERVICE:
       is_chat = llm_type in chat_llm_types
       response = await llm_service_predict(prompt, is_chat, llm_type)
-    elif llm_type in get_provider_models(PROVIDER_TRUSS):
-      model_endpoint = get_provider_value(
-          PROVIDER_TRUSS, KEY_MODEL_ENDPOINT, llm_type)
+    elif provider == PROVIDER_TRUSS:
       response = await llm_truss_service_predict(
-          llm_type, prompt, model_endpoint)
-    elif llm_type in get_provider_models(PROVIDER_VLLM):
-      model_endpoint = get_provider_value(
-          PROVIDER_VLLM, KEY_MODEL_ENDPOINT, llm_type)
+          llm_type, prompt, call_plan.model_endpoint)
+    elif provider == PROVIDER_VLLM:
       response = await llm_vllm_service_predict(
-          llm_type, prompt, model_endpoint)
-    elif llm_type in get_provider_models(PROVIDER_MODEL_GARDEN):
+          llm_type, prompt, call_plan.model_endpoint)
+    elif provider == PROVIDER_MODEL_GARDEN:
       response = await model_garden_predict(prompt, llm_type)
-    elif llm_type in get_provider_models(PROVIDER_ANTHROPIC):
+    elif provider == PROVIDER_ANTHROPIC:
       response = await anthropic_predict(prompt, llm_type, stream=stream)
-    elif llm_type in get_provider_models(PROVIDER_VERTEX):
-      google_llm = get_provider_value(
-          PROVIDER_VERTEX, KEY_MODEL_NAME, llm_type)
+    elif provider == PROVIDER_VERTEX:
+      google_llm = call_plan.model_name
       if google_llm is None:
         raise RuntimeError(
             f"Vertex model name not found for llm type {llm_type}")
@@ -134,7 +133,7 @@ async def llm_generate(prompt: str, llm_type: str, stream: bool = False) -> \
       is_multimodal = False
       response = await google_llm_predict(
         prompt, is_chat, is_multimodal, google_llm, stream=stream)
-    elif llm_type in get_provider_models(PROVIDER_LANGCHAIN):
+    elif provider == PROVIDER_LANGCHAIN:
       response = await langchain_llm_generate(prompt, llm_type)
     else:
       raise ResourceNotFoundException(f"Cannot find llm type '{llm_type}'")
@@ -207,7 +206,9 @@ async def anthropic_predict(prompt: str,
                                 default="us-east5")
 
     Logger.info(f"Using Anthropic region: {region} for model: {llm_type}")
-    client = AnthropicVertex(project_id=PROJECT_ID, region=region)
+    client = client_registry.get(
+        client_key(PROVIDER_ANTHROPIC, None, region),
+        lambda: AnthropicVertex(project_id=PROJECT_ID, region=region))
 
     model_name = get_provider_value(PROVIDER_ANTHROPIC,
                                     KEY_MODEL_ENDPOINT,
@@ -481,9 +482,10 @@ async def llm_generate_multimodal(prompt: str, llm_type: str,
     # for Google models, prioritize native client over langchain
     chat_llm_types = get_model_config().get_chat_llm_types()
     multimodal_llm_types = get_model_config().get_multimodal_llm_types()
-    if llm_type in get_provider_models(PROVIDER_VERTEX):
-      google_llm = get_provider_value(
-          PROVIDER_VERTEX, KEY_MODEL_NAME, llm_type)
+    call_plan = get_call_plan(llm_type)
+    provider = call_plan.provider_id if call_plan else None
+    if provider == PROVIDER_VERTEX:
+      google_llm = call_plan.model_name
       if google_llm is None:
         raise RuntimeError(
             f"Vertex model name not found for llm type {llm_type}")
@@ -495,8 +497,7 @@ async def llm_generate_multimodal(prompt: str, llm_type: str,
       response = await google_llm_predict(prompt, is_chat, is_multimodal,
                             google_llm, None, None, user_file_bytes,
                             user_files)
-    elif llm_type in get_provider_models(PROVIDER_ANTHROPIC):
-      multimodal_llm_types = get_model_config().get_multimodal_llm_types()
+    elif provider == PROVIDER_ANTHROPIC:
       if llm_type not in multimodal_llm_types:
         raise RuntimeError(
             f"Anthropic model {llm_type} should be designated multimodal")
@@ -576,8 +577,9 @@ async def llm_chat(prompt: str, llm_type: str,
     raise ResourceNotFoundException(f"Cannot find chat llm type '{llm_type}'")
 
   # validate chat file params and model for them
-  is_multimodal = (llm_type in get_provider_models(PROVIDER_VERTEX) or
-                   llm_type in get_provider_models(PROVIDER_ANTHROPIC))
+  call_plan = get_call_plan(llm_type)
+  provider = call_plan.provider_id if call_plan else None
+  is_multimodal = provider in (PROVIDER_VERTEX, PROVIDER_ANTHROPIC)
 
   if chat_file_bytes is not None or chat_files:
     if chat_file_bytes is not None and chat_files:
@@ -609,30 +611,25 @@ async def llm_chat(prompt: str, llm_type: str,
     check_context_length(prompt, llm_type)
 
     # call the appropriate provider to generate the chat response
-    if llm_type in get_provider_models(PROVIDER_LLM_SERVICE):
+    if provider == PROVIDER_LLM_SERVICE:
       is_chat = True
       response = await llm_service_predict(
           prompt, is_chat, llm_type, user_chat)
-    elif llm_type in get_provider_models(PROVIDER_TRUSS):
-      model_endpoint = get_provider_value(
-          PROVIDER_TRUSS, KEY_MODEL_ENDPOINT, llm_type)
+    elif provider == PROVIDER_TRUSS:
       response = await llm_truss_service_predict(
-          llm_type, prompt, model_endpoint)
-    elif llm_type in get_provider_models(PROVIDER_VLLM):
-      model_endpoint = get_provider_value(
-          PROVIDER_VLLM, KEY_MODEL_ENDPOINT, llm_type)
+          llm_type, prompt, call_plan.model_endpoint)
+    elif provider == PROVIDER_VLLM:
       response = await llm_vllm_service_predict(
-          llm_type, prompt, model_endpoint)
-    elif llm_type in get_provider_models(PROVIDER_MODEL_GARDEN):
+          llm_type, prompt, call_plan.model_endpoint)
+    elif provider == PROVIDER_MODEL_GARDEN:
       response = await model_garden_predict(prompt, llm_type)
-    elif llm_type in get_provider_models(PROVIDER_ANTHROPIC):
+    elif provider == PROVIDER_ANTHROPIC:
       response = await anthropic_predict(prompt, llm_type, stream=stream,
                                   user_file_bytes=chat_file_bytes,
                                   user_files=chat_files,
                                   user_chat=user_chat)
-    elif llm_type in get_provider_models(PROVIDER_VERTEX):
-      google_llm = get_provider_value(
-          PROVIDER_VERTEX, KEY_MODEL_NAME, llm_type)
+    elif provider == PROVIDER_VERTEX:
+      google_llm = call_plan.model_name
       if google_llm is None:
         raise RuntimeError(
             f"Vertex model name not found for llm type {llm_type}")
@@ -643,7 +640,7 @@ async def llm_chat(prompt: str, llm_type: str,
                                           chat_file_bytes, chat_files,
                                           user_data=user_data,
                                           stream=stream)
-    elif llm_type in get_provider_models(PROVIDER_LANGCHAIN):
+    elif provider == PROVIDER_LANGCHAIN:
       response = await langchain_llm_generate(prompt, llm_type, user_chat)
     return response
   except Exception as e:
@@ -747,7 +744,9 @@ async def llm_truss_service_predict(llm_type: str, prompt: str,
     }
   )
 
-  resp = post_method(api_url, request_body=parameters)
+  # truss predictions have no side effects, and can be retried on errors
+  resp = await async_post_method(api_url, request_body=parameters,
+                                 idempotent=True)
 
   if resp.status_code != 200:
     raise InternalServerError(
@@ -808,14 +807,18 @@ async def llm_vllm_service_predict(llm_type: str, prompt: str,
   openai_api_key = "EMPTY"  # Not required for vLLM
   openai_api_base = f"http://{model_endpoint}/v1"
 
-  client = OpenAI(
-    api_key=openai_api_key,
-    base_url=openai_api_base,
-  )
+  def create_vllm_client():
+    client = OpenAI(
+      api_key=openai_api_key,
+      base_url=openai_api_base,
+    )
+    # resolve the served model id once per client
+    models = client.models.list()
+    return client, models.data[0].id
 
+  vllm_client_key = client_key(PROVIDER_VLLM, llm_type, openai_api_base)
   try:
-    models = client.models.list()
-    model = models.data[0].id
+    client, model = client_registry.get(vllm_client_key, create_vllm_client)
 
     Logger.info(
       "Text generation with vLLM hosted model initiated",
@@ -842,6 +845,7 @@ async def llm_vllm_service_predict(llm_type: str, prompt: str,
         **parameter_kwargs
     )
     output = response.choices[0].message.content
+    client_registry.report_success(vllm_client_key)
     Logger.info(
       "Response from vLLM service received",
       extra={
@@ -857,6 +861,8 @@ async def llm_vllm_service_predict(llm_type: str, prompt: str,
 
   except OpenAIError as e:
     Logger.error(f"OpenAI API error: {e}")
+    if isinstance(e, (APIConnectionError, OpenAIInternalServerError)):
+      client_registry.report_failure(vllm_client_key, e)
     raise InternalServerError(f"Error: {e}") from e
 
   return output
@@ -917,9 +923,9 @@ async def llm_service_predict(prompt: str, is_chat: bool,
       "session_id": context["session_id"]
     }
   )
-  resp = post_method(api_url,
-                     request_body=request_body,
-                     token=auth_token)
+  resp = await async_post_method(api_url,
+                                 request_body=request_body,
+                                 token=auth_token)
 
   if resp.status_code != 200:
     raise InternalServerError(
@@ -971,8 +977,7 @@ async def model_garden_predict(prompt: str,
     openapi_endpoint = f"https://{REGION}-aiplatform.googleapis.com/" \
                        f"v1/projects/{PROJECT_ID}/locations/{REGION}/" \
                       f"endpoints/openapi/chat/completions"
-    req_headers = {"Authorization": f"Bearer {auth_token}",
-                   "Content-Type": "application/json"}
+    req_headers = {"Content-Type": "application/json"}
     req_body = {"model": f"{aip_endpoint_name}",
                 "messages":[{"role": "user",
                              "content": f"{prompt}"}]}
@@ -991,9 +996,9 @@ async def model_garden_predict(prompt: str,
       }
     )
 
-    resp = requests.post(
-      url=f"{openapi_endpoint}", json=req_body, headers=req_headers,
-      timeout=DEFAULT_TIMEOUT)
+    resp = await async_post_method(
+      openapi_endpoint, request_body=req_body, headers=req_headers,
+      token=auth_token, timeout=DEFAULT_TIMEOUT)
 
     if resp.status_code != 200:
       raise InternalServerError(
@@ -1169,13 +1174,10 @@ async def google_llm_predict(prompt: str, is_chat: bool, is_multimodal: bool,
                                if isinstance(entry, str))
 
   # Get model params at the model level else use global vertex params.
-  parameters = get_provider_value(PROVIDER_VERTEX, KEY_MODEL_PARAMS)
-  provider_config = get_provider_model_config(PROVIDER_VERTEX)
-  for _, model_config in provider_config.items():
-    model_name = model_config.get(KEY_MODEL_NAME)
-    if model_name == google_llm and KEY_MODEL_PARAMS in model_config:
-      parameters = model_config.get(KEY_MODEL_PARAMS)
+  parameters = get_model_config().get_provider_model_name_params(
+      PROVIDER_VERTEX, google_llm)
 
+  model_key = None
   try:
     if is_chat:
       # gemini uses new "GenerativeModel" class and requires different params
@@ -1185,7 +1187,12 @@ async def google_llm_predict(prompt: str, is_chat: bool, is_multimodal: bool,
           prompt_list.extend(
             convert_history_to_gemini_prompt(user_chat.history, is_multimodal))
         prompt_list.append(Content(role="user", parts=[Part.from_text(prompt)]))
-        chat_model = GenerativeModel(google_llm, system_instruction=system_prompt)
+        model_key = client_key(PROVIDER_VERTEX, google_llm, None,
+                               GenerativeModel.__name__, system_prompt)
+        chat_model = client_registry.get(
+            model_key,
+            lambda: GenerativeModel(google_llm,
+                                    system_instruction=system_prompt))
         if is_multimodal:
           if user_file_bytes is not None and user_files is not None:
             # user_file_bytes refers to a single image and so we index into
@@ -1232,22 +1239,34 @@ async def google_llm_predict(prompt: str, is_chat: bool, is_multimodal: bool,
               raise InternalServerError(str(e)) from e
           return response_generator()
 
+        client_registry.report_success(model_key)
         return response.text
 
       else:
-        chat_model = ChatModel.from_pretrained(google_llm)
+        model_key = client_key(PROVIDER_VERTEX, google_llm, None,
+                               ChatModel.__name__)
+        chat_model = client_registry.get(
+            model_key, lambda: ChatModel.from_pretrained(google_llm))
         chat = chat_model.start_chat()
         response = await chat.send_message_async(context_prompt, **parameters)
     else:
-      text_model = TextGenerationModel.from_pretrained(google_llm)
+      model_key = client_key(PROVIDER_VERTEX, google_llm, None,
+                             TextGenerationModel.__name__)
+      text_model = client_registry.get(
+          model_key, lambda: TextGenerationModel.from_pretrained(google_llm))
       response = await text_model.predict_async(
           context_prompt,
           **parameters,
       )
 
   except Exception as e:
+    # only failures of the model service count towards evicting the model
+    # client, not errors of the request such as an invalid argument
+    if model_key is not None and is_transport_failure(e):
+      client_registry.report_failure(model_key, e)
     raise InternalServerError(str(e)) from e
 
+  client_registry.report_success(model_key)
   Logger.info(
     "Google LLM response received",
     extra={
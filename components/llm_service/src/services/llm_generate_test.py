@@ -247,7 +247,7 @@ async def test_llm_truss_service_predict(clean_firestore, test_chat):
   }
   get_model_config().llm_models = TEST_TRUSS_CONFIG
   with mock.patch(
-          "services.llm_generate.post_method",
+          "services.llm_generate.async_post_method",
           return_value=mock.Mock(status_code=200,
                                  json=lambda: FAKE_TRUSS_RESPONSE)):
     response = await llm_chat(
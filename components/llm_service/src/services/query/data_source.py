@@ -18,25 +18,36 @@ import json
 import hashlib
 import traceback
 import os
+import shutil
 import uuid
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from urllib.parse import unquote
 from copy import copy
 from base64 import b64encode
-from typing import List, Tuple
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 from common.utils.logging_handler import Logger
 from common.models import QueryEngine
-from config import get_default_manifest
+from config import (get_default_manifest, PDF_EXTRACT_PROCESSES,
+                    PDF_EXTRACT_MIN_PAGES, PDF_EXTRACT_TIMEOUT,
+                    MULTIMODAL_PDF_PAGE_WINDOW,
+                    MULTIMODAL_PAGE_UPLOAD_WORKERS, GCS_DOWNLOAD_WORKERS)
 from pypdf import PdfReader, PdfWriter, PageObject
 from pdf2image import convert_from_path
 from langchain_community.document_loaders import CSVLoader
 from utils.errors import NoDocumentsIndexedException
 from utils import text_helper, gcs_helper
+from utils.pdf_helper import (extract_pdf_page_range, get_pdf_executor,
+                              terminate_pdf_executor)
 from llama_index.core import SimpleDirectoryReader
 from llama_index.core.node_parser import (SentenceSplitter,
                                          SentenceWindowNodeParser)
 from llama_index.core import Document
+from metrics import MULTIMODAL_DOC_PEAK_RSS
 
 # pylint: disable=broad-exception-caught,unused-argument
 
@@ -57,6 +68,14 @@ DEFAULT_CHUNK_SIZE = 250
 CHUNKING_CLASS_PARAM = "chunking_class"
 CHUNK_SIZE_PARAM = "chunk_size"
 
+def get_rss_bytes() -> int:
+  """ resident set size of this process in bytes, 0 if not available """
+  try:
+    with open("/proc/self/statm", "r", encoding="utf-8") as f:
+      return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except (OSError, ValueError, IndexError):
+    return 0
+
 class DataSourceFile():
   """ object storing meta data about a data source file """
   def __init__(self,
@@ -65,13 +84,21 @@ class DataSourceFile():
                local_path:str=None,
                gcs_path:str=None,
                doc_id:str=None,
-               mime_type:str=None):
+               mime_type:str=None,
+               generation:int=None,
+               md5_hash:str=None,
+               file_hash:str=None):
     self.doc_name = doc_name
     self.src_url = src_url
     self.local_path = local_path
     self.gcs_path = gcs_path
     self.doc_id = doc_id
     self.mime_type = mime_type
+    # version of the source file, if known
+    self.generation = generation
+    self.md5_hash = md5_hash
+    # sha256 hash of the downloaded file
+    self.file_hash = file_hash
 
   def __repr__(self) -> str:
     """
@@ -83,7 +110,10 @@ class DataSourceFile():
       f"local_path={self.local_path}, "
       f"gcs_path={self.gcs_path}, "
       f"doc_id={self.doc_id}, "
-      f"mime_type={self.mime_type})"
+      f"mime_type={self.mime_type}, "
+      f"generation={self.generation}, "
+      f"md5_hash={self.md5_hash}, "
+      f"file_hash={self.file_hash})"
     )
 
 
@@ -95,6 +125,8 @@ class DataSource:
   def __init__(self, storage_client, params=None):
     self.storage_client = storage_client
     self.docs_not_processed = []
+    # urls of docs skipped by iter_documents because they are unchanged
+    self.docs_unchanged = []
     self.params = params or {}
 
     # set chunk size
@@ -144,27 +176,88 @@ class DataSource:
     Returns:
         list of DataSourceFile
     """
-    doc_filepaths = []
+    return list(self.iter_documents(doc_url, temp_dir))
+
+  def iter_documents(self, doc_url: str, temp_dir: str,
+                     known_versions: Optional[
+                         Dict[str, Tuple[Optional[int], Optional[str]]]]=None,
+                     max_workers: int = GCS_DOWNLOAD_WORKERS) -> \
+        Iterator[DataSourceFile]:
+    """
+    Download files from doc_url source to a local tmp directory, yielding
+    each file as soon as it is downloaded.  Files are downloaded by a pool
+    of max_workers threads, and yielded in listing order with at most
+    max_workers files downloaded ahead.  Data sources that only override
+    download_documents download all files before yielding.
+
+    If known_versions is provided, files whose generation and md5 hash
+    match the version recorded for their url are not downloaded, and
+    their urls are added to docs_unchanged.
+
+    Args:
+        doc_url: url pointing to container of documents to be indexed
+        temp_dir: Path to temporary directory to download files to
+        known_versions: dict of doc url to (generation, md5_hash) of
+          files that have already been indexed
+        max_workers: number of concurrent downloads
+
+    Returns:
+        iterator of DataSourceFile
+    """
+    if type(self).download_documents is not DataSource.download_documents:
+      yield from self.download_documents(doc_url, temp_dir)
+      return
+
     bucket_name = doc_url.split("gs://")[1].split("/")[0]
     Logger.info(f"downloading {doc_url} from bucket {bucket_name}")
 
-    for blob in self.storage_client.list_blobs(bucket_name):
-      # Download the file to the tmp folder flattening all directories
-      file_name = Path(blob.name).name
-      file_path = os.path.join(temp_dir, file_name)
-      blob.download_to_filename(file_path)
-      gcs_path = blob.path.replace("/b/","")
-      gcs_url = f"gs://{gcs_path}"
-      doc_filepaths.append(DataSourceFile(doc_name=blob.name,
-                                          src_url=blob.public_url,
-                                          local_path=file_path,
-                                          gcs_path=gcs_url))
-
-    if len(doc_filepaths) == 0:
+    num_files = 0
+    local_names = set()
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as download_pool:
+      for blob in self.storage_client.list_blobs(bucket_name):
+        num_files += 1
+        if known_versions is not None and \
+            known_versions.get(blob.public_url) == (blob.generation,
+                                                    blob.md5_hash):
+          self.docs_unchanged.append(blob.public_url)
+          continue
+
+        # Download the file to the tmp folder flattening all directories,
+        # into a sub folder if another file has the same name
+        file_name = Path(blob.name).name
+        file_path = os.path.join(temp_dir, file_name)
+        if file_name in local_names:
+          file_path = os.path.join(temp_dir, str(num_files), file_name)
+          os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        local_names.add(file_name)
+
+        pending.append(download_pool.submit(self.download_blob,
+                                            blob, file_path))
+        if len(pending) >= max_workers:
+          yield pending.popleft().result()
+      while pending:
+        yield pending.popleft().result()
+
+    if num_files == 0:
       raise NoDocumentsIndexedException(
           f"No documents can be indexed at url {doc_url}")
+    if self.docs_unchanged:
+      Logger.info(f"skipped {len(self.docs_unchanged)} unchanged files "
+                  f"of {num_files} at {doc_url}")
 
-    return doc_filepaths
+  @staticmethod
+  def download_blob(blob, file_path: str) -> DataSourceFile:
+    """ Download a GCS blob to file_path """
+    blob.download_to_filename(file_path)
+    gcs_path = blob.path.replace("/b/","")
+    gcs_url = f"gs://{gcs_path}"
+    return DataSourceFile(doc_name=blob.name,
+                          src_url=blob.public_url,
+                          local_path=file_path,
+                          gcs_path=gcs_url,
+                          generation=blob.generation,
+                          md5_hash=blob.md5_hash)
 
   def init_metadata(self, q_engine: QueryEngine) -> dict:
     """ 
@@ -272,8 +365,9 @@ class DataSource:
        doc_filepath: local file path of document
     Returns:
        array where each item is an object representing a page of the document
-       contains two properties for image b64 data & text chunks 
-       or None if the document could not be processed
+       contains properties for image b64 data or the GCS url of the page
+       image, and text chunks, or None if the document could not be
+       processed
     """
     Logger.info(f"generating index data for {doc_name}")
 
@@ -318,47 +412,11 @@ class DataSource:
       chunk_bucket_folder = (f"{GENIE_FOLDER_MARKER}/"
                              f"{get_file_hash(doc_filepath)}")
 
-      # If doc is a PDF, convert it to an array of PNGs for each page
+      # If doc is a PDF, chunk it into a PNG image and text for each page
       allowed_image_types = ["png", "jpg", "jpeg", "bmp", "gif"]
       if doc_extension == "pdf":
-
-        with tempfile.TemporaryDirectory() as path:
-          png_array = convert_from_path(doc_filepath, output_folder=path)
-
-        # Open PDF and iterate over pages
-        with open(doc_filepath, "rb") as f:
-          reader = PdfReader(f)
-          num_pages = len(reader.pages)
-          Logger.info(f"Reading pdf doc {doc_name} with {num_pages} pages")
-          for i in range(num_pages):
-            # Create a pdf file for the page and chunk into contextual_text
-            pdf_doc = self.create_pdf_page(reader.pages[i], doc_filepath, i)
-            contextual_text = self.extract_contextual_text(pdf_doc["filename"],
-                                                  pdf_doc["filepath"], doc_url)
-
-            # Take PNG version of page and convert to b64
-            png_doc_filepath = \
-              ".png".join(pdf_doc["filepath"].rsplit(".pdf", 1))
-            png_array[i].save(png_doc_filepath, format="png")
-            png_b64 = self.extract_b64(png_doc_filepath)
-
-            # Upload to Google Cloud Bucket and return gs URL
-            png_url = gcs_helper.upload_to_gcs(self.storage_client,
-                                               bucket_name,
-                                               png_doc_filepath,
-                                               chunk_bucket_folder)
-
-            # Clean up temp files
-            os.remove(pdf_doc["filepath"])
-            os.remove(png_doc_filepath)
-
-            # Push chunk object into chunk array
-            chunk_obj = {
-              "image": png_b64,
-              "image_url": png_url,
-              "text": contextual_text
-            }
-            doc_chunks.append(chunk_obj)
+        doc_chunks.extend(self.iter_pdf_multimodal_chunks(
+            doc_name, doc_url, doc_filepath, bucket_name, chunk_bucket_folder))
       elif doc_extension in allowed_image_types:
         # TODO: Convert image file into something text readable (pdf, html, ext)
         # So that we can extract text chunks
@@ -411,6 +469,91 @@ class DataSource:
     # Return array of page data
     return doc_chunks
 
+  def iter_pdf_multimodal_chunks(
+      self,
+      doc_name: str,
+      doc_url: str,
+      doc_filepath: str,
+      bucket_name: str,
+      chunk_bucket_folder: str,
+      page_window: int = MULTIMODAL_PDF_PAGE_WINDOW,
+      upload_workers: int = MULTIMODAL_PAGE_UPLOAD_WORKERS) -> Iterator[dict]:
+    """
+    Generate multimodal chunks for the pages of a PDF.
+
+    Pages are rendered to PNG files page_window pages at a time, so no more
+    than page_window rendered pages are held at once, and the page images
+    of a window are uploaded to GCS concurrently.  Chunks hold the GCS url
+    of their page image, not the image itself, which is read from GCS when
+    the chunk is embedded.
+
+    Args:
+      doc_name: file name of document
+      doc_url: remote url of document
+      doc_filepath: local file path of document
+      bucket_name: bucket to upload page images to
+      chunk_bucket_folder: folder in bucket for page images
+      page_window: max number of pages rendered at a time
+      upload_workers: number of concurrent page image uploads
+    Yields:
+      chunk object with image url and text for each page, in page order
+    """
+    peak_rss = get_rss_bytes()
+    try:
+      with open(doc_filepath, "rb") as f, \
+          tempfile.TemporaryDirectory() as render_dir, \
+          ThreadPoolExecutor(max_workers=upload_workers) as upload_pool:
+        reader = PdfReader(f)
+        num_pages = len(reader.pages)
+        Logger.info(f"Reading pdf doc {doc_name} with {num_pages} pages")
+        for start in range(0, num_pages, page_window):
+          end = min(start + page_window, num_pages)
+          # render the window straight to files, pdf2image pages are 1-based
+          png_paths = convert_from_path(doc_filepath,
+                                        first_page=start + 1,
+                                        last_page=end,
+                                        output_folder=render_dir,
+                                        fmt="png",
+                                        paths_only=True)
+          uploads = []
+          for i, png_path in zip(range(start, end), png_paths):
+            # Create a pdf file for the page and chunk into contextual_text
+            pdf_doc = self.create_pdf_page(reader.pages[i], doc_filepath, i)
+            contextual_text = self.extract_contextual_text(
+                pdf_doc["filename"], pdf_doc["filepath"], doc_url)
+            os.remove(pdf_doc["filepath"])
+
+            # name the page image after the page pdf
+            png_doc_filepath = \
+              ".png".join(pdf_doc["filepath"].rsplit(".pdf", 1))
+            shutil.move(png_path, png_doc_filepath)
+
+            upload = upload_pool.submit(gcs_helper.upload_to_gcs,
+                                        self.storage_client,
+                                        bucket_name,
+                                        png_doc_filepath,
+                                        chunk_bucket_folder)
+            chunk_obj = {
+              "image": None,
+              "image_url": None,
+              "text": contextual_text
+            }
+            uploads.append((chunk_obj, png_doc_filepath, upload))
+          peak_rss = max(peak_rss, get_rss_bytes())
+
+          # finish the uploads of this window before rendering the next one
+          for chunk_obj, png_doc_filepath, upload in uploads:
+            try:
+              chunk_obj["image_url"] = upload.result()
+            finally:
+              os.remove(png_doc_filepath)
+          for chunk_obj, _, _ in uploads:
+            yield chunk_obj
+    finally:
+      MULTIMODAL_DOC_PEAK_RSS.labels(doc_type="pdf").observe(peak_rss)
+      Logger.info(f"Peak RSS while chunking pdf doc {doc_name}: "
+                  f"{peak_rss / 2**20:.1f} MiB")
+
   def extract_contextual_text(self, doc_name: str, doc_filepath: str, \
         doc_url: str) -> str:
     """
@@ -500,14 +643,7 @@ class DataSource:
       loader = CSVLoader(file_path=doc_filepath)
     elif doc_extension == "pdf":
       # read PDF into array of pages
-      doc_text_list = []
-      with open(doc_filepath, "rb") as f:
-        reader = PdfReader(f)
-        num_pages = len(reader.pages)
-        Logger.info(f"Reading pdf file {doc_name} with {num_pages} pages")
-        for page in range(num_pages):
-          doc_text_list.append(reader.pages[page].extract_text())
-        Logger.info(f"Finished reading pdf file {doc_name}")
+      doc_text_list = DataSource.read_pdf(doc_name, doc_filepath)
     elif doc_extension in ["docx", "pptx", "ppt", "pptm"]:
       doc_text_list = []
       docs = SimpleDirectoryReader(
@@ -529,6 +665,88 @@ class DataSource:
 
     return doc_text_list
 
+  @staticmethod
+  def read_pdf(doc_name: str, doc_filepath: str,
+               processes: int = PDF_EXTRACT_PROCESSES,
+               min_pages: int = PDF_EXTRACT_MIN_PAGES,
+               timeout: float = PDF_EXTRACT_TIMEOUT) -> List[str]:
+    """
+    Read the text of each page of a PDF.
+
+    Text is extracted by the process-wide pool of worker processes of
+    utils.pdf_helper, so that a document that takes longer than timeout
+    is stopped.  PDFs with at least min_pages pages are split into page
+    ranges that are extracted in parallel, and the text is reassembled in
+    page order.
+
+    Args:
+      doc_name: name of document
+      doc_filepath: local file path
+      processes: number of worker processes (1 to extract in this process,
+        where the timeout is only checked between pages)
+      min_pages: min number of pages to extract in parallel
+      timeout: max number of seconds to extract the document
+    Returns:
+      list of page text strings
+    Raises:
+      TimeoutError: if the text is not extracted within timeout seconds
+    """
+    with open(doc_filepath, "rb") as f:
+      num_pages = len(PdfReader(f).pages)
+    Logger.info(f"Reading pdf file {doc_name} with {num_pages} pages")
+    deadline = time.monotonic() + timeout
+
+    if processes <= 1:
+      # the deadline is checked between pages
+      try:
+        doc_text_list = extract_pdf_page_range(doc_filepath, 0, num_pages,
+                                               deadline)
+      except TimeoutError as e:
+        raise TimeoutError(
+            f"timed out after {timeout}s reading pdf file {doc_name}") from e
+    else:
+      if num_pages < min_pages:
+        page_ranges = [(0, num_pages)]
+      else:
+        # a few ranges per process, so a slow range doesn't hold up the rest
+        num_ranges = min(num_pages, processes * 2)
+        range_size = -(-num_pages // num_ranges)
+        page_ranges = [(start, min(start + range_size, num_pages))
+                       for start in range(0, num_pages, range_size)]
+      try:
+        doc_text_list = DataSource._read_pdf_page_ranges(
+            doc_name, doc_filepath, page_ranges, processes, deadline, timeout)
+      except BrokenProcessPool:
+        # the pool was terminated by a timeout of another document
+        Logger.warning(f"pdf extraction pool restarted, retrying {doc_name}")
+        doc_text_list = DataSource._read_pdf_page_ranges(
+            doc_name, doc_filepath, page_ranges, processes, deadline, timeout)
+
+    Logger.info(f"Finished reading pdf file {doc_name}")
+    return doc_text_list
+
+  @staticmethod
+  def _read_pdf_page_ranges(doc_name: str, doc_filepath: str,
+                            page_ranges: List[Tuple[int, int]],
+                            processes: int, deadline: float,
+                            timeout: float) -> List[str]:
+    """ extract page ranges in the process pool, in page order """
+    executor = get_pdf_executor(processes)
+    futures = [executor.submit(extract_pdf_page_range,
+                               doc_filepath, start, end, deadline)
+               for start, end in page_ranges]
+    _, not_done = wait(futures,
+                       timeout=max(0, deadline - time.monotonic()))
+    if not_done:
+      # stop the workers, a hung page would otherwise keep running
+      terminate_pdf_executor(executor)
+      raise TimeoutError(
+          f"timed out after {timeout}s reading pdf file {doc_name}")
+    doc_text_list = []
+    for future in futures:
+      doc_text_list.extend(future.result())
+    return doc_text_list
+
   @staticmethod
   def create_pdf_page(page: PageObject, doc_filepath: str,
                        page_index: int) -> List[str]:
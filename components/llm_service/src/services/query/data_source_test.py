@@ -14,10 +14,15 @@
 """
   Unit tests for Data Source
 """
-import services
+import os
 import tempfile
+from unittest import mock
+import pytest
+import services
 
 import services.query.data_source
+from services.query.data_source import DataSource
+from testing.synthetic_pdf import write_synthetic_pdf, page_text
 
 def test_get_file_hash():
   correct_hash = (
@@ -26,3 +31,115 @@ def test_get_file_hash():
     f.write(b"hello world!")
     file_hash = services.query.data_source.get_file_hash(f.name)
     assert file_hash == correct_hash
+
+def test_read_pdf_parallel():
+  with tempfile.TemporaryDirectory() as temp_dir:
+    pdf_path = os.path.join(temp_dir, "test.pdf")
+    write_synthetic_pdf(pdf_path, num_pages=25, lines_per_page=2)
+    sequential = DataSource.read_pdf("test.pdf", pdf_path, processes=1)
+    parallel = DataSource.read_pdf("test.pdf", pdf_path,
+                                   processes=3, min_pages=1)
+    assert len(parallel) == 25
+    assert parallel == sequential
+    for page, text in enumerate(parallel):
+      assert page_text(page, 0) in text
+
+
+def test_read_pdf_timeout():
+  with tempfile.TemporaryDirectory() as temp_dir:
+    pdf_path = os.path.join(temp_dir, "test.pdf")
+    write_synthetic_pdf(pdf_path, num_pages=10)
+    with pytest.raises(TimeoutError):
+      DataSource.read_pdf("test.pdf", pdf_path,
+                          processes=2, min_pages=1, timeout=0)
+    with pytest.raises(TimeoutError):
+      DataSource.read_pdf("test.pdf", pdf_path, processes=1, timeout=0)
+
+    # the pool is replaced after a timeout, and small PDFs are read by a
+    # single worker
+    assert len(DataSource.read_pdf("test.pdf", pdf_path, processes=2,
+                                   min_pages=20)) == 10
+
+
+def test_chunk_pdf_multimodal_page_windows():
+  rendered = []
+
+  def fake_convert_from_path(pdf_path, first_page, last_page,
+                             output_folder, fmt, paths_only):
+    rendered.append((first_page, last_page))
+    assert not os.listdir(output_folder), "previous window not cleaned up"
+    paths = []
+    for page in range(first_page, last_page + 1):
+      path = os.path.join(output_folder, f"page-{page}.{fmt}")
+      with open(path, "wb") as f:
+        f.write(f"png {page}".encode("utf-8"))
+      paths.append(path)
+    return paths
+
+  def fake_upload_to_gcs(storage_client, bucket_name, file_path,
+                         bucket_folder):
+    return f"gs://{bucket_name}/{bucket_folder}/{os.path.basename(file_path)}"
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    pdf_path = os.path.join(temp_dir, "test.pdf")
+    write_synthetic_pdf(pdf_path, num_pages=7, lines_per_page=2)
+    data_source = DataSource(mock.Mock())
+    with mock.patch("services.query.data_source.convert_from_path",
+                    side_effect=fake_convert_from_path), \
+         mock.patch("services.query.data_source.gcs_helper.upload_to_gcs",
+                    side_effect=fake_upload_to_gcs), \
+         mock.patch.object(DataSource, "extract_contextual_text",
+                           side_effect=lambda name, path, url: name):
+      chunks = list(data_source.iter_pdf_multimodal_chunks(
+          "test.pdf", "gs://bucket/test.pdf", pdf_path,
+          "bucket", "folder", page_window=3, upload_workers=2))
+
+    assert rendered == [(1, 3), (4, 6), (7, 7)]
+    assert [chunk["text"] for chunk in chunks] == \
+        [f"{page}test.pdf" for page in range(7)]
+    assert [chunk["image_url"] for chunk in chunks] == \
+        [f"gs://bucket/folder/{page}test.png" for page in range(7)]
+    # page images are read from GCS when embedded, not held by the chunks
+    assert all(chunk["image"] is None for chunk in chunks)
+    # page files are removed after upload
+    assert os.listdir(temp_dir) == ["test.pdf"]
+
+
+class FakeBlob():
+  """ GCS blob that downloads its name as the file contents """
+  def __init__(self, name, generation, md5_hash):
+    self.name = name
+    self.generation = generation
+    self.md5_hash = md5_hash
+    self.path = f"/b/bucket/o/{name}"
+    self.public_url = f"https://storage.googleapis.com/bucket/{name}"
+
+  def download_to_filename(self, file_path):
+    with open(file_path, "w", encoding="utf-8") as f:
+      f.write(self.name)
+
+
+def test_iter_documents_incremental():
+  blobs = [FakeBlob(f"folder{i % 2}/doc{i % 5}.txt", i, f"md5-{i}")
+           for i in range(10)]
+  storage_client = mock.Mock()
+  storage_client.list_blobs.return_value = blobs
+  known_versions = {
+    blobs[0].public_url: (0, "md5-0"),
+    blobs[1].public_url: (1, "changed"),
+  }
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    data_source = DataSource(storage_client)
+    docs = list(data_source.iter_documents("gs://bucket", temp_dir,
+                                           known_versions, max_workers=3))
+    assert [doc.doc_name for doc in docs] == \
+        [blob.name for blob in blobs[1:]]
+    assert data_source.docs_unchanged == [blobs[0].public_url]
+    assert len({doc.local_path for doc in docs}) == len(docs)
+    for doc, blob in zip(docs, blobs[1:]):
+      assert (doc.generation, doc.md5_hash) == (blob.generation,
+                                                blob.md5_hash)
+      assert doc.gcs_path == f"gs://bucket/o/{blob.name}"
+      with open(doc.local_path, "r", encoding="utf-8") as f:
+        assert f.read() == blob.name
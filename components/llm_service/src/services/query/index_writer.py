@@ -0,0 +1,91 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Streaming writer of Matching Engine index data files.
+
+Embeddings are written as JSON lines with numeric values, and uploaded to
+GCS with a resumable upload as they are written, so memory use doesn't
+depend on the size of the file.
+"""
+from functools import lru_cache
+from typing import BinaryIO, Sequence
+import numpy as np
+
+# size of the chunks of a resumable upload, a multiple of 256 KiB
+INDEX_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# format of embedding values.  Matching Engine stores embeddings as float32,
+# and 9 significant decimal digits are enough for any float32 value to be
+# read back exactly.
+EMBEDDING_VALUE_FORMAT = "%.9g"
+
+
+@lru_cache(maxsize=8)
+def index_record_format(dimensions: int) -> str:
+  """ % format of an index data record with an embedding of dimensions """
+  values_format = ",".join([EMBEDDING_VALUE_FORMAT] * dimensions)
+  return '{"id":"%d","embedding":[' + values_format + "]}\n"
+
+
+class IndexDataWriter():
+  """
+  Write embeddings to a Matching Engine index data file in the JSON lines
+  format, one {"id": "<index>", "embedding": [<values>]} record per line.
+  """
+
+  def __init__(self, fileobj: BinaryIO):
+    """
+    Args:
+      fileobj: binary file to write to, e.g. returned by open_index_blob
+    """
+    self.fileobj = fileobj
+    self.num_records = 0
+
+  def write(self, ids: Sequence[int],
+            embeddings: Sequence[Sequence[float]]) -> int:
+    """
+    Write a record for each id and embedding.
+
+    Returns:
+      number of records written
+    Raises:
+      ValueError if an embedding has a nan or infinite value, which are
+        not valid JSON
+    """
+    is_finite = np.isfinite(np.asarray(embeddings, dtype=float)).all(axis=-1)
+    if not is_finite.all():
+      bad_ids = [idx for idx, finite in zip(ids, is_finite) if not finite]
+      raise ValueError(f"non-finite embedding values for ids {bad_ids}")
+    records = "".join([
+      index_record_format(len(embedding)) % (idx, *embedding)
+      for idx, embedding in zip(ids, embeddings)
+    ])
+    self.fileobj.write(records.encode("utf-8"))
+    num_records = min(len(ids), len(embeddings))
+    self.num_records += num_records
+    return num_records
+
+
+def open_index_blob(bucket, blob_name: str,
+                    chunk_size: int = INDEX_UPLOAD_CHUNK_SIZE) -> BinaryIO:
+  """
+  Open a GCS blob for writing with a resumable upload.  Data is uploaded
+  in chunks of chunk_size bytes as it is written, and the blob is created
+  when the file is closed.
+  """
+  return bucket.blob(blob_name).open("wb",
+                                     chunk_size=chunk_size,
+                                     ignore_flush=True,
+                                     content_type="application/json")
@@ -0,0 +1,66 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+  Unit tests for Matching Engine index data writer
+"""
+import io
+import json
+from unittest import mock
+import numpy as np
+import pytest
+from services.query.index_writer import (IndexDataWriter, open_index_blob,
+                                         INDEX_UPLOAD_CHUNK_SIZE)
+
+
+def test_index_data_writer():
+  rng = np.random.default_rng(0)
+  embeddings = rng.standard_normal((3, 16)).astype(np.float32).tolist()
+  fileobj = io.BytesIO()
+  writer = IndexDataWriter(fileobj)
+
+  assert writer.write(np.arange(10, 12), embeddings[:2]) == 2
+  assert writer.write([12], embeddings[2:]) == 1
+  assert writer.num_records == 3
+
+  records = [json.loads(line)
+             for line in fileobj.getvalue().decode("utf-8").splitlines()]
+  assert [record["id"] for record in records] == ["10", "11", "12"]
+  for record, embedding in zip(records, embeddings):
+    assert all(isinstance(value, float) for value in record["embedding"])
+    # float32 values are written without loss of precision
+    assert np.array_equal(np.float32(record["embedding"]),
+                          np.float32(embedding))
+
+
+def test_index_data_writer_non_finite():
+  fileobj = io.BytesIO()
+  writer = IndexDataWriter(fileobj)
+
+  with pytest.raises(ValueError, match=r"\[11\]"):
+    writer.write([10, 11], [[0.5, 1.0], [np.nan, 1.0]])
+  with pytest.raises(ValueError):
+    writer.write([12], [[np.inf, 1.0]])
+  assert writer.num_records == 0
+  assert fileobj.getvalue() == b""
+
+
+def test_open_index_blob():
+  bucket = mock.Mock()
+  index_file = open_index_blob(bucket, "doc_0_index.json")
+
+  bucket.blob.assert_called_once_with("doc_0_index.json")
+  bucket.blob.return_value.open.assert_called_once_with(
+      "wb", chunk_size=INDEX_UPLOAD_CHUNK_SIZE, ignore_flush=True,
+      content_type="application/json")
+  assert index_file == bucket.blob.return_value.open.return_value
@@ -0,0 +1,365 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Embedding index kept in local files.
+
+An index is a directory holding append-only files:
+  embeddings.f32: normalized float32 embeddings, one row per embedding,
+    memory-mapped for search
+  metadata.jsonl: metadata dict of each row
+  ids.i64: int64 index of each row.  Rows are committed by appending to
+    this file, so rows after the last id are discarded.
+  deleted.i64: int64 indexes of deleted rows
+
+Searches are brute-force dot products over the memory-mapped rows, or use
+an in-memory HNSW index of the rows when hnswlib is installed and the index
+has at least hnsw_min_size rows.
+"""
+import json
+import os
+import shutil
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+from common.utils.logging_handler import Logger
+
+try:
+  import hnswlib
+except ImportError:
+  hnswlib = None
+
+Logger = Logger.get_logger(__file__)
+
+EMBEDDINGS_FILE = "embeddings.f32"
+METADATA_FILE = "metadata.jsonl"
+IDS_FILE = "ids.i64"
+DELETED_FILE = "deleted.i64"
+INDEX_CONFIG_FILE = "index.json"
+
+# HNSW index build and search parameters
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_MIN_EF = 64
+
+MetadataFilter = Callable[[dict], bool]
+
+
+COMPARISONS = {
+  "<": lambda value, operand: value < operand,
+  "<=": lambda value, operand: value <= operand,
+  ">": lambda value, operand: value > operand,
+  ">=": lambda value, operand: value >= operand,
+  "=": lambda value, operand: value == operand,
+}
+
+# operators of langchain metadata filters, e.g. {"year": {"$gte": 2020}}
+LANGCHAIN_COMPARISONS = {
+  "$lt": "<",
+  "$lte": "<=",
+  "$gt": ">",
+  "$gte": ">=",
+}
+
+
+def match_metadata_filter(filter_dict: dict, metadata: dict) -> bool:
+  """
+  Match metadata against a filter dict, as returned by
+  VectorStore.translate_filter, or a filter dict of a query, with
+  langchain operators (e.g. {"$gte": 2020}) and the "contains" operator
+  of authorization filters
+  """
+  for key, condition in filter_dict.items():
+    if key in ("AND", "$and"):
+      matched = all(match_metadata_filter(clause, metadata)
+                    for clause in condition)
+    elif key in ("OR", "$or"):
+      matched = any(match_metadata_filter(clause, metadata)
+                    for clause in condition)
+    elif key == "NOT":
+      matched = not match_metadata_filter(condition, metadata)
+    elif not isinstance(condition, dict):
+      # {field: value} is an equality filter
+      matched = key in metadata and _match_condition(metadata[key], "$eq",
+                                                     condition)
+    else:
+      matched = key in metadata and all(
+          _match_condition(metadata[key], operator, operand)
+          for operator, operand in condition.items())
+    if not matched:
+      return False
+  return True
+
+
+def _match_condition(value, operator: str, operand) -> bool:
+  # list fields match if any of their values matches
+  values = value if isinstance(value, list) else [value]
+  if operator == "IN":
+    # text fields match if any of their values is in the literals
+    return any(str(v) in operand for v in values)
+  if operator == "contains":
+    return any(str(v) == str(operand) for v in values)
+  if operator == "$eq":
+    return any(v == operand for v in values)
+  if operator == "$ne":
+    return all(v != operand for v in values)
+  if operator == "$in":
+    return any(v in operand for v in values)
+  if operator == "$nin":
+    return all(v not in operand for v in values)
+  operator = LANGCHAIN_COMPARISONS.get(operator, operator)
+  try:
+    return COMPARISONS[operator](float(value), float(operand))
+  except (KeyError, TypeError, ValueError):
+    return False
+
+
+class LocalEmbeddingIndex():
+  """
+  Embedding index in a local directory, searched by cosine similarity.
+  Appends and deletes are visible to searches in the same process right
+  away, and to other processes on their next search.
+  """
+
+  def __init__(self, path: str, hnsw_min_size: Optional[int] = None):
+    """
+    Args:
+      path: directory of the index files
+      hnsw_min_size: min number of rows searched with an HNSW index, None
+        to always search by brute force
+    """
+    self.path = path
+    self.hnsw_min_size = hnsw_min_size
+    self.dimensions = None
+    self._lock = threading.Lock()
+    self._loaded_size = -1
+    self._deleted_size = -1
+    self._embeddings = np.zeros((0, 0), dtype=np.float32)
+    self._ids = np.zeros(0, dtype=np.int64)
+    self._live = np.zeros(0, dtype=bool)
+    self._metadata = None
+    self._hnsw = None
+    self._hnsw_size = 0
+
+  def _file(self, name: str) -> str:
+    return os.path.join(self.path, name)
+
+  @property
+  def size(self) -> int:
+    """ number of rows, including deleted rows """
+    with self._lock:
+      self._load()
+      return len(self._ids)
+
+  def append(self, ids: Sequence[int],
+             embeddings: Sequence[Sequence[float]],
+             metadata: Optional[List[dict]] = None):
+    """ add embeddings with their indexes and (optional) metadata dicts """
+    rows = np.asarray(embeddings, dtype=np.float32)
+    if len(rows) == 0:
+      return
+    if rows.ndim != 2 or len(rows) != len(ids):
+      raise ValueError(f"expected {len(ids)} embeddings, got {rows.shape}")
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    rows = rows / np.where(norms == 0, 1, norms)
+    metadata = metadata or [None] * len(rows)
+
+    with self._lock:
+      os.makedirs(self.path, exist_ok=True)
+      self._init_dimensions(rows.shape[1])
+      self._discard_uncommitted_rows()
+      with open(self._file(EMBEDDINGS_FILE), "ab") as f:
+        f.write(rows.tobytes())
+      with open(self._file(METADATA_FILE), "a", encoding="utf-8") as f:
+        f.writelines(json.dumps(row_metadata or {}) + "\n"
+                     for row_metadata in metadata)
+      with open(self._file(IDS_FILE), "ab") as f:
+        f.write(np.asarray(ids, dtype=np.int64).tobytes())
+
+  def delete(self, ids: Sequence[int]):
+    """ delete the rows with the given indexes """
+    if len(ids) == 0:
+      return
+    with self._lock:
+      os.makedirs(self.path, exist_ok=True)
+      with open(self._file(DELETED_FILE), "ab") as f:
+        f.write(np.asarray(ids, dtype=np.int64).tobytes())
+
+  def clear(self):
+    """ delete all index files """
+    with self._lock:
+      shutil.rmtree(self.path, ignore_errors=True)
+      self.dimensions = None
+      self._loaded_size = -1
+      self._deleted_size = -1
+      self._hnsw = None
+      self._hnsw_size = 0
+
+  def search(self, query_embedding: Sequence[float], k: int,
+             metadata_filter: Optional[MetadataFilter] = None) -> List[int]:
+    """
+    Returns:
+      indexes of the (at most) k rows most similar to query_embedding,
+      most similar first, optionally limited to rows whose metadata
+      matches metadata_filter
+    """
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm > 0:
+      query = query / norm
+
+    with self._lock:
+      self._load()
+      if len(self._ids) == 0 or k <= 0:
+        return []
+      if len(query) != self.dimensions:
+        raise ValueError(f"expected a query embedding of {self.dimensions} "
+                         f"dimensions, got {len(query)}")
+
+      live = self._live
+      if metadata_filter is not None:
+        live = live & np.fromiter(
+            (metadata_filter(row_metadata)
+             for row_metadata in self._load_metadata()),
+            dtype=bool, count=len(self._ids))
+      elif self._use_hnsw():
+        return self._hnsw_search(query, k)
+
+      scores = np.asarray(self._embeddings @ query)
+      scores[~live] = -np.inf
+      k = min(k, int(live.sum()))
+      if k == 0:
+        return []
+      rows = np.argpartition(-scores, k - 1)[:k]
+      rows = rows[np.argsort(-scores[rows])]
+      return self._ids[rows].tolist()
+
+  def _init_dimensions(self, dimensions: int):
+    config_path = self._file(INDEX_CONFIG_FILE)
+    if self.dimensions is None and os.path.exists(config_path):
+      with open(config_path, "r", encoding="utf-8") as f:
+        self.dimensions = json.load(f)["dimensions"]
+    if self.dimensions is None:
+      with open(config_path, "w", encoding="utf-8") as f:
+        json.dump({"dimensions": dimensions}, f)
+      self.dimensions = dimensions
+    elif self.dimensions != dimensions:
+      raise ValueError(f"expected embeddings of {self.dimensions} "
+                       f"dimensions, got {dimensions}")
+
+  def _discard_uncommitted_rows(self):
+    """ truncate rows written after the last committed id """
+    num_rows = self._file_size(IDS_FILE) // 8
+    embeddings_size = num_rows * self.dimensions * 4
+    if self._file_size(EMBEDDINGS_FILE) == embeddings_size:
+      return
+    Logger.warning(f"discarding uncommitted rows of index {self.path}")
+    with open(self._file(EMBEDDINGS_FILE), "ab") as f:
+      f.truncate(embeddings_size)
+    lines = []
+    if os.path.exists(self._file(METADATA_FILE)):
+      with open(self._file(METADATA_FILE), "r", encoding="utf-8") as f:
+        lines = [f.readline() for _ in range(num_rows)]
+    with open(self._file(METADATA_FILE), "w", encoding="utf-8") as f:
+      f.writelines(lines)
+
+  def _file_size(self, name: str) -> int:
+    try:
+      return os.path.getsize(self._file(name))
+    except FileNotFoundError:
+      return 0
+
+  def _load(self):
+    """ map the committed rows, if they changed since the last load """
+    ids_size = self._file_size(IDS_FILE)
+    deleted_size = self._file_size(DELETED_FILE)
+    if ids_size == self._loaded_size and deleted_size == self._deleted_size:
+      return
+
+    if ids_size != self._loaded_size:
+      num_rows = ids_size // 8
+      if num_rows == 0:
+        self._embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+      else:
+        if self.dimensions is None:
+          with open(self._file(INDEX_CONFIG_FILE), "r", encoding="utf-8") as f:
+            self.dimensions = json.load(f)["dimensions"]
+        self._embeddings = np.memmap(self._file(EMBEDDINGS_FILE),
+                                     dtype=np.float32, mode="r",
+                                     shape=(num_rows, self.dimensions))
+        self._ids = np.fromfile(self._file(IDS_FILE), dtype=np.int64,
+                                count=num_rows)
+      self._metadata = None
+      if num_rows < self._hnsw_size:
+        self._hnsw = None
+        self._hnsw_size = 0
+
+    deleted = np.zeros(0, dtype=np.int64)
+    if deleted_size > 0:
+      deleted = np.fromfile(self._file(DELETED_FILE), dtype=np.int64)
+    self._live = ~np.isin(self._ids, deleted)
+    self._loaded_size = ids_size
+    self._deleted_size = deleted_size
+
+  def _load_metadata(self) -> List[dict]:
+    if self._metadata is None:
+      with open(self._file(METADATA_FILE), "r", encoding="utf-8") as f:
+        self._metadata = [json.loads(f.readline())
+                          for _ in range(len(self._ids))]
+    return self._metadata
+
+  def _use_hnsw(self) -> bool:
+    # deleted rows are skipped in HNSW results, so the index is only
+    # used while they are a small fraction of the rows
+    return (hnswlib is not None and self.hnsw_min_size is not None
+            and len(self._ids) >= self.hnsw_min_size
+            and (~self._live).sum() * 10 < len(self._ids))
+
+  def _hnsw_search(self, query: np.ndarray, k: int) -> List[int]:
+    num_rows = len(self._ids)
+    if self._hnsw is None:
+      self._hnsw = hnswlib.Index(space="ip", dim=self.dimensions)
+      self._hnsw.init_index(max_elements=num_rows, M=HNSW_M,
+                            ef_construction=HNSW_EF_CONSTRUCTION)
+    if num_rows > self._hnsw_size:
+      # add rows appended since the last search
+      self._hnsw.resize_index(num_rows)
+      self._hnsw.add_items(self._embeddings[self._hnsw_size:],
+                           np.arange(self._hnsw_size, num_rows))
+      self._hnsw_size = num_rows
+
+    num_deleted = int((~self._live).sum())
+    num_neighbors = min(k + num_deleted, num_rows)
+    self._hnsw.set_ef(max(HNSW_MIN_EF, num_neighbors))
+    rows, _ = self._hnsw.knn_query(query, k=num_neighbors)
+    rows = [row for row in rows[0] if self._live[row]][:k]
+    return self._ids[rows].tolist()
+
+
+_local_indexes: Dict[str, LocalEmbeddingIndex] = {}
+_local_indexes_lock = threading.Lock()
+
+
+def get_local_index(path: str,
+                    hnsw_min_size: Optional[int] = None) -> LocalEmbeddingIndex:
+  """
+  Return the process-wide index of path, so that the rows mapped by one
+  search are reused by the next.
+  """
+  with _local_indexes_lock:
+    index = _local_indexes.get(path)
+    if index is None or index.hnsw_min_size != hnsw_min_size:
+      index = _local_indexes[path] = LocalEmbeddingIndex(path, hnsw_min_size)
+    return index
@@ -0,0 +1,131 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+  Unit tests for the local embedding index
+"""
+import os
+import numpy as np
+import pytest
+from services.query.local_index import (LocalEmbeddingIndex,
+                                        match_metadata_filter,
+                                        EMBEDDINGS_FILE, METADATA_FILE)
+
+DIMENSIONS = 8
+
+
+@pytest.fixture
+def embeddings():
+  rng = np.random.default_rng(0)
+  return rng.standard_normal((20, DIMENSIONS))
+
+
+def test_search(tmp_path, embeddings):
+  index = LocalEmbeddingIndex(str(tmp_path))
+  index.append(range(100, 110), embeddings[:10])
+
+  assert index.search(embeddings[3], 1) == [103]
+  assert index.search(embeddings[3] * 5, 3)[0] == 103
+  assert len(index.search(embeddings[3], 20)) == 10
+
+  # appends are searched incrementally, and by other index instances
+  index.append(range(110, 120), embeddings[10:])
+  assert index.search(embeddings[15], 1) == [115]
+  other_index = LocalEmbeddingIndex(str(tmp_path))
+  assert other_index.size == 20
+  assert other_index.search(embeddings[15], 1) == [115]
+
+  # deleted rows are not returned
+  index.delete([115])
+  results = other_index.search(embeddings[15], 20)
+  assert len(results) == 19 and 115 not in results
+
+  index.clear()
+  assert index.search(embeddings[15], 1) == []
+
+
+def test_search_metadata_filter(tmp_path, embeddings):
+  index = LocalEmbeddingIndex(str(tmp_path))
+  metadata = [{"year": 2000 + i, "color": ["red", "blue"][i % 2]}
+              for i in range(10)]
+  index.append(range(10), embeddings[:10], metadata)
+
+  filter_dict = {"AND": [{"year": {">=": 2004.0}},
+                         {"color": {"IN": ["red"]}}]}
+  results = index.search(embeddings[1], 10,
+                         lambda m: match_metadata_filter(filter_dict, m))
+  assert sorted(results) == [4, 6, 8]
+
+
+def test_discard_uncommitted_rows(tmp_path, embeddings):
+  index = LocalEmbeddingIndex(str(tmp_path))
+  index.append(range(5), embeddings[:5], [{"n": i} for i in range(5)])
+
+  # rows written without their ids, e.g. by an interrupted append
+  with open(os.path.join(tmp_path, EMBEDDINGS_FILE), "ab") as f:
+    f.write(np.ones((2, DIMENSIONS), dtype=np.float32).tobytes())
+  with open(os.path.join(tmp_path, METADATA_FILE), "a", encoding="utf-8") as f:
+    f.write("{}\n{}\n")
+
+  index.append(range(5, 10), embeddings[5:10], [{"n": i} for i in range(5, 10)])
+  assert index.search(embeddings[7], 1) == [7]
+  results = index.search(embeddings[7], 10,
+                         lambda m: m["n"] == 7)
+  assert results == [7]
+
+
+def test_match_metadata_filter():
+  metadata = {"year": 2020, "tags": ["a", "b"], "title": "x"}
+  assert match_metadata_filter({"year": {"<": 2021.0}}, metadata)
+  assert not match_metadata_filter({"year": {">": 2021.0}}, metadata)
+  assert match_metadata_filter({"tags": {"IN": ["b", "c"]}}, metadata)
+  assert not match_metadata_filter({"title": {"IN": ["y"]}}, metadata)
+  assert match_metadata_filter(
+      {"OR": [{"title": {"IN": ["y"]}}, {"NOT": {"year": {"=": 2019.0}}}]},
+      metadata)
+  assert not match_metadata_filter({"missing": {"=": 1.0}}, metadata)
+  assert not match_metadata_filter({"title": {"<": 1.0}}, metadata)
+
+
+def test_match_metadata_filter_query_operators():
+  # filters of queries: authorization filters and langchain operators
+  metadata = {"year": 2020, "authz": ["admin", "staff"], "title": "x"}
+  assert match_metadata_filter({"authz": {"contains": "admin"}}, metadata)
+  assert not match_metadata_filter({"authz": {"contains": "guest"}},
+                                   metadata)
+  assert match_metadata_filter({"year": {"$gte": 2020, "$lt": 2021}},
+                               metadata)
+  assert not match_metadata_filter({"year": {"$gt": 2020}}, metadata)
+  assert match_metadata_filter({"title": {"$eq": "x"}}, metadata)
+  assert match_metadata_filter({"title": "x"}, metadata)
+  assert not match_metadata_filter({"title": {"$ne": "x"}}, metadata)
+  assert match_metadata_filter({"authz": {"$in": ["staff", "guest"]}},
+                               metadata)
+  assert not match_metadata_filter({"title": {"$nin": ["x"]}}, metadata)
+  assert match_metadata_filter(
+      {"$or": [{"title": "y"}, {"authz": {"contains": "staff"}}]}, metadata)
+  assert not match_metadata_filter(
+      {"$and": [{"title": "x"}, {"year": {"$lt": 2000}}]}, metadata)
+
+
+def test_hnsw_search_after_clear(tmp_path, embeddings):
+  pytest.importorskip("hnswlib")
+  index = LocalEmbeddingIndex(str(tmp_path), hnsw_min_size=5)
+  index.append(range(10), embeddings[:10])
+  assert index.search(embeddings[3], 1) == [3]
+
+  # rows appended after a clear replace the rows in the HNSW index
+  index.clear()
+  index.append(range(100, 110), embeddings[10:])
+  assert index.search(embeddings[13], 1) == [103]
+  assert index.search(embeddings[3], 1) != [3]
@@ -0,0 +1,160 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Bounded, concurrent async pipeline used for document ingestion
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+from common.utils.logging_handler import Logger
+from metrics import INGESTION_STAGE_ITEMS, INGESTION_STAGE_LATENCY
+
+Logger = Logger.get_logger(__file__)
+
+# marks the end of the items in a stage queue
+_END_OF_STAGE = object()
+
+# seconds between checks for a stopped pipeline while the source is blocked
+# on a full queue
+_SOURCE_POLL_INTERVAL = 1
+
+
+class PipelineStage():
+  """
+  A pipeline stage, run by a number of concurrent workers.
+
+  func is called with each item from the previous stage and returns the
+  item to pass on to the next stage, or None to drop the item.  Exceptions
+  raised by func stop the whole pipeline, so expected per item failures
+  should be handled in func.
+  """
+  def __init__(self,
+               name: str,
+               func: Callable[[Any], Awaitable[Optional[Any]]],
+               workers: int = 1):
+    self.name = name
+    self.func = func
+    self.workers = max(1, workers)
+    self.num_items = 0
+    self.busy_time = 0.0
+
+
+async def run_pipeline(name: str,
+                       source: Iterable,
+                       stages: List[PipelineStage],
+                       queue_size: int = 1) -> List[Any]:
+  """
+  Run items from source through stages.
+
+  The stages are connected by queues holding at most queue_size items, so a
+  slow stage applies backpressure to the stages before it, and to the
+  source.  The source is iterated in a worker thread, as producing items
+  may block (e.g. downloading files).
+
+  Args:
+    name: pipeline name used in logs and metrics
+    source: iterable of items for the first stage
+    stages: list of PipelineStage
+    queue_size: max number of items waiting for each stage
+  Returns:
+    list of items returned by the last stage
+  """
+  loop = asyncio.get_running_loop()
+  stopped = threading.Event()
+  queues = [asyncio.Queue(maxsize=max(1, queue_size)) for _ in stages]
+  results = []
+  num_source_items = 0
+
+  def produce():
+    nonlocal num_source_items
+    for item in source:
+      future = asyncio.run_coroutine_threadsafe(queues[0].put(item), loop)
+      while True:
+        try:
+          future.result(timeout=_SOURCE_POLL_INTERVAL)
+          break
+        except concurrent.futures.TimeoutError:
+          if stopped.is_set():
+            future.cancel()
+            return
+      num_source_items += 1
+
+  async def end_stage(stage_index: int):
+    for _ in range(stages[stage_index].workers):
+      await queues[stage_index].put(_END_OF_STAGE)
+
+  async def run_source():
+    await asyncio.to_thread(produce)
+    await end_stage(0)
+
+  async def run_worker(stage_index: int):
+    stage = stages[stage_index]
+    while True:
+      item = await queues[stage_index].get()
+      if item is _END_OF_STAGE:
+        return
+      start_time = time.time()
+      status = "success"
+      output = None
+      try:
+        output = await stage.func(item)
+      except Exception:
+        status = "error"
+        raise
+      finally:
+        latency = time.time() - start_time
+        stage.busy_time += latency
+        INGESTION_STAGE_LATENCY.labels(
+            pipeline=name, stage=stage.name).observe(latency)
+        if status == "success" and output is None:
+          status = "dropped"
+        INGESTION_STAGE_ITEMS.labels(
+            pipeline=name, stage=stage.name, status=status).inc()
+      stage.num_items += 1
+      if output is None:
+        continue
+      if stage_index + 1 < len(stages):
+        await queues[stage_index + 1].put(output)
+      else:
+        results.append(output)
+
+  async def run_stage(stage_index: int):
+    await asyncio.gather(*[run_worker(stage_index)
+                           for _ in range(stages[stage_index].workers)])
+    if stage_index + 1 < len(stages):
+      await end_stage(stage_index + 1)
+
+  start_time = time.time()
+  tasks = [asyncio.ensure_future(run_source())]
+  tasks += [asyncio.ensure_future(run_stage(i)) for i in range(len(stages))]
+  try:
+    await asyncio.gather(*tasks)
+  except BaseException:
+    stopped.set()
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    raise
+
+  elapsed = time.time() - start_time
+  Logger.info(f"pipeline [{name}] processed {num_source_items} items in "
+              f"{elapsed:.1f}s")
+  for stage in stages:
+    Logger.info(f"pipeline [{name}] stage [{stage.name}] "
+                f"items={stage.num_items} busy_time={stage.busy_time:.1f}s "
+                f"workers={stage.workers} "
+                f"throughput={stage.num_items / max(elapsed, 1e-6):.2f}/s")
+  return results
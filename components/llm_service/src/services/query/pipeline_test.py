@@ -0,0 +1,73 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Unit tests for the ingestion pipeline
+"""
+import asyncio
+import pytest
+from services.query.pipeline import PipelineStage, run_pipeline
+
+
+@pytest.mark.asyncio
+async def test_run_pipeline():
+  async def double(item):
+    await asyncio.sleep(0.01)
+    return item * 2
+
+  async def drop_odd(item):
+    return item if item % 4 == 0 else None
+
+  stages = [PipelineStage("double", double, workers=3),
+            PipelineStage("drop_odd", drop_odd)]
+  results = await run_pipeline("test", range(10), stages, queue_size=2)
+  assert sorted(results) == [0, 4, 8, 12, 16]
+  assert stages[0].num_items == 10
+  assert stages[1].num_items == 10
+
+
+@pytest.mark.asyncio
+async def test_run_pipeline_backpressure():
+  # the source is not consumed ahead of a slow stage by more than the
+  # queue sizes and the items held by workers
+  produced = []
+  max_in_flight = 0
+
+  def source():
+    for i in range(20):
+      produced.append(i)
+      yield i
+
+  async def slow(item):
+    nonlocal max_in_flight
+    max_in_flight = max(max_in_flight, len(produced) - item)
+    await asyncio.sleep(0.01)
+    return item
+
+  stages = [PipelineStage("slow", slow)]
+  results = await run_pipeline("test", source(), stages, queue_size=2)
+  assert sorted(results) == list(range(20))
+  assert max_in_flight <= 4
+
+
+@pytest.mark.asyncio
+async def test_run_pipeline_error():
+  async def fail(item):
+    if item == 3:
+      raise RuntimeError("stage error")
+    return item
+
+  stages = [PipelineStage("fail", fail, workers=2)]
+  with pytest.raises(RuntimeError):
+    await run_pipeline("test", range(100), stages, queue_size=1)
@@ -15,15 +15,15 @@
 Query Engine Service
 """
 from copy import deepcopy
+import asyncio
 import tempfile
+import time
 import traceback
 import os
 import json
 import re
-from numpy.linalg import norm
 import numpy as np
-import pandas as pd
-from typing import List, Optional, Tuple, Dict
+from typing import Any, AsyncGenerator, List, Optional, Tuple, Dict
 from google.cloud import storage
 from rerankers import Reranker
 from common.utils.logging_handler import Logger
@@ -49,8 +49,11 @@ from services.query.query_prompts import (get_question_prompt,
 from services.query.vector_store import (VectorStore,
                                          MatchingEngineVectorStore,
                                          PostgresVectorStore,
+                                         LocalVectorStore,
                                          NUM_MATCH_RESULTS)
-from services.query.data_source import DataSource, DataSourceFile
+from services.query.data_source import (DataSource, DataSourceFile,
+                                        get_file_hash)
+from services.query.pipeline import PipelineStage, run_pipeline
 from services.query.web_datasource import WebDataSource
 from services.query.web_datasource_job import WebDataSourceJob
 from services.query.sharepoint_datasource import SharePointDataSource
@@ -61,15 +64,20 @@ from utils.errors import (NoDocumentsIndexedException,
                           ContextWindowExceededException)
 from utils.file_helper import validate_multimodal_file_type
 from utils import text_helper
+from metrics import (INTEGRATED_SEARCH_CHILD_COUNT,
+                     INTEGRATED_SEARCH_CHILD_LATENCY)
 from config import (PROJECT_ID, DEFAULT_QUERY_CHAT_MODEL,
                     DEFAULT_MULTIMODAL_LLM_TYPE,
                     DEFAULT_QUERY_EMBEDDING_MODEL,
                     DEFAULT_QUERY_MULTIMODAL_EMBEDDING_MODEL,
                     DEFAULT_WEB_DEPTH_LIMIT, get_model_config,
-                    MODALITY_SET)
+                    MODALITY_SET, INTEGRATED_SEARCH_CHILD_TIMEOUT,
+                    INGESTION_QUEUE_SIZE, INGESTION_CHUNK_WORKERS,
+                    INGESTION_INDEX_WORKERS, INGESTION_SAVE_WORKERS)
 from config.vector_store_config import (DEFAULT_VECTOR_STORE,
                                         VECTOR_STORE_LANGCHAIN_PGVECTOR,
-                                        VECTOR_STORE_MATCHING_ENGINE)
+                                        VECTOR_STORE_MATCHING_ENGINE,
+                                        VECTOR_STORE_LOCAL)
 
 # pylint: disable=broad-exception-caught,ungrouped-imports
 
@@ -77,9 +85,15 @@ Logger = Logger.get_logger(__file__)
 
 VECTOR_STORES = {
   VECTOR_STORE_MATCHING_ENGINE: MatchingEngineVectorStore,
-  VECTOR_STORE_LANGCHAIN_PGVECTOR: PostgresVectorStore
+  VECTOR_STORE_LANGCHAIN_PGVECTOR: PostgresVectorStore,
+  VECTOR_STORE_LOCAL: LocalVectorStore
 }
 
+# query engine build modes: build a new engine, or update the documents
+# of an existing engine
+QE_BUILD_MODE_CREATE = "create"
+QE_BUILD_MODE_UPDATE = "update"
+
 RERANK_MODEL_NAME = "colbert"
 reranker = Reranker(RERANK_MODEL_NAME, verbose=0)
 
@@ -88,6 +102,11 @@ MIN_QUERY_REFERENCES = 2
 # total number of references to return from integrated search
 NUM_INTEGRATED_QUERY_REFERENCES = 6
 
+# events yielded by query_generate_stream
+QUERY_STREAM_REFERENCES = "references"
+QUERY_STREAM_TOKEN = "token"
+QUERY_STREAM_RESULT = "result"
+
 
 async def query_generate(
             user_id: str,
@@ -130,6 +149,124 @@ async def query_generate(
               f"prompt=[{prompt}], q_engine=[{q_engine.name}], "
               f"user_query=[{user_query}]")
 
+  llm_type, query_filter = get_query_generate_params(
+      q_engine, user_data, llm_type, query_filter)
+
+  query_references = await retrieve_ranked_references(prompt,
+                                                      q_engine,
+                                                      user_id,
+                                                      user_query,
+                                                      rank_sentences,
+                                                      query_filter)
+
+  # generate question prompt
+  # (from user's text prompt plus text info in query_references)
+  question_prompt, query_references = \
+      await generate_question_prompt(prompt,
+                                     llm_type,
+                                     query_references,
+                                     user_query)
+
+  # generate list of URLs for additional context
+  # (from non-text info in query_references)
+  context_files = get_reference_context_files(query_references)
+
+  # send prompt and additional context to model
+  question_response = await llm_chat(question_prompt, llm_type,
+                                     chat_files=context_files)
+
+  query_result = save_query_result(prompt, question_response, q_engine,
+                                   query_references, user_query)
+
+  return query_result, query_references
+
+
+async def query_generate_stream(
+            user_id: str,
+            prompt: str,
+            q_engine: QueryEngine,
+            user_data: Optional[dict] = None,
+            llm_type: Optional[str] = None,
+            user_query: Optional[UserQuery] = None,
+            rank_sentences=False,
+            query_filter: Optional[dict]=None) -> \
+                AsyncGenerator[Tuple[str, Any], None]:
+  """
+  Execute a query over a query engine and stream the generated response.
+
+  This is the streaming version of query_generate.  It yields a sequence
+  of (event, data) tuples:
+    (QUERY_STREAM_REFERENCES, list of QueryReference objects), once the
+      references that fit in the question prompt are known, before the
+      first token
+    (QUERY_STREAM_TOKEN, str) for each chunk of the generated response
+    (QUERY_STREAM_RESULT, (QueryResult, list of QueryReference objects)),
+      once the response is complete and the QueryResult is saved
+
+  Args: see query_generate
+
+  Raises:
+    ResourceNotFoundException if the named query engine doesn't exist
+  """
+  Logger.info(f"Executing streaming query: "
+              f"llm_type=[{llm_type}], "
+              f"user_id=[{user_id}], "
+              f"prompt=[{prompt}], q_engine=[{q_engine.name}], "
+              f"user_query=[{user_query}]")
+
+  llm_type, query_filter = get_query_generate_params(
+      q_engine, user_data, llm_type, query_filter)
+
+  query_references = await retrieve_ranked_references(prompt,
+                                                      q_engine,
+                                                      user_id,
+                                                      user_query,
+                                                      rank_sentences,
+                                                      query_filter)
+
+  # the prompt may drop references that don't fit the model context, so
+  # the references are sent once the prompt is built
+  question_prompt, query_references = \
+      await generate_question_prompt(prompt,
+                                     llm_type,
+                                     query_references,
+                                     user_query)
+  yield QUERY_STREAM_REFERENCES, query_references
+  context_files = get_reference_context_files(query_references)
+
+  # models without streaming support return the full response as a string
+  response = await llm_chat(question_prompt, llm_type,
+                            chat_files=context_files,
+                            stream=True)
+  if isinstance(response, str):
+    response_chunks = [response]
+    yield QUERY_STREAM_TOKEN, response
+  else:
+    response_chunks = []
+    async for chunk in response:
+      if isinstance(chunk, str):
+        response_chunks.append(chunk)
+        yield QUERY_STREAM_TOKEN, chunk
+
+  question_response = "".join(response_chunks)
+  query_result = save_query_result(prompt, question_response, q_engine,
+                                   query_references, user_query)
+
+  yield QUERY_STREAM_RESULT, (query_result, query_references)
+
+
+def get_query_generate_params(q_engine: QueryEngine,
+                              user_data: Optional[dict] = None,
+                              llm_type: Optional[str] = None,
+                              query_filter: Optional[str] = None) -> \
+                                Tuple[str, Optional[dict]]:
+  """
+  Determine the generation model and retrieval filter for a query, and
+  check the user has access to the model.
+
+  Returns:
+    llm_type, query filter dict (or None)
+  """
   # process query filter and RBAC roles for user
   authz_filter = create_authz_filter(user_data)
   Logger.info(f"query_generate authz_filter = {authz_filter}")
@@ -158,6 +295,20 @@ async def query_generate(
   if not get_model_config().is_model_enabled_for_user(llm_type, user_data):
     raise UnauthorizedUserError("User does not have access to model")
 
+  return llm_type, query_filter
+
+
+async def retrieve_ranked_references(prompt: str,
+                                     q_engine: QueryEngine,
+                                     user_id: str,
+                                     user_query: Optional[UserQuery] = None,
+                                     rank_sentences=False,
+                                     query_filter: Optional[dict] = None) -> \
+                                       List[QueryReference]:
+  """
+  Retrieve references for a query, reranked for integrated search, and
+  add them to the user query history if there is a user query.
+  """
   # perform retrieval
   query_references = await retrieve_references(prompt,
                                                q_engine,
@@ -175,19 +326,18 @@ async def query_generate(
   # the answer so the frontend can display the retrieved results as soon as
   # they are available.
   if user_query:
-    update_user_query(
+    await update_user_query(
         prompt, None, user_id, q_engine, query_references, user_query)
 
-  # generate question prompt
-  # (from user's text prompt plus text info in query_references)
-  question_prompt, query_references = \
-      await generate_question_prompt(prompt,
-                                     llm_type,
-                                     query_references,
-                                     user_query)
+  return query_references
 
-  # generate list of URLs for additional context
-  # (from non-text info in query_references)
+
+def get_reference_context_files(
+    query_references: List[QueryReference]) -> List[DataSourceFile]:
+  """
+  Generate list of files for additional context from non-text info
+  in query references.
+  """
   context_files = []
   for ref in query_references:
     if ref.modality != "text" and ref.chunk_url:
@@ -198,11 +348,18 @@ async def query_generate(
                                           mime_type=ref_mimetype))
       # TODO: If ref is a video chunk, then update new element of
       # context_files according to ref.timestamp_start and ref.timestamp_stop
+  return context_files
 
-  # send prompt and additional context to model
-  question_response = await llm_chat(question_prompt, llm_type,
-                                     chat_files=context_files)
 
+def save_query_result(prompt: str,
+                      question_response: str,
+                      q_engine: QueryEngine,
+                      query_references: List[QueryReference],
+                      user_query: Optional[UserQuery] = None) -> QueryResult:
+  """
+  Save the QueryResult of a query, and add the response to the user
+  query history if there is a user query.
+  """
   # update user query with response
   if user_query:
     # insert the response before the just added references
@@ -218,8 +375,7 @@ async def query_generate(
                              prompt=prompt,
                              response=question_response)
   query_result.save()
-
-  return query_result, query_references
+  return query_result
 
 async def query_generate_for_chat(
             user_id: str,
@@ -392,12 +548,12 @@ async def retrieve_references(prompt: str,
                                    NUM_MATCH_RESULTS, query_filter)
   elif q_engine.query_engine_type == QE_TYPE_INTEGRATED_SEARCH:
     child_engines = QueryEngine.find_children(q_engine)
-    for child_engine in child_engines:
-      # make a recursive call to retrieve references for child engine
-      child_query_references = await retrieve_references(prompt,
-                                                         child_engine,
-                                                         user_id,
-                                                         query_filter)
+    # retrieve references for all child engines concurrently
+    child_results = await asyncio.gather(
+        *[retrieve_child_references(prompt, child_engine, user_id,
+                                    rank_sentences, query_filter)
+          for child_engine in child_engines])
+    for child_query_references in child_results:
       query_references += child_query_references
   elif q_engine.query_engine_type == QE_TYPE_LLM_SERVICE or \
       not q_engine.query_engine_type:
@@ -407,6 +563,60 @@ async def retrieve_references(prompt: str,
 
   return query_references
 
+async def retrieve_child_references(prompt: str,
+                                    child_engine: QueryEngine,
+                                    user_id: str,
+                                    rank_sentences: bool = False,
+                                    query_filter: dict = None) \
+    -> List[QueryReference]:
+  """
+  Retrieve references from a child engine of an integrated search engine.
+  A child that fails or does not respond within
+  INTEGRATED_SEARCH_CHILD_TIMEOUT seconds is logged and contributes no
+  references, so that it does not fail the integrated query.
+
+  Args:
+    prompt: the text prompt to pass to the query engine
+    child_engine: the child QueryEngine to query
+    user_id: user id of user making query
+    rank_sentences (bool): rank sentence relevance in retrieved chunks
+    query_filter: (optional) filter expression
+  Returns:
+    list of QueryReference objects
+  """
+  engine_type = child_engine.query_engine_type or QE_TYPE_LLM_SERVICE
+  status = "success"
+  child_query_references = []
+  start_time = time.time()
+  try:
+    # make a recursive call to retrieve references for child engine
+    child_query_references = await asyncio.wait_for(
+        retrieve_references(prompt, child_engine, user_id,
+                            rank_sentences=rank_sentences,
+                            query_filter=query_filter),
+        timeout=INTEGRATED_SEARCH_CHILD_TIMEOUT)
+  except asyncio.TimeoutError:
+    status = "timeout"
+    Logger.error(f"Child engine [{child_engine.name}] timed out after "
+                 f"{INTEGRATED_SEARCH_CHILD_TIMEOUT}s")
+  except Exception as e:
+    status = "error"
+    Logger.error(f"Child engine [{child_engine.name}] failed: {e}")
+    Logger.error(traceback.print_exc())
+  finally:
+    latency = time.time() - start_time
+    INTEGRATED_SEARCH_CHILD_LATENCY.labels(
+        engine_type=engine_type,
+        engine_name=child_engine.name).observe(latency)
+    INTEGRATED_SEARCH_CHILD_COUNT.labels(
+        engine_type=engine_type,
+        engine_name=child_engine.name,
+        status=status).inc()
+  Logger.info(f"Child engine [{child_engine.name}] returned "
+              f"{len(child_query_references)} references in "
+              f"{latency:.3f}s, status={status}")
+  return child_query_references
+
 async def query_search(q_engine: QueryEngine,
                        query_prompt: str,
                        rank_sentences: bool = False,
@@ -460,49 +670,78 @@ async def query_search(q_engine: QueryEngine,
     # of a LIST of embedding vectors.
     _, query_embeddings = \
         await embeddings.get_embeddings([query_prompt],
-                                        q_engine.embedding_type)
+                                        q_engine.embedding_type,
+                                        use_cache=True)
     query_embedding = query_embeddings[0]
 
   # retrieve indexes of relevant document chunks from vector store
   qe_vector_store = vector_store_from_query_engine(q_engine)
-  match_indexes_list = qe_vector_store.similarity_search(q_engine,
-                                                         query_embedding,
-                                                         query_filter)
+  # run the (blocking) vector store search in a thread so that concurrent
+  # queries, e.g. integrated search children, are not serialized
+  match_indexes_list = await asyncio.to_thread(
+      qe_vector_store.similarity_search, q_engine, query_embedding,
+      query_filter)
 
-  query_references = []
   # Assemble document chunk models from vector store indexes
-  for match in match_indexes_list:
-    doc_chunk = QueryDocumentChunk.find_by_index(q_engine.id, match)
-    if doc_chunk is None:
-      raise ResourceNotFoundException(
-        f"Missing doc chunk match index {match} q_engine {q_engine.name}")
-
-    query_doc = QueryDocument.find_by_id(doc_chunk.query_document_id)
+  doc_chunks = await asyncio.to_thread(QueryDocumentChunk.find_by_indexes,
+                                       q_engine.id, match_indexes_list)
+  missing_indexes = [match for match in match_indexes_list
+                     if match not in doc_chunks]
+  if missing_indexes:
+    raise ResourceNotFoundException(
+      f"Missing doc chunk match index {missing_indexes[0]} "
+      f"q_engine {q_engine.name}")
+  doc_chunks = [doc_chunks[match] for match in match_indexes_list]
+
+  # look up documents and chunks of other modalities of the matches
+  # concurrently
+  doc_ids = [doc_chunk.query_document_id for doc_chunk in doc_chunks]
+  linked_ids = [linked_id for doc_chunk in doc_chunks
+                for linked_id in doc_chunk.linked_ids or []]
+  query_docs, linked_chunks = await asyncio.gather(
+      asyncio.to_thread(QueryDocument.find_by_ids, doc_ids),
+      asyncio.to_thread(QueryDocumentChunk.find_by_ids, linked_ids))
+  query_docs = {query_doc.id: query_doc for query_doc in query_docs}
+  linked_chunks = {linked_chunk.id: linked_chunk
+                   for linked_chunk in linked_chunks}
+
+  # each match with the chunks of other modalities of the same chunk
+  matches = []
+  for doc_chunk in doc_chunks:
+    query_doc = query_docs.get(doc_chunk.query_document_id)
     if query_doc is None:
       raise ResourceNotFoundException(
         f"Query doc {doc_chunk.query_document_id} q_engine {q_engine.name}")
+    friend_chunks = []
+    for linked_id in doc_chunk.linked_ids or []:
+      query_doc_chunk_friend = linked_chunks.get(linked_id)
+      if query_doc_chunk_friend is None:
+        raise ResourceNotFoundException(
+          f"Missing linked doc chunk {linked_id} q_engine {q_engine.name}")
+      friend_chunks.append(query_doc_chunk_friend)
+    matches.append((doc_chunk, query_doc, friend_chunks))
+
+  # rank sentences of all retrieved text chunks, including linked text
+  # chunks of other matches, in one batch
+  chunk_sentences = {}
+  if rank_sentences:
+    chunk_sentences = await rank_chunk_sentences(
+        q_engine, query_embedding,
+        [chunk for doc_chunk, _, friend_chunks in matches
+         for chunk in [doc_chunk] + friend_chunks])
 
-    query_reference = make_query_reference(q_engine=q_engine,
-                                           query_doc=query_doc,
-                                           doc_chunk=doc_chunk,
-                                           query_embeddings=query_embeddings,
-                                           rank_sentences=rank_sentences)
-    query_reference.save()
-    query_references.append(query_reference)
-
+  query_references = []
+  for doc_chunk, query_doc, friend_chunks in matches:
     # Also create a query_reference for other modalities of the same chunk
-    linked_ids = query_reference.linked_ids
-    if linked_ids:
-      for linked_id in linked_ids:
-        query_doc_chunk_friend = QueryDocumentChunk.find_by_id(linked_id)
-        query_reference_friend = make_query_reference(
+    for chunk in [doc_chunk] + friend_chunks:
+      query_reference = make_query_reference(
           q_engine=q_engine,
           query_doc=query_doc,
-          doc_chunk=query_doc_chunk_friend,
-          query_embeddings=query_embeddings,
-          rank_sentences=rank_sentences)
-        query_reference_friend.save()
-        query_references.append(query_reference_friend)
+          doc_chunk=chunk,
+          rank_sentences=rank_sentences,
+          ranked_sentences=chunk_sentences.get(chunk.id))
+      query_reference.save()
+      query_references.append(query_reference)
 
   Logger.info(f"Retrieved {len(query_references)} "
                f"references={query_references}")
@@ -514,8 +753,9 @@ async def query_search(q_engine: QueryEngine,
 def make_query_reference(q_engine: QueryEngine,
                            query_doc: QueryDocument,
                            doc_chunk: QueryDocumentChunk,
-                           query_embeddings: List[Optional[List[float]]],
-                           rank_sentences: bool = False) -> \
+                           rank_sentences: bool = False,
+                           ranked_sentences: Optional[
+                             Tuple[List[str], np.ndarray]] = None) -> \
                             QueryReference:
   """
   Make a single QueryReference object, with appropriate fields
@@ -525,7 +765,9 @@ def make_query_reference(q_engine: QueryEngine,
     q_engine: The QueryEngine object that was searched
     query_doc: The QueryDocument object retreived from q_engine
     doc_chunk: The QueryDocumentChunk object of the retrieved query_doc
-    query_embeddings: The embedding vector for the query prompt
+    rank_sentences: pick the most relevant sentences of a text chunk
+    ranked_sentences: sentences of the chunk and their similarity scores,
+      as computed by rank_chunk_sentences
     
   Returns:
     query_reference: The QueryReference object corresponding to doc_chunk
@@ -545,19 +787,14 @@ def make_query_reference(q_engine: QueryEngine,
     if not clean_text:
       clean_text = text_helper.clean_text(doc_chunk.text)
 
-    # Pick out sentences from document chunk and rank them.
-    if rank_sentences:
-      # Assemble sentences from a document chunk. Currently it gets the
-      # sentences from the top-ranked document chunk.
-      sentences = doc_chunk.sentences
-      if not sentences or len(sentences) == 0:
-        sentences = text_helper.text_to_sentence_list(doc_chunk.text)
-
-      # Only update clean_text when sentences is not empty.
+    # Pick out the most relevant sentences from document chunk.
+    # Only update clean_text when sentences is not empty.
+    if rank_sentences and ranked_sentences:
+      sentences, similarity_scores = ranked_sentences
       Logger.info(f"Processing {len(sentences)} sentences.")
-      if sentences and len(sentences) > 0:
+      if len(sentences) > 0:
         top_sentences = get_top_relevant_sentences(
-            q_engine, query_embeddings, sentences,
+            sentences, similarity_scores,
             expand_neighbors=2, highlight_top_sentence=True)
         clean_text = " ".join(top_sentences)
 
@@ -651,16 +888,64 @@ def rerank_references(prompt: str,
 
   return ranked_query_refs
 
-def get_top_relevant_sentences(q_engine, query_embeddings,
-    sentences, expand_neighbors=2, highlight_top_sentence=False) -> list:
+async def rank_chunk_sentences(q_engine: QueryEngine,
+                               query_embedding: List[float],
+                               doc_chunks: List[QueryDocumentChunk]) -> \
+                                 Dict[str, Tuple[List[str], np.ndarray]]:
+  """
+  Score the sentences of all text chunks against the query embedding.
+  Sentences of all chunks are embedded in a single get_embeddings call
+  and scored with a single get_similarity call.
 
-  _, sentence_embeddings = embeddings.get_embeddings(sentences,
-                                                     q_engine.embedding_type)
-  similarity_scores = get_similarity(query_embeddings, sentence_embeddings)
+  Args:
+    q_engine: QueryEngine the chunks were retrieved from
+    query_embedding: embedding vector of the query prompt
+    doc_chunks: retrieved QueryDocumentChunk models
+  Returns:
+    dict of chunk id to (list of sentences, numpy array of scores)
+  """
+  chunk_sentences = {}
+  for doc_chunk in doc_chunks:
+    if (doc_chunk.modality or "text").casefold() != "text":
+      continue
+    # Assemble sentences from a document chunk.
+    sentences = doc_chunk.sentences
+    if not sentences:
+      sentences = text_helper.text_to_sentence_list(doc_chunk.text)
+    if sentences:
+      chunk_sentences[doc_chunk.id] = sentences
+
+  all_sentences = [sentence for sentences in chunk_sentences.values()
+                   for sentence in sentences]
+  if not all_sentences:
+    return {}
+
+  is_successful, sentence_embeddings = await embeddings.get_embeddings(
+      all_sentences, q_engine.embedding_type)
+  # sentences that could not be embedded are never picked as top sentence
+  is_successful = np.asarray(is_successful, dtype=bool)
+  similarity_scores = np.full(len(all_sentences), -np.inf)
+  if is_successful.any():
+    similarity_scores[is_successful] = get_similarity(query_embedding,
+                                                      sentence_embeddings)
   Logger.info("Similarity scores of query_embeddings and sentence_embeddings: "
               f"{len(similarity_scores)}")
 
-  top_sentence_index = np.argmax(similarity_scores)
+  ranked_sentences = {}
+  offset = 0
+  for chunk_id, sentences in chunk_sentences.items():
+    ranked_sentences[chunk_id] = (
+        sentences, similarity_scores[offset:offset + len(sentences)])
+    offset += len(sentences)
+  return ranked_sentences
+
+def get_top_relevant_sentences(sentences, similarity_scores,
+    expand_neighbors=2, highlight_top_sentence=False) -> list:
+  """
+  Return the sentence with the highest similarity score and its neighbors.
+  """
+  sentences = list(sentences)
+  top_sentence_index = int(np.argmax(similarity_scores))
   start_index = top_sentence_index - expand_neighbors
   end_index = top_sentence_index + expand_neighbors + 1
 
@@ -673,19 +958,25 @@ def get_top_relevant_sentences(q_engine, query_embeddings,
 
   return sentences[start_index:end_index]
 
-def get_similarity(query_embeddings, sentence_embeddings) -> list:
-  query_df = pd.DataFrame(query_embeddings.transpose())
-  sentence_df = pd.DataFrame(sentence_embeddings)
+def get_similarity(query_embeddings, sentence_embeddings) -> np.ndarray:
+  """
+  Cosine similarity of each sentence embedding with the query embedding.
 
-  cos_sim = []
-  for _, row in sentence_df.iterrows():
-    x = row
-    y = query_df
-    # calculate the cosine similarity
-    cosine = np.dot(x, y) / (norm(x) * norm(y))
-    cos_sim.append(cosine[0])
+  Args:
+    query_embeddings: query embedding vector, shape (dim,) or (1, dim)
+    sentence_embeddings: matrix of sentence embeddings, shape (n, dim)
+  Returns:
+    numpy array of n cosine similarity scores
+  """
+  query_vector = np.asarray(query_embeddings, dtype=np.float64).reshape(-1)
+  sentence_matrix = np.atleast_2d(
+      np.asarray(sentence_embeddings, dtype=np.float64))
 
-  return cos_sim
+  # normalize the embeddings once, then score all sentences with a
+  # single matrix-vector product
+  query_vector = query_vector / np.linalg.norm(query_vector)
+  sentence_norms = np.linalg.norm(sentence_matrix, axis=1)
+  return (sentence_matrix @ query_vector) / sentence_norms
 
 async def batch_query_generate(request_body: Dict, job: BatchJobModel) -> Dict:
   """
@@ -722,12 +1013,12 @@ async def batch_query_generate(request_body: Dict, job: BatchJobModel) -> Dict:
 
   # update user query
   user_query, query_reference_dicts = \
-      update_user_query(prompt,
-                        query_result.response,
-                        user_id,
-                        q_engine,
-                        query_references,
-                        user_query)
+      await update_user_query(prompt,
+                              query_result.response,
+                              user_id,
+                              q_engine,
+                              query_references,
+                              user_query)
 
   # update result data in batch job model
   result_data = {
@@ -743,14 +1034,14 @@ async def batch_query_generate(request_body: Dict, job: BatchJobModel) -> Dict:
 
   return result_data
 
-def update_user_query(prompt: str,
-                      response: str,
-                      user_id: str,
-                      q_engine: QueryEngine,
-                      query_references: List[QueryReference],
-                      user_query: UserQuery = None,
-                      query_filter=None) -> \
-                      Tuple[UserQuery, List[dict]]:
+async def update_user_query(prompt: str,
+                            response: str,
+                            user_id: str,
+                            q_engine: QueryEngine,
+                            query_references: List[QueryReference],
+                            user_query: UserQuery = None,
+                            query_filter=None) -> \
+                            Tuple[UserQuery, List[dict]]:
   """ Save user query history """
   query_reference_dicts = [
     ref.get_fields(reformat_datetime=True) for ref in query_references
@@ -761,15 +1052,15 @@ def update_user_query(prompt: str,
     user_query = UserQuery(user_id=user_id,
                           query_engine_id=q_engine.id,
                           prompt=prompt)
-    user_query.save()
-  user_query.update_history(prompt=prompt,
-                            response=response,
-                            references=query_reference_dicts)
+  user_query.add_history(prompt=prompt,
+                         response=response,
+                         references=query_reference_dicts)
 
   if query_filter:
-    user_query.update_history(custom_entry={
+    user_query.add_history(custom_entry={
       "query_filter": query_filter,
     })
+  await user_query.asave(merge=True)
 
   return user_query, query_reference_dicts
 
@@ -793,9 +1084,11 @@ async def batch_build_query_engine(request_body: Dict,
   embedding_type = request_body.get("embedding_type")
   vector_store_type = request_body.get("vector_store")
   params = request_body.get("params")
+  build_mode = request_body.get("build_mode") or QE_BUILD_MODE_CREATE
 
   Logger.info(f"Starting batch job for query engine [{query_engine}] "
               f"job id [{job.id}], request_body=[{request_body}]")
+  Logger.info(f"build mode: [{build_mode}]")
   Logger.info(f"doc_url: [{doc_url}] user id: [{user_id}]")
   Logger.info(f"query engine type: [{query_engine_type}]")
   Logger.info(f"query description: [{description}]")
@@ -804,11 +1097,17 @@ async def batch_build_query_engine(request_body: Dict,
   Logger.info(f"vector store type: [{vector_store_type}]")
   Logger.info(f"params: [{params}]")
 
-  q_engine, docs_processed, docs_not_processed = \
-      await query_engine_build(doc_url, query_engine, user_id,
-                               query_engine_type,
-                               llm_type, description,
-                               embedding_type, vector_store_type, params)
+  docs_deleted = None
+  if build_mode == QE_BUILD_MODE_UPDATE:
+    q_engine, docs_processed, docs_not_processed, docs_deleted = \
+        await query_engine_update(request_body.get("query_engine_id"),
+                                  doc_url)
+  else:
+    q_engine, docs_processed, docs_not_processed = \
+        await query_engine_build(doc_url, query_engine, user_id,
+                                 query_engine_type,
+                                 llm_type, description,
+                                 embedding_type, vector_store_type, params)
 
   # update result data in batch job model
   docs_processed_urls = [doc.doc_url for doc in docs_processed]
@@ -817,6 +1116,13 @@ async def batch_build_query_engine(request_body: Dict,
     "docs_processed": docs_processed_urls,
     "docs_not_processed": docs_not_processed
   }
+  chunks_not_indexed = {doc.doc_url: doc.chunks_not_indexed
+                        for doc in docs_processed
+                        if getattr(doc, "chunks_not_indexed", None)}
+  if chunks_not_indexed:
+    result_data["chunks_not_indexed"] = chunks_not_indexed
+  if docs_deleted is not None:
+    result_data["docs_deleted"] = docs_deleted
   job.result_data = result_data
   job.save(merge=True)
 
@@ -914,6 +1220,11 @@ async def query_engine_build(doc_url: str,
                            QE_TYPE_INTEGRATED_SEARCH):
     # no vector store set for vertex search or integrated search
     vector_store_type = None
+  elif is_multimodal and \
+      (vector_store_type or DEFAULT_VECTOR_STORE) == VECTOR_STORE_LOCAL:
+    raise ValidationError(
+        f"Vector store {VECTOR_STORE_LOCAL} does not support multimodal "
+        "engines")
 
   # create query engine model
   q_engine = QueryEngine(name=query_engine,
@@ -1013,180 +1324,437 @@ async def build_doc_index(doc_url: str, q_engine: QueryEngine,
     Logger.error(traceback.print_exc())
     raise InternalServerError(str(e)) from e
 
+async def query_engine_update(query_engine_id: str,
+                              doc_url: Optional[str] = None) -> \
+    Tuple[QueryEngine, List[QueryDocument], List[str], List[str]]:
+  """
+  Update the document index of an existing query engine with the current
+  documents at its source: new and changed documents are indexed, and
+  documents that are no longer at the source are deleted.
+
+  Args:
+    query_engine_id: id of the query engine to update
+    doc_url: (optional) URL to the set of documents, by default the url
+      the engine was built from
+
+  Returns:
+    Tuple of QueryEngine, list of QueryDocument objects of docs processed,
+      list of urls of docs not processed, list of urls of docs deleted
+
+  Raises:
+    ResourceNotFoundException if the query engine doesn't exist
+    ValidationError if the query engine type doesn't support updates
+  """
+  q_engine = QueryEngine.find_by_id(query_engine_id)
+  if q_engine is None:
+    raise ResourceNotFoundException(f"Engine {query_engine_id} not found")
+
+  if q_engine.query_engine_type != QE_TYPE_LLM_SERVICE:
+    raise ValidationError(
+        f"Query engine type {q_engine.query_engine_type} can't be updated")
+
+  doc_url = doc_url or q_engine.doc_url
+  if not doc_url:
+    raise ValidationError(f"Query engine {q_engine.name} has no doc_url")
+
+  params = q_engine.params or {}
+  is_multimodal = str(params.get("is_multimodal", "")).lower() == "true"
+
+  qe_vector_store = vector_store_from_query_engine(q_engine)
+  docs_processed, docs_not_processed, docs_deleted = \
+      await update_doc_index(doc_url, q_engine, qe_vector_store,
+                             is_multimodal)
+
+  Logger.info(f"Completed query engine update for {q_engine.name}")
+
+  return q_engine, docs_processed, docs_not_processed, docs_deleted
+
+async def update_doc_index(doc_url: str, q_engine: QueryEngine,
+                           qe_vector_store: VectorStore,
+                           is_multimodal: Optional[bool] = False) -> \
+        Tuple[List[QueryDocument], List[str], List[str]]:
+  """
+  Update the document index of a query engine.  Documents whose source
+  file is unchanged since they were indexed are skipped.  Documents that
+  changed are indexed again, and their previous version deleted once the
+  new version is indexed.  Documents that failed to process keep their
+  previous version.  Models of deleted documents are removed only after
+  the index update is deployed.
+
+  Args:
+    doc_url: URL pointing to folder of documents
+    q_engine: the query engine to update the index of
+    qe_vector_store: the vector store used for the query engine
+    is_multimodal: True if multimodal, False if text-only (default False)
+
+  Returns:
+    Tuple of list of QueryDocument objects of docs processed,
+      list of urls of docs not processed, list of urls of docs deleted
+  """
+  storage_client = storage.Client(project=PROJECT_ID)
+  data_source = datasource_from_url(doc_url, q_engine, storage_client)
+
+  known_docs = {
+    q_doc.doc_url: q_doc
+    for q_doc in QueryDocument.find_all_by_query_engine_id(q_engine.id)
+  }
+  Logger.info(f"updating index of [{q_engine.name}] with "
+              f"{len(known_docs)} indexed docs")
+
+  # initialize the vector store index update
+  qe_vector_store.init_index()
+
+  try:
+    docs_processed, docs_not_processed = await process_documents(
+      doc_url, qe_vector_store, q_engine, storage_client, is_multimodal,
+      known_docs=known_docs, data_source=data_source)
+
+    source_urls = set(data_source.docs_unchanged)
+    source_urls.update(docs_not_processed)
+    source_urls.update(q_doc.doc_url for q_doc in docs_processed)
+    replaced_docs = [known_docs[q_doc.doc_url] for q_doc in docs_processed
+                     if q_doc.doc_url in known_docs]
+    removed_docs = [q_doc for doc_url, q_doc in known_docs.items()
+                    if doc_url not in source_urls]
+    deleted_docs = replaced_docs + removed_docs
+    delete_document_embeddings(qe_vector_store, deleted_docs)
+
+    # apply the update to the deployed index (e.g. matching engine).
+    # db vector stores typically don't require this step.
+    qe_vector_store.deploy_update()
+
+    # the models of deleted docs are only removed once the deployed index
+    # no longer returns their embeddings, so a failed update leaves every
+    # index match resolvable to its chunk.
+    delete_document_models(deleted_docs)
+
+    Logger.info(f"updated index of [{q_engine.name}]: "
+                f"{len(docs_processed)} docs indexed, "
+                f"{len(data_source.docs_unchanged)} unchanged, "
+                f"{len(removed_docs)} removed, "
+                f"{len(docs_not_processed)} not processed")
+
+    return (docs_processed, docs_not_processed,
+            [q_doc.doc_url for q_doc in removed_docs])
+
+  except Exception as e:
+    Logger.error(f"Error updating doc index {e}")
+    Logger.error(traceback.print_exc())
+    raise InternalServerError(str(e)) from e
+
+def delete_document_embeddings(qe_vector_store: VectorStore,
+                               q_docs: List[QueryDocument]):
+  """
+  Delete the embeddings of documents of a query engine from the vector
+  store.  For deployed indexes the deletion takes effect on deploy_update.
+  """
+  if not q_docs:
+    return
+
+  indexes = []
+  for q_doc in q_docs:
+    if q_doc.index_start is not None and q_doc.index_end is not None:
+      indexes.extend(range(int(q_doc.index_start), int(q_doc.index_end)))
+  qe_vector_store.delete_indexes(indexes)
+
+  Logger.info(f"deleted {len(indexes)} embeddings of {len(q_docs)} docs")
+
+def delete_document_models(q_docs: List[QueryDocument]):
+  """
+  Delete the QueryDocument and QueryDocumentChunk models of documents of
+  a query engine.
+  """
+  for q_doc in q_docs:
+    QueryDocumentChunk.collection.filter(
+      "query_document_id", "==", q_doc.id
+    ).delete()
+    QueryDocument.delete_by_id(q_doc.id)
+
+  if q_docs:
+    Logger.info(f"deleted {len(q_docs)} docs")
+
 async def process_documents(doc_url: str, qe_vector_store: VectorStore,
                       q_engine: QueryEngine, storage_client,
-                      is_multimodal: Optional[bool] = False) -> \
+                      is_multimodal: Optional[bool] = False,
+                      known_docs: Optional[Dict[str, QueryDocument]] = None,
+                      data_source: Optional[DataSource] = None) -> \
                       Tuple[List[QueryDocument], List[str]]:
   """
   Process docs in data source and upload embeddings to vector store
-  
+
+  Documents are streamed through a pipeline of bounded stages: download,
+  chunk (in worker threads), embed and index in the vector store, and
+  save document models.  Each stage has its own concurrency, and the
+  bounded queues between stages limit how many downloaded files are held
+  on local disk at once.
+
   Args:
     doc_url: URL pointing to folder of documents
     qe_vector_store: the vector store used for the query engine
     q_engine: the query engine name to build the index for
     storage_client: client used for storing the data source
     is_multimodal: True if multimodal, False if text-only (default False)
+    known_docs: (optional) dict of doc url to QueryDocument of the docs
+      already indexed in q_engine.  Source files that are unchanged since
+      they were indexed are skipped, and indexes continue from the end of
+      the q_engine index.
+    data_source: (optional) the DataSource for doc_url
   
   Returns:
      Tuple of list of QueryDocument objects for docs processed,
         list of doc urls of docs not processed
   """
   # get datasource class for doc_url
-  data_source = datasource_from_url(doc_url, q_engine, storage_client)
+  if data_source is None:
+    data_source = datasource_from_url(doc_url, q_engine, storage_client)
+
+  # versions of the files already indexed in the engine
+  known_versions = None
+  if known_docs is not None:
+    known_versions = {
+      url: (q_doc.generation, q_doc.md5_hash)
+      for url, q_doc in known_docs.items()
+    }
 
   # initialize metadata
   metadata_manifest = data_source.init_metadata(q_engine)
 
-  docs_processed = []
-  with tempfile.TemporaryDirectory() as temp_dir:
-    data_source_files = data_source.download_documents(doc_url, temp_dir)
-
-    # counter for unique index ids
-    index_base = 0
+  # next unused vector store index.  Index ranges are allocated to docs
+  # before they are indexed, so docs can be indexed concurrently.
+  next_index_base = 0
+  if known_docs is not None:
+    next_index_base = q_engine.next_index or max(
+        (int(q_doc.index_end or 0) for q_doc in known_docs.values()),
+        default=0)
+
+  async def chunk_stage(data_source_file: DataSourceFile):
+    doc_name = data_source_file.doc_name
+    index_doc_url = data_source_file.src_url
+    doc_filepath = data_source_file.local_path
+
+    Logger.info(f"processing [{doc_name}] with {is_multimodal=}")
+
+    if os.path.exists(doc_filepath):
+      data_source_file.file_hash = await asyncio.to_thread(get_file_hash,
+                                                           doc_filepath)
+    known_doc = known_docs.get(index_doc_url) if known_docs else None
+    if known_doc is not None and known_doc.file_hash is not None and \
+        known_doc.file_hash == data_source_file.file_hash:
+      Logger.info(f"skipping unchanged doc [{doc_name}]")
+      data_source.docs_unchanged.append(index_doc_url)
+      os.remove(doc_filepath)
+      return None
 
-    for data_source_file in data_source_files:
-      doc_name = data_source_file.doc_name
-      index_doc_url = data_source_file.src_url
-      doc_filepath = data_source_file.local_path
+    if is_multimodal:
+      chunk_document = data_source.chunk_document_multimodal
+    else:
+      chunk_document = data_source.chunk_document
+    doc_chunks = await asyncio.to_thread(chunk_document,
+                                         doc_name,
+                                         index_doc_url,
+                                         doc_filepath)
+
+    # cleanup temp local file
+    if os.path.exists(doc_filepath):
+      os.remove(doc_filepath)
 
-      Logger.info(f"processing [{doc_name}] with {is_multimodal=}")
+    if doc_chunks is None or len(doc_chunks) == 0:
+      # unable to process this doc; skip
+      Logger.error(f"unable to chunk doc [{index_doc_url}]")
+      if index_doc_url not in data_source.docs_not_processed:
+        data_source.docs_not_processed.append(index_doc_url)
+      return None
 
-      if is_multimodal:
-        doc_chunks = data_source.chunk_document_multimodal(doc_name,
-                                                      index_doc_url,
-                                                      doc_filepath)
-      else:
-        doc_chunks = data_source.chunk_document(doc_name,
-                                                index_doc_url,
-                                                doc_filepath)
+    Logger.info(f"doc chunks extracted for [{doc_name}]")
+    return data_source_file, doc_chunks
 
-      if doc_chunks is None or len(doc_chunks) == 0:
-        # unable to process this doc; skip
-        Logger.error(f"unable to chunk doc [{index_doc_url}]")
-        continue
+  async def index_stage(chunked_doc: Tuple[DataSourceFile, list]):
+    nonlocal next_index_base
+    data_source_file, doc_chunks = chunked_doc
+    doc_name = data_source_file.doc_name
+    index_doc_url = data_source_file.src_url
 
-      Logger.info(f"doc chunks extracted for [{doc_name}]")
+    # each chunk has an embedding for each modality
+    num_embeddings = len(doc_chunks)
+    if is_multimodal:
+      num_embeddings *= len(MODALITY_SET)
+    index_base = next_index_base
+    next_index_base += num_embeddings
 
-      # generate embedding data and store in vector store
-      try:
-        metadata = metadata_manifest.get(doc_name, None)
+    # generate embedding data and store in vector store
+    metadata = metadata_manifest.get(doc_name, None)
+    try:
+      failed_indexes = []
+      if is_multimodal:
+        new_index_base = \
+          await qe_vector_store.index_document_multimodal(doc_name,
+                                                     doc_chunks,
+                                                     index_base)
+      else:
         metadata_list = []
         if metadata is not None:
           metadata_list = [deepcopy(metadata) for chunk in doc_chunks]
-        if is_multimodal:
-          new_index_base = \
-            await qe_vector_store.index_document_multimodal(doc_name,
-                                                       doc_chunks,
-                                                       index_base)
-          Logger.info(
-            f"Successfully indexed {len(doc_chunks)} chunks for [{doc_name}]"
-            )
-        else:
-          new_index_base = \
-            await qe_vector_store.index_document(doc_name,
-                                                 doc_chunks,
-                                                 index_base,
-                                                 metadata_list)
-          Logger.info(
-            f"Successfully indexed {len(doc_chunks)} chunks for [{doc_name}]"
-            )
-      except Exception as e:
-        # unable to process this doc; skip
-        Logger.error(f"error indexing doc [{index_doc_url}]: {str(e)}")
-        data_source.docs_not_processed.append(index_doc_url)
-        continue
+        new_index_base, failed_indexes = \
+          await qe_vector_store.index_document(doc_name,
+                                               doc_chunks,
+                                               index_base,
+                                               metadata_list)
+      Logger.info(
+        f"Successfully indexed {len(doc_chunks)} chunks for [{doc_name}]")
+    except Exception as e:
+      # unable to process this doc; skip
+      Logger.error(f"error indexing doc [{index_doc_url}]: {str(e)}")
+      data_source.docs_not_processed.append(index_doc_url)
+      return None
+
+    return (data_source_file, doc_chunks, index_base, new_index_base,
+            metadata, failed_indexes)
+
+  async def save_stage(indexed_doc: tuple):
+    return await asyncio.to_thread(save_document_models,
+                                   q_engine,
+                                   data_source,
+                                   *indexed_doc,
+                                   is_multimodal=is_multimodal)
+
+  stages = [
+    PipelineStage("chunk", chunk_stage, INGESTION_CHUNK_WORKERS),
+    PipelineStage("index", index_stage, INGESTION_INDEX_WORKERS),
+    PipelineStage("save", save_stage, INGESTION_SAVE_WORKERS),
+  ]
+  with tempfile.TemporaryDirectory() as temp_dir:
+    docs_processed = await run_pipeline(
+        "process_documents",
+        data_source.iter_documents(doc_url, temp_dir, known_versions),
+        stages,
+        queue_size=INGESTION_QUEUE_SIZE)
 
-      # cleanup temp local file
-      os.remove(doc_filepath)
+  # store the end of the index, so an index update can continue from it
+  q_engine.next_index = next_index_base
+  q_engine.update()
+
+  return docs_processed, data_source.docs_not_processed
+
+def save_document_models(q_engine: QueryEngine,
+                         data_source: DataSource,
+                         data_source_file: DataSourceFile,
+                         doc_chunks: list,
+                         index_base: int,
+                         index_end: int,
+                         metadata: Optional[dict] = None,
+                         failed_indexes: Optional[List[int]] = None,
+                         is_multimodal: Optional[bool] = False) -> \
+                          QueryDocument:
+  """
+  Store QueryDocument and QueryDocumentChunk models for an indexed document
+
+  Args:
+    q_engine: the query engine the document is indexed for
+    data_source: the data source of the document
+    data_source_file: the DataSourceFile of the document
+    doc_chunks: the chunks of the document, as returned by the data source
+    index_base: vector store index of the first chunk of the document
+    index_end: vector store index following the document
+    metadata: (optional) document metadata from the manifest
+    failed_indexes: (optional) indexes of text chunks that failed to embed,
+      which are not in the vector store and get no chunk models
+    is_multimodal: True if multimodal, False if text-only (default False)
 
-      # store QueryDocument and QueryDocumentChunk models
-      query_doc = QueryDocument(query_engine_id=q_engine.id,
-                                query_engine=q_engine.name,
-                                doc_url=index_doc_url,
-                                index_file=data_source_file.doc_id,
-                                index_start=index_base,
-                                index_end=new_index_base,
-                                metadata=metadata)
-      query_doc.save()
-
-      # Initialize counter of all ORM objects to be made from all chunks
-      j = 0
-      # Iterate over all chunks
-      for i in range(0, len(doc_chunks)):
-
-        if is_multimodal:
-          # Use multimodal pipeline
-
-          # Initialize list of ORM object indexes and ids to be made
-          # from this chunk
-          linked_indexes = []
-          linked_ids = []
-          # Sort keys of ith chunk in alphabetical order
-          # Keys of interest are in MODALITY_SET
-          # These keys hold info related to specific modalities that
-          # need to be stored in ORM objects
-          sorted_keys = sorted(list(doc_chunks[i].keys()))
-
-          # Create a QueryDocumentChunk ORM object for each modality
-          # of ith chunk, in alphabetical order
-          for key in sorted_keys:
-            if key in MODALITY_SET:
-              # doc_chunk is dict representing ith chunk
-              doc_chunk = doc_chunks[i]
-              # Make ORM object for current modality of ith chunk
-              query_doc_chunk = make_query_document_chunk(
-                query_engine_id=q_engine.id,
-                query_document_id=query_doc.id,
-                index=j+index_base,
-                doc_chunk=doc_chunk,
-                page=i,
-                data_source=data_source,
-                modality=key)
-              # Save ORM object in Firestore
-              query_doc_chunk.save()
-              # Build up lists of ORM object indexes and ids made for ith chunk
-              linked_indexes.append(query_doc_chunk.index)
-              linked_ids.append(query_doc_chunk.id)
-              # Increment counter of all ORM objects made for all chunks
-              j+=1
-
-          # Set linked_ids field of all ORM objects just made for ith chunk
-          for index in linked_indexes:
-            query_doc_chunk = \
-              QueryDocumentChunk.find_by_index(q_engine.id, index)
-            friend_ids = [friend_id for friend_id in linked_ids
-                          if friend_id != query_doc_chunk.id]
-            query_doc_chunk.linked_ids = friend_ids
-            query_doc_chunk.save()
-
-        else:
-          # Use text-only pipeline
-
-          # doc_chunk is a dict representing the ith chunk
-          # with key "text"
-          doc_chunk = {}
-          doc_chunk["text"] = doc_chunks[i]
-          # Make ORM object for text modality of ith chunk
+  Returns:
+    the saved QueryDocument
+  """
+  doc_name = data_source_file.doc_name
+  query_doc = QueryDocument(query_engine_id=q_engine.id,
+                            query_engine=q_engine.name,
+                            doc_url=data_source_file.src_url,
+                            index_file=data_source_file.doc_id,
+                            index_start=index_base,
+                            index_end=index_end,
+                            metadata=metadata,
+                            generation=data_source_file.generation,
+                            md5_hash=data_source_file.md5_hash,
+                            file_hash=data_source_file.file_hash,
+                            chunks_not_indexed=len(failed_indexes or []))
+  query_doc.save()
+  failed_indexes = set(failed_indexes or [])
+
+  # Build all chunk ORM objects first, then write them with batched writes
+  query_doc_chunks = []
+  # Initialize counter of all ORM objects to be made from all chunks
+  j = 0
+  # Iterate over all chunks
+  for i in range(0, len(doc_chunks)):
+
+    if is_multimodal:
+      # Use multimodal pipeline
+
+      # Initialize list of ORM objects to be made from this chunk
+      linked_chunks = []
+      # Sort keys of ith chunk in alphabetical order
+      # Keys of interest are in MODALITY_SET
+      # These keys hold info related to specific modalities that
+      # need to be stored in ORM objects
+      sorted_keys = sorted(list(doc_chunks[i].keys()))
+
+      # Create a QueryDocumentChunk ORM object for each modality
+      # of ith chunk, in alphabetical order
+      for key in sorted_keys:
+        if key in MODALITY_SET:
+          # doc_chunk is dict representing ith chunk
+          doc_chunk = doc_chunks[i]
+          # Make ORM object for current modality of ith chunk
           query_doc_chunk = make_query_document_chunk(
             query_engine_id=q_engine.id,
             query_document_id=query_doc.id,
-            index=i+index_base,
+            index=j+index_base,
             doc_chunk=doc_chunk,
-            page=None,
+            page=i,
             data_source=data_source,
-            modality="text")
-          # Save ORM object in Firestore
-          query_doc_chunk.save()
+            modality=key)
+          # Assign id now so linked ids can be set before the object is saved
+          query_doc_chunk.id = QueryDocumentChunk.new_id()
+          linked_chunks.append(query_doc_chunk)
+          # Increment counter of all ORM objects made for all chunks
+          j+=1
+
+      # Set linked_ids field of all ORM objects just made for ith chunk
+      linked_ids = [linked_chunk.id for linked_chunk in linked_chunks]
+      for query_doc_chunk in linked_chunks:
+        query_doc_chunk.linked_ids = [friend_id for friend_id in linked_ids
+                                      if friend_id != query_doc_chunk.id]
+      query_doc_chunks.extend(linked_chunks)
 
-      if is_multimodal:
-        Logger.info(f"{j} doc chunk models created for [{doc_name}]")
-      else:
-        Logger.info(f"{i+1} doc chunk models created for [{doc_name}]")
+    else:
+      # Use text-only pipeline
 
-      index_base = new_index_base
-      docs_processed.append(query_doc)
+      # skip chunks that have no embedding in the vector store
+      if i+index_base in failed_indexes:
+        continue
 
-  return docs_processed, data_source.docs_not_processed
+      # doc_chunk is a dict representing the ith chunk
+      # with key "text"
+      doc_chunk = {}
+      doc_chunk["text"] = doc_chunks[i]
+      # Make ORM object for text modality of ith chunk
+      query_doc_chunk = make_query_document_chunk(
+        query_engine_id=q_engine.id,
+        query_document_id=query_doc.id,
+        index=i+index_base,
+        doc_chunk=doc_chunk,
+        page=None,
+        data_source=data_source,
+        modality="text")
+      query_doc_chunks.append(query_doc_chunk)
+
+  # Save ORM objects in Firestore, each written exactly once
+  QueryDocumentChunk.save_all(query_doc_chunks)
+
+  if is_multimodal:
+    Logger.info(f"{j} doc chunk models created for [{doc_name}]")
+  else:
+    Logger.info(f"{len(doc_chunks)} doc chunk models created for [{doc_name}]")
+
+  return query_doc
 
 # Create a single QueryDocumentChunk object
 def make_query_document_chunk(query_engine_id: str,
@@ -18,9 +18,11 @@
 # disabling pylint rules that conflict with pytest fixtures
 # pylint: disable=unused-argument,redefined-outer-name,ungrouped-imports,unused-import
 from copy import deepcopy
+import asyncio
 from pathlib import Path
+import numpy as np
 import pytest
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from unittest import mock
 from schemas.schema_examples import (QUERY_EXAMPLE,
                                      USER_QUERY_EXAMPLE,
@@ -45,19 +47,29 @@ from common.models.llm_query import QE_TYPE_INTEGRATED_SEARCH
 from common.utils.logging_handler import Logger
 from common.utils.config import set_env_var
 from common.utils.errors import UnauthorizedUserError
+from common.utils.http_exceptions import InternalServerError
 from common.testing.firestore_emulator import firestore_emulator, clean_firestore
 
 with set_env_var("PG_HOST", ""):
   from config import get_model_config, ModelConfig, MODEL_CONFIG_PATH
 
 from services.query.query_service import (query_generate,
+                                          query_generate_stream,
+                                          QUERY_STREAM_REFERENCES,
+                                          QUERY_STREAM_TOKEN,
+                                          QUERY_STREAM_RESULT,
                                           query_search,
                                           query_engine_build,
                                           process_documents,
                                           build_doc_index,
-                                          retrieve_references)
-from services.query.vector_store import VectorStore
-from services.query.data_source import DataSource, DataSourceFile
+                                          update_doc_index,
+                                          save_document_models,
+                                          retrieve_references,
+                                          get_similarity,
+                                          get_top_relevant_sentences)
+from services.query.vector_store import VectorStore, LocalVectorStore
+from services.query.data_source import (DataSource, DataSourceFile,
+                                        get_file_hash)
 
 Logger = Logger.get_logger(__file__)
 
@@ -157,16 +169,18 @@ DSF3 = DataSourceFile(DOC_NAME_3,
 class FakeVectorStore(VectorStore):
   """ mock vector store class """
   def __init__(self):
-    pass
+    self.deleted_indexes = []
   def init_index(self):
     pass
+  def delete_indexes(self, indexes: List[int]):
+    self.deleted_indexes.extend(indexes)
   async def index_document(self,
                            doc_name: str,
                            text_chunks: List[str],
                            index_base: int,
                            metadata: List[dict] = None) -> \
-                            int:
-    return 0
+                            Tuple[int, List[int]]:
+    return 0, []
   async def index_document_multimodal(self,
                                  doc_name: str,
                                  doc_chunks: List[object],
@@ -184,6 +198,7 @@ class FakeDataSource(DataSource):
   """ mock data source class """
   def __init__(self):
     self.docs_not_processed = [DSF3.src_url]
+    self.docs_unchanged = []
 
   def download_documents(self, doc_url: str, temp_dir: str) -> \
         List[DataSourceFile]:
@@ -238,6 +253,36 @@ async def test_query_generate(mock_query_search, mock_llm_chat,
   assert query_references[0] == create_query_reference
   assert query_references[1] == create_query_reference_2
 
+# Test of query_generate_stream: the references event carries the
+# references left in the question prompt, and comes before the first token
+@pytest.mark.asyncio
+@mock.patch("services.query.query_service.generate_question_prompt")
+@mock.patch("services.query.query_service.llm_chat")
+@mock.patch("services.query.query_service.query_search")
+async def test_query_generate_stream_references(mock_query_search,
+                        mock_llm_chat, mock_question_prompt,
+                        restore_config, create_engine, create_user,
+                        create_query_reference, create_query_reference_2):
+  prompt = QUERY_EXAMPLE["prompt"]
+  mock_query_search.return_value = [create_query_reference,
+                                    create_query_reference_2]
+  mock_llm_chat.return_value = FAKE_GENERATE_RESPONSE
+  mock_question_prompt.return_value = ("question prompt",
+                                       [create_query_reference])
+
+  events = [
+    (event, data) async for event, data in
+    query_generate_stream(create_user.id, prompt, create_engine)
+  ]
+
+  assert [event for event, _ in events] == [QUERY_STREAM_REFERENCES,
+                                            QUERY_STREAM_TOKEN,
+                                            QUERY_STREAM_RESULT]
+  assert events[0][1] == [create_query_reference]
+  assert events[1][1] == FAKE_GENERATE_RESPONSE
+  _, result_references = events[2][1]
+  assert result_references == [create_query_reference]
+
 @pytest.mark.asyncio
 @mock.patch("services.query.query_service.llm_chat")
 @mock.patch("services.query.query_service.query_search")
@@ -333,6 +378,145 @@ async def test_query_search(mock_get_top_relevant_sentences,
   assert query_references[1].chunk_id == qdoc_chunk2.id
   assert query_references[2].chunk_id == qdoc_chunk3.id
 
+@pytest.mark.asyncio
+@mock.patch("services.query.query_service.embeddings.get_embeddings")
+@mock.patch("services.query.query_service.vector_store_from_query_engine")
+async def test_query_search_rank_sentences(mock_get_vector_store,
+                                           mock_get_embeddings,
+                                           create_engine, create_user,
+                                           create_query_docs,
+                                           create_query_doc_chunks):
+  # the query is embedded first, then the sentences of all chunks
+  # are embedded in a single batch
+  mock_get_embeddings.side_effect = [
+    ([True], np.array([[1.0, 0.0]])),
+    ([True, True, True], np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]))
+  ]
+  mock_get_vector_store.return_value = FakeVectorStore()
+  prompt = QUERY_EXAMPLE["prompt"]
+  query_references = await query_search(create_engine, prompt,
+                                        rank_sentences=True)
+  assert len(query_references) == len(create_query_doc_chunks)
+  assert mock_get_embeddings.call_count == 2
+  sentences = mock_get_embeddings.call_args_list[1].args[0]
+  assert len(sentences) == len(create_query_doc_chunks)
+  assert query_references[0].document_text == \
+      f"<b>{create_query_doc_chunks[0].sentences[0]}</b>"
+
+@pytest.mark.asyncio
+@mock.patch("services.query.query_service.embeddings.get_embeddings")
+@mock.patch("services.query.query_service.vector_store_from_query_engine")
+async def test_query_search_rank_sentences_linked_chunks(
+    mock_get_vector_store, mock_get_embeddings, create_engine, create_user,
+    create_query_docs, create_query_doc_chunks):
+  # text chunks linked to a match are ranked in the same batch as the matches
+  friend_chunk = QueryDocumentChunk.from_dict({
+    **QUERY_DOCUMENT_CHUNK_EXAMPLE_1,
+    "id": "asd98798as7dhjhkkjhk1friend",
+    "index": 10,
+    "text": "<p>friend sentence</p>",
+    "clean_text": "friend sentence",
+    "sentences": ["friend sentence"]
+  })
+  friend_chunk.save()
+  qdoc_chunk1 = create_query_doc_chunks[0]
+  qdoc_chunk1.linked_ids = [friend_chunk.id]
+  qdoc_chunk1.update()
+
+  mock_get_embeddings.side_effect = [
+    ([True], np.array([[1.0, 0.0]])),
+    ([True] * 4, np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]))
+  ]
+  mock_get_vector_store.return_value = FakeVectorStore()
+  prompt = QUERY_EXAMPLE["prompt"]
+  query_references = await query_search(create_engine, prompt,
+                                        rank_sentences=True)
+  assert len(query_references) == len(create_query_doc_chunks) + 1
+  assert mock_get_embeddings.call_count == 2
+  sentences = mock_get_embeddings.call_args_list[1].args[0]
+  assert "friend sentence" in sentences
+  assert query_references[1].chunk_id == friend_chunk.id
+  assert query_references[1].document_text == "<b>friend sentence</b>"
+
+@pytest.mark.asyncio
+@mock.patch("services.query.query_service.embeddings.get_embeddings")
+@mock.patch("services.query.query_service.vector_store_from_query_engine")
+async def test_query_search_local_vector_store_filter(
+    mock_get_vector_store, mock_get_embeddings, tmp_path, create_engine,
+    create_query_docs, create_query_doc_chunks):
+  # query filters reach the vector store as dicts, with the authz filter
+  # of the user merged in
+  with mock.patch("services.query.vector_store.LOCAL_VECTOR_STORE_PATH",
+                  str(tmp_path)):
+    local_vector_store = LocalVectorStore(create_engine)
+  chunk_embeddings = np.eye(3, 4)
+  local_vector_store.index.append(
+      [chunk.index for chunk in create_query_doc_chunks], chunk_embeddings,
+      [{"authz": ["admin"], "year": 2020},
+       {"authz": ["staff"], "year": 2021},
+       {"authz": ["admin", "staff"], "year": 2022}])
+  mock_get_vector_store.return_value = local_vector_store
+  mock_get_embeddings.return_value = [True], chunk_embeddings[1:2]
+
+  query_filter = {"year": {"$gte": 2021}, "authz": {"contains": "staff"}}
+  query_references = await query_search(create_engine, QUERY_EXAMPLE["prompt"],
+                                        query_filter=query_filter)
+  assert [ref.chunk_id for ref in query_references] == \
+      [create_query_doc_chunks[1].id, create_query_doc_chunks[2].id]
+
+  query_filter = {"authz": {"contains": "guest"}}
+  query_references = await query_search(create_engine, QUERY_EXAMPLE["prompt"],
+                                        query_filter=query_filter)
+  assert query_references == []
+
+@pytest.mark.asyncio
+@mock.patch("services.query.query_service.INTEGRATED_SEARCH_CHILD_TIMEOUT", 0.1)
+@mock.patch("services.query.query_service.query_search")
+@mock.patch("services.query.query_service.QueryEngine.find_children")
+async def test_retrieve_references_integrated_child_failure(
+    mock_find_children, mock_query_search):
+  # a failing or slow child engine does not fail the integrated search
+  child_engines = []
+  for name in ["child ok", "child error", "child slow"]:
+    child_engine = mock.Mock(query_engine_type=None)
+    child_engine.name = name
+    child_engines.append(child_engine)
+  mock_find_children.return_value = child_engines
+  q_engine = mock.Mock(query_engine_type=QE_TYPE_INTEGRATED_SEARCH)
+
+  async def fake_query_search(child_engine, prompt, rank_sentences,
+                              query_filter):
+    if child_engine.name == "child error":
+      raise RuntimeError("child engine error")
+    if child_engine.name == "child slow":
+      await asyncio.sleep(1)
+    return [child_engine.name]
+  mock_query_search.side_effect = fake_query_search
+
+  query_references = await retrieve_references("test prompt", q_engine,
+                                               "fake-user-id")
+  assert query_references == ["child ok"]
+  assert mock_query_search.call_count == 3
+
+def test_get_similarity():
+  query_embedding = np.array([[3.0, 4.0]])
+  sentence_embeddings = np.array([[3.0, 4.0], [-4.0, 3.0], [-6.0, -8.0]])
+  scores = get_similarity(query_embedding, sentence_embeddings)
+  assert np.allclose(scores, [1.0, 0.0, -1.0])
+
+  # a single sentence embedding and a flat query vector are accepted
+  scores = get_similarity([3.0, 4.0], [6.0, 8.0])
+  assert np.allclose(scores, [1.0])
+
+def test_get_top_relevant_sentences():
+  sentences = ["s0", "s1", "s2", "s3", "s4", "s5"]
+  scores = np.array([0.1, 0.2, 0.3, 0.9, 0.2, 0.1])
+  top_sentences = get_top_relevant_sentences(sentences, scores,
+                                             expand_neighbors=1,
+                                             highlight_top_sentence=True)
+  assert top_sentences == ["s2", "<b>s3</b>", "s4"]
+  assert sentences[3] == "s3"
+
 # Test of query_engine_build function, with no optional input argument params
 # Uses same 3 example docs as other tests of this function
 @pytest.mark.asyncio
@@ -599,3 +783,85 @@ async def test_process_documents_textonly(mock_get_datasource, create_engine):
   assert {doc.doc_url for doc in docs_processed} == \
          {DSF1.src_url, DSF2.src_url}
   assert set(docs_not_processed) == {DSF3.src_url}
+
+# Test of save_document_models: chunks that failed to embed get no chunk
+# models, and are counted on the query document
+def test_save_document_models_failed_chunks(create_engine):
+  doc_chunks = ["chunk 0", "chunk 1", "chunk 2"]
+  query_doc = save_document_models(create_engine, FakeDataSource(), DSF1,
+                                   doc_chunks, 10, 13,
+                                   failed_indexes=[11])
+
+  assert query_doc.chunks_not_indexed == 1
+  chunks = QueryDocumentChunk.find_by_indexes(create_engine.id,
+                                              [10, 11, 12])
+  assert sorted(chunks.keys()) == [10, 12]
+
+# Test of update_doc_index: doc 1 is unchanged, doc 2 has changed and
+# a doc that is no longer at the source is deleted
+@pytest.mark.asyncio
+@mock.patch("services.query.query_service.datasource_from_url")
+async def test_update_doc_index(mock_get_datasource, create_engine,
+                                create_query_docs):
+  mock_get_datasource.return_value = FakeDataSource()
+  qe_vector_store = FakeVectorStore()
+  Path(DSF1.local_path).touch()
+  Path(DSF2.local_path).touch()
+
+  query_doc1 = create_query_docs[0]
+  query_doc1.file_hash = get_file_hash(DSF1.local_path)
+  query_doc1.update()
+  removed_doc = QueryDocument(query_engine_id=create_engine.id,
+                              query_engine=create_engine.name,
+                              doc_url="abcd.com/pdf4",
+                              index_start=123,
+                              index_end=130)
+  removed_doc.save()
+
+  with mock.patch("google.cloud.storage.Client"):
+    docs_processed, docs_not_processed, docs_deleted = \
+        await update_doc_index(doc_url=FAKE_GCS_PATH,
+                               q_engine=create_engine,
+                               qe_vector_store=qe_vector_store)
+
+  assert [doc.doc_url for doc in docs_processed] == [DSF2.src_url]
+  assert docs_processed[0].index_start == 130
+  assert set(docs_not_processed) == {DSF3.src_url}
+  assert docs_deleted == [removed_doc.doc_url]
+  assert sorted(qe_vector_store.deleted_indexes) == \
+         list(range(0, 11)) + list(range(123, 130))
+  remaining_docs = QueryDocument.find_by_ids(
+      [query_doc1.id, create_query_docs[1].id, removed_doc.id])
+  assert [doc.id for doc in remaining_docs] == [query_doc1.id]
+  assert QueryEngine.find_by_id(create_engine.id).next_index == 131
+
+# Test of update_doc_index: when the index update fails to deploy, the
+# models of replaced and removed docs are kept
+@pytest.mark.asyncio
+@mock.patch("services.query.query_service.datasource_from_url")
+async def test_update_doc_index_deploy_failure(mock_get_datasource,
+                                               create_engine,
+                                               create_query_docs):
+  mock_get_datasource.return_value = FakeDataSource()
+  qe_vector_store = FakeVectorStore()
+  qe_vector_store.deploy_update = mock.Mock(
+      side_effect=RuntimeError("deploy failed"))
+  Path(DSF1.local_path).touch()
+  Path(DSF2.local_path).touch()
+
+  removed_doc = QueryDocument(query_engine_id=create_engine.id,
+                              query_engine=create_engine.name,
+                              doc_url="abcd.com/pdf4",
+                              index_start=123,
+                              index_end=130)
+  removed_doc.save()
+
+  with mock.patch("google.cloud.storage.Client"):
+    with pytest.raises(InternalServerError):
+      await update_doc_index(doc_url=FAKE_GCS_PATH,
+                             q_engine=create_engine,
+                             qe_vector_store=qe_vector_store)
+
+  doc_ids = [doc.id for doc in create_query_docs] + [removed_doc.id]
+  remaining_docs = QueryDocument.find_by_ids(doc_ids)
+  assert sorted(doc.id for doc in remaining_docs) == sorted(doc_ids)
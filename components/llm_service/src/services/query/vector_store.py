@@ -18,34 +18,40 @@ Query Vector Store
 
 from abc import ABC, abstractmethod
 from base64 import b64decode
+from functools import partial
+import asyncio
 import json
-import gc
 import os
 import uuid
-import shutil
-import tempfile
 import numpy as np
 from pathlib import Path
 from typing import List, Tuple, Any, Optional, Union
 from google.cloud import aiplatform, storage
 import pyparsing
 from pyparsing import (Word, alphanums, Suppress, ParseResults,
-                       delimitedList, Literal, Forward, ZeroOrMore,
-                       oneOf, ParserElement, QuotedString, Regex)
+                       delimitedList, Literal, Group, infix_notation,
+                       OpAssoc, oneOf, ParserElement, QuotedString, Regex)
 from common.models import QueryEngine
 from common.utils.logging_handler import Logger
 from common.utils.http_exceptions import InternalServerError
 from services import embeddings
-from config import PROJECT_ID, REGION, MODALITY_SET
+from config import (PROJECT_ID, REGION, MODALITY_SET,
+                    EMBEDDING_MAX_FAILED_CHUNK_RATIO,
+                    MULTIMODAL_EMBEDDING_WINDOW)
 from config.vector_store_config import (PG_HOST, PG_PORT,
                                         PG_DBNAME, PG_USER, PG_PASSWD,
                                         DEFAULT_VECTOR_STORE,
                                         VECTOR_STORE_LANGCHAIN_PGVECTOR,
-                                        VECTOR_STORE_MATCHING_ENGINE)
+                                        VECTOR_STORE_MATCHING_ENGINE,
+                                        VECTOR_STORE_LOCAL,
+                                        LOCAL_VECTOR_STORE_PATH,
+                                        LOCAL_VECTOR_STORE_HNSW_MIN_SIZE)
 from langchain.schema.vectorstore import VectorStore as LCVectorStore
 from langchain.vectorstores.pgvector import PGVector as LangchainPGVector
 from langchain.docstore.document import Document
-from utils.gcs_helper import create_bucket
+from services.query.index_writer import IndexDataWriter, open_index_blob
+from services.query.local_index import get_local_index, match_metadata_filter
+from utils.gcs_helper import create_bucket, download_bytes_from_gcs
 
 Logger = Logger.get_logger(__file__)
 
@@ -59,6 +65,25 @@ NUM_MATCH_RESULTS = 5
 MAX_NUM_TEXT_CHUNK_PROCESS = 1000
 
 
+def check_failed_embeddings(doc_name: str, failed_indexes: List[int],
+                            num_chunks: int):
+  """
+  Check the chunks of a document that failed to embed after retries, which
+  are not indexed.
+
+  Raises:
+    RuntimeError if more than EMBEDDING_MAX_FAILED_CHUNK_RATIO of the
+      chunks failed
+  """
+  if not failed_indexes:
+    return
+  message = (f"failed to generate embeddings for {len(failed_indexes)} of "
+             f"{num_chunks} chunks of [{doc_name}]")
+  if len(failed_indexes) > num_chunks * EMBEDDING_MAX_FAILED_CHUNK_RATIO:
+    raise RuntimeError(message)
+  Logger.error(f"{message}, indexing the remaining chunks")
+
+
 class VectorStore(ABC):
   """
   Abstract class for vector store db operations.  A VectorStore is created
@@ -82,7 +107,8 @@ class VectorStore(ABC):
   @abstractmethod
   async def index_document(self, doc_name: str, text_chunks: List[str],
                            index_base: int,
-                           metadata: List[dict] = None) -> int:
+                           metadata: List[dict] = None) -> \
+                            Tuple[int, List[int]]:
     """
     Generate index for a document in this vector store
     Args:
@@ -91,7 +117,11 @@ class VectorStore(ABC):
       index_base (int): index to start from; each chunk gets its own index
       metadata (List[dict]): list of metadata dicts for chunks
     Returns:
-      new_index_base: updated query engine index base
+      tuple of the updated query engine index base, and the indexes of
+      chunks that failed to embed and were not indexed
+    Raises:
+      RuntimeError if too many chunks failed to embed, see
+      check_failed_embeddings
     """
 
   @abstractmethod
@@ -102,6 +132,18 @@ class VectorStore(ABC):
     """ Delete vector store index for this query engine """
     raise NotImplementedError("Not implemented")
 
+  def delete_indexes(self, indexes: List[int]):
+    """ Delete the embeddings with the given indexes from the index """
+    raise NotImplementedError("Not implemented")
+
+  def deploy_update(self):
+    """
+    Apply an index update (embeddings indexed or deleted since init_index)
+    to the deployed index of this query engine.  Db vector stores update
+    the index as embeddings are added and deleted, and don't require this
+    step.
+    """
+
   @abstractmethod
   def similarity_search(self, q_engine: QueryEngine,
                         query_embedding: List[float],
@@ -126,7 +168,10 @@ class VectorStore(ABC):
       https://cloud.google.com/generative-ai-app-builder/docs/filter-search-metadata#filter-expression-syntax
 
     Returns:
-      A pyparsing ParseResults object
+      A pyparsing ParseResults object, holding one expression.  A simple
+      expression is a list [field, operator, operands...], and a NOT, AND
+      or OR combination is a list [operator, expression] or
+      [expression, operator, expression, ...].
     """
     # Enable packrat parsing for better performance
     ParserElement.enable_packrat()
@@ -144,35 +189,35 @@ class VectorStore(ABC):
     lower_bound = (double + pyparsing.Optional(bound_type)) | oneOf("*")
     upper_bound = (double + pyparsing.Optional(bound_type)) | oneOf("*")
 
-    # Define expressions
-    simple_text_expr = (
+    # Define expressions, each parsed as a group
+    simple_text_expr = Group(
         text_field
         + COLON
         + Literal("ANY")
         + LPAR
-        + delimitedList(literal, delim=COMMA)
+        + Group(delimitedList(literal, delim=COMMA))
         + RPAR
     )
-    simple_numerical_expr = (
+    simple_numerical_expr = Group(
         numerical_field
         + COLON
         + Literal("IN")
         + LPAR
-        + lower_bound
+        + Group(lower_bound)
         + COMMA
-        + upper_bound
+        + Group(upper_bound)
         + RPAR
-    ) | (numerical_field + comparison + double)
-
-    expression = Forward()
-    expression <<= (
-        pyparsing.Optional(oneOf("- NOT"))
-        + (simple_text_expr | simple_numerical_expr | \
-          (LPAR + expression + RPAR))
-    )
-
-    # Define the full filter with AND/OR combinations
-    filter_expr = expression + ZeroOrMore((oneOf("AND OR") + expression))
+    ) | Group(numerical_field + comparison + double)
+
+    # Define the full filter with NOT, AND and OR combinations, in order
+    # of precedence
+    filter_expr = infix_notation(
+        simple_text_expr | simple_numerical_expr,
+        [
+          (oneOf("- NOT"), 1, OpAssoc.RIGHT),
+          (Literal("AND"), 2, OpAssoc.LEFT),
+          (Literal("OR"), 2, OpAssoc.LEFT),
+        ])
 
     # parse expression
     parsed_expr = filter_expr.parse_string(filter_str, parse_all=True)
@@ -180,6 +225,62 @@ class VectorStore(ABC):
     return parsed_expr
 
 
+  def translate_filter(self,
+                       parsed_filter: Union[str, dict, ParseResults]) -> dict:
+    """
+    Converts a parsed filter expression into a dictionary representation
+    of the filter compatible with langchain vector store filters:
+      {field: {operator: value}} for numerical comparisons
+      {field: {"IN": [literals]}} for ANY filters
+      {"AND": [clauses]}, {"OR": [clauses]} and {"NOT": clause}
+    A numerical IN filter is translated to an AND of its bounds.
+    """
+    if isinstance(parsed_filter, dict):
+      return parsed_filter
+
+    if isinstance(parsed_filter, str):
+      # Handle single field name (no operator/value)
+      return {parsed_filter: {}}
+
+    if isinstance(parsed_filter, ParseResults):
+      parsed_filter = parsed_filter.as_list()
+
+    # unwrap the group holding a single expression
+    while len(parsed_filter) == 1 and isinstance(parsed_filter[0], list):
+      parsed_filter = parsed_filter[0]
+
+    if parsed_filter[0] in ("NOT", "-"):
+      return {"NOT": self.translate_filter(parsed_filter[1])}
+
+    if isinstance(parsed_filter[0], list):
+      # Handle "AND" or "OR" combinations
+      operator = parsed_filter[1]
+      clauses = [self.translate_filter(expr) for expr in parsed_filter[0::2]]
+      return {operator.upper(): clauses}
+
+    field_name, operator = parsed_filter[0], parsed_filter[1]
+
+    if operator == "ANY":
+      # Handle "ANY" filter
+      return {field_name: {"IN": list(parsed_filter[2])}}
+
+    if operator == "IN":
+      # Handle "IN" filter.  The lower bound is inclusive and the upper
+      # bound exclusive, unless marked "i" (inclusive) or "e" (exclusive)
+      lower, upper = parsed_filter[2], parsed_filter[3]
+      clauses = []
+      if lower[0] != "*":
+        inclusive = lower[1:] != ["e"]
+        clauses.append({field_name: {">=" if inclusive else ">": lower[0]}})
+      if upper[0] != "*":
+        inclusive = upper[1:] == ["i"]
+        clauses.append({field_name: {"<=" if inclusive else "<": upper[0]}})
+      return {"AND": clauses}
+
+    # Handle numerical comparisons
+    return {field_name: {operator: parsed_filter[2]}}
+
+
 class MatchingEngineVectorStore(VectorStore):
   """
   Class for vector store based on Vertex matching engine.
@@ -194,6 +295,8 @@ class MatchingEngineVectorStore(VectorStore):
     self.index_name = qe_name + "_MEindex"
     self.index_endpoint = None
     self.tree_ah_index = None
+    # indexes deleted by an index update
+    self.deleted_indexes = []
     self.index_description = ("Matching Engine index for LLM Service "
                               "query engine: " + self.q_engine.name)
 
@@ -223,93 +326,95 @@ class MatchingEngineVectorStore(VectorStore):
 
   async def index_document(self, doc_name: str, text_chunks: List[str],
                            index_base: int,
-                           metadata: List[dict] = None) -> int:
+                           metadata: List[dict] = None) -> \
+                            Tuple[int, List[int]]:
     """
-    Generate matching engine index data files in a local directory.
+    Generate embeddings for a document and stream them to a matching engine
+    index data file in the index data bucket.  Chunks are embedded in
+    windows of MAX_NUM_TEXT_CHUNK_PROCESS, and each window is uploaded as
+    it is written, so memory use doesn't depend on the document size.
     Args:
       doc_name (str): name of document to be indexed
       text_chunks (List[str]): list of text content chunks for document
       index_base (int): index to start from; each chunk gets its own index
     """
-
-
     chunk_index = 0
     num_chunks = len(text_chunks)
-    embeddings_dir = None
+    failed_indexes = []
 
-    # create a list of chunks to process
-    while chunk_index < num_chunks:
-      remaining_chunks = num_chunks - chunk_index
-      chunk_size = min(MAX_NUM_TEXT_CHUNK_PROCESS, remaining_chunks)
-      end_chunk_index = chunk_index + chunk_size
-      process_chunks = text_chunks[chunk_index:end_chunk_index]
-
-      Logger.info(f"processing {chunk_size} chunks for file {doc_name} "
-                  f"remaining chunks {remaining_chunks}")
-
-      # generate np array of chunk IDs starting from index base
-      ids = np.arange(index_base, index_base + len(process_chunks))
-
-      # Create temporary folder to write embeddings to
-      embeddings_dir = Path(tempfile.mkdtemp())
-
-      # Convert chunks to embeddings in batches, to manage API throttling
-      is_successful, chunk_embeddings = await embeddings.get_embeddings(
-          process_chunks,
-          self.embedding_type
-      )
+    bucket = self.storage_client.bucket(self.bucket_name)
+    blob_name = f"{Path(doc_name).stem}_{index_base}_index.json"
+    index_file = open_index_blob(bucket, blob_name)
+    writer = IndexDataWriter(index_file)
 
-      # check for success
-      if len(chunk_embeddings) == 0 or not all(is_successful):
-        raise RuntimeError(f"failed to generate embeddings for {doc_name}")
-
-      Logger.info(f"generated embeddings for chunks"
-                  f" {chunk_index} to {end_chunk_index}")
-
-      # create JSON
-      embeddings_formatted = [
-        json.dumps(
-          {
-            "id": str(idx),
-            "embedding": [str(value) for value in embedding],
-          }
+    try:
+      while chunk_index < num_chunks:
+        remaining_chunks = num_chunks - chunk_index
+        chunk_size = min(MAX_NUM_TEXT_CHUNK_PROCESS, remaining_chunks)
+        end_chunk_index = chunk_index + chunk_size
+        process_chunks = text_chunks[chunk_index:end_chunk_index]
+
+        Logger.info(f"processing {chunk_size} chunks for file {doc_name} "
+                    f"remaining chunks {remaining_chunks}")
+
+        # generate np array of chunk IDs starting from index base
+        ids = np.arange(index_base, index_base + len(process_chunks))
+
+        # Convert chunks to embeddings in batches, to manage API throttling
+        is_successful, chunk_embeddings = await embeddings.get_embeddings(
+            process_chunks,
+            self.embedding_type
         )
-        + "\n"
-        for idx, embedding in zip(ids[is_successful], chunk_embeddings)
-      ]
-
-      # Create output file
-      doc_stem = Path(doc_name).stem
-      chunk_path = embeddings_dir.joinpath(
-          f"{doc_stem}_{index_base}_index.json")
-
-      # write embeddings for chunk to file
-      with open(chunk_path, "w", encoding="utf-8") as f:
-        f.writelines(embeddings_formatted)
 
-      Logger.info(f"wrote embeddings file for chunks {chunk_index} "
-                  f"to {end_chunk_index}")
-
-      # clean up any large data structures
-      gc.collect()
-
-      index_base = index_base + len(process_chunks)
-      chunk_index = chunk_index + len(process_chunks)
-
-    # copy data files up to bucket
-    bucket = self.storage_client.get_bucket(self.bucket_name)
-    for root, _, files in os.walk(embeddings_dir):
-      for filename in files:
-        local_path = os.path.join(root, filename)
-        blob = bucket.blob(filename)
-        blob.upload_from_filename(local_path)
-
-    Logger.info(f"data uploaded for {doc_name}")
-
-    # clean up tmp files
-    shutil.rmtree(embeddings_dir)
-
-    return index_base
+        # check for success, chunks that failed after retries are not indexed
+        if len(chunk_embeddings) == 0:
+          raise RuntimeError(f"failed to generate embeddings for {doc_name}")
+        # embeddings with nan or infinite values can't be written to the
+        # index data file, and are handled as failed chunks
+        is_successful = np.array(is_successful, dtype=bool)
+        chunk_embeddings = np.asarray(chunk_embeddings)
+        is_finite = np.isfinite(chunk_embeddings).all(axis=1)
+        if not is_finite.all():
+          Logger.error(f"{np.sum(~is_finite)} embeddings of [{doc_name}] "
+                       f"have non-finite values")
+          is_successful[np.flatnonzero(is_successful)[~is_finite]] = False
+          chunk_embeddings = chunk_embeddings[is_finite]
+        failed_indexes.extend(ids[np.logical_not(is_successful)].tolist())
+        check_failed_embeddings(doc_name, failed_indexes, end_chunk_index)
+
+        Logger.info(f"generated embeddings for chunks"
+                    f" {chunk_index} to {end_chunk_index}")
+
+        # write embeddings for the window, uploading the data written
+        await asyncio.to_thread(writer.write,
+                                ids[is_successful], chunk_embeddings)
+
+        Logger.info(f"wrote embeddings for chunks {chunk_index} "
+                    f"to {end_chunk_index}")
+
+        index_base = index_base + len(process_chunks)
+        chunk_index = chunk_index + len(process_chunks)
+
+      # finish the upload
+      await asyncio.to_thread(index_file.close)
+    except Exception:
+      # closing the file finishes the upload, so delete the partial file
+      await asyncio.to_thread(self._discard_index_file,
+                              index_file, bucket, blob_name)
+      raise
+
+    Logger.info(f"uploaded {writer.num_records} embeddings for {doc_name}")
+
+    return index_base, failed_indexes
+
+  @staticmethod
+  def _discard_index_file(index_file, bucket, blob_name: str):
+    """ close and delete a partially written index data file """
+    try:
+      index_file.close()
+      bucket.blob(blob_name).delete()
+    except Exception as e:
+      Logger.error(f"error deleting index data file {blob_name}: {e}")
 
   def delete(self):
     """ Delete vector store index for this query engine """
@@ -319,6 +424,33 @@ class MatchingEngineVectorStore(VectorStore):
     if self.tree_ah_index:
       self.tree_ah_index.delete()
 
+  def delete_indexes(self, indexes: List[int]):
+    """
+    Record indexes to delete.  The deletions are applied by deploy_update.
+    """
+    self.deleted_indexes.extend(indexes)
+
+  def deploy_update(self):
+    """
+    Apply the embeddings uploaded to the data bucket since init_index, and
+    the deleted indexes, to the existing matching engine index.
+    """
+    bucket = self.storage_client.get_bucket(self.bucket_name)
+    if self.deleted_indexes:
+      # ids to delete are read from files in the delete folder of the
+      # update data
+      bucket.blob("delete/deleted_ids.txt").upload_from_string(
+          "".join(f"{idx}\n" for idx in self.deleted_indexes))
+    elif not any(True for _ in bucket.list_blobs(max_results=1)):
+      Logger.info(f"no changes to matching engine index {self.index_name}")
+      return
+
+    Logger.info(f"updating matching engine index {self.index_name}")
+    index = aiplatform.MatchingEngineIndex(self.q_engine.index_id)
+    index.update_embeddings(contents_delta_uri=self.bucket_uri,
+                            is_complete_overwrite=False)
+    Logger.info(f"Updated matching engine index {self.index_name}")
+
   def deploy(self):
     """ Create matching engine index and endpoint """
 
@@ -394,6 +526,7 @@ class LangChainVectorStore(VectorStore):
     super().__init__(q_engine, embedding_type)
     self.lc_vector_store = self._get_langchain_vector_store()
     self.index_length = 0
+    self.storage_client = None
 
   def delete(self):
     self.lc_vector_store.index.remove_ids(
@@ -403,6 +536,10 @@ class LangChainVectorStore(VectorStore):
   def init_index(self):
     pass
 
+  def delete_indexes(self, indexes: List[int]):
+    if indexes:
+      self.lc_vector_store.delete(ids=[str(idx) for idx in indexes])
+
   def _get_langchain_vector_store(self) -> LCVectorStore:
     # retrieve langchain vector store obj from config
     lc_vectorstore = LC_VECTOR_STORES.get(self.q_engine.vector_store)
@@ -423,15 +560,14 @@ class LangChainVectorStore(VectorStore):
 
     # Convert multimodal chunks to embeddings
     # Note that multimodal embedding model can only embed one chunk
-    # at a time. As opposed to the text-only embedding model, which
-    # can embed an array of multiple chunks at the same time.
+    # per request, so the chunks are embedded with concurrent requests.
     chunk_texts = []
     chunk_embeddings = []
 
     # Loop over chunks
+    modality_list_sorted = sorted(MODALITY_SET)
     for doc in doc_chunks:
       # Raise error is doc object is formatted incorrectly
-      modality_list_sorted = sorted(MODALITY_SET)
       modality_list_sorted_exist = \
         [modality in doc.keys() for modality in modality_list_sorted]
       if not any(modality_list_sorted_exist):
@@ -442,18 +578,24 @@ class LangChainVectorStore(VectorStore):
         if not exist:
           doc[modality] = None
 
-      # Get chunk embeddings
-      user_file_bytes = None
-      if doc["image"]:
-        user_file_bytes = b64decode(doc["image"])
-      chunk_embedding = \
-        await embeddings.get_multimodal_embeddings(
-          user_text=doc["text"],
-          user_file_bytes=user_file_bytes,
-          embedding_type=self.embedding_type)
-      # TODO: Also embed doc["video"] (video chunk) and
-      # potentially doc["audio"] (audio chunk)
-
+    # Get chunk embeddings a window of chunks at a time, so that page
+    # images read from GCS are only held for the chunks of one window
+    # TODO: Also embed doc["video"] (video chunk) and
+    # potentially doc["audio"] (audio chunk)
+    multimodal_embeddings = []
+    for start in range(0, len(doc_chunks), MULTIMODAL_EMBEDDING_WINDOW):
+      window = doc_chunks[start:start + MULTIMODAL_EMBEDDING_WINDOW]
+      window_file_bytes = await asyncio.gather(
+          *[asyncio.to_thread(self._read_chunk_image, doc) for doc in window])
+      multimodal_chunks = [(doc["text"], user_file_bytes)
+                           for doc, user_file_bytes
+                           in zip(window, window_file_bytes)]
+      multimodal_embeddings.extend(
+        await embeddings.get_multimodal_embeddings_batched(
+          multimodal_chunks,
+          embedding_type=self.embedding_type))
+
+    for doc, chunk_embedding in zip(doc_chunks, multimodal_embeddings):
       # Check to make sure that embeddings for available modalities exist
       for modality in modality_list_sorted:
         if modality in chunk_embedding:
@@ -484,12 +626,26 @@ class LangChainVectorStore(VectorStore):
 
     return new_index_base
 
+  def _read_chunk_image(self, doc: dict) -> Optional[bytes]:
+    """
+    Image bytes of a multimodal chunk, from its b64 image, or read from the
+    GCS url of the image for chunks that don't hold the image, e.g. PDF pages
+    """
+    if doc["image"]:
+      return b64decode(doc["image"])
+    image_url = doc.get("image_url")
+    if image_url and image_url.startswith("gs://"):
+      if self.storage_client is None:
+        self.storage_client = storage.Client(project=PROJECT_ID)
+      return download_bytes_from_gcs(self.storage_client, image_url)
+    return None
+
   async def index_document(self,
                            doc_name: str,
                            text_chunks: List[str],
                            index_base: int,
                            metadata: List[dict] = None) -> \
-                            int:
+                            Tuple[int, List[int]]:
     # generate list of chunk IDs starting from index base
     ids = list(range(index_base, index_base + len(text_chunks)))
     Logger.info(f"Indexed {len(ids)} embeddings for [{doc_name}]")
@@ -499,9 +655,19 @@ class LangChainVectorStore(VectorStore):
       await embeddings.get_embeddings(text_chunks,
                                       self.embedding_type)
 
-    # check for success
-    if len(chunk_embeddings) == 0 or not all(is_successful):
+    # check for success, chunks that failed after retries are not indexed
+    if len(chunk_embeddings) == 0:
       raise RuntimeError(f"failed to generate embeddings for {doc_name}")
+    failed_indexes = [idx for idx, success in zip(ids, is_successful)
+                      if not success]
+    check_failed_embeddings(doc_name, failed_indexes, len(text_chunks))
+    if failed_indexes:
+      text_chunks = [text for text, success
+                     in zip(text_chunks, is_successful) if success]
+      ids = [idx for idx, success in zip(ids, is_successful) if success]
+      if metadata:
+        metadata = [chunk_metadata for chunk_metadata, success
+                    in zip(metadata, is_successful) if success]
 
     # add embeddings to vector store
     self.lc_vector_store.add_embeddings(texts=text_chunks,
@@ -509,9 +675,9 @@ class LangChainVectorStore(VectorStore):
                                         ids=ids,
                                         metadatas=metadata)
     # return new index base
-    new_index_base = index_base + len(text_chunks)
+    new_index_base = index_base + len(is_successful)
     self.index_length = new_index_base
-    return new_index_base
+    return new_index_base, failed_indexes
 
   def similarity_search(self, q_engine: QueryEngine,
                        query_embedding: List[float],
@@ -543,9 +709,11 @@ class LangChainVectorStore(VectorStore):
     """
     Parse a filter for a langchain vector store.
     For now assume this is a string specifying a json dict
-    {"key":{"$op": "value"}}
+    {"key":{"$op": "value"}}, or a dict that was already decoded
     """
-    if filter_str is not None:
+    if isinstance(filter_str, dict):
+      filter_dict = filter_str
+    elif filter_str is not None:
       filter_dict = json.loads(filter_str)
     else:
       filter_dict = None
@@ -565,42 +733,6 @@ class LangChainVectorStore(VectorStore):
     """ Create matching engine index and endpoint """
     pass
 
-  def translate_filter(self,
-                       parsed_filter: Union[str, dict, ParseResults]) -> dict:
-    """
-    Converts a parsed filter expression into a dictionary representation
-    of the filter compatible with langchain vector store filters.
-    """
-    if isinstance(parsed_filter, dict):
-      return parsed_filter
-
-    if isinstance(parsed_filter, str):
-      # Handle single field name (no operator/value)
-      return {parsed_filter: {}}
-
-    if isinstance(parsed_filter, list) and len(parsed_filter) == 2:
-      # Handle numerical comparisons
-      field_name, (operator, value) = parsed_filter
-      return {field_name: {operator.upper(): value}}
-
-    if isinstance(parsed_filter, list) and len(parsed_filter) == 4:
-      # Handle "ANY" filter
-      field_name, _, _, literals = parsed_filter
-      return {field_name: {"IN": list(literals)}}
-
-    if isinstance(parsed_filter, list) and len(parsed_filter) == 6:
-      # Handle "IN" filter
-      field_name, _, _, lower, _, upper = parsed_filter
-      return {field_name: {"BETWEEN": [lower, upper]}}
-
-    if isinstance(parsed_filter, list) and len(parsed_filter) > 2:
-      # Handle "AND" or "OR" combinations
-      operator = parsed_filter[1]
-      clauses = [self.translate_filter(expr) for expr in parsed_filter[0::2]]
-      return {operator.upper(): clauses}
-
-    return None
-
 
 class LLMServicePGVector(LangchainPGVector):
   """
@@ -669,6 +801,94 @@ class PostgresVectorStore(LangChainVectorStore):
     return processed_results
 
 
+class LocalVectorStore(VectorStore):
+  """
+  Vector store kept in local files, with float32 embeddings in a
+  memory-mapped NumPy file per query engine.  Intended for small engines
+  and for testing, as the index files must be on a volume shared by the
+  build jobs and the service.
+  """
+  def __init__(self, q_engine: QueryEngine, embedding_type: str = None) -> None:
+    super().__init__(q_engine, embedding_type)
+    self.index = get_local_index(
+        os.path.join(LOCAL_VECTOR_STORE_PATH, q_engine.id),
+        LOCAL_VECTOR_STORE_HNSW_MIN_SIZE)
+
+  @property
+  def vector_store_type(self):
+    return VECTOR_STORE_LOCAL
+
+  def init_index(self):
+    pass
+
+  async def index_document(self,
+                           doc_name: str,
+                           text_chunks: List[str],
+                           index_base: int,
+                           metadata: List[dict] = None) -> \
+                            Tuple[int, List[int]]:
+    # generate list of chunk IDs starting from index base
+    ids = list(range(index_base, index_base + len(text_chunks)))
+
+    # Convert chunks to embeddings
+    is_successful, chunk_embeddings = \
+      await embeddings.get_embeddings(text_chunks,
+                                      self.embedding_type)
+
+    # check for success, chunks that failed after retries are not indexed
+    if len(chunk_embeddings) == 0:
+      raise RuntimeError(f"failed to generate embeddings for {doc_name}")
+    failed_indexes = [idx for idx, success in zip(ids, is_successful)
+                      if not success]
+    check_failed_embeddings(doc_name, failed_indexes, len(text_chunks))
+    if failed_indexes:
+      ids = [idx for idx, success in zip(ids, is_successful) if success]
+      if metadata:
+        metadata = [chunk_metadata for chunk_metadata, success
+                    in zip(metadata, is_successful) if success]
+
+    # append embeddings to the index files
+    await asyncio.to_thread(self.index.append,
+                            ids, chunk_embeddings, metadata or None)
+    Logger.info(f"Indexed {len(ids)} embeddings for [{doc_name}]")
+
+    # return new index base
+    return index_base + len(text_chunks), failed_indexes
+
+  def deploy(self):
+    pass
+
+  def delete(self):
+    self.index.clear()
+
+  def delete_indexes(self, indexes: List[int]):
+    self.index.delete(indexes)
+
+  def similarity_search(self, q_engine: QueryEngine,
+                        query_embedding: List[float],
+                        query_filter: Optional[Union[str, dict]] = None) -> \
+                          List[int]:
+    """
+    Retrieve text matches for query embeddings.
+    Args:
+      q_engine: QueryEngine model
+      query_embedding: single embedding array for query
+      query_filter: (optional) filter expression in the Vertex Search
+        format, or a filter dict, as passed by the query service with
+        the authorization filter of the user
+    Returns:
+      list of indexes that are matched of length NUM_MATCH_RESULTS
+    """
+    metadata_filter = None
+    if query_filter:
+      if not isinstance(query_filter, dict):
+        query_filter = self.parse_filter(query_filter)
+      filter_dict = self.translate_filter(query_filter)
+      metadata_filter = partial(match_metadata_filter, filter_dict)
+    return self.index.search(query_embedding, NUM_MATCH_RESULTS,
+                             metadata_filter)
+
+
 LC_VECTOR_STORES = {
   VECTOR_STORE_LANGCHAIN_PGVECTOR: PostgresVectorStore
 }
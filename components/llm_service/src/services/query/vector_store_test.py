@@ -0,0 +1,121 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+  Unit tests for vector store filters and the local vector store
+"""
+# disabling pylint rules that conflict with pytest fixtures
+# pylint: disable=unused-argument,redefined-outer-name
+from unittest import mock
+import numpy as np
+import pytest
+from common.utils.config import set_env_var
+with set_env_var("PG_HOST", ""):
+  from services.query.vector_store import LocalVectorStore
+
+
+@pytest.fixture
+def local_vector_store(tmp_path):
+  q_engine = mock.Mock(id="test-query-engine")
+  with mock.patch("services.query.vector_store.LOCAL_VECTOR_STORE_PATH",
+                  str(tmp_path)):
+    yield LocalVectorStore(q_engine)
+
+
+@pytest.mark.parametrize("filter_str,filter_dict", [
+  ('color: ANY("red","blue")', {"color": {"IN": ["red", "blue"]}}),
+  ("price < 10", {"price": {"<": 10.0}}),
+  ("price: IN(1, 5)",
+   {"AND": [{"price": {">=": 1.0}}, {"price": {"<": 5.0}}]}),
+  ("price: IN(*, 5i)", {"AND": [{"price": {"<=": 5.0}}]}),
+  ("price: IN(2e, *)", {"AND": [{"price": {">": 2.0}}]}),
+  ("(price < 3)", {"price": {"<": 3.0}}),
+  ("NOT price < 3", {"NOT": {"price": {"<": 3.0}}}),
+  ("-year < -1.5", {"NOT": {"year": {"<": -1.5}}}),
+  ('price >= 3 AND year = 2020 OR color: ANY("x")',
+   {"OR": [{"AND": [{"price": {">=": 3.0}}, {"year": {"=": 2020.0}}]},
+           {"color": {"IN": ["x"]}}]}),
+  ("a < 1 AND (b > 2 OR c = 3)",
+   {"AND": [{"a": {"<": 1.0}},
+            {"OR": [{"b": {">": 2.0}}, {"c": {"=": 3.0}}]}]}),
+])
+def test_parse_and_translate_filter(local_vector_store, filter_str,
+                                    filter_dict):
+  parsed_filter = local_vector_store.parse_filter(filter_str)
+  assert local_vector_store.translate_filter(parsed_filter) == filter_dict
+
+
+def test_translate_filter_dict(local_vector_store):
+  # langchain vector stores parse filters as json dicts, which are used as is
+  filter_dict = {"year": {"$gte": 2020}}
+  assert local_vector_store.translate_filter(filter_dict) == filter_dict
+
+
+@pytest.mark.asyncio
+async def test_local_vector_store(local_vector_store):
+  rng = np.random.default_rng(0)
+  chunk_embeddings = rng.standard_normal((4, 8))
+  text_chunks = ["chunk 0", "chunk 1", "chunk 2", "chunk 3"]
+  metadata = [{"year": 2000 + i} for i in range(4)]
+
+  with mock.patch("services.query.vector_store.embeddings.get_embeddings",
+                  new=mock.AsyncMock(
+                      return_value=([True] * 4, chunk_embeddings))):
+    index_base, failed_indexes = await local_vector_store.index_document(
+        "doc.txt", text_chunks, 10, metadata)
+  assert index_base == 14 and failed_indexes == []
+
+  q_engine = local_vector_store.q_engine
+  results = local_vector_store.similarity_search(q_engine,
+                                                 chunk_embeddings[2])
+  assert results[0] == 12 and sorted(results) == [10, 11, 12, 13]
+  results = local_vector_store.similarity_search(
+      q_engine, chunk_embeddings[2], query_filter="year >= 2002")
+  assert sorted(results) == [12, 13]
+
+  local_vector_store.delete_indexes([12])
+  results = local_vector_store.similarity_search(q_engine,
+                                                 chunk_embeddings[2])
+  assert 12 not in results
+
+  local_vector_store.delete()
+  assert local_vector_store.similarity_search(q_engine,
+                                              chunk_embeddings[2]) == []
+
+
+@pytest.mark.asyncio
+async def test_local_vector_store_failed_chunks(local_vector_store):
+  rng = np.random.default_rng(0)
+  text_chunks = [f"chunk {i}" for i in range(4)]
+  is_successful = [True, False, True, True]
+  chunk_embeddings = rng.standard_normal((3, 8))
+  get_embeddings = mock.AsyncMock(
+      return_value=(is_successful, chunk_embeddings))
+
+  # too many failed chunks fail the document
+  with mock.patch("services.query.vector_store.embeddings.get_embeddings",
+                  new=get_embeddings):
+    with pytest.raises(RuntimeError):
+      await local_vector_store.index_document("doc.txt", text_chunks, 0)
+
+  # failed chunks under the threshold are returned, and not indexed
+  with mock.patch("services.query.vector_store.embeddings.get_embeddings",
+                  new=get_embeddings), \
+       mock.patch("services.query.vector_store."
+                  "EMBEDDING_MAX_FAILED_CHUNK_RATIO", 0.5):
+    index_base, failed_indexes = await local_vector_store.index_document(
+        "doc.txt", text_chunks, 0)
+  assert index_base == 4 and failed_indexes == [1]
+  results = local_vector_store.similarity_search(local_vector_store.q_engine,
+                                                 chunk_embeddings[0])
+  assert sorted(results) == [0, 2, 3]
@@ -30,6 +30,8 @@ from common.models import QueryEngine, QueryDocument, QueryReference
 from common.utils.logging_handler import Logger
 from services.query.data_source import DataSourceFile
 from services.query.web_datasource import WebDataSource
+from services.client_registry import (client_registry, async_client_key,
+                                      is_transport_failure)
 import proto
 
 Logger = Logger.get_logger(__file__)
@@ -124,9 +126,13 @@ async def perform_vertex_search(data_store_id: str,
       else None
   )
 
-  # Create a client
-  client = \
-      discoveryengine.SearchServiceAsyncClient(client_options=client_options)
+  # Get a shared client for this event loop
+  search_client_key = async_client_key(
+      discoveryengine.SearchServiceAsyncClient.__name__, None, location)
+  client = client_registry.get(
+      search_client_key,
+      lambda: discoveryengine.SearchServiceAsyncClient(
+          client_options=client_options))
 
   # The full resource name of the search engine serving config, e.g.
   # "projects/{project_id}/locations/{location}/dataStores/{data_store_id}"
@@ -168,7 +174,13 @@ async def perform_vertex_search(data_store_id: str,
   )
 
   # perform search with client
-  response = await client.search(request)
+  try:
+    response = await client.search(request)
+  except Exception as e:
+    if is_transport_failure(e):
+      client_registry.report_failure(search_client_key, e)
+    raise
+  client_registry.report_success(search_client_key)
 
   # get list of results
   result_list = response.results
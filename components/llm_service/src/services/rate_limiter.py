@@ -0,0 +1,102 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Token bucket rate limiting of model API requests.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Hashable, Optional
+from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+
+# errors returned when a model quota is exceeded
+THROTTLED_EXCEPTIONS = (ResourceExhausted, TooManyRequests)
+
+
+class TokenBucket():
+  """
+  Token bucket limiting requests to rate per second, with bursts of up to
+  capacity requests.  acquire reserves its tokens when it is called, and
+  the bucket goes negative while callers wait for them, so waiting
+  coroutines are served in the order they called acquire.
+  """
+
+  def __init__(self, rate: float, capacity: Optional[float] = None):
+    if rate <= 0:
+      raise ValueError(f"rate must be positive, got {rate}")
+    self.rate = rate
+    self.capacity = capacity if capacity is not None else max(1.0, rate)
+    self.tokens = self.capacity
+    self.updated = time.monotonic()
+    self._lock = threading.Lock()
+
+  def _refill(self, now: float):
+    self.tokens = min(self.capacity,
+                      self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+
+  def try_acquire(self, tokens: float = 1) -> float:
+    """
+    Take tokens from the bucket if they are available.
+
+    Returns:
+      0 if the tokens were taken, otherwise the number of seconds until
+      they will be available
+    """
+    with self._lock:
+      self._refill(time.monotonic())
+      if self.tokens >= tokens:
+        self.tokens -= tokens
+        return 0
+      return (tokens - self.tokens) / self.rate
+
+  def _reserve(self, tokens: float) -> float:
+    """ take tokens, returning the seconds until they are available """
+    with self._lock:
+      self._refill(time.monotonic())
+      self.tokens -= tokens
+      return max(0, -self.tokens / self.rate)
+
+  def _release(self, tokens: float):
+    """ return reserved tokens that were not used """
+    with self._lock:
+      self.tokens = min(self.capacity, self.tokens + tokens)
+
+  async def acquire(self, tokens: float = 1):
+    """ take tokens, waiting until they are available """
+    delay = self._reserve(tokens)
+    if delay > 0:
+      try:
+        await asyncio.sleep(delay)
+      except asyncio.CancelledError:
+        self._release(tokens)
+        raise
+
+
+_rate_limiters: Dict[Hashable, TokenBucket] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: Hashable, rate: float) -> TokenBucket:
+  """
+  Return the process-wide token bucket for key, e.g. a model id, so that
+  concurrent requests share the quota.  The bucket is recreated if the
+  configured rate changes.
+  """
+  with _rate_limiters_lock:
+    bucket = _rate_limiters.get(key)
+    if bucket is None or bucket.rate != rate:
+      bucket = _rate_limiters[key] = TokenBucket(rate)
+    return bucket
@@ -0,0 +1,70 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Unit tests for the token bucket rate limiter
+"""
+import asyncio
+from unittest import mock
+import pytest
+from services.rate_limiter import TokenBucket, get_rate_limiter
+
+
+def test_token_bucket():
+  with mock.patch("services.rate_limiter.time.monotonic", return_value=0):
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    # bucket is empty, next token is available in 1 / rate seconds
+    assert bucket.try_acquire() == 0.5
+
+  with mock.patch("services.rate_limiter.time.monotonic", return_value=10):
+    # bucket refills up to capacity
+    assert bucket.try_acquire(2) == 0
+    assert bucket.try_acquire() == 0.5
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_acquire():
+  bucket = TokenBucket(rate=1000, capacity=1)
+  for _ in range(5):
+    await bucket.acquire()
+  assert bucket.tokens < 1
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_acquire_in_order():
+  with mock.patch("services.rate_limiter.time.monotonic", return_value=0), \
+       mock.patch("services.rate_limiter.asyncio.sleep",
+                  new=mock.AsyncMock()) as mock_sleep:
+    bucket = TokenBucket(rate=2, capacity=1)
+    # each waiter reserves the next token, and waits 1 / rate longer
+    for _ in range(4):
+      await bucket.acquire()
+    assert [call.args[0] for call in mock_sleep.call_args_list] == \
+        [0.5, 1.0, 1.5]
+    # a request that doesn't wait can't take the tokens of the waiters
+    assert bucket.try_acquire() == 2.0
+
+    # a cancelled waiter returns its tokens
+    mock_sleep.side_effect = asyncio.CancelledError
+    with pytest.raises(asyncio.CancelledError):
+      await bucket.acquire()
+    assert bucket.tokens == -3
+
+
+def test_get_rate_limiter():
+  bucket = get_rate_limiter("test-model", 5)
+  assert get_rate_limiter("test-model", 5) is bucket
+  assert get_rate_limiter("test-model", 10).rate == 10
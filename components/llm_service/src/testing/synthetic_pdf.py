@@ -0,0 +1,66 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Synthetic PDF files used in unit tests and benchmarks """
+
+
+def page_text(page: int, line: int) -> str:
+  """ text of a line of a synthetic PDF page """
+  return f"Page {page} line {line} of the synthetic test document"
+
+
+def write_synthetic_pdf(file_path: str, num_pages: int,
+                        lines_per_page: int = 40):
+  """
+  Write a PDF of num_pages pages, each with lines_per_page lines of text
+  returned by page_text.
+  """
+  # object numbers: 1 catalog, 2 pages, 3 font, then a page and a
+  # content stream object per page
+  objects = [
+    b"<< /Type /Catalog /Pages 2 0 R >>",
+    None,
+    b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+  ]
+  page_refs = []
+  for page in range(num_pages):
+    page_num = len(objects) + 1
+    page_refs.append(f"{page_num} 0 R")
+    lines = [f"({page_text(page, line)}) Tj T*"
+             for line in range(lines_per_page)]
+    content = ("BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(lines) +
+               " ET").encode("latin-1")
+    objects.append(
+        (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+         f"/Resources << /Font << /F1 3 0 R >> >> "
+         f"/Contents {page_num + 1} 0 R >>").encode("latin-1"))
+    objects.append(f"<< /Length {len(content)} >>\nstream\n".encode("latin-1")
+                   + content + b"\nendstream")
+  objects[1] = (f"<< /Type /Pages /Kids [{' '.join(page_refs)}] "
+                f"/Count {num_pages} >>").encode("latin-1")
+
+  pdf = bytearray(b"%PDF-1.4\n")
+  offsets = []
+  for num, obj in enumerate(objects, start=1):
+    offsets.append(len(pdf))
+    pdf += f"{num} 0 obj\n".encode("latin-1") + obj + b"\nendobj\n"
+  xref_offset = len(pdf)
+  pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+  for offset in offsets:
+    pdf += f"{offset:010d} 00000 n \n".encode("latin-1")
+  pdf += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+          f"startxref\n{xref_offset}\n%%EOF\n").encode("latin-1")
+
+  with open(file_path, "wb") as f:
+    f.write(pdf)
@@ -0,0 +1,26 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Add the summary fields (UserChat.prompt and message_count) to chats
+  created before chat listings used them.  Run once from the llm service
+  src folder:
+
+  PYTHONPATH=../../common/src python utils/backfill_chat_summaries.py
+"""
+from common.models import UserChat
+
+if __name__ == "__main__":
+  num_updated = UserChat.backfill_summaries()
+  print(f"Updated summary fields of {num_updated} chats")
@@ -123,6 +123,13 @@ def upload_to_gcs(storage_client: storage.Client, bucket_name: str,
   Logger.info(f"Uploaded {file_path} to {gcs_url}")
   return gcs_url
 
+def download_bytes_from_gcs(storage_client: storage.Client,
+                            gcs_url: str) -> bytes:
+  """ Download the contents of a gs:// url. """
+  bucket_name, blob_name = gcs_url.split("gs://")[1].split("/", 1)
+  bucket = storage_client.bucket(bucket_name)
+  return bucket.blob(blob_name).download_as_bytes()
+
 def upload_file_to_gcs(bucket: storage.Bucket,
                        file_name: str, file_obj: io.BytesIO) -> str:
   """ Upload file to GCS bucket. Returns URL to file. """
@@ -0,0 +1,90 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+PDF text extraction in worker processes.
+
+Workers are started with the forkserver (or spawn) method rather than
+forked from the service, which runs threads and gRPC clients, and only
+import this module, so they stay small.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from pypdf import PdfReader
+
+_pdf_executor = None
+_pdf_executor_workers = 0
+_pdf_executor_lock = threading.Lock()
+
+
+def extract_pdf_page_range(doc_filepath: str, start: int, end: int,
+                           deadline: Optional[float] = None) -> List[str]:
+  """
+  Extract the text of pages [start, end) of a PDF.
+
+  Args:
+    deadline: time.monotonic() time after which no more pages are
+      extracted, None for no deadline
+  Raises:
+    TimeoutError: if the deadline passes before the pages are extracted
+  """
+  with open(doc_filepath, "rb") as f:
+    reader = PdfReader(f)
+    pages = []
+    for page in range(start, end):
+      if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError(f"timed out reading page {page} of {doc_filepath}")
+      pages.append(reader.pages[page].extract_text())
+    return pages
+
+
+def get_pdf_executor(max_workers: int) -> ProcessPoolExecutor:
+  """
+  Return the process-wide pool of PDF extraction workers, creating it with
+  max_workers processes on first use.
+  """
+  global _pdf_executor, _pdf_executor_workers
+  with _pdf_executor_lock:
+    if _pdf_executor is None or _pdf_executor_workers != max_workers:
+      if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=False)
+      start_method = "forkserver"
+      if start_method not in multiprocessing.get_all_start_methods():
+        start_method = "spawn"
+      _pdf_executor = ProcessPoolExecutor(
+          max_workers=max_workers,
+          mp_context=multiprocessing.get_context(start_method))
+      _pdf_executor_workers = max_workers
+    return _pdf_executor
+
+
+def terminate_pdf_executor(executor: ProcessPoolExecutor):
+  """
+  Kill the worker processes of executor, e.g. after a timeout, so hung
+  extractions don't keep running.  Extractions of other documents in
+  progress on executor fail with BrokenProcessPool, and the next
+  get_pdf_executor call creates a new pool.
+  """
+  global _pdf_executor
+  with _pdf_executor_lock:
+    if _pdf_executor is executor:
+      _pdf_executor = None
+    # ProcessPoolExecutor has no public API to stop running tasks
+    # pylint: disable=protected-access
+    for process in list((executor._processes or {}).values()):
+      process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,114 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmark of ruleset evaluation throughput.
+
+Compares one POST /ruleset/{id}/evaluate request per record with a single
+POST /ruleset/{id}/evaluate_batch request, with the ruleset served from
+memory instead of Firestore.
+"""
+import json
+import time
+from types import SimpleNamespace
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from models.ruleset import RuleSet
+from routes import rulesets
+
+NUM_RECORDS = [100, 1000, 10000]
+
+RULES = {
+  "contentType": "application/vnd.gorules.decision",
+  "edges": [
+    {"id": "e1", "type": "edge", "sourceId": "input", "targetId": "table"},
+    {"id": "e2", "type": "edge", "sourceId": "table", "targetId": "output"},
+  ],
+  "nodes": [
+    {"id": "input", "name": "Request", "type": "inputNode"},
+    {
+      "id": "table",
+      "name": "eligibility",
+      "type": "decisionTableNode",
+      "content": {
+        "hitPolicy": "first",
+        "inputs": [
+          {"id": "age", "name": "Age", "type": "expression",
+           "field": "profile.age"},
+          {"id": "income", "name": "Household Income", "type": "expression",
+           "field": "profile.household_income"},
+        ],
+        "outputs": [
+          {"id": "eligible", "name": "Eligible", "type": "expression",
+           "field": "eligible"},
+        ],
+        "rules": [
+          {"_id": "r1", "age": "<19", "income": "", "eligible": "true"},
+          {"_id": "r2", "age": ">=65", "income": "<30000",
+           "eligible": "true"},
+          {"_id": "r3", "age": "", "income": "", "eligible": "false"},
+        ],
+      },
+    },
+    {"id": "output", "name": "Response", "type": "outputNode"},
+  ],
+}
+
+RULESET = SimpleNamespace(
+    runner_data={"gorules": {"rules_raw_json": RULES}},
+    last_modified_time="benchmark")
+
+
+def make_records(num_records: int) -> list:
+  return [{"profile": {"age": i % 90, "household_income": (i * 997) % 60000}}
+          for i in range(num_records)]
+
+
+def time_single(client: TestClient, records: list) -> float:
+  start = time.perf_counter()
+  for record in records:
+    resp = client.post("/ruleset/benchmark/evaluate", json=record)
+    assert resp.status_code == 200
+  return time.perf_counter() - start
+
+
+def time_batch(client: TestClient, records: list) -> float:
+  body = "\n".join(json.dumps(record) for record in records)
+  start = time.perf_counter()
+  resp = client.post("/ruleset/benchmark/evaluate_batch", content=body,
+                     headers={"Content-Type": "application/x-ndjson"})
+  assert resp.status_code == 200
+  assert len(resp.text.splitlines()) == len(records)
+  return time.perf_counter() - start
+
+
+def run_benchmark():
+  app = FastAPI()
+  app.include_router(rulesets.router)
+  client = TestClient(app)
+
+  print(f"{'records':>8} {'single (rec/s)':>15} "
+        f"{'batch (rec/s)':>14} {'speedup':>9}")
+  with mock.patch.object(RuleSet, "find_by_doc_id", return_value=RULESET):
+    for num_records in NUM_RECORDS:
+      records = make_records(num_records)
+      single_time = time_single(client, records)
+      batch_time = min(time_batch(client, records) for _ in range(3))
+      print(f"{num_records:>8} {num_records / single_time:>15.0f} "
+            f"{num_records / batch_time:>14.0f} "
+            f"{single_time / batch_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+  run_benchmark()
@@ -23,3 +23,11 @@ PROJECT_ID = os.environ.get("PROJECT_ID",
                             os.environ.get("GOOGLE_CLOUD_PROJECT"))
 DATABASE_PREFIX = os.getenv("DATABASE_PREFIX", "")
 SERVICE_NAME = os.getenv("SERVICE_NAME")
+
+# seconds a compiled ruleset decision is used before checking whether the
+# ruleset has changed in Firestore
+RULESET_CACHE_TTL = float(os.getenv("RULESET_CACHE_TTL", "60"))
+
+# number of threads evaluating the records of a batch evaluation request
+RULES_EVALUATE_WORKERS = int(os.getenv("RULES_EVALUATE_WORKERS",
+                                       str(min(8, os.cpu_count() or 1))))
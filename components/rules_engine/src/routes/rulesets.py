@@ -14,7 +14,10 @@
 
 """ Ruleset endpoints """
 
-from fastapi import APIRouter
+import json
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from schemas.ruleset import RulesetFieldsSchema, RulesetRulesImportSchema
 from schemas.evaluation_result import EvaluationResultSchema
 from rules_runners.gorules import GoRules
@@ -112,6 +115,71 @@ async def import_rules(
   }
 
 
+@router.put("/{ruleset_id}")
+async def put(
+  data: RulesetRulesImportSchema,
+  ruleset_id: str,
+  rules_runner: str="gorules"):
+  """Replace the rules of an existing RuleSet.
+
+  Args:
+    ruleset_id (str): unique id of the ruleset
+    data (str): A JSON string data.
+
+  Raises:
+    HTTPException: 404 Not Found if ruleset doesn't exist for the given id
+    HTTPException: 500 Internal Server Error if something fails
+
+  Returns:
+    [JSON]: {'status': 'Success'} if the ruleset is updated
+  """
+
+  runner = RULES_RUNNERS.get(rules_runner)
+
+  if not runner:
+    return {
+      "rules_runner": rules_runner,
+      "status": "Error",
+      "message": f"Rules_runner '{rules_runner}' is not defined."
+    }
+
+  if RuleSet.find_by_doc_id(ruleset_id) is None:
+    raise HTTPException(status_code=404,
+                        detail=f"Ruleset {ruleset_id} not found.")
+
+  runner.load_rules_from_json(ruleset_id, data.rules_data,
+                              create_new_ruleset=False)
+
+  return SUCCESS_RESPONSE
+
+
+@router.delete("/{ruleset_id}")
+async def delete(ruleset_id: str):
+  """Delete a RuleSet
+
+  Args:
+    ruleset_id (str): unique id of the ruleset
+
+  Raises:
+    HTTPException: 404 Not Found if ruleset doesn't exist for the given id
+    HTTPException: 500 Internal Server Error if something fails
+
+  Returns:
+    [JSON]: {'status': 'Success'} if the ruleset is deleted
+  """
+
+  ruleset = RuleSet.find_by_doc_id(ruleset_id)
+  if ruleset is None:
+    raise HTTPException(status_code=404,
+                        detail=f"Ruleset {ruleset_id} not found.")
+
+  RuleSet.collection.delete(ruleset.key)
+  for runner in RULES_RUNNERS.values():
+    runner.invalidate(ruleset_id)
+
+  return SUCCESS_RESPONSE
+
+
 # TODO: Replace record (dict) with actual Record data model.
 @router.post("/{ruleset_id}/evaluate",
              response_model=EvaluationResultSchema)
@@ -147,3 +215,110 @@ async def evaluate(
     "status": "Success",
     "result": output.get("result", None),
   }
+
+
+def parse_records(body: bytes, content_type: str) \
+    -> Tuple[List[Optional[dict]], Dict[int, str]]:
+  """Parse the records of a batch evaluation request.
+
+  Args:
+    body (bytes): a JSON array of records, or NDJSON with one record per line
+    content_type (str): request content type
+
+  Raises:
+    HTTPException: 422 if the body is not a valid JSON array
+
+  Returns:
+    records: list of records, None for records that are not valid
+    errors: error messages of invalid records by record index
+  """
+  records = []
+  errors = {}
+  text = body.decode("utf-8")
+  if "ndjson" not in content_type and text.lstrip().startswith("["):
+    try:
+      items = json.loads(text)
+    except json.JSONDecodeError as e:
+      raise HTTPException(status_code=422,
+                          detail=f"Invalid JSON array of records: {e}") from e
+  else:
+    items = []
+    for line in text.splitlines():
+      if not line.strip():
+        continue
+      try:
+        items.append(json.loads(line))
+      except json.JSONDecodeError as e:
+        errors[len(items)] = f"Invalid JSON record: {e}"
+        items.append(None)
+
+  for index, item in enumerate(items):
+    if not isinstance(item, dict) and index not in errors:
+      errors[index] = "Record is not a JSON object."
+    records.append(item if index not in errors else None)
+  return records, errors
+
+
+def evaluation_stream(records: List[Optional[dict]],
+                      errors: Dict[int, str],
+                      results: Iterator[Union[dict, Exception]]) \
+                        -> Iterator[str]:
+  """Format batch evaluation results as NDJSON lines in record order."""
+  for index in range(len(records)):
+    if index in errors:
+      line = {"index": index, "status": "Error", "message": errors[index]}
+    else:
+      output = next(results)
+      if isinstance(output, Exception):
+        line = {"index": index, "status": "Error", "message": str(output)}
+      else:
+        line = {"index": index, "status": "Success",
+                "result": output.get("result", None)}
+    yield json.dumps(line) + "\n"
+
+
+@router.post("/{ruleset_id}/evaluate_batch")
+async def evaluate_batch(
+    ruleset_id: str, request: Request, rules_runner: str="gorules"):
+  """Execute a ruleset against a batch of records.
+
+  The request body is a JSON array of records, or NDJSON
+  (application/x-ndjson) with one record per line.  All records are
+  evaluated against the same compiled ruleset.
+
+  Args:
+    ruleset_id (str): unique id of the ruleset
+    request (Request): request with the records in the body
+
+  Raises:
+    HTTPException: 404 Not Found if ruleset doesn't exist for the given id
+    HTTPException: 422 if the body is not a valid JSON array
+    HTTPException: 500 Internal Server Error if something fails
+
+  Returns:
+    NDJSON stream with one line per record, in the order of the records:
+    {"index": 0, "status": "Success", "result": {...}} or
+    {"index": 1, "status": "Error", "message": "..."}
+  """
+
+  runner = RULES_RUNNERS.get(rules_runner)
+
+  if not runner:
+    return {
+      "rules_runner": rules_runner,
+      "status": "Error",
+      "message": f"Rules_runner '{rules_runner}' is not defined."
+    }
+
+  body = await request.body()
+  records, errors = parse_records(body,
+                                  request.headers.get("content-type", ""))
+
+  try:
+    results = runner.evaluate_batch(
+        ruleset_id, [record for record in records if record is not None])
+  except AssertionError as e:
+    raise HTTPException(status_code=404, detail=str(e)) from e
+
+  return StreamingResponse(evaluation_stream(records, errors, results),
+                           media_type="application/x-ndjson")
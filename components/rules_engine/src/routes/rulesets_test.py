@@ -0,0 +1,281 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for ruleset endpoints
+"""
+# disabling these rules, as they cause issues with pytest fixtures
+# pylint: disable=unused-argument,redefined-outer-name,unused-import,unused-variable,ungrouped-imports
+import copy
+import json
+import os
+import pytest
+from fastapi import HTTPException
+from common.testing.firestore_emulator import firestore_emulator, clean_firestore
+from common.testing.client_with_emulator import client_with_emulator
+from models.ruleset import RuleSet
+from routes.rulesets import (RULES_RUNNERS, parse_records,
+                             evaluation_stream)
+
+os.environ["FIRESTORE_EMULATOR_HOST"] = "localhost:8080"
+
+api_url = "http://localhost/rules-engine/api/v1/ruleset"
+
+RULESET_ID = "ruleset-1"
+
+# eligible when age < 19 or age >= 65
+TEST_GORULES_RULES = {
+  "contentType": "application/vnd.gorules.decision",
+  "edges": [
+    {
+      "id": "edge-1",
+      "type": "edge",
+      "sourceId": "request",
+      "targetId": "decision"
+    },
+    {
+      "id": "edge-2",
+      "type": "edge",
+      "sourceId": "decision",
+      "targetId": "response"
+    }
+  ],
+  "nodes": [
+    {
+      "id": "request",
+      "name": "Request",
+      "type": "inputNode",
+      "position": {"x": 110, "y": 130}
+    },
+    {
+      "id": "decision",
+      "name": "eligibility_decision",
+      "type": "decisionTableNode",
+      "content": {
+        "hitPolicy": "first",
+        "inputs": [
+          {
+            "id": "age",
+            "name": "Age",
+            "type": "expression",
+            "field": "profile.age"
+          }
+        ],
+        "outputs": [
+          {
+            "id": "eligible",
+            "name": "Eligible",
+            "type": "expression",
+            "field": "eligible"
+          }
+        ],
+        "rules": [
+          {"_id": "rule-1", "age": "<19", "eligible": "true"},
+          {"_id": "rule-2", "age": ">=65", "eligible": "true"},
+          {"_id": "rule-3", "age": "", "eligible": "false"}
+        ]
+      },
+      "position": {"x": 420, "y": 130}
+    },
+    {
+      "id": "response",
+      "name": "Response",
+      "type": "outputNode",
+      "position": {"x": 720, "y": 130}
+    }
+  ]
+}
+
+NDJSON = "application/x-ndjson"
+
+
+@pytest.fixture
+def create_ruleset(clean_firestore):
+  RULES_RUNNERS["gorules"].load_rules_from_json(
+    RULESET_ID,
+    TEST_GORULES_RULES,
+    create_new_ruleset=True)
+  return RuleSet.find_by_doc_id(RULESET_ID)
+
+
+def ndjson_lines(resp):
+  return [json.loads(line) for line in resp.text.splitlines()]
+
+
+def test_parse_records_ndjson_errors():
+  body = (
+    b'{"profile": {"age": 15}}\n'
+    b'{"profile": \n'
+    b'\n'
+    b'[{"profile": {"age": 70}}]\n'
+    b'"record"\n'
+    b'{"profile": {"age": 20}}\n'
+  )
+  records, errors = parse_records(body, NDJSON)
+
+  # blank lines are skipped, invalid lines keep their place
+  assert records == [{"profile": {"age": 15}}, None, None, None,
+                     {"profile": {"age": 20}}]
+  assert sorted(errors) == [1, 2, 3]
+  assert errors[1].startswith("Invalid JSON record")
+  assert errors[2] == "Record is not a JSON object."
+  assert errors[3] == "Record is not a JSON object."
+
+
+def test_parse_records_json_array():
+  body = b'[{"profile": {"age": 15}}, 42, null, {"profile": {"age": 70}}]'
+  records, errors = parse_records(body, "application/json")
+
+  assert records == [{"profile": {"age": 15}}, None, None,
+                     {"profile": {"age": 70}}]
+  assert errors == {1: "Record is not a JSON object.",
+                    2: "Record is not a JSON object."}
+
+
+def test_parse_records_mixed_formats():
+  # with an NDJSON content type a leading array is a record line
+  body = b'[{"profile": {"age": 15}}]\n{"profile": {"age": 70}}\n'
+  records, errors = parse_records(body, NDJSON)
+  assert records == [None, {"profile": {"age": 70}}]
+  assert errors == {0: "Record is not a JSON object."}
+
+  # without it, NDJSON is detected from the first character
+  body = b'{"profile": {"age": 15}}\n[1]\n'
+  records, errors = parse_records(body, "application/json")
+  assert records == [{"profile": {"age": 15}}, None]
+  assert errors == {1: "Record is not a JSON object."}
+
+  # and a body starting with an array must be a single JSON array
+  body = b'[{"profile": {"age": 15}}]\n{"profile": {"age": 70}}\n'
+  with pytest.raises(HTTPException) as excinfo:
+    parse_records(body, "application/json")
+  assert excinfo.value.status_code == 422
+
+
+def test_evaluation_stream():
+  records = [{"a": 1}, None, {"a": 2}, {"a": 3}]
+  errors = {1: "Record is not a JSON object."}
+  results = iter([{"result": {"ok": True}},
+                  ValueError("evaluation failed"),
+                  {"result": {"ok": False}}])
+
+  lines = [json.loads(line)
+           for line in evaluation_stream(records, errors, results)]
+  assert lines == [
+    {"index": 0, "status": "Success", "result": {"ok": True}},
+    {"index": 1, "status": "Error",
+     "message": "Record is not a JSON object."},
+    {"index": 2, "status": "Error", "message": "evaluation failed"},
+    {"index": 3, "status": "Success", "result": {"ok": False}},
+  ]
+
+
+def test_evaluate_batch_ndjson(client_with_emulator, create_ruleset):
+  body = "\n".join([
+    '{"profile": {"age": 15}}',
+    'not json',
+    '{"profile": {"age": 20}}',
+    '[{"profile": {"age": 70}}]',
+    '{"profile": {"age": 70}}',
+  ])
+  resp = client_with_emulator.post(
+    f"{api_url}/{RULESET_ID}/evaluate_batch",
+    content=body, headers={"Content-Type": NDJSON})
+  assert resp.status_code == 200, resp.text
+  assert resp.headers["content-type"].startswith(NDJSON)
+
+  lines = ndjson_lines(resp)
+  assert [line["index"] for line in lines] == [0, 1, 2, 3, 4]
+  assert [line["status"] for line in lines] == \
+      ["Success", "Error", "Success", "Error", "Success"]
+  assert lines[0]["result"]["eligible"] is True
+  assert lines[1]["message"].startswith("Invalid JSON record")
+  assert lines[2]["result"]["eligible"] is False
+  assert lines[3]["message"] == "Record is not a JSON object."
+  assert lines[4]["result"]["eligible"] is True
+
+
+def test_evaluate_batch_json_array(client_with_emulator, create_ruleset):
+  records = [{"profile": {"age": 15}}, "record", {"profile": {"age": 20}}]
+  resp = client_with_emulator.post(
+    f"{api_url}/{RULESET_ID}/evaluate_batch", json=records)
+  assert resp.status_code == 200, resp.text
+
+  lines = ndjson_lines(resp)
+  assert [line["status"] for line in lines] == \
+      ["Success", "Error", "Success"]
+  assert lines[0]["result"]["eligible"] is True
+  assert lines[1]["message"] == "Record is not a JSON object."
+  assert lines[2]["result"]["eligible"] is False
+
+
+def test_evaluate_batch_invalid_array(client_with_emulator, create_ruleset):
+  resp = client_with_emulator.post(
+    f"{api_url}/{RULESET_ID}/evaluate_batch",
+    content='[{"profile": {"age": 15}}',
+    headers={"Content-Type": "application/json"})
+  assert resp.status_code == 422, resp.text
+
+
+def test_evaluate_batch_ruleset_not_found(client_with_emulator):
+  resp = client_with_emulator.post(
+    f"{api_url}/unknown-ruleset/evaluate_batch",
+    json=[{"profile": {"age": 15}}])
+  assert resp.status_code == 404, resp.text
+
+
+def test_put_ruleset(client_with_emulator, create_ruleset):
+  resp = client_with_emulator.post(
+    f"{api_url}/{RULESET_ID}/evaluate", json={"profile": {"age": 20}})
+  assert resp.json()["result"]["eligible"] is False
+
+  rules = copy.deepcopy(TEST_GORULES_RULES)
+  rules["nodes"][1]["content"]["rules"][-1]["eligible"] = "true"
+  resp = client_with_emulator.put(f"{api_url}/{RULESET_ID}",
+                                  json={"rules_data": rules})
+  assert resp.status_code == 200, resp.text
+  assert resp.json() == {"status": "Success"}
+
+  # the cached decision is replaced by the new rules
+  resp = client_with_emulator.post(
+    f"{api_url}/{RULESET_ID}/evaluate", json={"profile": {"age": 20}})
+  assert resp.json()["result"]["eligible"] is True
+
+
+def test_put_ruleset_not_found(client_with_emulator, clean_firestore):
+  resp = client_with_emulator.put(f"{api_url}/unknown-ruleset",
+                                  json={"rules_data": TEST_GORULES_RULES})
+  assert resp.status_code == 404, resp.text
+  assert RuleSet.find_by_doc_id("unknown-ruleset") is None
+
+
+def test_delete_ruleset(client_with_emulator, create_ruleset):
+  resp = client_with_emulator.post(
+    f"{api_url}/{RULESET_ID}/evaluate_batch",
+    json=[{"profile": {"age": 15}}])
+  assert resp.status_code == 200, resp.text
+
+  resp = client_with_emulator.delete(f"{api_url}/{RULESET_ID}")
+  assert resp.status_code == 200, resp.text
+  assert resp.json() == {"status": "Success"}
+  assert RuleSet.find_by_doc_id(RULESET_ID) is None
+
+  # the cached decision is dropped with the ruleset
+  resp = client_with_emulator.post(
+    f"{api_url}/{RULESET_ID}/evaluate_batch",
+    json=[{"profile": {"age": 15}}])
+  assert resp.status_code == 404, resp.text
+
+  resp = client_with_emulator.delete(f"{api_url}/{RULESET_ID}")
+  assert resp.status_code == 404, resp.text
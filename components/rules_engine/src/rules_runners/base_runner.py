@@ -14,6 +14,8 @@
 
 """ Rules Runner base class """
 
+from typing import Iterable, Iterator, Union
+
 class BaseRulesRunner:
   def __init__(self):
     pass
@@ -23,3 +25,15 @@ class BaseRulesRunner:
 
   def evaluate(self, ruleset_id: str, content: dict):
     pass
+
+  def evaluate_batch(self, ruleset_id: str,
+                     records: Iterable[dict]) \
+                       -> Iterator[Union[dict, Exception]]:
+    for content in records:
+      try:
+        yield self.evaluate(ruleset_id, content)
+      except Exception as e: # pylint: disable=broad-exception-caught
+        yield e
+
+  def invalidate(self, ruleset_id: str):
+    pass
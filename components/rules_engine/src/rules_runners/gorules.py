@@ -16,9 +16,22 @@
 
 import zen
 import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, NamedTuple, Union
+from config import RULESET_CACHE_TTL, RULES_EVALUATE_WORKERS
 from rules_runners.base_runner import BaseRulesRunner
 from models.ruleset import RuleSet
 
+
+class CachedDecision(NamedTuple):
+  """A compiled decision and the version of the RuleSet it was built from."""
+  version: str
+  decision: "zen.ZenDecision"
+  checked_time: float
+
+
 class GoRules(BaseRulesRunner):
   """GoRules Rules Runner implementation.
 
@@ -26,8 +39,11 @@ class GoRules(BaseRulesRunner):
       BaseRulesRunner: RulesRunner base class with required functions.
   """
 
-  def __init__(self):
+  def __init__(self, cache_ttl: float = RULESET_CACHE_TTL):
     self.engine = zen.ZenEngine()
+    # compiled decisions by ruleset id
+    self.decisions = {}
+    self.cache_ttl = cache_ttl
 
   def load_rules_from_json(self,
                            ruleset_id: str,
@@ -76,6 +92,47 @@ class GoRules(BaseRulesRunner):
     }
 
     ruleset.save()
+    self.invalidate(ruleset_id)
+
+  def invalidate(self, ruleset_id: str):
+    """Remove the compiled decision of a ruleset from the cache.
+
+    Args:
+        ruleset_id (str): RuleSet doc_id
+    """
+    self.decisions.pop(ruleset_id, None)
+
+  def get_decision(self, ruleset_id: str) -> "zen.ZenDecision":
+    """Get the compiled decision of a ruleset.
+
+    The decision is compiled once per RuleSet version.  Within cache_ttl
+    seconds of the last check the cached decision is used without reading
+    the RuleSet, after that the RuleSet version is checked again, so that
+    changes made through other replicas are picked up.
+
+    Args:
+        ruleset_id (str): RuleSet doc_id
+
+    Returns:
+        ZenDecision: compiled decision
+    """
+    cached = self.decisions.get(ruleset_id)
+    now = time.monotonic()
+    if cached and now - cached.checked_time < self.cache_ttl:
+      return cached.decision
+
+    ruleset = RuleSet.find_by_doc_id(ruleset_id)
+    assert ruleset, f"Ruleset {ruleset_id} not found."
+
+    version = str(ruleset.last_modified_time)
+    if cached and cached.version == version:
+      decision = cached.decision
+    else:
+      rules_data = ruleset.runner_data["gorules"]["rules_raw_json"]
+      rules_json = json.dumps(rules_data)
+      decision = self.engine.create_decision(rules_json)
+    self.decisions[ruleset_id] = CachedDecision(version, decision, now)
+    return decision
 
 
   def evaluate(self,
@@ -90,11 +147,56 @@ class GoRules(BaseRulesRunner):
     Returns:
         dict: Evaluation result.
     """
-    ruleset = RuleSet.find_by_doc_id(ruleset_id)
-    assert ruleset, f"Ruleset {ruleset_id} not found."
-
-    rules_data = ruleset.runner_data["gorules"]["rules_raw_json"]
-    rules_json = json.dumps(rules_data)
-    decision = self.engine.create_decision(rules_json)
+    decision = self.get_decision(ruleset_id)
     result = decision.evaluate(content)
     return result
+
+  def evaluate_batch(self,
+                     ruleset_id: str,
+                     records: Iterable[dict],
+                     max_workers: int = RULES_EVALUATE_WORKERS) \
+                       -> Iterator[Union[dict, Exception]]:
+    """Evaluate a batch of records against one compiled ruleset decision.
+
+    The ruleset is loaded when this is called, so a missing ruleset fails
+    before any record is evaluated.  Records are evaluated in a thread pool
+    of max_workers threads.
+
+    Args:
+        ruleset_id (str): RuleSet doc_id
+        records (Iterable[dict]): Contents in dict format.
+        max_workers (int): Number of evaluation threads.
+
+    Returns:
+        Iterator of evaluation results in the order of records, or the
+        exception raised evaluating a record.
+    """
+    decision = self.get_decision(ruleset_id)
+    return self._evaluate_records(decision, records, max_workers)
+
+  @staticmethod
+  def _evaluate_records(decision: "zen.ZenDecision",
+                        records: Iterable[dict],
+                        max_workers: int) \
+                          -> Iterator[Union[dict, Exception]]:
+    def _evaluate(content: dict) -> Union[dict, Exception]:
+      try:
+        return decision.evaluate(content)
+      except Exception as e: # pylint: disable=broad-exception-caught
+        return e
+
+    if max_workers <= 1:
+      yield from map(_evaluate, records)
+      return
+
+    # limit the number of records in flight, so results are streamed
+    # while later records are evaluated
+    max_pending = max_workers * 4
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+      pending = deque()
+      for content in records:
+        pending.append(pool.submit(_evaluate, content))
+        if len(pending) >= max_pending:
+          yield pending.popleft().result()
+      while pending:
+        yield pending.popleft().result()
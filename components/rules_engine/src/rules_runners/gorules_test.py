@@ -17,6 +17,8 @@ Unit test for gorules.py
 """
 # disabling these rules, as they cause issues with pytest fixtures
 # pylint: disable=unused-argument,redefined-outer-name,unused-import,unused-variable,ungrouped-imports
+import copy
+from unittest import mock
 from models.rule import Rule
 from common.testing.firestore_emulator import firestore_emulator, clean_firestore
 from datetime import datetime
@@ -187,3 +189,40 @@ def test_evaluate(clean_firestore):
     }
   })
   assert output["result"]["eligible"] is False
+
+def test_evaluate_cached(clean_firestore):
+  gorules.load_rules_from_json(
+    "ruleset-1",
+    TEST_GORULES_RULES,
+    create_new_ruleset=True)
+
+  output = gorules.evaluate("ruleset-1", {"profile": {"age": 20}})
+  assert output["result"]["eligible"] is False
+
+  # The compiled decision is reused without reading the ruleset.
+  with mock.patch.object(RuleSet, "find_by_doc_id",
+                         wraps=RuleSet.find_by_doc_id) as mock_find:
+    output = gorules.evaluate("ruleset-1", {"profile": {"age": 70}})
+    assert output["result"]["eligible"] is True
+    mock_find.assert_not_called()
+
+  # Loading new rules invalidates the cached decision.
+  rules = copy.deepcopy(TEST_GORULES_RULES)
+  rules["nodes"][1]["content"]["rules"][-1]["WJzDD6aMJo"] = "true"
+  gorules.load_rules_from_json("ruleset-1", rules)
+  output = gorules.evaluate("ruleset-1", {"profile": {"age": 20}})
+  assert output["result"]["eligible"] is True
+
+def test_evaluate_batch(clean_firestore):
+  gorules.load_rules_from_json(
+    "ruleset-1",
+    TEST_GORULES_RULES,
+    create_new_ruleset=True)
+
+  ages = [15, 20, 70] * 20
+  records = [{"profile": {"age": age}} for age in ages]
+  outputs = list(gorules.evaluate_batch("ruleset-1", records, max_workers=4))
+
+  # Results are returned in the order of the records.
+  assert [output["result"]["eligible"] for output in outputs] == \
+      [age < 19 or age >= 65 for age in ages]
@@ -104,42 +104,35 @@ def search_user_by_email(email: str):
 @track_search_users
 def search_user(search_query: str,
                 skip: int = Query(0, ge=0, le=2000),
-                limit: int = Query(10, ge=1, le=100)):
-  """Filter users based on the user email, first name and last name
+                limit: int = Query(10, ge=1, le=100),
+                page_token: Optional[str] = None):
+  """Filter users whose email, first name or last name words start with
+  the words of the search query
 
   ### Args:
       search_query(str): key to search against email, first name and last name
-      skip (int): Number of objects to be skipped
+      skip (int): Number of objects to be skipped, ignored if page_token
+        is provided
       limit (int): Size of group array to be returned
+      page_token (str): next_page_token returned by a previous search, to
+        fetch the following page
 
   ### Returns:
       UserSearchResponseModel: List of user objects
   """
   try:
-    filtered_user_list = []
-    users = User.collection.order("-created_time").filter(
-      "is_deleted", "==", False).fetch()
-    fetch_length = skip + limit
-    for user in users:
-      user_dict = user.get_fields(reformat_datetime=True)
-
-      if search_query.lower() in user_dict["email"].lower():
-        filtered_user_list.append(user_dict)
-
-      elif search_query.lower() in user_dict["first_name"].lower():
-        filtered_user_list.append(user_dict)
-
-      elif search_query.lower() in user_dict["last_name"].lower():
-        filtered_user_list.append(user_dict)
-
-      if len(filtered_user_list) == fetch_length:
-        break
-    result = filtered_user_list[skip:fetch_length]
+    users, next_page_token = User.search(search_query, skip=skip,
+                                         limit=limit, page_token=page_token)
+    result = [user.get_fields(reformat_datetime=True) for user in users]
     return {
       "success": True,
       "message": "Successfully fetched the users",
-      "data": result
+      "data": result,
+      "next_page_token": next_page_token
     }
+  except ValidationError as error:
+    logger.error(f"Validation error searching users: {error}")
+    raise BadRequest(str(error)) from error
   except Exception as error:
     logger.error(f"Error searching users with query '{search_query}': {error}")
     logger.error(traceback.format_exc())
@@ -191,10 +184,7 @@ def get_users(user_type: Optional[str] = None,
     if status is not None:
       collection_manager = collection_manager.filter("status", "==", status)
 
-    total_users = collection_manager.fetch()
-    count = 0
-    for idx, i in enumerate(total_users):
-      count = idx + 1
+    count = User.count_query(collection_manager)
 
     users = collection_sorting(collection_manager=collection_manager,
                                sort_by=sort_by, sort_order=sort_order,
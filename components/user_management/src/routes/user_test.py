@@ -18,6 +18,7 @@
 # disabling pylint rules that conflict with pytest fixtures
 # pylint: disable=unused-argument,redefined-outer-name,unused-import
 import os
+import datetime
 import pytest
 from copy import deepcopy
 from unittest import mock
@@ -902,6 +903,66 @@ def test_search_users(clean_firestore):
     assert i["first_name"] == filter_key, "Filtered output is wrong"
 
 
+def test_search_users_prefix_pagination(clean_firestore):
+  for first_name, email in [("steve", "steve.jobs@example.com"),
+                            ("stephen", "stephen.jobs@example.com"),
+                            ("tim", "tim.jobs@example.com")]:
+    user_dict = {**BASIC_USER_MODEL_EXAMPLE, "user_type_ref": "",
+                 "first_name": first_name, "email": email}
+    user = User.from_dict(user_dict)
+    user.user_id = ""
+    user.save()
+    user.user_id = user.id
+    user.update()
+
+  url = f"{api_url}/search"
+  params = {"search_query": "STE jobs", "limit": 1}
+  resp = client_with_emulator.get(url, params=params)
+  json_response = resp.json()
+  assert resp.status_code == 200, "Status should be 200"
+  first_page = json_response.get("data")
+  assert len(first_page) == 1
+  assert "search_tokens" not in first_page[0]
+  assert json_response.get("next_page_token") is not None
+
+  params["page_token"] = json_response.get("next_page_token")
+  resp = client_with_emulator.get(url, params=params)
+  json_response = resp.json()
+  assert resp.status_code == 200, "Status should be 200"
+  second_page = json_response.get("data")
+  assert len(second_page) == 1
+  assert {first_page[0]["first_name"], second_page[0]["first_name"]} == \
+    {"steve", "stephen"}, "Search matches prefixes of every query word"
+
+
+def test_search_users_pagination_same_time(clean_firestore):
+  # users created at the same time are not skipped between pages
+  created_time = datetime.datetime.utcnow()
+  user_ids = set()
+  for i in range(5):
+    user_dict = {**BASIC_USER_MODEL_EXAMPLE, "user_type_ref": "",
+                 "first_name": f"steve{i}",
+                 "email": f"steve{i}.jobs@example.com"}
+    user = User.from_dict(user_dict)
+    user.user_id = ""
+    user.save(input_datetime=created_time)
+    user_ids.add(user.id)
+
+  url = f"{api_url}/search"
+  params = {"search_query": "steve", "limit": 2}
+  page_ids = []
+  while True:
+    resp = client_with_emulator.get(url, params=params)
+    assert resp.status_code == 200, "Status should be 200"
+    json_response = resp.json()
+    page_ids.extend(i["id"] for i in json_response.get("data"))
+    if not json_response.get("next_page_token"):
+      break
+    params["page_token"] = json_response.get("next_page_token")
+  assert len(page_ids) == len(user_ids), "users skipped or repeated"
+  assert set(page_ids) == user_ids, "users skipped"
+
+
 def test_search_users_negative(clean_firestore):
   user_dict = {**BASIC_USER_MODEL_EXAMPLE, "user_type_ref": ""}
   user = User.from_dict(user_dict)
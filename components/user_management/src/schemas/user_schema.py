@@ -89,11 +89,13 @@ class UserSearchResponseModel(BaseModel):
   success: bool = True
   message: str = "Successfully fetched the users"
   data: List[FullUserDataModel]
+  next_page_token: Optional[str] = None
   model_config = ConfigDict(from_attributes=True, json_schema_extra={
       "example": {
           "success": True,
           "message": "Successfully fetched the users",
-          "data": [FULL_USER_MODEL_EXAMPLE]
+          "data": [FULL_USER_MODEL_EXAMPLE],
+          "next_page_token": None
       }
   })
 
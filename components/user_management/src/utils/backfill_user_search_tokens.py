@@ -0,0 +1,25 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+  Add the search index (User.search_tokens) to users created before user
+  search used it.  Run once from the user management src folder:
+
+  PYTHONPATH=../../common/src python utils/backfill_user_search_tokens.py
+"""
+from common.models import User
+
+if __name__ == "__main__":
+  num_updated = User.backfill_search_tokens()
+  print(f"Updated search tokens of {num_updated} users")
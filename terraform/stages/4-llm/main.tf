@@ -47,7 +47,8 @@ resource "null_resource" "dummy_collections_delete" {
     google_firestore_index.batch_jobs_index,
     google_firestore_index.query_documents_index,
     google_firestore_index.query_documents_2_index,
-    google_firestore_index.query_engines_index
+    google_firestore_index.query_engines_index,
+    google_firestore_index.users_search_index
   ]
   provisioner "local-exec" {
     command = "python3 dummy_collections_delete.py"
@@ -188,6 +189,29 @@ resource "google_firestore_index" "query_engines_index" {
   }
 }
 
+# user search by prefix tokens, see common.models.User.search
+resource "google_firestore_index" "users_search_index" {
+  depends_on = [null_resource.dummy_collections_create]
+  project    = var.project_id
+  collection = "users"
+
+  fields {
+    field_path   = "search_tokens"
+    array_config = "CONTAINS"
+  }
+  fields {
+    field_path = "is_deleted"
+    order      = "ASCENDING"
+  }
+  fields {
+    field_path = "created_time"
+    order      = "DESCENDING"
+  }
+  fields {
+    field_path = "__name__"
+    order      = "DESCENDING"
+  }
+}
 
 resource "google_secret_manager_secret" "llm_backend_robot_username" {
   secret_id = "llm-backend-robot-username"